@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Almacén de instantáneas compartido por todos los procesos de una máquina
+(varios workers de Streamlit detrás de un balanceador, y api.py).
+
+Es un fichero SQLite en modo WAL (VALENCIA_ALMACEN): los lectores no
+bloquean al que escribe ni entre ellos, y cada proceso abre una conexión por
+hilo.
+  - llegadas: una fila por URL de llegadas (metro o EMT) con el instante de
+    su última descarga buena y los movimientos como un array JSON de
+    [línea, destino, hora], sin nombres de campo. Cada escritura lleva una
+    versión que se asigna dentro de su transacción, así que crece en el orden
+    en que se confirman y los demás procesos leen lo nuevo con
+    `version > la última que vieron` (el instante de descarga no sirve: se
+    toma antes de escribir y otro proceso puede confirmar antes una fila
+    más reciente).
+  - instantaneas: la disponibilidad de ValenBici, con un número de versión
+    que solo cambia cuando cambian los datos; la fecha de la última
+    comprobación va aparte, así que un 304 no obliga a nadie a releerla.
+  - lideres: un arrendamiento por tarea ('metro', 'valenbici'). El proceso
+    que lo tiene descarga y publica; los demás leen del almacén lo que ha
+    cambiado y reconstruyen su instantánea en memoria una vez por cambio,
+    no en cada lectura. Si el líder muere, su arrendamiento caduca y otro
+    proceso lo toma.
+  - vistas: lecturas de cada estación en los procesos que no son el líder,
+    para que su planificador (planificador.py) sepa qué se está mirando. Se
+    leen igual, por su id (AUTOINCREMENT: no se reutiliza al borrar).
+Así las peticiones a los servicios de origen no crecen con el número de
+procesos. Las llegadas de EMT, que se piden bajo demanda, se comparten con
+cargador(): antes de descargar una parada se mira si otro proceso la ha
+descargado hace menos de `frescura` segundos.
+
+Sin VALENCIA_ALMACEN cada proceso funciona por su cuenta, como siempre.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from prefetch_metro import Movimiento, a_diccionarios, a_movimientos
+
+RUTA = os.environ.get('VALENCIA_ALMACEN')
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS llegadas (url TEXT PRIMARY KEY, version INTEGER NOT NULL, actualizada REAL NOT NULL,
+                                     datos BLOB NOT NULL);
+CREATE INDEX IF NOT EXISTS llegadas_version ON llegadas (version);
+CREATE TABLE IF NOT EXISTS instantaneas (nombre TEXT PRIMARY KEY, version INTEGER NOT NULL,
+                                         modificada REAL NOT NULL, comprobada REAL NOT NULL, datos BLOB NOT NULL);
+CREATE TABLE IF NOT EXISTS lideres (tarea TEXT PRIMARY KEY, proceso TEXT NOT NULL, hasta REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS vistas (id INTEGER PRIMARY KEY AUTOINCREMENT, url TEXT NOT NULL, veces REAL NOT NULL,
+                                   instante REAL NOT NULL);
+CREATE INDEX IF NOT EXISTS vistas_instante ON vistas (instante);
+"""
+
+
+def _codificar(registros):
+    return json.dumps(registros, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+class AlmacenInstantaneas:
+
+    def __init__(self, ruta, reloj=time.time):
+        self.ruta = ruta
+        self._reloj = reloj
+        # Identifica a este proceso en los arrendamientos (el pid solo se puede reutilizar)
+        self.proceso = f'{os.getpid()}-{uuid.uuid4().hex[:8]}'
+        self._local = threading.local()
+        directorio = os.path.dirname(os.path.abspath(ruta))
+        os.makedirs(directorio, exist_ok=True)
+        conexion = self._conexion()
+        conexion.execute('PRAGMA journal_mode=WAL')
+        conexion.executescript(ESQUEMA)
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+
+    def _conexion(self):
+        # Una conexión por hilo, en modo autocommit: cada sentencia es su propia transacción
+        conexion = getattr(self._local, 'conexion', None)
+        if conexion is None:
+            conexion = sqlite3.connect(self.ruta, timeout=5.0, isolation_level=None)
+            conexion.execute('PRAGMA synchronous=NORMAL')
+            self._local.conexion = conexion
+        return conexion
+
+    # :::::::::::::::::::::::::::: ARRENDAMIENTOS ::::::::::::::::::::::::::::
+
+    def liderar(self, tarea, duracion):
+        """True si este proceso es (o pasa a ser) el que hace `tarea` durante los próximos `duracion` segundos."""
+        ahora = self._reloj()
+        # Una sola sentencia: se toma si está libre o caducado, se renueva si ya es nuestro
+        cursor = self._conexion().execute(
+            'INSERT INTO lideres (tarea, proceso, hasta) VALUES (?, ?, ?) '
+            'ON CONFLICT (tarea) DO UPDATE SET proceso = excluded.proceso, hasta = excluded.hasta '
+            'WHERE lideres.proceso = excluded.proceso OR lideres.hasta < ?',
+            (tarea, self.proceso, ahora + duracion, ahora))
+        return cursor.rowcount == 1
+
+    def es_lider(self, tarea):
+        """True si este proceso tiene ahora el arrendamiento de `tarea` (sin tomarlo ni renovarlo)."""
+        fila = self._conexion().execute('SELECT proceso, hasta FROM lideres WHERE tarea = ?', (tarea,)).fetchone()
+        return fila is not None and fila[0] == self.proceso and fila[1] >= self._reloj()
+
+    def soltar(self, tarea):
+        self._conexion().execute('DELETE FROM lideres WHERE tarea = ? AND proceso = ?', (tarea, self.proceso))
+
+    # ::::::::::::::::::::::::::::::: LLEGADAS :::::::::::::::::::::::::::::::
+
+    def guardar_llegadas(self, llegadas, actualizada=None):
+        """Guarda {url: tupla de Movimiento} descargadas en `actualizada` (ahora si no se indica)."""
+        actualizada = self._reloj() if actualizada is None else actualizada
+        conexion = self._conexion()
+        # IMMEDIATE: con el bloqueo de escritura tomado, nadie confirma otra versión entre la lectura y el insert
+        conexion.execute('BEGIN IMMEDIATE')
+        try:
+            version = conexion.execute('SELECT IFNULL(MAX(version), 0) + 1 FROM llegadas').fetchone()[0]
+            conexion.executemany(
+                'INSERT OR REPLACE INTO llegadas (url, version, actualizada, datos) VALUES (?, ?, ?, ?)',
+                [(url, version, actualizada, _codificar(m)) for url, m in llegadas.items()])
+        except BaseException:
+            conexion.execute('ROLLBACK')
+            raise
+        conexion.execute('COMMIT')
+
+    def llegadas_desde(self, version, urls=None):
+        """[(url, versión, actualizada, tupla de Movimiento)] escritas después de `version`, solo de `urls`
+        si se indican."""
+        consulta = 'SELECT url, version, actualizada, datos FROM llegadas WHERE version > ?'
+        parametros = [version]
+        if urls is not None:
+            urls = list(urls)
+            consulta += f" AND url IN ({', '.join('?' * len(urls))})"
+            parametros += urls
+        filas = self._conexion().execute(consulta, parametros).fetchall()
+        return [(url, version, actualizada, tuple(Movimiento(*m) for m in json.loads(datos)))
+                for url, version, actualizada, datos in filas]
+
+    def llegada(self, url):
+        """(actualizada, tupla de Movimiento) de `url`, o None si nadie la ha descargado."""
+        fila = self._conexion().execute('SELECT actualizada, datos FROM llegadas WHERE url = ?', (url,)).fetchone()
+        if fila is None:
+            return None
+        return fila[0], tuple(Movimiento(*m) for m in json.loads(fila[1]))
+
+    def cargador(self, cargar, frescura):
+        """Envuelve `cargar(url)` (descargar_movimientos): usa la descarga de otro proceso si es reciente."""
+        def cargar_compartido(url):
+            guardada = self.llegada(url)
+            if guardada is not None and self._reloj() - guardada[0] < frescura:
+                self._contar('aciertos')
+                return a_diccionarios(guardada[1])
+            self._contar('fallos')
+            movimientos = cargar(url)
+            self.guardar_llegadas({url: a_movimientos(movimientos)})
+            return movimientos
+        return cargar_compartido
+
+    def _contar(self, contador):
+        # cargador() se llama desde los hilos de todas las sesiones: += no es atómico
+        with self._lock:
+            setattr(self, contador, getattr(self, contador) + 1)
+
+    # :::::::::::::::::::::::::::::::: VISTAS ::::::::::::::::::::::::::::::::
+
+    def anotar_vistas(self, vistas):
+        """Guarda {url: lecturas} de este proceso para el líder."""
+        ahora = self._reloj()
+        self._conexion().executemany('INSERT INTO vistas (url, veces, instante) VALUES (?, ?, ?)',
+                                     [(url, veces, ahora) for url, veces in vistas.items()])
+
+    def vistas_desde(self, id_, olvidar=300.0):
+        """[(id, url, lecturas)] anotadas después de la vista `id_`; borra las de hace más de `olvidar` s."""
+        conexion = self._conexion()
+        conexion.execute('DELETE FROM vistas WHERE instante < ?', (self._reloj() - olvidar,))
+        return conexion.execute('SELECT id, url, veces FROM vistas WHERE id > ?', (id_,)).fetchall()
+
+    # ::::::::::::::::::::::::::::: INSTANTÁNEAS :::::::::::::::::::::::::::::
+
+    def publicar(self, nombre, modificada, comprobada, registros=None):
+        """Publica una versión nueva con `registros`, o solo la fecha de comprobación si es None."""
+        conexion = self._conexion()
+        if registros is None:
+            conexion.execute('UPDATE instantaneas SET comprobada = ? WHERE nombre = ?', (comprobada, nombre))
+            return
+        conexion.execute(
+            'INSERT INTO instantaneas (nombre, version, modificada, comprobada, datos) VALUES (?, 1, ?, ?, ?) '
+            'ON CONFLICT (nombre) DO UPDATE SET version = version + 1, modificada = excluded.modificada, '
+            'comprobada = excluded.comprobada, datos = excluded.datos',
+            (nombre, modificada, comprobada, _codificar(registros)))
+
+    def leer(self, nombre, version=None):
+        """(versión, modificada, comprobada, registros) de `nombre`, con registros None si la versión
+        es la que ya se tiene; None si nadie la ha publicado."""
+        conexion = self._conexion()
+        fila = conexion.execute('SELECT version, modificada, comprobada FROM instantaneas WHERE nombre = ?',
+                                (nombre,)).fetchone()
+        if fila is None:
+            return None
+        if fila[0] == version:
+            return fila + (None,)
+        # Versión y datos en la misma consulta: otro proceso puede haber publicado entre medias
+        fila = conexion.execute('SELECT version, modificada, comprobada, datos FROM instantaneas WHERE nombre = ?',
+                                (nombre,)).fetchone()
+        return fila[:3] + (json.loads(fila[3]),)
+
+
+def abrir():
+    """Almacén de VALENCIA_ALMACEN, o None si no está configurado."""
+    return AlmacenInstantaneas(RUTA) if RUTA else None
@@ -0,0 +1,501 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+API HTTP de solo lectura (JSON) para aplicaciones móviles y pantallas.
+
+Es un proceso aparte de Streamlit que usa las mismas piezas que la
+aplicación: el motor de precarga del metro (PrefetchMetro), la caché de
+llegadas de EMT (CacheLlegadas con descargar_movimientos), el servicio de
+ValenBici y los índices de búsqueda y espacial sobre el paquete de datos.
+Casi todas las respuestas salen de las instantáneas en memoria de esos
+motores, sin red:
+  - un servidor asyncio propio (solo GET y HEAD, HTTP/1.1 con keep-alive),
+  - caché de respuestas ya serializadas por URL, válida mientras no cambie
+    la versión de los datos de los que sale (la instantánea del motor) y
+    durante un máximo de segundos por ruta,
+  - ETag (débil, el mismo con y sin gzip) y 304 con If-None-Match,
+  - gzip con Accept-Encoding, comprimido una sola vez por respuesta cacheada.
+
+Rutas:
+  GET /v1/buscar?tipo=metro|emt&q=benimac&k=20
+  GET /v1/metro/llegadas?estacion=Benimaclet
+  GET /v1/emt/llegadas?parada=2180          (nombre o número de parada)
+  GET /v1/valenbici                          (todas las estaciones; ?numero=84 para una)
+  GET /v1/cercanas?lat=39.4699&lon=-0.3763&radio=400&tipos=Metro,EMT
+  GET /metrics                               (métricas del proceso, ver metricas.py)
+
+Uso: python api.py --puerto 8080
+"""
+
+import argparse
+import asyncio
+import gzip
+import hashlib
+import json
+import logging
+import math
+import os
+import sys
+import time
+from collections import OrderedDict, namedtuple
+from datetime import datetime
+from email.utils import formatdate
+from urllib.parse import parse_qsl, urlsplit
+
+import numpy as np
+
+import almacen_compartido
+import datos_estaticos
+import metricas
+from buscador import IndiceBusqueda, normalizar
+from cache_llegadas import CacheLlegadas
+from historico import Historico
+from indice_espacial import TIPOS, IndiceTransporte
+from llegadas import descargar_movimientos
+from planificador import ttl_llegadas
+from prefetch_metro import PrefetchMetro
+from tiempos import segundos_restantes_bus, segundos_restantes_metro
+from valenbici import ServicioValenBici
+
+log = logging.getLogger('api')
+
+PUERTO = int(os.environ.get('VALENCIA_API_PUERTO', 8080))
+HOST = os.environ.get('VALENCIA_API_HOST', '127.0.0.1')
+
+MAX_CABECERAS = 16384  # bytes de la línea de petición y las cabeceras
+MAX_CUERPO = 65536  # bytes de cuerpo que se leen (y descartan) antes de responder 405
+ESPERA_CONEXION = 30.0  # segundos sin peticiones antes de cerrar una conexión keep-alive
+MIN_GZIP = 1024  # bytes: por debajo no merece la pena comprimir
+MAX_K = 200
+MAX_RADIO = 5000
+
+TIEMPO_API = metricas.registro.histograma('valencia_api_segundos', 'Duración de las respuestas de la API',
+                                           ('ruta', 'estado'))
+
+ESTADOS = {200: 'OK', 304: 'Not Modified', 400: 'Bad Request', 404: 'Not Found',
+           405: 'Method Not Allowed', 413: 'Payload Too Large', 431: 'Request Header Fields Too Large',
+           500: 'Internal Server Error', 502: 'Bad Gateway'}
+
+# Respuesta ya serializada: el cuerpo en gzip se calcula la primera vez que se pide
+Respuesta = namedtuple('Respuesta', ['estado', 'cuerpo', 'etag', 'max_edad', 'comprimido'])
+
+
+class ErrorAPI(Exception):
+
+    def __init__(self, estado, mensaje):
+        super().__init__(mensaje)
+        self.estado = estado
+        self.mensaje = mensaje
+
+
+def respuesta_json(objeto, max_edad=0, estado=200):
+    cuerpo = json.dumps(objeto, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    etag = 'W/"' + hashlib.blake2b(cuerpo, digest_size=12).hexdigest() + '"'
+    comprimido = [None] if len(cuerpo) >= MIN_GZIP else None
+    return Respuesta(estado, cuerpo, etag, max_edad, comprimido)
+
+
+def _gzip(respuesta):
+    if respuesta.comprimido[0] is None:
+        # Varias peticiones a la vez pueden comprimir la misma respuesta: el resultado es igual
+        respuesta.comprimido[0] = gzip.compress(respuesta.cuerpo, compresslevel=6, mtime=0)
+    return respuesta.comprimido[0]
+
+
+def _coincide(if_none_match, etag):
+    if if_none_match.strip() == '*':
+        return True
+    opaco = etag[2:]
+    return any(v.strip().removeprefix('W/') == opaco for v in if_none_match.split(','))
+
+
+def _parametro(consulta, nombre, tipo=str, defecto=None):
+    valor = consulta.get(nombre)
+    if valor is None or valor == '':
+        if defecto is None:
+            raise ErrorAPI(400, f'falta el parámetro {nombre}')
+        return defecto
+    try:
+        valor = tipo(valor)
+    except ValueError:
+        raise ErrorAPI(400, f'valor no válido para {nombre}')
+    if isinstance(valor, float) and not math.isfinite(valor):
+        raise ErrorAPI(400, f'valor no válido para {nombre}')
+    return valor
+
+
+class CacheRespuestas:
+    """Respuestas por URL con su versión de datos y su caducidad; expulsa las menos usadas."""
+
+    def __init__(self, max_entradas=8192, reloj=time.monotonic):
+        self.max_entradas = max_entradas
+        self._reloj = reloj
+        self._entradas = OrderedDict()  # clave -> (caduca, versión, Respuesta)
+        self.aciertos = 0
+        self.fallos = 0
+
+    def obtener(self, clave, version):
+        # Solo se usa desde el bucle de asyncio: no hace falta lock
+        entrada = self._entradas.get(clave)
+        if entrada is not None and entrada[1] == version and self._reloj() < entrada[0]:
+            self._entradas.move_to_end(clave)
+            self.aciertos += 1
+            return entrada[2]
+        self.fallos += 1
+        return None
+
+    def guardar(self, clave, version, respuesta):
+        self._entradas[clave] = (self._reloj() + respuesta.max_edad, version, respuesta)
+        self._entradas.move_to_end(clave)
+        while len(self._entradas) > self.max_entradas:
+            self._entradas.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entradas)
+
+
+# :::::::::::::::::::::::::::::::: DATOS :::::::::::::::::::::::::::::::::
+
+class Datos:
+    """Índices y motores compartidos por todas las peticiones del proceso."""
+
+    def __init__(self, motor_metro=None, cache_emt=None, valenbici=None, historico=None):
+        paquete = datos_estaticos.paquete()
+        metro, emt = paquete['metro'], paquete['emt']
+        self.indice_metro = IndiceBusqueda(metro['Denominació / Denominación'])
+        self.indice_emt = IndiceBusqueda(emt['Denominació / Denominación'], emt['Id. Parada'])
+        self.indice_transporte = IndiceTransporte.desde_paquete(paquete)
+        # Nombre -> URL de llegadas (la primera fila de cada nombre, como en la aplicación)
+        self.urls_metro, self.urls_emt, self.ids_emt = {}, {}, {}
+        for nombre, url in zip(metro['Denominació / Denominación'], metro['Pròximes Arribades / Próximas llegadas']):
+            self.urls_metro.setdefault(str(nombre), str(url))
+        for nombre, url, id_parada in zip(emt['Denominació / Denominación'],
+                                          emt['Pròximes Arribades / Proximas Llegadas'], emt['Id. Parada']):
+            self.urls_emt.setdefault(str(nombre), str(url))
+            self.ids_emt.setdefault(str(nombre), int(id_parada))
+
+        # Los motores llevan sus propios hilos. Con VALENCIA_ALMACEN comparten las descargas con los
+        # procesos de Streamlit, y el que tenga el arrendamiento de cada tarea (este u otro) alimenta el histórico
+        self.almacen = almacen_compartido.abrir()
+        self.historico = historico or Historico(intervalo=float(os.environ.get('VALENCIA_VOLCADO_HISTORICO', 900)),
+                                                almacen=self.almacen)
+        self.motor_metro = motor_metro or PrefetchMetro(
+            list(self.urls_metro.values()), descargar_movimientos,
+            periodo=float(os.environ.get('VALENCIA_PERIODO_METRO', 10)),
+            concurrencia=int(os.environ.get('VALENCIA_CONCURRENCIA_METRO', 8)), almacen=self.almacen,
+            al_publicar=self.historico.registrar_metro, al_ceder=self.historico.metro.volcar,
+            presupuesto=float(os.environ.get('VALENCIA_PRESUPUESTO_METRO', 0)) or None,
+            intervalo_minimo=float(os.environ.get('VALENCIA_INTERVALO_MIN_METRO', 2)),
+            intervalo_maximo=float(os.environ.get('VALENCIA_INTERVALO_MAX_METRO', 120)))
+        ttl = float(os.environ.get('VALENCIA_TTL_LLEGADAS', 5))
+        self.cache_emt = cache_emt or CacheLlegadas(ttl=ttl,
+                                                    max_entradas=int(os.environ.get('VALENCIA_MAX_ESTACIONES', 512)),
+                                                    max_edad=float(os.environ.get('VALENCIA_MAX_EDAD_LLEGADAS', 600)),
+                                                    ttl_de=ttl_llegadas(
+                                                        ttl, float(os.environ.get('VALENCIA_TTL_MAX_LLEGADAS', 60))))
+        self.valenbici = valenbici or ServicioValenBici(periodo=float(os.environ.get('VALENCIA_PERIODO_VALENBICI', 60)),
+                                                        almacen=self.almacen,
+                                                        al_publicar=self.historico.registrar_valenbici,
+                                                        al_ceder=self.historico.valenbici.volcar)
+        self.cargar_llegadas = (descargar_movimientos if self.almacen is None
+                                else self.almacen.cargador(descargar_movimientos, frescura=self.cache_emt.ttl))
+        metricas.CACHES.vigilar('llegadas', self.cache_emt, acierto='aciertos', fallo='fallos', obsoleta='obsoletas')
+        if self.almacen is not None:
+            metricas.CACHES.vigilar('almacen', self.almacen, acierto='aciertos', fallo='fallos')
+        metricas.EVENTOS.vigilar('prefetch_metro', self.motor_metro, rondas='rondas', descargas='descargas',
+                                 lecturas='lecturas', errores='errores')
+        metricas.EVENTOS.vigilar('valenbici', self.valenbici, descargas='descargas', errores='errores',
+                                 no_modificadas='no_modificadas', estaciones_cambiadas='estaciones_cambiadas',
+                                 lecturas='lecturas')
+
+    def iniciar(self):
+        self.motor_metro.iniciar()
+        self.valenbici.iniciar()
+        return self
+
+    def detener(self):
+        self.motor_metro.detener()
+        self.valenbici.detener()
+
+
+# ::::::::::::::::::::::::::::::::: RUTAS ::::::::::::::::::::::::::::::::::
+# Cada ruta: (función que da la versión de sus datos, segundos máximos en caché, manejador).
+# El manejador recibe la consulta y devuelve el objeto que se serializa a JSON.
+
+class API:
+
+    def __init__(self, datos, cache=None):
+        self.datos = datos
+        self.cache = cache or CacheRespuestas()
+        metricas.CACHES.vigilar('api', self.cache, acierto='aciertos', fallo='fallos')
+        motor, bicis = datos.motor_metro, datos.valenbici
+        self.rutas = {
+            '/v1/buscar': (lambda: 0, 3600, self.buscar),
+            '/v1/metro/llegadas': (lambda: motor.instantanea().creada, 1, self.llegadas_metro),
+            '/v1/emt/llegadas': (lambda: 0, datos.cache_emt.ttl, self.llegadas_emt),
+            '/v1/valenbici': (lambda: bicis.instantanea().modificada, 5, self.valenbici),
+            '/v1/cercanas': (lambda: 0, 3600, self.cercanas),
+        }
+
+    async def buscar(self, consulta):
+        tipo = _parametro(consulta, 'tipo', defecto='metro')
+        if tipo not in ('metro', 'emt'):
+            raise ErrorAPI(400, "tipo debe ser 'metro' o 'emt'")
+        k = max(1, min(_parametro(consulta, 'k', int, 20), MAX_K))
+        indice = self.datos.indice_metro if tipo == 'metro' else self.datos.indice_emt
+        nombres = indice.buscar(consulta.get('q', ''), k=k)
+        if tipo == 'metro':
+            return {'resultados': [{'nombre': n} for n in nombres]}
+        return {'resultados': [{'nombre': n, 'id': self.datos.ids_emt.get(n)} for n in nombres]}
+
+    def _resolver(self, texto, urls, indice, ids=None):
+        # Nombre exacto, el mismo sin mayúsculas ni acentos, o número de parada (EMT)
+        if texto in urls:
+            return texto
+        encontradas = indice.buscar(texto, k=1)
+        if encontradas:
+            nombre = encontradas[0]
+            if normalizar(nombre) == normalizar(texto) or (ids is not None and str(ids.get(nombre)) == texto):
+                return nombre
+        return None
+
+    async def llegadas_metro(self, consulta):
+        estacion = self._resolver(_parametro(consulta, 'estacion'), self.datos.urls_metro, self.datos.indice_metro)
+        if estacion is None:
+            raise ErrorAPI(404, 'estación desconocida')
+        url = self.datos.urls_metro[estacion]
+        self.datos.motor_metro.ver(url)
+        instantanea = self.datos.motor_metro.instantanea()
+        movimientos = instantanea.llegadas.get(url)
+        actualizado = instantanea.actualizadas.get(url)
+        if movimientos is None:
+            # El motor aún no ha descargado esta estación
+            movimientos = [(m["Número de Línea"], m["Destino"], m["Tiempo"])
+                           for m in await self._descargar(url)]
+            actualizado = time.time() - (self.datos.cache_emt.edad(url) or 0.0)
+        ahora = time.time()
+        segundos = segundos_restantes_metro([m[2] for m in movimientos], datetime.fromtimestamp(ahora))
+        llegadas = [{'linea': linea, 'destino': destino, 'hora': hora,
+                     'segundos': None if np.isnan(s) else int(s)}
+                    for (linea, destino, hora), s in zip(movimientos, segundos)]
+        llegadas.sort(key=lambda l: (l['segundos'] is None, l['segundos'] or 0, l['destino']))
+        return {'estacion': estacion, 'actualizado': round(actualizado, 3), 'generado': round(ahora, 3),
+                'llegadas': llegadas}
+
+    async def llegadas_emt(self, consulta):
+        parada = self._resolver(_parametro(consulta, 'parada'), self.datos.urls_emt, self.datos.indice_emt,
+                                self.datos.ids_emt)
+        if parada is None:
+            raise ErrorAPI(404, 'parada desconocida')
+        url = self.datos.urls_emt[parada]
+        movimientos = await self._descargar(url)
+        actualizado = time.time() - (self.datos.cache_emt.edad(url) or 0.0)
+        segundos = segundos_restantes_bus([m["Tiempo"] for m in movimientos])
+        llegadas = [{'linea': m["Número de Línea"], 'destino': m["Destino"], 'tiempo': m["Tiempo"],
+                     'segundos': None if np.isnan(s) else int(s)}
+                    for m, s in zip(movimientos, segundos)]
+        llegadas.sort(key=lambda l: (l['segundos'] is None, l['segundos'] or 0))
+        return {'parada': parada, 'id': self.datos.ids_emt[parada], 'actualizado': round(actualizado, 3),
+                'generado': round(time.time(), 3), 'llegadas': llegadas}
+
+    async def _descargar(self, url):
+        # La caché une las peticiones simultáneas a la misma URL; la descarga bloquea, va a un hilo
+        try:
+            return await asyncio.to_thread(self.datos.cache_emt.obtener, url, self.datos.cargar_llegadas)
+        except Exception as e:
+            log.warning('No se pudieron obtener las llegadas: %s', type(e).__name__)
+            raise ErrorAPI(502, 'el servicio de llegadas no responde')
+
+    async def valenbici(self, consulta):
+        instantanea = self.datos.valenbici.instantanea()
+        estaciones = instantanea.estaciones
+        if consulta.get('numero'):
+            numero = _parametro(consulta, 'numero', int)
+            if numero not in estaciones:
+                raise ErrorAPI(404, 'estación desconocida')
+            estaciones = {numero: estaciones[numero]}
+        return {'origen': instantanea.origen, 'actualizado': round(instantanea.modificada, 3),
+                'estaciones': [e._asdict() for _, e in sorted(estaciones.items())]}
+
+    async def cercanas(self, consulta):
+        lat, lon = _parametro(consulta, 'lat', float), _parametro(consulta, 'lon', float)
+        radio = min(_parametro(consulta, 'radio', float, 400.0), MAX_RADIO)
+        tipos = set(consulta['tipos'].split(',')) if consulta.get('tipos') else set(TIPOS.values())
+        indice = self.datos.indice_transporte
+        indices, distancias = indice.en_radio(lat, lon, radio)
+        filas = [f for f in indice.filas(indices, distancias) if f['Tipo'] in tipos]
+        return {'resultados': [{'tipo': f['Tipo'], 'nombre': f['Nombre'], 'lineas': f['Líneas'],
+                                'distancia': f['Distancia (m)'], 'lat': f['lat'], 'lon': f['lon']}
+                               for f in filas]}
+
+    async def responder(self, destino):
+        """Respuesta (cacheada si se puede) para la ruta y consulta de `destino`."""
+        partes = urlsplit(destino)
+        if partes.path == '/metrics':
+            return Respuesta(200, metricas.registro.exportar().encode('utf-8'), None, 0, None)
+        ruta = self.rutas.get(partes.path)
+        if ruta is None:
+            return respuesta_json({'error': 'ruta desconocida'}, estado=404)
+        version, max_edad, manejador = ruta
+        clave = partes.path + '?' + partes.query
+        actual = version()
+        respuesta = self.cache.obtener(clave, actual)
+        if respuesta is None:
+            try:
+                objeto = await manejador(dict(parse_qsl(partes.query)))
+            except ErrorAPI as e:
+                return respuesta_json({'error': e.mensaje}, estado=e.estado)
+            respuesta = respuesta_json(objeto, max_edad)
+            self.cache.guardar(clave, actual, respuesta)
+        return respuesta
+
+
+# :::::::::::::::::::::::::::::::: SERVIDOR :::::::::::::::::::::::::::::::
+
+def _cabecera(estado, respuesta, cuerpo, gz, seguir):
+    lineas = [f'HTTP/1.1 {estado} {ESTADOS.get(estado, "")}',
+              f'Date: {formatdate(usegmt=True)}',
+              'Content-Type: ' + ('text/plain; version=0.0.4; charset=utf-8' if respuesta.etag is None
+                                  else 'application/json; charset=utf-8'),
+              f'Content-Length: {len(cuerpo)}',
+              'Access-Control-Allow-Origin: *']
+    if respuesta.etag is not None:
+        lineas.append(f'ETag: {respuesta.etag}')
+        lineas.append(f'Cache-Control: public, max-age={int(respuesta.max_edad)}')
+        lineas.append('Vary: Accept-Encoding')
+    if gz:
+        lineas.append('Content-Encoding: gzip')
+    if not seguir:
+        lineas.append('Connection: close')
+    return ('\r\n'.join(lineas) + '\r\n\r\n').encode('latin-1')
+
+
+class Servidor:
+
+    def __init__(self, api, host=HOST, puerto=PUERTO):
+        self.api = api
+        self.host, self.puerto = host, puerto
+        self._servidor = None
+
+    async def iniciar(self):
+        self._servidor = await asyncio.start_server(self._conexion, self.host, self.puerto, limit=MAX_CABECERAS,
+                                                    reuse_address=True)
+        self.puerto = self._servidor.sockets[0].getsockname()[1]
+        return self
+
+    async def servir(self):
+        async with self._servidor:
+            await self._servidor.serve_forever()
+
+    def cerrar(self):
+        if self._servidor is not None:
+            self._servidor.close()
+
+    async def _conexion(self, reader, writer):
+        try:
+            while True:
+                try:
+                    peticion = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), ESPERA_CONEXION)
+                except asyncio.LimitOverrunError:
+                    writer.write(self._error(431))
+                    break
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+                    break
+                seguir = await self._atender(peticion, reader, writer)
+                await writer.drain()
+                if not seguir:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    def _error(self, estado):
+        respuesta = respuesta_json({'error': ESTADOS[estado]}, estado=estado)
+        return _cabecera(estado, respuesta, respuesta.cuerpo, False, False) + respuesta.cuerpo
+
+    async def _atender(self, peticion, reader, writer):
+        inicio = time.perf_counter()
+        lineas = peticion.decode('latin-1').split('\r\n')
+        try:
+            metodo, destino, version = lineas[0].split(' ')
+        except ValueError:
+            writer.write(self._error(400))
+            return False
+        cabeceras = {}
+        for linea in lineas[1:]:
+            nombre, separador, valor = linea.partition(':')
+            if separador:
+                cabeceras[nombre.strip().lower()] = valor.strip()
+        conexion = cabeceras.get('connection', '').lower()
+        seguir = conexion != 'close' if version == 'HTTP/1.1' else conexion == 'keep-alive'
+        longitud = cabeceras.get('content-length', '0')
+        if not longitud.isdigit():
+            writer.write(self._error(400))
+            return False
+        longitud = int(longitud)
+        if longitud:
+            # Esta API no lee cuerpos: un GET o HEAD con cuerpo es un error y los demás métodos se
+            # descartan (sin leer más de MAX_CUERPO bytes); en ambos casos se cierra la conexión
+            if metodo in ('GET', 'HEAD'):
+                writer.write(self._error(400))
+                return False
+            if longitud > MAX_CUERPO:
+                writer.write(self._error(413))
+                return False
+            try:
+                await reader.readexactly(longitud)
+            except asyncio.IncompleteReadError:
+                writer.write(self._error(400))
+                return False
+        if metodo not in ('GET', 'HEAD'):
+            writer.write(self._error(405))
+            return False
+
+        try:
+            respuesta = await self.api.responder(destino)
+        except Exception:
+            log.exception('Error al responder a %s', destino)
+            respuesta = respuesta_json({'error': ESTADOS[500]}, estado=500)
+
+        estado, cuerpo, gz = respuesta.estado, respuesta.cuerpo, False
+        if estado == 200 and respuesta.etag is not None and _coincide(cabeceras.get('if-none-match', ''),
+                                                                         respuesta.etag):
+            estado, cuerpo = 304, b''
+        elif respuesta.comprimido is not None and 'gzip' in cabeceras.get('accept-encoding', ''):
+            cuerpo, gz = _gzip(respuesta), True
+        writer.write(_cabecera(estado, respuesta, cuerpo, gz, seguir))
+        if metodo != 'HEAD':
+            writer.write(cuerpo)
+        ruta = urlsplit(destino).path
+        if ruta not in self.api.rutas and ruta != '/metrics':
+            ruta = 'desconocida'  # Sin una etiqueta por cada URL inventada
+        TIEMPO_API.observar(time.perf_counter() - inicio, ruta, str(estado))
+        return seguir
+
+
+async def ejecutar(host, puerto):
+    datos = Datos().iniciar()
+    servidor = await Servidor(API(datos), host, puerto).iniciar()
+    log.info('API en http://%s:%d', host, servidor.puerto)
+    try:
+        await servidor.servir()
+    finally:
+        datos.detener()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--puerto', type=int, default=PUERTO)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s %(levelname)s %(message)s')
+    try:
+        asyncio.run(ejecutar(args.host, args.puerto))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
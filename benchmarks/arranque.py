@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Informe de arranque de APP_Valenciaalminuto.py: qué cuesta abrir cada página
+en un proceso nuevo.
+
+1. Tiempo de importación (python -X importtime) del script principal
+   (streamlit, metricas, recursos) y, encima de eso, de cada módulo de
+   paginas/, con sus dependencias directas más pesadas.
+2. Primera ejecución de cada página con AppTest en un proceso nuevo: 'Home'
+   y después la página, con los servicios externos simulados como en
+   benchmarks/carga.py (latencia 10 ms), para que la red no cuente.
+3. Comprueba que 'Home' no carga ningún CSV ni ningún parser: ni
+   datos_estaticos, ni parser_llegadas, ni pandas, pydeck o requests. Si
+   alguno aparece el proceso termina con código 1.
+
+Uso:
+    python benchmarks/arranque.py
+    python benchmarks/arranque.py --salida arranque.json   # resultados en JSON para seguirlos en el tiempo
+"""
+
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+RAIZ = os.path.abspath(os.path.join(BENCHMARKS, '..'))
+sys.path.insert(0, BENCHMARKS)
+
+from carga import SERVICIOS, simular  # noqa: E402
+
+BASE = 'import streamlit, metricas, recursos'
+PAGINAS = {
+    'Home': 'paginas.inicio',
+    'MetroValencia Schedule': 'paginas.metro',
+    'EMT Schedules': 'paginas.emt',
+    'EMT Map': 'paginas.mapa_emt',
+    'ValenBici': 'paginas.rutas_bici',
+    'Stops Near Me': 'paginas.cercanas',
+    'Favorites': 'paginas.favoritos',
+}
+# Lo que 'Home' no debe cargar
+PROHIBIDOS_HOME = ('datos_estaticos', 'parser_llegadas', 'llegadas', 'pandas', 'pydeck', 'requests', 'yagmail')
+
+_LINEA_IMPORTTIME = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)')
+
+
+def tiempos_importacion(codigo):
+    """[(nivel, módulo, µs propios, µs acumulados)] de python -X importtime -c codigo."""
+    salida = subprocess.run([sys.executable, '-X', 'importtime', '-c', codigo], cwd=RAIZ,
+                            capture_output=True, text=True, check=True).stderr
+    return [(len(m.group(3)) // 2, m.group(4), int(m.group(1)), int(m.group(2)))
+            for m in map(_LINEA_IMPORTTIME.match, salida.splitlines()) if m]
+
+
+def importacion_pagina(modulo, max_dependencias=5):
+    """Microsegundos de importar `modulo` sobre la base y sus dependencias directas más caras."""
+    lineas = tiempos_importacion(f'{BASE}; import {modulo}')
+    # Las líneas salen al terminar cada importación: las de la página van después de las de la base
+    fin_base = max(i for i, l in enumerate(lineas) if l[0] == 0 and l[1] == 'recursos')
+    propias = lineas[fin_base + 1:]
+    total = sum(l[3] for l in propias if l[0] == 0)
+    dependencias = sorted(((l[1], l[3]) for l in propias if l[0] == 1 and l[1] != 'paginas'), key=lambda d: -d[1])
+    return total, dependencias[:max_dependencias]
+
+
+def primera_ejecucion(pagina, puertos):
+    """Segundos de la primera ejecución de 'Home' y de `pagina` en un proceso nuevo, y módulos tras 'Home'."""
+    codigo = f'''
+import json, sys, time
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file({os.path.join(RAIZ, 'APP_Valenciaalminuto.py')!r}, default_timeout=120)
+inicio = time.perf_counter(); at.run(); home = time.perf_counter() - inicio
+cargados = [m for m in {PROHIBIDOS_HOME!r} if m in sys.modules]
+pagina = None
+if {pagina!r} != 'Home':
+    inicio = time.perf_counter(); at.sidebar.selectbox[0].set_value({pagina!r}).run()
+    pagina = time.perf_counter() - inicio
+print(json.dumps({{'home': home, 'pagina': pagina, 'cargados': cargados, 'errores': len(at.exception)}}))
+'''
+    entorno = dict(os.environ, VALENCIA_REDIRECCIONES=','.join(
+        f'{host}=http://127.0.0.1:{puertos[nombre]}' for nombre, host in SERVICIOS.items()))
+    salida = subprocess.run([sys.executable, '-c', codigo], cwd=RAIZ, env=entorno,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(salida.strip().splitlines()[-1])
+
+
+def main():
+    import multiprocessing
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--salida', help='guardar los resultados en este fichero JSON')
+    args = parser.parse_args()
+
+    base = tiempos_importacion(BASE)
+    base_total = sum(l[3] for l in base if l[0] == 0)
+    resultados = {'importacion_base_ms': base_total / 1e3, 'paginas': {}}
+    print(f'Importación del script principal ({BASE}): {base_total / 1e3:.0f} ms')
+    for nombre, ms in sorted(((l[1], l[3] / 1e3) for l in base if l[0] == 0), key=lambda d: -d[1])[:5]:
+        print(f'    {nombre:28s} {ms:8.1f} ms')
+
+    extremo, conexion = multiprocessing.Pipe()
+    simuladores = multiprocessing.Process(target=simular, args=(conexion, 0.01, 0.0), daemon=True)
+    simuladores.start()
+    puertos = extremo.recv()
+
+    fallos = []
+    print(f"\n{'página':24s} {'importar':>9s} {'1ª ejecución':>13s}   dependencias más pesadas")
+    try:
+        for pagina, modulo in PAGINAS.items():
+            total, dependencias = importacion_pagina(modulo)
+            ejecucion = primera_ejecucion(pagina, puertos)
+            segundos = ejecucion['home'] if pagina == 'Home' else ejecucion['pagina']
+            resultados['paginas'][pagina] = {
+                'importacion_ms': total / 1e3,
+                'primera_ejecucion_ms': segundos * 1e3,
+                'dependencias_ms': {n: us / 1e3 for n, us in dependencias},
+            }
+            detalle = ', '.join(f'{n} {us / 1e3:.0f}' for n, us in dependencias)
+            print(f'{pagina:24s} {total / 1e3:7.0f}ms {segundos * 1e3:11.0f}ms   {detalle}')
+            if pagina == 'Home':
+                resultados['home_carga'] = ejecucion['cargados']
+                if ejecucion['cargados']:
+                    fallos.append(f"'Home' carga {', '.join(ejecucion['cargados'])}")
+            if ejecucion['errores']:
+                fallos.append(f"'{pagina}' termina con {ejecucion['errores']} excepciones")
+    finally:
+        extremo.send('fin')
+
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as f:
+            json.dump(resultados, f, indent=2, ensure_ascii=False)
+    for fallo in fallos:
+        print(f'AVISO: {fallo}', file=sys.stderr)
+    return 1 if any(f.startswith("'Home' carga") for f in fallos) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
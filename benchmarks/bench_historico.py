@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Mide el histórico (historico.py): añade registros de disponibilidad de
+ValenBici para 276 estaciones durante 7 días, uno por estación y minuto
+(~2,8 millones), y consulta una estación en todo el intervalo.
+
+Uso: python benchmarks/bench_historico.py [días]
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from historico import SEGUNDOS_DIA, Serie  # noqa: E402
+
+ESTACIONES = 276
+
+
+def main(dias=7):
+    directorio = tempfile.mkdtemp()
+    try:
+        fin = int(time.time())
+        inicio = fin - dias * SEGUNDOS_DIA
+        reloj = [inicio]
+        serie = Serie(directorio, 'valenbici', [('bicis', '<u2'), ('libres', '<u2')],
+                      intervalo=900.0, reloj=lambda: reloj[0])
+        azar = np.random.default_rng(1)
+
+        # Escritura: un registro por estación y minuto, en el orden en que llegarían
+        n = 0
+        t_escritura = time.perf_counter()
+        for t in range(inicio, fin, 60):
+            reloj[0] = t
+            bicis = azar.integers(0, 30, ESTACIONES)
+            for numero in range(ESTACIONES):
+                serie.anadir(numero, t, (int(bicis[numero]), 30 - int(bicis[numero])))
+            n += ESTACIONES
+        serie.volcar()
+        t_escritura = time.perf_counter() - t_escritura
+        tamano = sum(os.path.getsize(os.path.join(serie.directorio, f)) for f in os.listdir(serie.directorio))
+        print(f'{n} registros en {len(serie.segmentos)} segmentos, {tamano / 2 ** 20:.1f} MiB en disco, '
+              f'{n / t_escritura:,.0f} registros/s')
+
+        # Consulta de una estación en todo el intervalo: con una serie recién abierta
+        # (segmentos sin abrir todavía) y repitiendo la consulta
+        serie = Serie(directorio, 'valenbici', [('bicis', '<u2'), ('libres', '<u2')])
+        for fase in ('primera consulta', 'repetida'):
+            t_consulta = time.perf_counter()
+            resultado = serie.consultar(84, desde=inicio, hasta=fin)
+            t_consulta = time.perf_counter() - t_consulta
+            print(f'estación 84, {dias} días ({fase}): {len(resultado)} registros, '
+                  f'media {resultado["bicis"].mean():.1f} bicis, {t_consulta * 1e3:.2f} ms')
+    finally:
+        shutil.rmtree(directorio)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(*map(int, sys.argv[1:])))
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Compara el JSON que recibe el navegador en los mapas de 'EMT Map' (todas las
+paradas) y 'Interactive Map' (todas las líneas) con la preparación original
+(todas las columnas del CSV + icon_data por fila) y con la de mapas.py.
+
+Uso: python benchmarks/bench_mapas.py [repeticiones]
+"""
+
+import os
+import sys
+import time
+
+import pandas as pd
+import pydeck as pdk
+
+DIRECTORIO = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, DIRECTORIO)
+import mapas  # noqa: E402
+
+
+# Copia de la preparación original de APP_Valenciaalminuto.py
+def mapa_original(csv, icono, zoom, tooltip=None):
+    data = pd.read_csv(os.path.join(DIRECTORIO, csv), delimiter=';')
+    data['lon'], data['lat'] = zip(*data['geo_point_2d'].apply(
+        lambda x: (float(x.split(',')[1]), float(x.split(',')[0]))))
+    data['icon_data'] = data.apply(lambda row: {
+        'url': icono,
+        'width': 128,
+        'height': 128,
+        'anchorY': 128,
+    }, axis=1)
+    capa = pdk.Layer('IconLayer', data=data, get_icon='icon_data', get_size=2.5, size_scale=15,
+                     get_position='[lon, lat]', pickable=True)
+    # Lo mismo que hace st.pydeck_chart antes de serializar
+    capa.data = data.to_dict(orient='records')
+    return pdk.Deck(layers=[capa], initial_view_state=pdk.ViewState(
+        latitude=data['lat'].mean(), longitude=data['lon'].mean(), zoom=zoom, pitch=50),
+        map_style='mapbox://styles/mapbox/satellite-v9', tooltip=tooltip)
+
+
+def mapa_nuevo(tabla, icono, zoom, tooltip=None, **campos):
+    import datos_estaticos
+    data = datos_estaticos.paquete()[tabla].a_dataframe()
+    registros = mapas.puntos(data['lat'], data['lon'], **{k: data[v] for k, v in campos.items()})
+    return mapas.Mapa(layers=[mapas.capa_puntos(registros, icono, pickable=True)],
+                      initial_view_state=mapas.vista(registros, zoom=zoom, pitch=50),
+                      map_style='mapbox://styles/mapbox/satellite-v9', tooltip=tooltip)
+
+
+def medir(funcion, repeticiones):
+    mejor, texto = float('inf'), None
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        texto = funcion().to_json()
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return texto, mejor
+
+
+def main(repeticiones=3):
+    casos = [
+        ('EMT, todas las paradas',
+         lambda: mapa_original('emt.csv', mapas.ICONO_EMT.url, 12,
+                               {"text": "{Denominació / Denominación}\nBuses: {Línies / Líneas}"}),
+         lambda: mapa_nuevo('emt', mapas.ICONO_EMT, 12, {"text": "{n}\nBuses: {l}"},
+                            n='Denominació / Denominación', l='Línies / Líneas')),
+        ('Metro, todas las líneas',
+         lambda: mapa_original('fgv-bocas.csv', mapas.ICONO_METRO.url, 11),
+         lambda: mapa_nuevo('metro', mapas.ICONO_METRO, 11)),
+    ]
+    for nombre, original, nuevo in casos:
+        texto_original, t_original = medir(original, repeticiones)
+        texto_nuevo, t_nuevo = medir(nuevo, repeticiones)
+        mapa = nuevo()
+        mapa.to_json()
+        inicio = time.perf_counter()
+        mapa.to_json()
+        t_cacheado = time.perf_counter() - inicio
+        print(f'{nombre}')
+        print(f'  original  {len(texto_original) / 1024:8.1f} KiB  {t_original * 1e3:8.2f} ms')
+        print(f'  mapas.py  {len(texto_nuevo) / 1024:8.1f} KiB  {t_nuevo * 1e3:8.2f} ms   '
+              f'(cacheado {t_cacheado * 1e6:.1f} µs)')
+        print(f'  mejora    {len(texto_original) / len(texto_nuevo):8.1f}x tamaño  '
+              f'{t_original / t_nuevo:6.1f}x tiempo')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(*map(int, sys.argv[1:])))
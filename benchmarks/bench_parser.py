@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Comprueba que parser_llegadas da el mismo resultado que la extracción con
+BeautifulSoup sobre las páginas guardadas en benchmarks/fixtures y compara
+el tiempo de ambos.
+
+Uso: python benchmarks/bench_parser.py [repeticiones]
+"""
+
+import os
+import sys
+import time
+
+from bs4 import BeautifulSoup
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from parser_llegadas import extraer_movimientos  # noqa: E402
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+# Extracción original de obtener_proximos_movimientos_bus (la de metro es la misma sin valores por defecto)
+def referencia_bs(html):
+    soup = BeautifulSoup(html, 'html.parser')
+    movimientos = []
+    for div in soup.find_all('div', style=lambda value: value and 'padding-left: 5px' in value):
+        imagen = div.find('img')
+        numero_linea = imagen['src'].split('_')[-1].split('.')[0] if imagen else "Desconocido"
+        b_tag = div.find('b')
+        destino = b_tag.text.strip() if b_tag else "Destino desconocido"
+        span_tags = div.find_all('span')
+        tiempo = span_tags[-1].text.strip() if span_tags else "Tiempo desconocido"
+        movimientos.append({"Número de Línea": numero_linea, "Destino": destino, "Tiempo": tiempo})
+    return movimientos
+
+
+def cargar_paginas():
+    paginas = {}
+    for carpeta in ('geoportal', 'emt'):
+        for nombre in sorted(os.listdir(os.path.join(FIXTURES, carpeta))):
+            with open(os.path.join(FIXTURES, carpeta, nombre), encoding='utf-8') as f:
+                paginas[f'{carpeta}/{nombre}'] = f.read()
+    return paginas
+
+
+def cronometrar(funcion, paginas, repeticiones):
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        for html in paginas:
+            funcion(html)
+    return (time.perf_counter() - inicio) / (repeticiones * len(paginas))
+
+
+def main(repeticiones=200):
+    paginas = cargar_paginas()
+    for nombre, html in paginas.items():
+        esperado, obtenido = referencia_bs(html), extraer_movimientos(html)
+        if esperado != obtenido:
+            print(f'DIFERENCIA en {nombre}:\n  bs4:    {esperado}\n  parser: {obtenido}')
+            return 1
+
+    t_bs = cronometrar(referencia_bs, list(paginas.values()), repeticiones)
+    t_parser = cronometrar(extraer_movimientos, list(paginas.values()), repeticiones)
+    print(f'{len(paginas)} páginas, resultados idénticos')
+    print(f'BeautifulSoup:   {t_bs * 1e6:9.1f} us/página')
+    print(f'parser_llegadas: {t_parser * 1e6:9.1f} us/página')
+    print(f'Mejora:          {t_bs / t_parser:9.1f}x')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(*map(int, sys.argv[1:])))
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Comprueba que el cálculo por lotes de tiempos.py da los mismos textos que
+calcular_tiempo_restante y calcular_tiempo_restante_bus, y mide la mejora.
+
+Uso: python benchmarks/bench_tiempos.py [llegadas]
+"""
+
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import tiempos  # noqa: E402
+
+
+# Copias de las funciones de APP_Valenciaalminuto.py, con el "ahora" como parámetro
+def calcular_tiempo_restante(hora_llegada, ahora):
+    formato = '%H:%M:%S'
+    try:
+        ahora = ahora.strftime(formato)
+        hora_actual = datetime.strptime(ahora, formato)
+        hora_llegada_dt = datetime.strptime(hora_llegada, formato)
+        if hora_llegada_dt < hora_actual:
+            hora_llegada_dt += timedelta(days=1)
+        tiempo_restante = hora_llegada_dt - hora_actual
+        tiempo_restante_str = str(tiempo_restante)
+        if tiempo_restante_str == '<Na>':
+            return '+1 hora'
+        minutos_segundos = tiempo_restante_str.split(":")[1:]
+        return ":".join(minutos_segundos)
+    except ValueError:
+        return '+1 hora'
+
+
+def calcular_tiempo_restante_bus(hora_llegada):
+    try:
+        minutos = int(hora_llegada.split('min')[0].split('-')[-1].strip())
+        tiempo_restante = timedelta(minutes=minutos)
+        return f'{tiempo_restante.seconds//3600:02d}:{(tiempo_restante.seconds//60)%60:02d}'
+    except ValueError:
+        return "Tiempo desconocido"
+
+
+def horas_metro(n, azar):
+    horas = [f'{azar.randrange(24):02d}:{azar.randrange(60):02d}:{azar.randrange(60):02d}' for _ in range(n)]
+    # Algunos textos raros: formato corto que strptime acepta, horas imposibles y basura
+    for i, raro in zip(range(0, n, max(1, n // 8)), ['7:05:00', '24:00:00', '12:61:00', '', 'Inmediato',
+                                                     '12:00:60', '00:00:00', 'Vía 1']):
+        horas[i] = raro
+    return horas
+
+
+def minutos_bus(hora_llegada):
+    # Solo la lectura de calcular_tiempo_restante_bus: con más de 13 cifras timedelta se desborda
+    try:
+        return int(hora_llegada.split('min')[0].split('-')[-1].strip()) * 60
+    except ValueError:
+        return float('nan')
+
+
+def textos_bus(n, azar):
+    textos = [f'{azar.choice(["P. Congressos", "Campanar", "Natzaret"])} - {azar.randrange(0, 3000)} min'
+              for _ in range(n)]
+    for i, raro in zip(range(0, n, max(1, n // 12)), ['Pròxim', '- 5 min', '5min', 'Dr. Lluch-Mar - 7 min',
+                                                      '- +3 min', 'Tiempo desconocido', '- ١٢ min', '- ５ min',
+                                                      '1_0 min', '-\xa07\u2003min', '-  8 min', 'Port - 9']):
+        textos[i] = raro
+    return textos
+
+
+# Para comparar solo los segundos: números que timedelta no admite y el camino de numpy no calcula
+LARGOS_BUS = ['- 1234567890123456 min', '- 12345678901234567890 min', '- 000000000000000042 min']
+
+
+def main(n=10000):
+    azar = random.Random(1)
+    ahora = datetime.now().replace(microsecond=0)
+    horas, textos = horas_metro(n, azar), textos_bus(n, azar)
+
+    esperado = [calcular_tiempo_restante(h, ahora) for h in horas]
+    if esperado != tiempos.tiempos_restantes_metro(horas, ahora):
+        print('DIFERENCIA en metro')
+        return 1
+    if [calcular_tiempo_restante_bus(t) for t in textos] != tiempos.tiempos_restantes_bus(textos):
+        print('DIFERENCIA en bus')
+        return 1
+    largos = textos + LARGOS_BUS * (tiempos.MIN_LOTE_BUS // len(LARGOS_BUS) + 1)
+    esperado_bus = np.array([minutos_bus(t) for t in largos], dtype=np.float64)
+    if not np.array_equal(esperado_bus, tiempos.segundos_restantes_bus(largos), equal_nan=True):
+        print('DIFERENCIA en bus (números largos)')
+        return 1
+    print(f'{n} llegadas de metro y de bus, resultados idénticos')
+
+    for nombre, fila_a_fila, lote in [
+        ('metro', lambda: [calcular_tiempo_restante(h, ahora) for h in horas],
+         lambda: tiempos.segundos_restantes_metro(horas, ahora)),
+        ('bus', lambda: [calcular_tiempo_restante_bus(t) for t in textos],
+         lambda: tiempos.segundos_restantes_bus(textos)),
+    ]:
+        inicio = time.perf_counter()
+        fila_a_fila()
+        t_fila = time.perf_counter() - inicio
+        inicio = time.perf_counter()
+        lote()
+        t_lote = time.perf_counter() - inicio
+        print(f'{nombre:5s}  fila a fila {t_fila * 1e3:8.2f} ms   lote {t_lote * 1e3:8.2f} ms   '
+              f'mejora {t_fila / t_lote:6.1f}x')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(*map(int, sys.argv[1:])))
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Simulación de una caída de geoportal y EMT con los simuladores de
+benchmarks/carga.py.
+
+N sesiones leen sin parar las llegadas de unas cuantas estaciones de metro y
+paradas de EMT a través de CacheLlegadas y cliente_http, como las páginas, en
+tres fases de --fase segundos:
+
+1. normal: los simuladores contestan bien (y la caché se llena);
+2. caída: geoportal y EMT devuelven 503 a todo;
+3. vuelta: contestan bien otra vez.
+
+De cada fase informa de las lecturas, las que fallan, la latencia (p50, p99),
+la edad máxima de los datos servidos, las peticiones que llegan a los
+servicios y los hilos vivos. Termina con código 1 si durante la caída alguna
+lectura falla o tarda, si los servicios reciben más peticiones que las que
+permiten el disyuntor y sus pruebas, o si al final de la vuelta los datos no
+son frescos otra vez.
+
+Uso: python benchmarks/caida.py --sesiones 20 --fase 10
+"""
+
+import argparse
+import multiprocessing
+import os
+import statistics
+import sys
+import threading
+import time
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARKS, '..'))
+sys.path.insert(0, BENCHMARKS)
+
+from carga import SERVICIOS, simular  # noqa: E402
+
+CAIDOS = ('geoportal', 'emt')
+FASES = (('normal', 0.0), ('caída', 1.0), ('vuelta', 0.0))
+
+
+def percentil(valores, p):
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(p / 100 * len(valores)))] if valores else float('nan')
+
+
+class Lector(threading.Thread):
+    # Una sesión que vuelve a pedir sus llegadas cada `pausa` segundos, como el refresco de la página
+
+    def __init__(self, numero, cache, urls, cargar, pausa, fin, lecturas):
+        super().__init__(name=f'lector-{numero}', daemon=True)
+        self.numero, self.cache, self.urls, self.cargar = numero, cache, urls, cargar
+        self.pausa, self.fin, self.lecturas = pausa, fin, lecturas
+
+    def run(self):
+        paso = self.numero
+        while not self.fin.is_set():
+            url = self.urls[paso % len(self.urls)]
+            paso += 1
+            inicio = time.perf_counter()
+            try:
+                self.cache.obtener(url, self.cargar)
+                error = False
+            except Exception:
+                error = True
+            self.lecturas.append((time.perf_counter() - inicio, error, self.cache.edad(url)))
+            self.fin.wait(self.pausa)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sesiones', type=int, default=20)
+    parser.add_argument('--fase', type=float, default=10.0, help='segundos de cada fase')
+    parser.add_argument('--pausa', type=float, default=0.2, help='segundos entre lecturas de cada sesión')
+    parser.add_argument('--ttl', type=float, default=2.0, help='segundos que las llegadas son frescas')
+    parser.add_argument('--umbral', type=int, default=5, help='fallos seguidos que abren el disyuntor')
+    parser.add_argument('--espera', type=float, default=1.0, help='segundos abierto la primera vez')
+    args = parser.parse_args()
+    espera_max = args.fase / 3
+
+    extremo, conexion = multiprocessing.Pipe()
+    simuladores = multiprocessing.Process(target=simular, args=(conexion, 0.02, 0.0), daemon=True)
+    simuladores.start()
+    puertos = extremo.recv()
+
+    # Antes de importar cliente_http: el cliente del proceso lee su configuración al importarse
+    os.environ['VALENCIA_REDIRECCIONES'] = ','.join(
+        f'{host}=http://127.0.0.1:{puertos[nombre]}' for nombre, host in SERVICIOS.items())
+    os.environ['VALENCIA_DISYUNTOR_FALLOS'] = str(args.umbral)
+    os.environ['VALENCIA_DISYUNTOR_ESPERA'] = str(args.espera)
+    os.environ['VALENCIA_DISYUNTOR_ESPERA_MAX'] = str(espera_max)
+    import cliente_http
+    import datos_estaticos
+    from cache_llegadas import CacheLlegadas
+    from llegadas import descargar_movimientos
+
+    paquete = datos_estaticos.paquete()
+    urls = (list(dict.fromkeys(paquete['metro']['Pròximes Arribades / Próximas llegadas']))[:3]
+            + list(dict.fromkeys(paquete['emt']['Pròximes Arribades / Proximas Llegadas']))[:3])
+    urls = [str(url) for url in urls]
+    cache = CacheLlegadas(ttl=args.ttl, max_edad=600)
+
+    fin = threading.Event()
+    lecturas = []
+    lectores = [Lector(i, cache, urls, descargar_movimientos, args.pausa, fin, lecturas)
+                for i in range(args.sesiones)]
+
+    extremo.send('estadisticas')
+    anteriores = extremo.recv()
+    resultados = []
+    try:
+        for i, (fase, errores) in enumerate(FASES):
+            for nombre in CAIDOS:
+                extremo.send(('errores', nombre, errores))
+                extremo.recv()
+            if i == 0:
+                for lector in lectores:
+                    lector.start()
+            desde, hilos = len(lecturas), 0
+            limite = time.monotonic() + args.fase
+            while time.monotonic() < limite:
+                hilos = max(hilos, threading.active_count())
+                time.sleep(0.05)
+            extremo.send('estadisticas')
+            estadisticas = extremo.recv()
+            peticiones = sum(estadisticas[n][0] - anteriores[n][0] for n in CAIDOS)
+            anteriores = estadisticas
+            resultados.append((fase, lecturas[desde:], peticiones, hilos))
+    finally:
+        fin.set()
+        extremo.send('fin')
+
+    print(f"{'fase':8s} {'lecturas':>9s} {'fallidas':>9s} {'p50 ms':>8s} {'p99 ms':>8s} {'edad máx':>9s} "
+          f"{'peticiones':>11s} {'hilos':>6s}")
+    for fase, datos, peticiones, hilos in resultados:
+        latencias = [d[0] * 1e3 for d in datos]
+        edades = [d[2] for d in datos if d[2] is not None]
+        print(f'{fase:8s} {len(datos):9d} {sum(d[1] for d in datos):9d} {statistics.median(latencias):8.2f} '
+              f'{percentil(latencias, 99):8.2f} {max(edades, default=0):8.1f}s {peticiones:11d} {hilos:6d}')
+    print(f"Disyuntores: {cliente_http.cliente.estadisticas()['disyuntores']}, "
+          f"peticiones rechazadas: {cliente_http.cliente.rechazadas_disyuntor}")
+
+    fallos = []
+    _, caida, peticiones_caida, _ = resultados[1]
+    if any(d[1] for d in caida):
+        fallos.append('hay lecturas fallidas durante la caída')
+    if percentil([d[0] for d in caida], 99) > 0.05:
+        fallos.append('las lecturas tardan más de 50 ms durante la caída')
+    # Hasta abrirse, `umbral` fallos por servicio y sus reintentos; después una prueba cada vez que se cierra la espera
+    cota = len(CAIDOS) * (3 * args.umbral + 2 * int(args.fase / args.espera) + 2)
+    if peticiones_caida > cota:
+        fallos.append(f'{peticiones_caida} peticiones durante la caída (cota {cota})')
+    _, vuelta, _, _ = resultados[2]
+    ultimas = [d[2] for d in vuelta[-len(urls) * 2:] if d[2] is not None]
+    if not ultimas or max(ultimas) > args.ttl + espera_max + 1:
+        fallos.append('los datos no vuelven a ser frescos tras la caída')
+    for fallo in fallos:
+        print(f'FALLO: {fallo}', file=sys.stderr)
+    return 1 if fallos else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Prueba de carga de APP_Valenciaalminuto.py con N sesiones simultáneas.
+
+1. Arranca, en un proceso aparte, cuatro servidores locales que simulan
+   geoportal, EMT (QR.php), JCDecaux y Mapbox con las respuestas de
+   benchmarks/fixtures, con una latencia (exponencial, de media --latencia)
+   y una fracción de errores 503 (--errores) configurables.
+2. Redirige a ellos los cuatro hosts con VALENCIA_REDIRECCIONES (ver
+   cliente_http.py), así que la aplicación no sabe que no está en producción.
+3. Lanza N sesiones con streamlit.testing.v1.AppTest en hilos del mismo
+   proceso, que hace de servidor: comparten las cachés, los motores en
+   segundo plano y el cliente HTTP como las sesiones de una instancia real.
+   Cada sesión se queda en una página ('MetroValencia Schedule', 'EMT
+   Schedules', 'EMT Map' o 'ValenBici', por turnos) y cada --pausa segundos
+   interactúa con ella o la vuelve a ejecutar (como haría el refresco).
+4. Informa de la latencia de cada ejecución del script por página (p50, p90,
+   p99), la CPU y la memoria del proceso y las peticiones a cada servicio por
+   espectador.
+
+Lo que se mide es el coste en el servidor de cada ejecución del script; no
+incluye el transporte por websocket hasta el navegador. Los refrescos de
+st.fragment se simulan como ejecuciones completas, así que las latencias de
+las páginas con fragmentos son una cota superior. La CPU incluye la de los
+propios hilos de AppTest (el "navegador"), pero no la de los simuladores.
+
+Uso: python benchmarks/carga.py --sesiones 20 --duracion 60 --latencia 0.15 --errores 0.02
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+RAIZ = os.path.join(BENCHMARKS, '..')
+APP = os.path.join(RAIZ, 'APP_Valenciaalminuto.py')
+
+SERVICIOS = {
+    'geoportal': 'geoportal.valencia.es',
+    'emt': 'www.emtvalencia.es',
+    'jcdecaux': 'api.jcdecaux.com',
+    'mapbox': 'api.mapbox.com',
+}
+
+PAGINAS = ['MetroValencia Schedule', 'EMT Schedules', 'EMT Map', 'ValenBici']
+
+
+# :::::::::::::::::::::::::::: SIMULADORES ::::::::::::::::::::::::::::::::
+
+class Simulador(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        servidor = self.server
+        with servidor.lock:
+            servidor.peticiones += 1
+        if servidor.latencia:
+            time.sleep(min(random.expovariate(1 / servidor.latencia), 10 * servidor.latencia))
+        if random.random() < servidor.errores:
+            with servidor.lock:
+                servidor.fallos += 1
+            self._responder(503, b'', 'text/plain')
+            return
+        ruta = servidor.fichero(f'https://{servidor.host}{self.path}')
+        if ruta is None:
+            self._responder(404, b'', 'text/plain')
+            return
+        contenido = servidor.contenidos.get(ruta)
+        if contenido is None:
+            with open(ruta, 'rb') as f:
+                contenido = servidor.contenidos[ruta] = f.read()
+        tipo = 'application/json' if ruta.endswith('.json') else 'text/html; charset=utf-8'
+        self._responder(200, contenido, tipo)
+
+    def _responder(self, estado, contenido, tipo):
+        self.send_response(estado)
+        self.send_header('Content-Type', tipo)
+        self.send_header('Content-Length', str(len(contenido)))
+        self.end_headers()
+        self.wfile.write(contenido)
+
+    def log_message(self, *args):
+        pass
+
+
+def simular(conexion, latencia, errores):
+    """Proceso de los simuladores: envía los puertos y contesta a 'estadisticas' (o a un cambio de
+    errores) con las peticiones y fallos de cada uno hasta 'fin'."""
+    sys.path.insert(0, BENCHMARKS)
+    from suite import fichero_grabado
+
+    servidores = {}
+    for nombre, host in SERVICIOS.items():
+        servidor = ThreadingHTTPServer(('127.0.0.1', 0), Simulador)
+        servidor.daemon_threads = True
+        servidor.host, servidor.fichero, servidor.contenidos = host, fichero_grabado, {}
+        servidor.latencia, servidor.errores = latencia, errores
+        servidor.lock, servidor.peticiones, servidor.fallos = threading.Lock(), 0, 0
+        threading.Thread(target=servidor.serve_forever, daemon=True).start()
+        servidores[nombre] = servidor
+    conexion.send({nombre: s.server_address[1] for nombre, s in servidores.items()})
+    while True:
+        orden = conexion.recv()
+        if orden == 'fin':
+            break
+        if isinstance(orden, tuple):
+            # ('errores', servicio, fracción): empieza o termina una caída (benchmarks/caida.py)
+            _, nombre, fraccion = orden
+            servidores[nombre].errores = fraccion
+        conexion.send({nombre: (s.peticiones, s.fallos) for nombre, s in servidores.items()})
+
+
+# :::::::::::::::::::::::::::::: SESIONES :::::::::::::::::::::::::::::::::
+
+def _opcion(azar, elemento):
+    opciones = [o for o in elemento.options if o]
+    return azar.choice(opciones) if opciones else None
+
+
+def accion(pagina, at, azar, paso):
+    """Una interacción típica con la página, o solo volver a ejecutarla (refresco)."""
+    interactuar = paso % 3 == 0
+    if pagina in ('MetroValencia Schedule', 'EMT Schedules') and interactuar and at.main.selectbox:
+        at.main.selectbox[0].set_value(_opcion(azar, at.main.selectbox[0]))
+    elif pagina == 'EMT Map' and interactuar and at.checkbox:
+        casilla = at.checkbox[0]
+        casilla.uncheck() if casilla.value else casilla.check()
+    elif pagina == 'ValenBici' and interactuar and len(at.sidebar.selectbox) >= 3:
+        at.sidebar.selectbox[1].set_value(_opcion(azar, at.sidebar.selectbox[1]))
+        at.sidebar.selectbox[2].set_value(_opcion(azar, at.sidebar.selectbox[2]))
+        at.sidebar.button[0].click()
+    at.run()
+
+
+class Sesion(threading.Thread):
+
+    def __init__(self, numero, pagina, fin, pausa, resultados):
+        super().__init__(name=f'sesion-{numero}', daemon=True)
+        self.pagina, self.fin, self.pausa = pagina, fin, pausa
+        self.resultados = resultados
+        self.azar = random.Random(numero)
+
+    def _medir(self, funcion):
+        inicio = time.perf_counter()
+        try:
+            funcion()
+            fallo = bool(self.at.exception)
+        except Exception:
+            fallo = True
+        self.resultados.append((self.pagina, time.perf_counter() - inicio, fallo))
+
+    def run(self):
+        from streamlit.testing.v1 import AppTest
+        self.at = AppTest.from_file(APP, default_timeout=120)
+        self._medir(self.at.run)
+        self._medir(lambda: self.at.sidebar.selectbox[0].set_value(self.pagina).run())
+        paso = 1
+        while time.monotonic() < self.fin:
+            # Pausa aleatoria alrededor de --pausa para que las sesiones no vayan acompasadas
+            time.sleep(self.azar.uniform(0.5, 1.5) * self.pausa)
+            self._medir(lambda: accion(self.pagina, self.at, self.azar, paso))
+            paso += 1
+
+
+# ::::::::::::::::::::::::::::::: INFORME :::::::::::::::::::::::::::::::::
+
+def _rss_actual():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        return None
+
+
+def informe(resultados, sesiones, duracion, cpu, rss_max, upstream):
+    import numpy as np
+    print(f"\n{'página':24s} {'ejecuciones':>11s} {'fallos':>7s} {'p50':>9s} {'p90':>9s} {'p99':>9s} {'máx':>9s}")
+    for pagina in PAGINAS + ['(todas)']:
+        filas = [r for r in resultados if pagina == '(todas)' or r[0] == pagina]
+        if not filas:
+            continue
+        tiempos = np.array([r[1] for r in filas]) * 1e3
+        p50, p90, p99 = np.percentile(tiempos, [50, 90, 99])
+        print(f'{pagina:24s} {len(filas):11d} {sum(r[2] for r in filas):7d} '
+              f'{p50:7.0f}ms {p90:7.0f}ms {p99:7.0f}ms {tiempos.max():7.0f}ms')
+
+    print(f'\nCPU del proceso: {cpu:.1f} s en {duracion:.0f} s ({100 * cpu / duracion:.0f}% de un núcleo)')
+    rss = _rss_actual()
+    print(f"Memoria: máxima {rss_max / 2 ** 20:.0f} MiB" + (f', al terminar {rss / 2 ** 20:.0f} MiB' if rss else ''))
+
+    print(f"\n{'servicio':12s} {'peticiones':>10s} {'503':>6s} {'por espectador':>15s} {'por esp. y min':>15s}")
+    for nombre, (peticiones, fallos) in upstream.items():
+        print(f'{nombre:12s} {peticiones:10d} {fallos:6d} {peticiones / sesiones:15.1f} '
+              f'{peticiones / sesiones / (duracion / 60):15.2f}')
+    total = sum(p for p, _ in upstream.values())
+    print(f"{'total':12s} {total:10d} {sum(f for _, f in upstream.values()):6d} {total / sesiones:15.1f} "
+          f'{total / sesiones / (duracion / 60):15.2f}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sesiones', type=int, default=10)
+    parser.add_argument('--duracion', type=float, default=30.0, help='segundos de carga tras abrir las sesiones')
+    parser.add_argument('--pausa', type=float, default=2.0, help='segundos medios entre acciones de una sesión')
+    parser.add_argument('--latencia', type=float, default=0.1, help='latencia media de los servicios simulados')
+    parser.add_argument('--errores', type=float, default=0.0, help='fracción de respuestas 503')
+    parser.add_argument('--paginas', default=','.join(PAGINAS), help='páginas a repartir entre las sesiones')
+    args = parser.parse_args()
+
+    extremo, conexion = multiprocessing.Pipe()
+    simuladores = multiprocessing.Process(target=simular, args=(conexion, args.latencia, args.errores), daemon=True)
+    simuladores.start()
+    puertos = extremo.recv()
+
+    # Antes de importar nada de la aplicación: el cliente HTTP lee las redirecciones al crearse
+    os.environ['VALENCIA_REDIRECCIONES'] = ','.join(
+        f'{host}=http://127.0.0.1:{puertos[nombre]}' for nombre, host in SERVICIOS.items())
+    temporal = tempfile.mkdtemp(prefix='carga-valencia-')
+    for variable, nombre in [('VALENCIA_HISTORICO', 'historico'), ('VALENCIA_RUTAS', 'rutas.db'),
+                             ('VALENCIA_SUSCRIPCIONES', 'suscripciones.db')]:
+        os.environ.setdefault(variable, os.path.join(temporal, nombre))
+    os.chdir(RAIZ)  # El script abre las imágenes con rutas relativas
+    sys.path.insert(0, RAIZ)
+
+    paginas = [p.strip() for p in args.paginas.split(',') if p.strip()]
+    resultados = []
+    cpu_inicio, inicio = time.process_time(), time.monotonic()
+    fin = inicio + args.duracion
+    sesiones = [Sesion(i, paginas[i % len(paginas)], fin, args.pausa, resultados) for i in range(args.sesiones)]
+    for sesion in sesiones:
+        sesion.start()
+    for sesion in sesiones:
+        sesion.join()
+    duracion = time.monotonic() - inicio
+    cpu = time.process_time() - cpu_inicio
+
+    extremo.send('estadisticas')
+    upstream = extremo.recv()
+    extremo.send('fin')
+    simuladores.join(timeout=5)
+
+    rss_max = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024  # KiB en Linux
+    print(f'{args.sesiones} sesiones, {duracion:.0f} s, latencia simulada {args.latencia * 1e3:.0f} ms, '
+          f'errores {args.errores:.0%}')
+    informe(resultados, args.sesiones, duracion, cpu, rss_max, upstream)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
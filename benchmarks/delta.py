@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Trabajo del servidor y bytes enviados en cada refresco de las páginas de
+llegadas: antes (tabla entera con st.table en metro, un st.markdown por
+llegada en EMT) y ahora (solo los cambios, delta_llegadas.py).
+
+Simula una estación con mucho movimiento que miran --sesiones sesiones:
+--rutas líneas/destinos con --proximos trenes cada una, una descarga cada
+--periodo segundos y un refresco de cada sesión cada --refresco segundos
+durante --minutos; los trenes pasan, entran otros nuevos al final y de vez
+en cuando uno se retrasa. Los tiempos son por sesión y refresco. Los bytes son los del elemento que recibe el
+navegador en cada refresco (el proto de la tabla, de los markdown o del
+componente con sus argumentos); lo que es igual en los dos casos (la marca
+'Updated N s ago', las cabeceras del mensaje) no se cuenta.
+
+Termina con código 1 si en metro el tiempo o los bytes por refresco no bajan
+al menos --mejora veces.
+
+Uso: python benchmarks/delta.py --rutas 8 --proximos 5 --sesiones 10
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import pandas as pd  # noqa: E402
+from streamlit.elements.table import marshall_table  # noqa: E402
+from streamlit.proto.Components_pb2 import ComponentInstance  # noqa: E402
+from streamlit.proto.Markdown_pb2 import Markdown  # noqa: E402
+from streamlit.proto.Table_pb2 import Table  # noqa: E402
+
+import tiempos  # noqa: E402
+from delta_llegadas import FilasCompartidas, TableroLlegadas, filas_bus, filas_metro  # noqa: E402
+
+DESTINOS = ['Rafelbunyol', 'Aeroport', 'Marítim', 'Riba-roja de Túria', 'Castelló', 'Torrent Avinguda',
+            'Bétera', 'Natzaret', 'Llíria', 'Alboraia Peris Aragó', 'Vilanova de Castelló', 'Dr. Lluch']
+
+
+def simular(rutas, proximos, minutos, refresco, periodo, semilla=0):
+    """[(instante, descarga)] de cada refresco; la descarga (lista de (línea, destino, instante de llegada))
+    es el mismo objeto en los refrescos que caen dentro del mismo `periodo`, como en el motor y la caché."""
+    azar = random.Random(semilla)
+    inicio = time.time()
+    frecuencias = {(str(1 + i % 10), DESTINOS[i % len(DESTINOS)]): azar.uniform(240, 600) for i in range(rutas)}
+    trenes = [[ruta, inicio + azar.uniform(0, frecuencia) + k * frecuencia]
+              for ruta, frecuencia in frecuencias.items() for k in range(proximos)]
+    refrescos, descarga, descargada = [], None, -math.inf
+    for paso in range(int(minutos * 60 / refresco)):
+        ahora = inicio + paso * refresco
+        if ahora - descargada >= periodo:
+            # Los que ya han pasado (se ven unos segundos en el andén) dejan sitio a uno nuevo al final
+            for tren in [t for t in trenes if t[1] < ahora - 20]:
+                trenes.remove(tren)
+                siguientes = [t[1] for t in trenes if t[0] == tren[0]]
+                trenes.append([tren[0], max(siguientes, default=ahora) + frecuencias[tren[0]]])
+            if azar.random() < 0.2:
+                azar.choice(trenes)[1] += azar.uniform(30, 120)
+            descarga, descargada = [(ruta[0], ruta[1], llegada) for ruta, llegada in trenes], ahora
+        refrescos.append((ahora, descarga))
+    return refrescos
+
+
+def llegadas_metro(trenes):
+    return [{"Número de Línea": linea, "Destino": destino,
+             "Tiempo": datetime.fromtimestamp(llegada).strftime('%H:%M:%S')} for linea, destino, llegada in trenes]
+
+
+def llegadas_bus(trenes, ahora):
+    return [{"Número de Línea": linea, "Destino": destino,
+             "Tiempo": f'{destino} - {max(0, math.ceil((llegada - ahora) / 60))} min'}
+            for linea, destino, llegada in trenes]
+
+
+# Lo que hacían las páginas en cada refresco, hasta el proto que se envía
+def antes_metro(llegadas, ahora):
+    restantes = tiempos.tiempos_restantes_metro([llegada["Tiempo"] for llegada in llegadas],
+                                                datetime.fromtimestamp(ahora))
+    for llegada, restante in zip(llegadas, restantes):
+        llegada["Tiempo Restante"] = restante
+    tabla = Table()
+    marshall_table(tabla.arrow_data, pd.DataFrame(llegadas).sort_values(by="Destino"))
+    return tabla.ByteSize()
+
+
+def antes_bus(llegadas, ahora):
+    restantes = tiempos.tiempos_restantes_bus([llegada["Tiempo"] for llegada in llegadas])
+    for llegada, restante in zip(llegadas, restantes):
+        llegada["Tiempo Restante"] = restante
+    df_llegadas = pd.DataFrame(llegadas).sort_values(by="Tiempo Restante")
+    return sum(Markdown(body=f"<h3 style='font-size:50px;'>{x}</h3>", allow_html=True).ByteSize()
+               for x in df_llegadas['Tiempo'])
+
+
+def ahora_panel(modo, filas, tablero, ahora):
+    # Lo que hace recursos.panel_llegadas: el tablero y los argumentos del componente en JSON
+    mensaje = tablero.actualizar(filas, ahora=ahora)
+    argumentos = json.dumps(dict(modo=modo, mensaje=mensaje, default=None, key=f'panel_{modo}'))
+    return ComponentInstance(component_name='recursos.llegadas', json_args=argumentos).ByteSize()
+
+
+def medir_antes(refrescos, llegadas, pintar, sesiones):
+    # Cada sesión copiaba las llegadas (a_diccionarios o la copia de la caché) y las pintaba enteras
+    descargas = {}
+    entradas = [(ahora, descargas.setdefault(id(d), (d, llegadas(d, ahora)))[1]) for ahora, d in refrescos]
+    inicio = time.perf_counter()
+    bytes_ = [pintar([dict(m) for m in compartidas], ahora)
+              for ahora, compartidas in entradas for _ in range(sesiones)]
+    return (time.perf_counter() - inicio) / len(bytes_), sum(bytes_) / len(bytes_)
+
+
+def medir_ahora(refrescos, llegadas, modo, calcular, tolerancia, sesiones):
+    # Las filas se calculan una vez por descarga para todas las sesiones (FilasCompartidas)
+    descargas = {}
+    entradas = [(ahora, descargas.setdefault(id(d), (d, llegadas(d, ahora)))[1]) for ahora, d in refrescos]
+    compartidas = FilasCompartidas()
+    tableros = [TableroLlegadas(tolerancia) for _ in range(sesiones)]
+    inicio = time.perf_counter()
+    bytes_ = []
+    for ahora, fuente in entradas:
+        for tablero in tableros:
+            filas = compartidas.obtener('estacion', fuente, lambda: calcular(fuente, ahora))
+            bytes_.append(ahora_panel(modo, filas, tablero, ahora))
+    return (time.perf_counter() - inicio) / len(bytes_), sum(bytes_) / len(bytes_)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rutas', type=int, default=8, help='líneas/destinos de la estación')
+    parser.add_argument('--proximos', type=int, default=5, help='próximos trenes de cada ruta')
+    parser.add_argument('--minutos', type=float, default=10.0)
+    parser.add_argument('--refresco', type=float, default=5.0, help='segundos entre refrescos')
+    parser.add_argument('--periodo', type=float, default=10.0, help='segundos entre descargas de la estación')
+    parser.add_argument('--sesiones', type=int, default=10, help='sesiones mirando la misma estación')
+    parser.add_argument('--mejora', type=float, default=10.0, help='veces que deben bajar tiempo y bytes en metro')
+    args = parser.parse_args()
+
+    refrescos = simular(args.rutas, args.proximos, args.minutos, args.refresco, args.periodo)
+    casos = {
+        'metro': (lambda trenes, ahora: llegadas_metro(trenes), antes_metro, filas_metro, 1.0),
+        'emt': (llegadas_bus, antes_bus, filas_bus, 60.0),
+    }
+    print(f'{len(refrescos)} refrescos de {args.rutas * args.proximos} llegadas cada {args.refresco:g} s, '
+          f'{args.sesiones} sesiones, una descarga cada {args.periodo:g} s')
+    print(f"{'página':6s} {'antes µs':>9s} {'ahora µs':>9s} {'veces':>6s} {'antes B':>8s} {'ahora B':>8s} {'veces':>6s}")
+    fallos = []
+    for nombre, (llegadas, antes, calcular, tolerancia) in casos.items():
+        t_antes, b_antes = medir_antes(refrescos, llegadas, antes, args.sesiones)
+        t_ahora, b_ahora = medir_ahora(refrescos, llegadas, nombre, calcular, tolerancia, args.sesiones)
+        print(f'{nombre:6s} {t_antes * 1e6:9.1f} {t_ahora * 1e6:9.1f} {t_antes / t_ahora:6.1f} '
+              f'{b_antes:8.0f} {b_ahora:8.0f} {b_antes / b_ahora:6.1f}')
+        if nombre == 'metro' and min(t_antes / t_ahora, b_antes / b_ahora) < args.mejora:
+            fallos.append(f'{nombre}: la mejora no llega a {args.mejora:g} veces')
+    for fallo in fallos:
+        print(f'FALLO: {fallo}', file=sys.stderr)
+    return 1 if fallos else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
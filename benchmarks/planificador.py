@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Rondas fijas frente al planificador (planificador.py) con el mismo
+presupuesto de peticiones, en tiempo simulado y sin red.
+
+Cada una de las --estaciones estaciones tiene varias líneas con trenes cada
+5-15 minutos; cuando un tren está a menos de 10 minutos su hora prevista
+puede retrasarse de golpe (lo que cambia lo que hay que mostrar). Unas pocas
+estaciones tienen sesiones mirándolas (muchas en la más popular, pocas en
+las demás), que leen cada --refresco segundos.
+
+Cada segundo se mide, en las estaciones que alguien mira, el error entre el
+próximo tren que ven (el de la última descarga) y el real, ponderado por
+sesiones. Termina con código 1 si el planificador pasa del presupuesto o si
+no reduce el error medio de lo que se mira.
+
+Uso: python benchmarks/planificador.py --estaciones 133 --presupuesto 13.3 --minutos 60
+"""
+
+import argparse
+import bisect
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from planificador import Planificador  # noqa: E402
+
+ERROR_GRANDE = 30  # segundos: a partir de aquí el próximo tren que se ve es otro o llega mucho antes
+
+
+class Estacion:
+
+    def __init__(self, azar, duracion):
+        # Trenes (hora programada, [(instante en que se anuncia un retraso, segundos)])
+        self.trenes = []
+        for _ in range(azar.randint(2, 4)):
+            frecuencia = azar.uniform(300, 900)
+            hora = azar.uniform(0, frecuencia)
+            while hora < duracion + 1800:
+                retrasos = [(hora - azar.uniform(0, 600), azar.uniform(30, 180))
+                            for _ in range(azar.random() < 0.3)]
+                self.trenes.append((hora, retrasos))
+                hora += frecuencia
+
+    def prevista(self, tren, t):
+        hora, retrasos = tren
+        return hora + sum(segundos for anuncio, segundos in retrasos if anuncio <= t)
+
+    def llegadas(self, t):
+        """Horas previstas en `t` de los trenes que aún no han pasado."""
+        return sorted(h for h in (self.prevista(tren, t) for tren in self.trenes) if h > t)
+
+
+def simular(estaciones, sesiones, presupuesto, duracion, refresco, adaptativo, semilla=0):
+    azar = random.Random(semilla)
+    reloj = [0.0]
+    urls = list(range(len(estaciones)))
+    planificador = Planificador(urls, presupuesto, reloj=lambda: reloj[0])
+    periodo = len(estaciones) / presupuesto
+    vistas = {}          # url -> horas de las llegadas de su última descarga
+    peticiones = 0
+    error_total = error_grande = peso = 0.0
+    siguiente_ronda = 0.0
+    for segundo in range(int(duracion)):
+        t = reloj[0] = float(segundo)
+        if adaptativo:
+            for url, n in sesiones.items():
+                # Cada sesión lee cada `refresco` segundos (repartidas en el tiempo)
+                veces = sum(1 for k in range(n) if (segundo + k) % refresco == 0)
+                if veces:
+                    planificador.ver(url, veces)
+            pendientes = planificador.pendientes()
+        elif t >= siguiente_ronda:
+            pendientes, siguiente_ronda = urls, t + periodo
+        else:
+            pendientes = []
+        for url in pendientes:
+            llegadas = estaciones[url].llegadas(t)
+            vistas[url] = llegadas
+            peticiones += 1
+            if adaptativo:
+                planificador.programar(url, llegadas[0] - t if llegadas else None)
+        # Error de lo que ven las sesiones: el primer tren de la última descarga que no ha pasado
+        for url, n in sesiones.items():
+            reales = estaciones[url].llegadas(t)
+            vistas_url = vistas.get(url, [])
+            i = bisect.bisect_right(vistas_url, t)
+            if not reales or i >= len(vistas_url):
+                continue
+            error = abs(vistas_url[i] - reales[0])
+            error_total += error * n
+            error_grande += (error > ERROR_GRANDE) * n
+            peso += n
+    return peticiones / duracion, error_total / max(peso, 1), error_grande / max(peso, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--estaciones', type=int, default=133)
+    parser.add_argument('--presupuesto', type=float, default=13.3, help='peticiones por segundo')
+    parser.add_argument('--minutos', type=float, default=60.0)
+    parser.add_argument('--refresco', type=int, default=5, help='segundos entre lecturas de cada sesión')
+    args = parser.parse_args()
+
+    azar = random.Random(1)
+    duracion = args.minutos * 60
+    estaciones = [Estacion(azar, duracion) for _ in range(args.estaciones)]
+    # Sesiones por estación: una muy popular y unas cuantas con pocas
+    sesiones = {0: 40, 1: 10, 2: 5, 3: 2, 4: 1, 5: 1, 6: 1, 7: 1}
+
+    print(f'{args.estaciones} estaciones, presupuesto {args.presupuesto:g} peticiones/s, '
+          f'{sum(sesiones.values())} sesiones en {len(sesiones)} estaciones, {args.minutos:g} minutos')
+    print(f"{'':14s} {'peticiones/s':>13s} {'error medio':>12s} {f'error > {ERROR_GRANDE} s':>13s}")
+    resultados = {}
+    for nombre, adaptativo in (('rondas fijas', False), ('planificador', True)):
+        tasa, error, grande = simular(estaciones, sesiones, args.presupuesto, duracion, args.refresco, adaptativo)
+        resultados[nombre] = (tasa, error)
+        print(f'{nombre:14s} {tasa:13.2f} {error:11.1f}s {grande * 100:12.1f}%')
+
+    fallos = []
+    tasa, error = resultados['planificador']
+    if tasa > args.presupuesto * 1.01:
+        fallos.append(f'el planificador hace {tasa:.2f} peticiones/s con un presupuesto de {args.presupuesto:g}')
+    if error >= resultados['rondas fijas'][1]:
+        fallos.append('el planificador no reduce el error de lo que se mira')
+    for fallo in fallos:
+        print(f'FALLO: {fallo}', file=sys.stderr)
+    return 1 if fallos else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
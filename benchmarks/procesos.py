@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Peticiones a los servicios de origen según el número de procesos, con y sin
+almacén compartido (almacen_compartido.py).
+
+Cada proceso hace lo que hace un worker de Streamlit: un motor de metro
+(PrefetchMetro), el servicio de ValenBici y unas sesiones que leen llegadas
+de EMT a través de CacheLlegadas. Los servicios son los simuladores de
+benchmarks/carga.py. Se mide con 1 proceso y con --procesos procesos, sin
+almacén (cada uno por su cuenta) y con uno (un líder por tarea). Con el
+almacén las peticiones a geoportal y JCDecaux no deben crecer con los
+procesos; si lo hacen más de un 50 % el proceso termina con código 1.
+
+Uso: python benchmarks/procesos.py --procesos 4 --duracion 10
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+RAIZ = os.path.abspath(os.path.join(BENCHMARKS, '..'))
+sys.path.insert(0, BENCHMARKS)
+
+from carga import SERVICIOS, simular  # noqa: E402
+
+# Estaciones de metro del motor (menos que en producción, para rondas cortas) y paradas de EMT leídas
+ESTACIONES_METRO = 30
+PARADAS_EMT = 8
+
+
+def worker(puertos, ruta, duracion, resultado):
+    """Un proceso con sus motores y sus lectores; devuelve lo que ha visto en `resultado`."""
+    os.environ['VALENCIA_REDIRECCIONES'] = ','.join(
+        f'{host}=http://127.0.0.1:{puertos[nombre]}' for nombre, host in SERVICIOS.items())
+    sys.path.insert(0, RAIZ)
+    import datos_estaticos
+    from almacen_compartido import AlmacenInstantaneas
+    from cache_llegadas import CacheLlegadas
+    from llegadas import descargar_movimientos
+    from prefetch_metro import PrefetchMetro
+    from valenbici import ORIGEN_API, ServicioValenBici
+
+    paquete = datos_estaticos.paquete()
+    metro = [str(u) for u in dict.fromkeys(paquete['metro']['Pròximes Arribades / Próximas llegadas'])]
+    emt = [str(u) for u in dict.fromkeys(paquete['emt']['Pròximes Arribades / Proximas Llegadas'])]
+    almacen = AlmacenInstantaneas(ruta) if ruta else None
+    motor = PrefetchMetro(metro[:ESTACIONES_METRO], descargar_movimientos, periodo=2.0, almacen=almacen).iniciar()
+    bicis = ServicioValenBici(periodo=2.0, almacen=almacen)
+    bicis.ESPERA_SEGUIDOR = 0.5
+    bicis.iniciar()
+    cache = CacheLlegadas(ttl=1.0)
+    cargar = descargar_movimientos if almacen is None else almacen.cargador(descargar_movimientos, frescura=1.0)
+
+    fin = threading.Event()
+
+    def leer():
+        azar = random.Random()
+        while not fin.is_set():
+            try:
+                cache.obtener(azar.choice(emt[:PARADAS_EMT]), cargar)
+            except Exception:
+                pass
+            fin.wait(0.05)
+
+    lectores = [threading.Thread(target=leer, daemon=True) for _ in range(4)]
+    for lector in lectores:
+        lector.start()
+    time.sleep(duracion)
+    fin.set()
+    resultado.put({'estaciones': len(motor.instantanea().llegadas),
+                   'valenbici_api': bicis.instantanea().origen == ORIGEN_API,
+                   'rondas': motor.rondas, 'lecturas': motor.lecturas + bicis.lecturas})
+    motor.detener()
+    bicis.detener()
+
+
+def medir(extremo, puertos, procesos, compartido, duracion):
+    extremo.send('estadisticas')
+    antes = extremo.recv()
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, 'instantaneas.db') if compartido else None
+        resultado = multiprocessing.Queue()
+        hijos = [multiprocessing.Process(target=worker, args=(puertos, ruta, duracion, resultado))
+                 for _ in range(procesos)]
+        for hijo in hijos:
+            hijo.start()
+        vistos = [resultado.get() for _ in hijos]
+        for hijo in hijos:
+            hijo.join()
+    extremo.send('estadisticas')
+    despues = extremo.recv()
+    return {n: despues[n][0] - antes[n][0] for n in SERVICIOS}, vistos
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--procesos', type=int, default=4)
+    parser.add_argument('--duracion', type=float, default=10.0, help='segundos de cada medida')
+    args = parser.parse_args()
+
+    extremo, conexion = multiprocessing.Pipe()
+    simuladores = multiprocessing.Process(target=simular, args=(conexion, 0.01, 0.0), daemon=True)
+    simuladores.start()
+    puertos = extremo.recv()
+
+    medidas = {}
+    print(f"{'almacén':8s} {'procesos':>8s} {'geoportal':>10s} {'emt':>6s} {'jcdecaux':>9s}   "
+          f"{'estaciones por proceso':24s} valenbici del feed")
+    try:
+        for compartido in (False, True):
+            for procesos in (1, args.procesos):
+                peticiones, vistos = medir(extremo, puertos, procesos, compartido, args.duracion)
+                medidas[compartido, procesos] = peticiones
+                print(f"{'sí' if compartido else 'no':8s} {procesos:8d} {peticiones['geoportal']:10d} "
+                      f"{peticiones['emt']:6d} {peticiones['jcdecaux']:9d}   "
+                      f"{str([v['estaciones'] for v in vistos]):24s} {all(v['valenbici_api'] for v in vistos)}")
+    finally:
+        extremo.send('fin')
+
+    fallos = []
+    for servicio in ('geoportal', 'jcdecaux'):
+        uno, varios = medidas[True, 1][servicio], medidas[True, args.procesos][servicio]
+        if varios > 1.5 * max(uno, 1):
+            fallos.append(f'{servicio}: {varios} peticiones con {args.procesos} procesos frente a {uno} con uno')
+    for fallo in fallos:
+        print(f'FALLO: {fallo}', file=sys.stderr)
+    return 1 if fallos else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
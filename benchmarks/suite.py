@@ -0,0 +1,514 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Suite de benchmarks de los caminos críticos, sin red.
+
+Las respuestas de geoportal, EMT (QR.php), JCDecaux y Mapbox se sirven desde
+benchmarks/fixtures a través de un adaptador de requests montado en un
+ClienteHTTP, así que también se mide la pila de descarga (cliente, reintentos,
+parser) sin salir a internet. Cubre:
+  parser      extracción de llegadas de las páginas de geoportal y EMT
+  descarga    descargar_movimientos y la caché de llegadas
+  tiempos     tiempo restante de 1000 llegadas de metro y de bus
+  datos       compilar los CSV, abrir el paquete binario y leer los CSV con pandas
+  busqueda    construir el índice de EMT y consultas típicas
+  espacial    paradas a 400 m de un punto
+  mapas       construir y serializar los mapas de pydeck
+  valenbici   procesar el feed de JCDecaux y leer la copia del CSV
+  rutas       rutas en caché y decodificación de la polilínea
+  metricas    coste de medir una ejecución de página y de exportar las métricas
+
+Cada caso se repite hasta durar al menos 50 ms por tanda y se guarda el mejor
+tiempo por operación de 5 tandas. El resultado se compara con la línea base
+(benchmarks/baseline.json) y los casos más lentos que el umbral se marcan como
+regresión; en ese caso el proceso termina con código 1.
+
+Uso:
+    python benchmarks/suite.py                    # ejecutar y comparar con la línea base
+    python benchmarks/suite.py --filtro mapas     # solo los casos que contienen 'mapas'
+    python benchmarks/suite.py --guardar-base     # guardar los resultados como nueva línea base
+    python benchmarks/suite.py --grabar           # volver a grabar las fixtures desde los servicios reales
+
+Las fixtures de JCDecaux y Mapbox incluidas se generaron a partir de
+Valenbici.csv con el formato de las respuestas reales; --grabar las sustituye
+por respuestas grabadas.
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+from urllib.parse import parse_qs, urlsplit
+
+import requests
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARKS, '..'))
+import cliente_http  # noqa: E402
+import datos_estaticos  # noqa: E402
+
+FIXTURES = os.path.join(BENCHMARKS, 'fixtures')
+RUTA_BASE = os.path.join(BENCHMARKS, 'baseline.json')
+
+MINIMO_TANDA = 0.05
+TANDAS = 5
+
+
+# ::::::::::::::::::::::::::::: GRABACIONES :::::::::::::::::::::::::::::::
+
+def fichero_grabado(url):
+    """Fixture que corresponde a una URL de alguno de los cuatro servicios, o None."""
+    partes = urlsplit(url)
+    consulta = parse_qs(partes.query)
+    if partes.hostname == 'geoportal.valencia.es':
+        carpeta, nombre = 'geoportal', f"estacion_{consulta.get('estacion', [''])[0]}.html"
+    elif partes.hostname == 'www.emtvalencia.es':
+        carpeta, nombre = 'emt', f"parada_{consulta.get('p', [''])[0]}.html"
+    elif partes.hostname == 'api.jcdecaux.com':
+        carpeta, nombre = 'jcdecaux', 'stations.json'
+    elif partes.hostname == 'api.mapbox.com':
+        carpeta = 'mapbox'
+        nombre = 'matrix.json' if '/directions-matrix/' in partes.path else 'directions.json'
+    else:
+        return None
+    ruta = os.path.join(FIXTURES, carpeta, nombre)
+    if not os.path.exists(ruta):
+        # Estación o parada sin grabar: cualquier otra página del mismo servicio
+        ruta = os.path.join(FIXTURES, carpeta, sorted(os.listdir(os.path.join(FIXTURES, carpeta)))[0])
+    return ruta
+
+
+class AdaptadorGrabaciones(BaseAdapter):
+    """Adaptador de requests que contesta con las fixtures en lugar de ir a la red."""
+
+    def send(self, request, **kwargs):
+        response = requests.Response()
+        response.request = request
+        response.url = request.url
+        ruta = fichero_grabado(request.url)
+        if ruta is None:
+            response.status_code, response._content = 404, b''
+        else:
+            with open(ruta, 'rb') as f:
+                response.status_code, response._content = 200, f.read()
+        tipo = 'application/json' if ruta and ruta.endswith('.json') else 'text/html; charset=utf-8'
+        response.headers = CaseInsensitiveDict({'Content-Type': tipo, 'Content-Length': str(len(response._content))})
+        response.encoding = 'utf-8'
+        return response
+
+    def close(self):
+        pass
+
+
+def cliente_grabaciones():
+    cliente = cliente_http.ClienteHTTP()
+    adaptador = AdaptadorGrabaciones()
+    cliente.session.mount('http://', adaptador)
+    cliente.session.mount('https://', adaptador)
+    return cliente
+
+
+def grabar(n=5):
+    """Descarga respuestas reales de los cuatro servicios y las guarda como fixtures."""
+    import rutas
+    import valenbici
+
+    def guardar(carpeta, nombre, contenido):
+        os.makedirs(os.path.join(FIXTURES, carpeta), exist_ok=True)
+        with open(os.path.join(FIXTURES, carpeta, nombre), 'wb') as f:
+            f.write(contenido)
+        print(f'{carpeta}/{nombre}: {len(contenido)} bytes')
+
+    paquete = datos_estaticos.paquete()
+    for carpeta, prefijo, tabla, columna in [
+        ('geoportal', 'estacion', 'metro', 'Pròximes Arribades / Próximas llegadas'),
+        ('emt', 'parada', 'emt', 'Pròximes Arribades / Proximas Llegadas'),
+    ]:
+        for url, id_parada in list(zip(paquete[tabla][columna], paquete[tabla]['Id. Parada']))[:n]:
+            response = cliente_http.get(url)
+            response.raise_for_status()
+            guardar(carpeta, f'{prefijo}_{id_parada}.html', response.content)
+
+    response = cliente_http.get(valenbici.URL_ESTACIONES)
+    response.raise_for_status()
+    guardar('jcdecaux', 'stations.json', response.content)
+
+    estaciones = sorted(valenbici.desde_csv().values())
+    origen, destino = estaciones[0], estaciones[len(estaciones) // 3]
+    response = cliente_http.get(
+        f'{rutas.URL_DIRECCIONES}/{origen.lon},{origen.lat};{destino.lon},{destino.lat}',
+        params={'access_token': rutas.MAPBOX_KEY, 'geometries': 'polyline'})
+    response.raise_for_status()
+    guardar('mapbox', 'directions.json', response.content)
+
+    bloque = estaciones[:rutas.MAX_COORDENADAS_MATRIZ]
+    response = cliente_http.get(
+        f"{rutas.URL_MATRIZ}/{';'.join(f'{e.lon},{e.lat}' for e in bloque)}",
+        params={'access_token': rutas.MAPBOX_KEY, 'sources': ';'.join(map(str, range(12))),
+                'destinations': ';'.join(map(str, range(12, len(bloque))))})
+    response.raise_for_status()
+    guardar('mapbox', 'matrix.json', response.content)
+
+
+# ::::::::::::::::::::::::::::::: CASOS :::::::::::::::::::::::::::::::::::
+# Cada caso prepara lo necesario fuera de la medida y devuelve la función a cronometrar
+
+def _paginas(carpeta):
+    directorio = os.path.join(FIXTURES, carpeta)
+    paginas = []
+    for nombre in sorted(os.listdir(directorio)):
+        with open(os.path.join(directorio, nombre), encoding='utf-8') as f:
+            paginas.append(f.read())
+    return paginas
+
+
+def caso_parser(carpeta):
+    def preparar():
+        from parser_llegadas import extraer_movimientos
+        paginas = _paginas(carpeta)
+        return lambda: [extraer_movimientos(html) for html in paginas]
+    return preparar
+
+
+def caso_descarga_metro():
+    import llegadas
+    cliente = cliente_grabaciones()
+    url = datos_estaticos.paquete()['metro']['Pròximes Arribades / Próximas llegadas'][0]
+
+    def descargar():
+        # descargar_movimientos usa el cliente del módulo: se sustituye solo durante la medida
+        original, cliente_http.cliente = cliente_http.cliente, cliente
+        try:
+            return llegadas.descargar_movimientos(url)
+        finally:
+            cliente_http.cliente = original
+    return descargar
+
+
+def caso_cache_llegadas():
+    from cache_llegadas import CacheLlegadas
+    cache = CacheLlegadas(ttl=3600)
+    movimientos = [{"Número de Línea": "3", "Destino": "Aeroport", "Tiempo": "12:00:00"}] * 6
+    cache.obtener('url', lambda url: movimientos)
+    return lambda: cache.obtener('url', lambda url: movimientos)
+
+
+def caso_tiempos(tipo):
+    def preparar():
+        import random
+        import tiempos
+        azar = random.Random(1)
+        if tipo == 'metro':
+            horas = [f'{azar.randrange(24):02d}:{azar.randrange(60):02d}:{azar.randrange(60):02d}'
+                     for _ in range(1000)]
+            return lambda: tiempos.tiempos_restantes_metro(horas)
+        textos = [f'P. Congressos - {azar.randrange(60)} min' for _ in range(1000)]
+        return lambda: tiempos.tiempos_restantes_bus(textos)
+    return preparar
+
+
+class _Temporal:
+    # Directorio temporal que se borra al terminar la suite
+    directorio = None
+
+    @classmethod
+    def ruta(cls, nombre):
+        if cls.directorio is None:
+            cls.directorio = tempfile.mkdtemp(prefix='bench-valencia-')
+        return os.path.join(cls.directorio, nombre)
+
+    @classmethod
+    def limpiar(cls):
+        if cls.directorio is not None:
+            shutil.rmtree(cls.directorio, ignore_errors=True)
+            cls.directorio = None
+
+
+def caso_compilar():
+    ruta = _Temporal.ruta('datos.bin')
+    return lambda: datos_estaticos.compilar(ruta)
+
+
+def caso_abrir_paquete():
+    ruta = datos_estaticos.compilar(_Temporal.ruta('datos-abrir.bin'))
+
+    def abrir():
+        paquete = datos_estaticos.Paquete(ruta)
+        return [paquete[tabla].a_dataframe() for tabla in datos_estaticos.ESQUEMA]
+    return abrir
+
+
+def caso_csv_pandas():
+    import pandas as pd
+    rutas_csv = [os.path.join(datos_estaticos.DIRECTORIO, csv) for csv, _ in datos_estaticos.ESQUEMA.values()]
+    return lambda: [pd.read_csv(ruta, delimiter=';') for ruta in rutas_csv]
+
+
+def _indice_emt():
+    from buscador import IndiceBusqueda
+    tabla = datos_estaticos.paquete()['emt']
+    return IndiceBusqueda(tabla['Denominació / Denominación'], tabla['Id. Parada'])
+
+
+def caso_indice_emt():
+    return _indice_emt
+
+
+def caso_busqueda(consulta, k=50):
+    def preparar():
+        indice = _indice_emt()
+        return lambda: indice.buscar(consulta, k=k)
+    return preparar
+
+
+def _indice_lineas_emt():
+    from indice_lineas import IndiceLineas
+    tabla = datos_estaticos.paquete()['emt']
+    return IndiceLineas(tabla['Línies / Líneas'], tabla['Denominació / Denominación'])
+
+
+def caso_indice_lineas():
+    return _indice_lineas_emt
+
+
+def caso_lineas(todas):
+    def preparar():
+        indice = _indice_lineas_emt()
+        if todas:
+            return lambda: indice.filas(indice.interseccion(['19', '99']))
+        return lambda: indice.filas(indice.union(['3', '9', 'N1']))
+    return preparar
+
+
+def caso_en_radio():
+    from indice_espacial import IndiceTransporte
+    indice = IndiceTransporte.desde_paquete(datos_estaticos.paquete())
+    return lambda: indice.en_radio(39.4699, -0.3763, 400)
+
+
+def caso_mapa(tabla):
+    def preparar():
+        import mapas
+        data = datos_estaticos.paquete()[tabla].a_dataframe()
+        if tabla == 'emt':
+            campos, icono, tooltip = ({'n': data['Denominació / Denominación'], 'l': data['Línies / Líneas']},
+                                      mapas.ICONO_EMT, {"text": "{n}\nBuses: {l}"})
+        else:
+            campos, icono, tooltip = {}, mapas.ICONO_METRO, None
+
+        def construir():
+            registros = mapas.puntos(data['lat'], data['lon'], **campos)
+            return mapas.Mapa(layers=[mapas.capa_puntos(registros, icono, pickable=True)],
+                              initial_view_state=mapas.vista(registros, zoom=12, pitch=50),
+                              tooltip=tooltip).to_json()
+        return construir
+    return preparar
+
+
+def caso_mapa_valenbici():
+    import mapas
+    from valenbici import ServicioValenBici
+    servicio = ServicioValenBici(cliente=cliente_grabaciones())
+    servicio.actualizar()
+    data = servicio.estaciones()
+
+    def construir():
+        registros = mapas.puntos(data['lat'], data['lon'], a=data['address'], b=data['available_bikes'],
+                                 e=data['available_bike_stands'], s=data['status'])
+        return mapas.Mapa(layers=[mapas.capa_puntos(registros, mapas.ICONO_BICI, tamano=4, pickable=True)],
+                          initial_view_state=mapas.vista(registros, zoom=13)).to_json()
+    return construir
+
+
+def caso_feed_valenbici():
+    from valenbici import ServicioValenBici
+    servicio = ServicioValenBici(cliente=cliente_grabaciones())
+    servicio.actualizar()
+
+    def actualizar():
+        # Se olvida la huella del último cuerpo para que el feed se procese y se compare entero
+        servicio._huella = None
+        return servicio.actualizar()
+    return actualizar
+
+
+def caso_csv_valenbici():
+    from valenbici import desde_csv
+    return desde_csv
+
+
+def caso_ruta_cacheada():
+    from rutas import AlmacenRutas, ServicioRutas
+    servicio = ServicioRutas(AlmacenRutas(_Temporal.ruta('rutas.db')), descargar=lambda o, d: (300.0, 1200.0, ''))
+    origen, destino = (1, -0.38, 39.48), (84, -0.33, 39.47)
+    servicio.geometria(origen, destino)
+    return lambda: servicio.ruta(origen, destino)
+
+
+def caso_polilinea():
+    from rutas import decodificar_polilinea
+    with open(os.path.join(FIXTURES, 'mapbox', 'directions.json'), encoding='utf-8') as f:
+        geometria = json.load(f)['routes'][0]['geometry']
+    return lambda: decodificar_polilinea(geometria)
+
+
+def caso_metricas_pagina():
+    import metricas
+    return lambda: metricas.terminar_pagina('bench', metricas.empezar_pagina())
+
+
+def caso_metricas_exportar():
+    import metricas
+    for host in ('geoportal.valencia.es', 'www.emtvalencia.es', 'api.jcdecaux.com', 'api.mapbox.com'):
+        metricas.HTTP.observar(0.05, host, '200')
+    return metricas.registro.exportar
+
+
+CASOS = [
+    ('parser.geoportal', caso_parser('geoportal')),
+    ('parser.emt', caso_parser('emt')),
+    ('descarga.metro', caso_descarga_metro),
+    ('descarga.cache_acierto', caso_cache_llegadas),
+    ('tiempos.metro_1000', caso_tiempos('metro')),
+    ('tiempos.bus_1000', caso_tiempos('bus')),
+    ('datos.compilar', caso_compilar),
+    ('datos.abrir_paquete', caso_abrir_paquete),
+    ('datos.csv_pandas', caso_csv_pandas),
+    ('busqueda.indice_emt', caso_indice_emt),
+    ('busqueda.emt_letra', caso_busqueda('a')),
+    ('busqueda.emt_palabra', caso_busqueda('blasco')),
+    ('busqueda.emt_numero', caso_busqueda('2180')),
+    ('lineas.indice_emt', caso_indice_lineas),
+    ('lineas.emt_union', caso_lineas(False)),
+    ('lineas.emt_interseccion', caso_lineas(True)),
+    ('espacial.en_radio_400', caso_en_radio),
+    ('mapas.emt_todas', caso_mapa('emt')),
+    ('mapas.metro_todas', caso_mapa('metro')),
+    ('mapas.valenbici', caso_mapa_valenbici),
+    ('valenbici.feed', caso_feed_valenbici),
+    ('valenbici.csv', caso_csv_valenbici),
+    ('rutas.cacheada', caso_ruta_cacheada),
+    ('rutas.polilinea', caso_polilinea),
+    ('metricas.pagina', caso_metricas_pagina),
+    ('metricas.exportar', caso_metricas_exportar),
+]
+
+
+# ::::::::::::::::::::::::::::: EJECUCIÓN :::::::::::::::::::::::::::::::::
+
+def _tanda(funcion, n):
+    inicio = time.perf_counter()
+    for _ in range(n):
+        funcion()
+    return time.perf_counter() - inicio
+
+
+def medir(funcion, minimo=MINIMO_TANDA, tandas=TANDAS):
+    """Mejor tiempo por operación, en segundos, de `tandas` tandas de al menos `minimo` segundos."""
+    # Como timeit.Timer.autorange: se duplica el número de operaciones hasta llenar la tanda
+    n = 1
+    while True:
+        duracion = _tanda(funcion, n)
+        if duracion >= minimo:
+            break
+        n *= 2
+    mejor = duracion / n
+    for _ in range(tandas - 1):
+        mejor = min(mejor, _tanda(funcion, n) / n)
+    return mejor
+
+
+def ejecutar(filtro=None):
+    resultados = {}
+    try:
+        for nombre, preparar in CASOS:
+            if filtro and filtro not in nombre:
+                continue
+            resultados[nombre] = medir(preparar())
+            print(f'  {nombre:28s} {_formato(resultados[nombre])}', file=sys.stderr)
+    finally:
+        _Temporal.limpiar()
+    return resultados
+
+
+def _formato(segundos):
+    if segundos >= 1e-3:
+        return f'{segundos * 1e3:9.2f} ms'
+    return f'{segundos * 1e6:9.2f} µs'
+
+
+def informe(resultados, base, umbral):
+    """Tabla de comparación con la línea base; devuelve los casos con regresión."""
+    regresiones = []
+    print(f"{'caso':28s} {'actual':>12s} {'base':>12s} {'relación':>9s}")
+    for nombre, segundos in resultados.items():
+        referencia = base.get(nombre)
+        if referencia is None:
+            print(f'{nombre:28s} {_formato(segundos):>12s} {"-":>12s} {"nuevo":>9s}')
+            continue
+        relacion = segundos / referencia
+        marca = ''
+        if relacion > 1 + umbral:
+            marca = '  REGRESIÓN'
+            regresiones.append(nombre)
+        elif relacion < 1 / (1 + umbral):
+            marca = '  mejora'
+        print(f'{nombre:28s} {_formato(segundos):>12s} {_formato(referencia):>12s} {relacion:8.2f}x{marca}')
+    return regresiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--filtro', help='ejecutar solo los casos cuyo nombre contiene este texto')
+    parser.add_argument('--base', default=RUTA_BASE, help='fichero de la línea base')
+    parser.add_argument('--guardar-base', action='store_true', help='guardar los resultados como línea base')
+    parser.add_argument('--umbral', type=float, default=0.25,
+                        help='fracción de tiempo extra a partir de la que un caso es una regresión')
+    parser.add_argument('--salida', help='guardar también los resultados en este fichero JSON')
+    parser.add_argument('--grabar', action='store_true', help='volver a grabar las fixtures (necesita red)')
+    args = parser.parse_args()
+
+    if args.grabar:
+        grabar()
+        return 0
+
+    resultados = ejecutar(args.filtro)
+    documento = {
+        'creada': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'resultados': resultados,
+    }
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as f:
+            json.dump(documento, f, indent=2, ensure_ascii=False)
+
+    base = {}
+    if os.path.exists(args.base):
+        with open(args.base, encoding='utf-8') as f:
+            base = json.load(f)['resultados']
+    regresiones = informe(resultados, base, args.umbral)
+
+    if args.guardar_base:
+        if args.filtro:
+            # Guardar una ejecución parcial no borra los demás casos de la línea base
+            documento['resultados'] = {**base, **resultados}
+        with open(args.base, 'w', encoding='utf-8') as f:
+            json.dump(documento, f, indent=2, ensure_ascii=False)
+        print(f'Línea base guardada en {args.base}')
+        return 0
+    if regresiones:
+        print(f"{len(regresiones)} regresiones: {', '.join(regresiones)}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Índice de búsqueda de estaciones y paradas por nombre o número.
+
+Los nombres se normalizan (minúsculas, sin acentos ni signos) de forma que
+'cami' encuentra 'Camí' y 'marcelli' encuentra 'Marcel·lí'. El índice guarda,
+para cada n-grama de 1 a 3 caracteres, las entradas que lo contienen; una
+consulta solo compara el texto de las entradas que tienen todos sus n-gramas.
+Los resultados se ordenan de mejor a peor coincidencia:
+  número de parada exacto, nombre exacto, empieza por la consulta,
+  alguna palabra empieza por la consulta y, por último, contiene la consulta
+(alfabéticamente dentro de cada grupo). Los tres primeros grupos salen de
+búsquedas binarias, así que una consulta corta con muchas coincidencias se
+resuelve sin recorrerlas todas.
+"""
+
+import heapq
+import re
+import unicodedata
+from bisect import bisect_left
+
+N_GRAMA = 3
+
+# Signos que unen partes de una palabra y se eliminan sin dejar espacio
+_UNIONES = str.maketrans('', '', "·'’.")
+_NO_ALFANUMERICO = re.compile(r'[^0-9a-z]+')
+# Carácter mayor que cualquiera de un texto normalizado, para buscar rangos por prefijo
+_MAYOR = '{'
+
+
+def normalizar(texto):
+    texto = unicodedata.normalize('NFKD', str(texto).casefold())
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return _NO_ALFANUMERICO.sub(' ', texto.translate(_UNIONES)).strip()
+
+
+def _n_gramas(texto):
+    for n in range(1, N_GRAMA + 1):
+        for i in range(len(texto) - n + 1):
+            yield texto[i:i + n]
+
+
+class IndiceBusqueda:
+
+    def __init__(self, nombres, ids=None):
+        nombres = [str(n) for n in nombres]
+        # Orden alfabético de siempre para la lista completa (consulta vacía)
+        self.nombres = sorted(set(nombres))
+        # Internamente las entradas se ordenan por su texto normalizado: así los nombres
+        # que empiezan por la consulta forman un rango contiguo
+        self._entradas = sorted(self.nombres, key=lambda n: (normalizar(n), n))
+        self._normalizados = [normalizar(n) for n in self._entradas]
+        posicion = {nombre: i for i, nombre in enumerate(self._entradas)}
+
+        self._exactos = {}
+        for i, texto in enumerate(self._normalizados):
+            self._exactos.setdefault(texto, []).append(i)
+
+        # Texto desde el comienzo de cada palabra que no es la primera, ordenado
+        sufijos = sorted((texto[p + 1:], i) for i, texto in enumerate(self._normalizados)
+                         for p, c in enumerate(texto) if c == ' ')
+        self._sufijos = [s for s, _ in sufijos]
+        self._sufijos_entrada = [i for _, i in sufijos]
+
+        self._n_gramas = {}
+        for i, texto in enumerate(self._normalizados):
+            for n_grama in set(_n_gramas(texto)):
+                self._n_gramas.setdefault(n_grama, []).append(i)
+        # Conjuntos inmutables: el índice se comparte entre sesiones
+        self._n_gramas = {k: frozenset(v) for k, v in self._n_gramas.items()}
+
+        # Número de parada -> entrada (EMT)
+        self._ids = {}
+        if ids is not None:
+            for nombre, id_parada in zip(nombres, ids):
+                self._ids.setdefault(str(int(id_parada)), posicion[nombre])
+
+    def __len__(self):
+        return len(self.nombres)
+
+    def _rango(self, lista, texto):
+        # Posiciones de `lista` (ordenada) que empiezan por `texto`
+        return bisect_left(lista, texto), bisect_left(lista, texto + _MAYOR)
+
+    def _candidatos(self, palabra):
+        # Entradas que contienen todos los n-gramas de `palabra`
+        if len(palabra) <= N_GRAMA:
+            return self._n_gramas.get(palabra, frozenset())
+        conjuntos = sorted((self._n_gramas.get(palabra[i:i + N_GRAMA], frozenset())
+                            for i in range(len(palabra) - N_GRAMA + 1)), key=len)
+        return frozenset.intersection(*conjuntos)
+
+    def _contienen(self, palabras):
+        candidatos = None
+        for palabra in sorted(palabras, key=len, reverse=True):
+            encontrados = self._candidatos(palabra)
+            candidatos = encontrados if candidatos is None else candidatos & encontrados
+            if not candidatos:
+                return ()
+        return (i for i in candidatos if all(p in self._normalizados[i] for p in palabras))
+
+    def buscar(self, consulta, k=None):
+        """Nombres que coinciden con `consulta`, de mejor a peor; todos si está vacía. Como mucho `k`
+        (ninguno si k <= 0), o sin límite si k es None."""
+        if k is not None and k <= 0:
+            return []
+        texto = normalizar(consulta)
+        if not texto:
+            return list(self.nombres) if k is None else self.nombres[:k]
+
+        resultado = []
+        vistos = set()
+
+        def anadir(indices):
+            # Añade entradas en orden hasta tener k; devuelve True si ya hay suficientes
+            for i in indices:
+                if i not in vistos:
+                    vistos.add(i)
+                    resultado.append(i)
+                    if k is not None and len(resultado) >= k:
+                        return True
+            return False
+
+        def mejores(indices):
+            # Las que faltan para llegar a k, en orden alfabético, sin ordenar todo el conjunto
+            indices = [i for i in set(indices) if i not in vistos]
+            return sorted(indices) if k is None else heapq.nsmallest(k - len(resultado), indices)
+
+        def encontradas():
+            return [self._entradas[i] for i in resultado]
+
+        # Grupos de mejor a peor (ver arriba): en cuanto hay k no se calculan los siguientes
+        i_id = self._ids.get(texto)
+        if anadir([i_id] if i_id is not None else ()):
+            return encontradas()
+        if anadir(self._exactos.get(texto, ())):
+            return encontradas()
+        if anadir(range(*self._rango(self._normalizados, texto))):
+            return encontradas()
+        if anadir(mejores(self._sufijos_entrada[slice(*self._rango(self._sufijos, texto))])):
+            return encontradas()
+        anadir(mejores(self._contienen(texto.split())))
+        return encontradas()
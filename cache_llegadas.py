@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Caché compartida de próximas llegadas para todas las sesiones del proceso.
+
+Cada estación se identifica por la URL de sus próximas llegadas. Mientras el
+resultado sea fresco (ttl) todas las sesiones reciben la misma lista sin tocar
+el servidor de origen. Si varias sesiones piden a la vez una estación caducada
+solo una de ellas descarga los datos y el resto espera a ese resultado.
+
+Pasado el ttl, y hasta `max_edad`, el último resultado bueno se sigue
+sirviendo al momento mientras un hilo en segundo plano lo vuelve a pedir
+(stale-while-revalidate): si el servicio de origen está lento o caído las
+páginas no esperan y muestran los datos con su antigüedad (edad()). Los
+errores no se guardan ni borran lo que hay; el disyuntor de cliente_http
+evita que esas revalidaciones lleguen al origen mientras sigue caído.
+
+Con `ttl_de` cada entrada tiene su propio ttl, calculado de los movimientos al
+guardarlos (planificador.ttl_llegadas: más corto cuanto más cerca está la
+próxima llegada).
+
+obtener_varias pide varias estaciones a la vez en un pool de hilos: una página
+con varias paradas tarda lo que la más lenta, no la suma de todas (el límite
+de peticiones simultáneas por host lo pone cliente_http).
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class _Descarga:
+    # Descarga en curso de una URL que comparten todas las sesiones que la piden
+    def __init__(self):
+        self.terminada = threading.Event()
+        self.resultado = None
+        self.error = None
+
+
+class CacheLlegadas:
+
+    def __init__(self, ttl=10.0, max_entradas=512, max_edad=600.0, ttl_de=None, reloj=time.monotonic):
+        self.ttl = ttl
+        self.ttl_de = ttl_de  # Función movimientos -> ttl de la entrada; sin ella, `ttl` para todas
+        self.max_edad = max_edad  # Hasta esta edad se sirve lo que hay mientras se revalida
+        self.max_entradas = max_entradas
+        self._reloj = reloj
+        self._lock = threading.Lock()
+        self._entradas = OrderedDict()  # url -> (instante de carga, movimientos, ttl)
+        self._en_curso = {}             # url -> _Descarga
+        self.aciertos = 0
+        self.fallos = 0
+        self.obsoletas = 0  # Respuestas caducadas servidas mientras se revalidaban
+
+    def _fresca(self, url):
+        # Movimientos de `url` si aún no han caducado; se llama con el lock tomado
+        entrada = self._entradas.get(url)
+        if entrada is not None and self._reloj() - entrada[0] < entrada[2]:
+            self._entradas.move_to_end(url)
+            self.aciertos += 1
+            return entrada[1]
+        return None
+
+    def obtener(self, url, cargar):
+        """Devuelve los movimientos de `url`, llamando a `cargar(url)` solo si hace falta."""
+        with self._lock:
+            movimientos = self._fresca(url)
+            if movimientos is not None:
+                return movimientos
+
+            descarga = self._en_curso.get(url)
+            lider = descarga is None
+            if lider:
+                descarga = _Descarga()
+                self._en_curso[url] = descarga
+
+            entrada = self._entradas.get(url)
+            if entrada is not None and self._reloj() - entrada[0] < self.max_edad:
+                # Caducada pero utilizable: se sirve ya y se revalida en segundo plano
+                self.obsoletas += 1
+                self._entradas.move_to_end(url)
+                if lider:
+                    threading.Thread(target=self._descargar, args=(url, cargar, descarga),
+                                     name='revalidar-llegadas', daemon=True).start()
+                return entrada[1]
+            self.fallos += 1
+
+        if lider:
+            self._descargar(url, cargar, descarga)
+        else:
+            # Otra sesión ya está descargando esta estación: esperar su resultado
+            descarga.terminada.wait()
+        if descarga.error is not None:
+            raise descarga.error
+        return descarga.resultado
+
+    def _descargar(self, url, cargar, descarga):
+        try:
+            descarga.resultado = cargar(url)
+        except Exception as e:
+            # Los errores no se guardan: la siguiente petición lo vuelve a intentar
+            descarga.error = e
+        else:
+            with self._lock:
+                self._guardar(url, descarga.resultado)
+        finally:
+            with self._lock:
+                del self._en_curso[url]
+            descarga.terminada.set()
+
+    def edad(self, url):
+        """Segundos desde la última descarga buena de `url`, o None si no hay ninguna."""
+        with self._lock:
+            entrada = self._entradas.get(url)
+        return None if entrada is None else self._reloj() - entrada[0]
+
+    def obtener_varias(self, urls, cargar, ejecutor):
+        """{url: movimientos, o la excepción de su descarga}; las que faltan se descargan a la vez en `ejecutor`."""
+        resultado, pendientes = {}, []
+        with self._lock:
+            for url in dict.fromkeys(urls):
+                movimientos = self._fresca(url)
+                if movimientos is not None:
+                    resultado[url] = movimientos
+                else:
+                    pendientes.append(url)
+        futuros = [(url, ejecutor.submit(self.obtener, url, cargar)) for url in pendientes]
+        for url, futuro in futuros:
+            try:
+                resultado[url] = futuro.result()
+            except Exception as e:
+                resultado[url] = e
+        return resultado
+
+    def _guardar(self, url, movimientos):
+        ttl = self.ttl
+        if self.ttl_de is not None:
+            try:
+                ttl = self.ttl_de(movimientos)
+            except Exception:
+                pass
+        self._entradas[url] = (self._reloj(), movimientos, ttl)
+        self._entradas.move_to_end(url)
+        # Expulsar las estaciones menos consultadas recientemente
+        while len(self._entradas) > self.max_entradas:
+            self._entradas.popitem(last=False)
+
+    def invalidar(self, url=None):
+        with self._lock:
+            if url is None:
+                self._entradas.clear()
+            else:
+                self._entradas.pop(url, None)
+
+    def __len__(self):
+        return len(self._entradas)
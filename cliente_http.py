@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cliente HTTP compartido para todas las llamadas a servicios externos
+(geoportal, EMT, JCDecaux y Mapbox).
+
+- Una sola requests.Session con un pool de conexiones keep-alive por host, de
+  modo que solo la primera petición a cada host paga el handshake TCP/TLS.
+- Timeouts estrictos de conexión y de lectura en todas las peticiones.
+- Reintentos con espera aleatoria (full jitter) limitados por un presupuesto
+  global: cada petición aporta una fracción de reintento y cada reintento
+  gasta uno entero, así una caída no multiplica la carga sobre el origen.
+- Límite de peticiones simultáneas por host.
+- Duración de cada petición por host y estado, y peticiones en curso, en
+  metricas.py.
+- Un disyuntor por host: tras varios fallos seguidos deja de enviar peticiones
+  a ese host durante un tiempo (que crece si sigue caído) y después deja pasar
+  una sola petición de prueba; si sale bien vuelve a cerrarse. Mientras está
+  abierto get() lanza CircuitoAbierto al momento, sin ocupar ningún hilo ni
+  conexión esperando a un servicio caído.
+- Redirección opcional de hosts (VALENCIA_REDIRECCIONES) a servidores locales
+  que los simulan, para las pruebas de carga (benchmarks/carga.py).
+"""
+
+import logging
+import os
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metricas
+
+log = logging.getLogger('cliente_http')
+
+# Errores y códigos de estado que merece la pena reintentar
+ERRORES_REINTENTABLES = (requests.ConnectionError, requests.Timeout)
+ESTADOS_REINTENTABLES = {429, 500, 502, 503, 504}
+
+# Estados del disyuntor (el índice es el valor de la métrica valencia_disyuntor_estado)
+CERRADO, SEMIABIERTO, ABIERTO = 'cerrado', 'semiabierto', 'abierto'
+ESTADOS_DISYUNTOR = (CERRADO, SEMIABIERTO, ABIERTO)
+
+
+class CircuitoAbierto(requests.ConnectionError):
+    """El disyuntor del host está abierto: la petición no se ha enviado."""
+
+
+def leer_redirecciones(texto):
+    """'host=http://127.0.0.1:8001,host2=...' -> {host: url base}."""
+    redirecciones = {}
+    for par in filter(None, (texto or '').split(',')):
+        host, base = par.split('=', 1)
+        redirecciones[host.strip()] = base.strip().rstrip('/')
+    return redirecciones
+
+
+class PresupuestoReintentos:
+
+    def __init__(self, proporcion=0.1, maximo=10.0):
+        self.proporcion = proporcion
+        self.maximo = maximo
+        self._saldo = maximo
+        self._lock = threading.Lock()
+
+    def ingresar(self):
+        with self._lock:
+            self._saldo = min(self.maximo, self._saldo + self.proporcion)
+
+    def gastar(self):
+        with self._lock:
+            if self._saldo >= 1.0:
+                self._saldo -= 1.0
+                return True
+            return False
+
+
+class Disyuntor:
+
+    def __init__(self, host, umbral=5, espera=15.0, espera_max=300.0, reloj=time.monotonic):
+        self.host = host
+        self.umbral = umbral          # Fallos seguidos que lo abren
+        self.espera = espera          # Segundos abierto la primera vez; se duplica en cada apertura seguida
+        self.espera_max = espera_max
+        self._reloj = reloj
+        self._lock = threading.Lock()
+        self.estado = CERRADO
+        self._fallos = 0
+        self._aperturas = 0  # Aperturas seguidas sin ninguna petición buena entre ellas
+        self._abierto_hasta = 0.0
+        self._sonda = False  # Hay una petición de prueba en curso (semiabierto)
+
+    def permitir(self):
+        """True si se puede enviar una petición al host; en semiabierto solo una a la vez."""
+        with self._lock:
+            if self.estado == CERRADO:
+                return True
+            if self.estado == ABIERTO:
+                if self._reloj() < self._abierto_hasta:
+                    return False
+                self._cambiar(SEMIABIERTO)
+            if self._sonda:
+                return False
+            self._sonda = True
+            return True
+
+    def exito(self):
+        with self._lock:
+            self._fallos = 0
+            self._aperturas = 0
+            self._sonda = False
+            if self.estado != CERRADO:
+                self._cambiar(CERRADO)
+
+    def sin_respuesta(self):
+        """La petición falló por algo que no dice nada del host (URL mal formada, certificado, decodificación):
+        el estado no cambia, solo se libera la petición de prueba si lo era."""
+        with self._lock:
+            self._sonda = False
+
+    def fallo(self):
+        with self._lock:
+            self._fallos += 1
+            self._sonda = False
+            # En semiabierto basta con que falle la petición de prueba
+            if self.estado == SEMIABIERTO or (self.estado == CERRADO and self._fallos >= self.umbral):
+                espera = min(self.espera_max, self.espera * 2 ** self._aperturas)
+                self._aperturas += 1
+                self._abierto_hasta = self._reloj() + espera
+                self._cambiar(ABIERTO)
+
+    def _cambiar(self, estado):
+        log.warning('Disyuntor de %s: %s -> %s', self.host, self.estado, estado)
+        self.estado = estado
+        metricas.DISYUNTORES.fijar(ESTADOS_DISYUNTOR.index(estado), self.host)
+
+
+class ClienteHTTP:
+
+    def __init__(self, timeout=(3.05, 10.0), reintentos=2, espera_base=0.2, espera_max=2.0,
+                 max_por_host=8, presupuesto=None, redirecciones=None,
+                 umbral_disyuntor=5, espera_disyuntor=15.0, espera_max_disyuntor=300.0):
+        self.timeout = timeout
+        self.reintentos = reintentos
+        self.espera_base = espera_base
+        self.espera_max = espera_max
+        self.max_por_host = max_por_host
+        self.presupuesto = presupuesto or PresupuestoReintentos()
+        self.redirecciones = dict(redirecciones or {})  # host -> URL base que lo sustituye
+        self.umbral_disyuntor = umbral_disyuntor
+        self.espera_disyuntor = espera_disyuntor
+        self.espera_max_disyuntor = espera_max_disyuntor
+
+        self.session = requests.Session()
+        # Un pool por host, con tantas conexiones como peticiones simultáneas permitidas
+        adaptador = HTTPAdapter(pool_connections=16, pool_maxsize=max_por_host, max_retries=0)
+        self.session.mount('http://', adaptador)
+        self.session.mount('https://', adaptador)
+        self._adaptador = adaptador
+
+        self._lock = threading.Lock()
+        self._semaforos = {}
+        self._disyuntores = {}
+        self.peticiones = {}  # host -> número de peticiones enviadas
+        self.reintentos_hechos = 0
+        self.reintentos_denegados = 0
+        self.rechazadas_disyuntor = 0
+
+    def _semaforo(self, host):
+        with self._lock:
+            semaforo = self._semaforos.get(host)
+            if semaforo is None:
+                semaforo = self._semaforos[host] = threading.BoundedSemaphore(self.max_por_host)
+                self._disyuntores[host] = Disyuntor(host, self.umbral_disyuntor, self.espera_disyuntor,
+                                                     self.espera_max_disyuntor)
+            self.peticiones[host] = self.peticiones.get(host, 0) + 1
+            return semaforo, self._disyuntores[host]
+
+    def get(self, url, params=None, timeout=None, **kwargs):
+        """Como requests.get, pero con pool, timeout, reintentos, límite por host y disyuntor."""
+        partes = urlsplit(url)
+        host = partes.hostname
+        if host in self.redirecciones:
+            url = self.redirecciones[host] + partes.path + (f'?{partes.query}' if partes.query else '')
+        semaforo, disyuntor = self._semaforo(host)
+        self.presupuesto.ingresar()
+
+        intento = 0
+        anterior = None  # Excepción o respuesta del intento anterior
+        while True:
+            if not disyuntor.permitir():
+                self._contar('rechazadas_disyuntor')
+                # Si el disyuntor se ha abierto entre reintentos, el error que cuenta es el del host
+                if isinstance(anterior, Exception):
+                    raise anterior
+                if anterior is not None:
+                    return anterior
+                raise CircuitoAbierto(f'{host} no responde: disyuntor {disyuntor.estado}')
+            with semaforo:
+                metricas.HTTP_EN_CURSO.sumar(1, host)
+                inicio = time.perf_counter()
+                try:
+                    response = self.session.get(url, params=params, timeout=timeout or self.timeout, **kwargs)
+                except Exception as e:
+                    metricas.HTTP.observar(time.perf_counter() - inicio, host, type(e).__name__)
+                    if isinstance(e, ERRORES_REINTENTABLES):
+                        disyuntor.fallo()
+                    else:
+                        disyuntor.sin_respuesta()
+                    if not isinstance(e, ERRORES_REINTENTABLES) or not self._puede_reintentar(intento):
+                        raise
+                    anterior = e
+                else:
+                    metricas.HTTP.observar(time.perf_counter() - inicio, host, str(response.status_code))
+                    if response.status_code in ESTADOS_REINTENTABLES:
+                        disyuntor.fallo()
+                    else:
+                        disyuntor.exito()
+                    if response.status_code not in ESTADOS_REINTENTABLES or not self._puede_reintentar(intento):
+                        return response
+                    response.close()
+                    anterior = response
+                finally:
+                    metricas.HTTP_EN_CURSO.sumar(-1, host)
+            # Espera fuera del semáforo para no bloquear a otras peticiones al mismo host
+            time.sleep(random.uniform(0, min(self.espera_max, self.espera_base * 2 ** intento)))
+            intento += 1
+
+    def _puede_reintentar(self, intento):
+        if intento >= self.reintentos:
+            return False
+        if not self.presupuesto.gastar():
+            self._contar('reintentos_denegados')
+            return False
+        self._contar('reintentos_hechos')
+        return True
+
+    def _contar(self, contador):
+        # Los hilos de todas las sesiones comparten el cliente: += no es atómico
+        with self._lock:
+            setattr(self, contador, getattr(self, contador) + 1)
+
+    def estadisticas(self):
+        # Peticiones frente a conexiones abiertas por host: la diferencia son handshakes ahorrados
+        conexiones = {}
+        pools = self._adaptador.poolmanager.pools
+        for clave in pools.keys():
+            pool = pools[clave]
+            conexiones[pool.host] = conexiones.get(pool.host, 0) + pool.num_connections
+        return {
+            'peticiones': dict(self.peticiones),
+            'conexiones': conexiones,
+            'reintentos': self.reintentos_hechos,
+            'reintentos_denegados': self.reintentos_denegados,
+            'rechazadas_disyuntor': self.rechazadas_disyuntor,
+            'disyuntores': {host: d.estado for host, d in list(self._disyuntores.items())},
+        }
+
+
+# Cliente único del proceso: los módulos se importan una sola vez aunque Streamlit
+# vuelva a ejecutar el script en cada interacción
+cliente = ClienteHTTP(redirecciones=leer_redirecciones(os.environ.get('VALENCIA_REDIRECCIONES')),
+                      umbral_disyuntor=int(os.environ.get('VALENCIA_DISYUNTOR_FALLOS', 5)),
+                      espera_disyuntor=float(os.environ.get('VALENCIA_DISYUNTOR_ESPERA', 15)),
+                      espera_max_disyuntor=float(os.environ.get('VALENCIA_DISYUNTOR_ESPERA_MAX', 300)))
+metricas.EVENTOS.vigilar('cliente_http', cliente, reintentos='reintentos_hechos',
+                        reintentos_denegados='reintentos_denegados', rechazadas_disyuntor='rechazadas_disyuntor')
+
+
+def get(url, params=None, **kwargs):
+    return cliente.get(url, params=params, **kwargs)
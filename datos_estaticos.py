@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Paquete binario con los datos estáticos de la aplicación (fgv-bocas.csv,
+emt.csv y Valenbici.csv).
+
+Los CSV se compilan a un único fichero columnar (datos.bin):
+  - coordenadas ya convertidas a float (lat, lon), sin tener que partir
+    geo_point_2d en cada ejecución,
+  - textos como categorías (códigos enteros + tabla de valores distintos),
+  - sin la columna geo_shape, que repite las coordenadas en JSON.
+
+El fichero se abre con mmap una sola vez por proceso: las columnas numéricas
+son vistas de solo lectura sobre esas páginas, compartidas por todas las
+sesiones (y por todos los procesos que abran el mismo fichero).
+
+Compilar a mano:  python datos_estaticos.py
+Si datos.bin no existe, no se puede leer (truncado, de otro programa), es de
+otra versión o de otro esquema, o algún CSV es más reciente, se recompila al
+cargarlo.
+"""
+
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import threading
+
+import numpy as np
+import pandas as pd
+
+log = logging.getLogger('datos_estaticos')
+
+DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+RUTA_PAQUETE = os.path.join(DIRECTORIO, 'datos.bin')
+
+MAGIA = b'VAM1'
+VERSION = 2  # Formato de la cabecera y de las columnas
+ALINEACION = 8
+
+# tabla -> (CSV, [(columna del CSV, tipo)]); 'cat' = texto categórico,
+# 'bool' = 'T'/'F', y geo_point_2d se convierte en las columnas 'lat' y 'lon'
+ESQUEMA = {
+    'metro': ('fgv-bocas.csv', [
+        ('gid', 'i4'),
+        ('Denominació / Denominación', 'cat'),
+        ('Línies / Líneas', 'cat'),
+        ('Id. Parada', 'i4'),
+        ('Id. Boca', 'i4'),
+        ('Pròximes Arribades / Próximas llegadas', 'cat'),
+        ('geo_point_2d', 'punto'),
+    ]),
+    'emt': ('emt.csv', [
+        ('Id. Parada', 'i4'),
+        ('Suprimida', 'i1'),
+        ('Denominació / Denominación', 'cat'),
+        ('Línies / Líneas', 'cat'),
+        ('Pròximes Arribades / Proximas Llegadas', 'cat'),
+        ('geo_point_2d', 'punto'),
+    ]),
+    'valenbici': ('Valenbici.csv', [
+        ('Direccion', 'cat'),
+        ('Numero', 'i4'),
+        ('Activo', 'bool'),
+        ('Bicis_disponibles', 'i2'),
+        ('Espacios_libres', 'i2'),
+        ('Espacios_totales', 'i2'),
+        ('ticket', 'bool'),
+        ('fecha_actualizacion', 'cat'),
+        ('geo_point_2d', 'punto'),
+    ]),
+}
+
+
+# ::::::::::::::::::::::::::::: COMPILACIÓN ::::::::::::::::::::::::::::::::
+
+def _esquema():
+    # ESQUEMA tal como queda en la cabecera (JSON, con listas): un paquete compilado con otro se recompila
+    return json.loads(json.dumps(ESQUEMA))
+
+
+def _firma(csv):
+    # Tamaño y fecha de modificación del CSV, para saber si el paquete está al día
+    info = os.stat(os.path.join(DIRECTORIO, csv))
+    return [info.st_size, info.st_mtime_ns]
+
+
+def _columnas_tabla(csv, columnas):
+    data = pd.read_csv(os.path.join(DIRECTORIO, csv), delimiter=';')
+    for nombre, tipo in columnas:
+        serie = data[nombre]
+        if tipo == 'punto':
+            partes = serie.str.split(',', expand=True)
+            yield 'lat', 'f8', partes[0].astype(float).to_numpy(), None
+            yield 'lon', 'f8', partes[1].astype(float).to_numpy(), None
+        elif tipo == 'cat':
+            categorias = pd.Categorical(serie.astype(str))
+            dtype = 'i2' if len(categorias.categories) < 2 ** 15 else 'i4'
+            yield nombre, dtype, categorias.codes.astype(dtype), list(categorias.categories)
+        elif tipo == 'bool':
+            yield nombre, 'b1', (serie == 'T').to_numpy(), None
+        else:
+            yield nombre, tipo, serie.to_numpy().astype(tipo), None
+
+
+def compilar(ruta=RUTA_PAQUETE):
+    """Lee los CSV y escribe el paquete binario en `ruta`."""
+    cabecera = {'version': VERSION, 'esquema': _esquema(), 'fuentes': {}, 'tablas': {}}
+    buffers = []
+    desplazamiento = 0
+    for tabla, (csv, columnas) in ESQUEMA.items():
+        cabecera['fuentes'][csv] = _firma(csv)
+        descripcion = cabecera['tablas'][tabla] = {'filas': None, 'columnas': []}
+        for nombre, dtype, valores, categorias in _columnas_tabla(csv, columnas):
+            datos = np.ascontiguousarray(valores, dtype=dtype).tobytes()
+            descripcion['filas'] = len(valores)
+            descripcion['columnas'].append({
+                'nombre': nombre, 'dtype': dtype, 'desplazamiento': desplazamiento,
+                'categorias': categorias,
+            })
+            relleno = -len(datos) % ALINEACION
+            buffers.append(datos + b'\0' * relleno)
+            desplazamiento += len(datos) + relleno
+
+    texto = json.dumps(cabecera, ensure_ascii=False).encode('utf-8')
+    texto += b' ' * (-(len(MAGIA) + 4 + len(texto)) % ALINEACION)
+    temporal = f'{ruta}.{os.getpid()}.tmp'
+    with open(temporal, 'wb') as f:
+        f.write(MAGIA + struct.pack('<I', len(texto)) + texto)
+        for datos in buffers:
+            f.write(datos)
+    os.replace(temporal, ruta)  # Nunca se deja un paquete a medio escribir
+    return ruta
+
+
+# ::::::::::::::::::::::::::::::: LECTURA ::::::::::::::::::::::::::::::::::
+
+class Tabla:
+
+    def __init__(self, filas, columnas):
+        self.filas = filas
+        self.columnas = columnas  # nombre -> array (solo lectura) o pd.Categorical
+        self._dataframe = None
+
+    def __len__(self):
+        return self.filas
+
+    def __getitem__(self, nombre):
+        return self.columnas[nombre]
+
+    def a_dataframe(self):
+        # Copia superficial: cada página puede añadir columnas sin tocar la compartida
+        if self._dataframe is None:
+            self._dataframe = pd.DataFrame(self.columnas, copy=False)
+        return self._dataframe.copy(deep=False)
+
+
+class Paquete:
+
+    def __init__(self, ruta):
+        with open(ruta, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(MAGIA)] != MAGIA:
+            raise ValueError(f'{ruta} no es un paquete de datos estáticos')
+        (longitud,) = struct.unpack_from('<I', self._mmap, len(MAGIA))
+        inicio = len(MAGIA) + 4
+        self.cabecera = json.loads(self._mmap[inicio:inicio + longitud])
+        base = inicio + longitud
+
+        self.tablas = {}
+        for tabla, descripcion in self.cabecera['tablas'].items():
+            filas = descripcion['filas']
+            columnas = {}
+            for columna in descripcion['columnas']:
+                valores = np.frombuffer(self._mmap, dtype=columna['dtype'], count=filas,
+                                        offset=base + columna['desplazamiento'])
+                if columna['categorias'] is not None:
+                    valores = pd.Categorical.from_codes(valores, categories=columna['categorias'])
+                columnas[columna['nombre']] = valores
+            self.tablas[tabla] = Tabla(filas, columnas)
+
+    def al_dia(self):
+        # Misma versión y esquema que este código, y compilado desde los CSV actuales
+        if self.cabecera.get('version') != VERSION or self.cabecera.get('esquema') != _esquema():
+            return False
+        try:
+            return all(_firma(csv) == firma for csv, firma in self.cabecera['fuentes'].items())
+        except OSError:
+            return False
+
+    def __getitem__(self, tabla):
+        return self.tablas[tabla]
+
+
+_paquete = None
+_lock = threading.Lock()
+
+
+def _cargar(ruta):
+    # Paquete de `ruta`, o None si no se puede leer: se recompila en lugar de fallar
+    try:
+        return Paquete(ruta)
+    except (OSError, ValueError, KeyError, TypeError, struct.error) as e:
+        log.warning('No se pudo leer %s, se recompila: %s', ruta, e)
+        return None
+
+
+def paquete(ruta=RUTA_PAQUETE):
+    """Paquete del proceso; se compila si falta o si algún CSV ha cambiado."""
+    global _paquete
+    if _paquete is None:
+        with _lock:
+            if _paquete is None:
+                cargado = _cargar(ruta) if os.path.exists(ruta) else None
+                if cargado is None or not cargado.al_dia():
+                    try:
+                        compilar(ruta)
+                    except OSError:
+                        # Directorio de la aplicación de solo lectura
+                        ruta = compilar(os.path.join(tempfile.gettempdir(), 'valenciaalminuto-datos.bin'))
+                    cargado = Paquete(ruta)
+                _paquete = cargado
+    return _paquete
+
+
+def metro():
+    return paquete()['metro'].a_dataframe()
+
+
+def emt():
+    return paquete()['emt'].a_dataframe()
+
+
+def valenbici():
+    return paquete()['valenbici'].a_dataframe()
+
+
+if __name__ == '__main__':
+    destino = compilar(*sys.argv[1:])
+    print(f'{destino}: {os.path.getsize(destino)} bytes')
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Envío por diferencias de las próximas llegadas al navegador.
+
+Las páginas de llegadas se refrescan cada pocos segundos, pero casi siempre
+lo único que cambia es la cuenta atrás. En lugar de volver a construir y
+enviar la tabla entera, cada sesión guarda un TableroLlegadas con lo último
+que ha enviado y en cada refresco manda solo las filas nuevas, las que han
+cambiado de hora y las que ya no están (trenes o autobuses que han pasado).
+
+Cada fila se identifica por su línea y su destino, más un número de serie
+para distinguir las que tienen los dos iguales ('3|Rafelbunyol|7'): de un
+refresco al siguiente cada llegada conserva su id aunque pasen las que iban
+delante. Lleva el instante de llegada en milisegundos desde 1970, no el
+tiempo restante: la cuenta atrás la lleva el navegador
+(componentes/llegadas/index.html) entre refresco y refresco. Una llegada cuya hora se mueve menos que `tolerancia`
+segundos no se vuelve a enviar (EMT da minutos: su hora calculada baila
+hasta un minuto de un refresco a otro).
+
+Mensajes que recibe el navegador:
+  {'version': n, 'base': versión sobre la que se aplican (None si es la tabla
+   completa; igual a n si no ha cambiado nada), 'ahora': ms,
+   'cambios': [[id, línea, destino, llegada en ms o None, texto], ...],
+   'borradas': [id, ...]}
+Si el navegador no tiene la versión `base` (se ha vuelto a montar) pide la
+tabla completa devolviendo {'completa': contador}.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+import numpy as np
+
+from tiempos import segundos_restantes_bus, segundos_restantes_metro
+
+
+def filas_metro(llegadas, ahora=None):
+    """[(línea, destino, llegada en ms desde 1970 o None, texto)] de las llegadas de metro ('HH:MM:SS'),
+    por orden de llegada."""
+    ahora = time.time() if ahora is None else ahora
+    segundos = segundos_restantes_metro([m["Tiempo"] for m in llegadas], datetime.fromtimestamp(ahora))
+    return _filas(llegadas, segundos, ahora)
+
+
+def filas_bus(llegadas, ahora=None):
+    """Lo mismo para EMT ('Port - 10 min')."""
+    ahora = time.time() if ahora is None else ahora
+    segundos = segundos_restantes_bus([m["Tiempo"] for m in llegadas])
+    return _filas(llegadas, segundos, ahora)
+
+
+def _filas(llegadas, segundos, ahora):
+    # Ya en milisegundos y por orden de llegada: se calculan una vez por descarga (FilasCompartidas)
+    filas = [(m["Número de Línea"], m["Destino"], None if np.isnan(s) else round((ahora + float(s)) * 1000),
+              m["Tiempo"]) for m, s in zip(llegadas, segundos)]
+    return sorted(filas, key=_orden)
+
+
+class FilasCompartidas:
+    # Filas de cada URL calculadas una sola vez por descarga para todas las sesiones: la clave
+    # es la lista (o tupla) de llegadas que comparten la caché y el motor, que solo cambia al
+    # descargarse de nuevo. Con las mismas filas que la vez anterior el tablero no compara nada
+
+    def __init__(self, max_entradas=512):
+        self.max_entradas = max_entradas
+        self._lock = threading.Lock()
+        self._entradas = OrderedDict()  # url -> (llegadas, filas)
+
+    def obtener(self, url, llegadas, calcular):
+        """Filas de `llegadas` de `url`, llamando a `calcular()` solo si son otras llegadas."""
+        with self._lock:
+            entrada = self._entradas.get(url)
+            if entrada is not None and entrada[0] is llegadas:
+                self._entradas.move_to_end(url)
+                return entrada[1]
+        filas = calcular()
+        with self._lock:
+            self._entradas[url] = (llegadas, filas)
+            self._entradas.move_to_end(url)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+        return filas
+
+
+def _orden(fila):
+    # Por hora de llegada; las que no tienen hora, al final
+    return (fila[2] is None, fila[2] or 0)
+
+
+class TableroLlegadas:
+
+    def __init__(self, tolerancia=1.0):
+        self.tolerancia = tolerancia
+        self.version = 0
+        self._filas = {}     # id -> [id, línea, destino, llegada en ms o None, texto], tal y como se envió
+        self.atendida = 0    # Última petición de tabla completa del navegador ya atendida
+        self._serie = 0
+        self._ultimas = None  # Filas del último mensaje
+
+    def _con_ids(self, filas, ahora):
+        # Cada llegada conserva el id que tenía en el envío anterior: dentro de cada línea y destino
+        # se emparejan por orden de llegada, saltando antes las anteriores que ya han pasado
+        ahora = ahora * 1000 + self.tolerancia * 1000
+        anteriores = {}
+        for fila in self._filas.values():
+            anteriores.setdefault((fila[1], fila[2]), []).append(fila)
+        resultado, emparejadas = {}, {}
+        for linea, destino, llegada, texto in filas:
+            clave = (linea, destino)
+            viejas = anteriores.get(clave, ())
+            n = emparejadas.get(clave)
+            if n is None:
+                n = 0
+                if llegada is not None:
+                    while n < len(viejas) and viejas[n][3] is not None and viejas[n][3] < min(llegada, ahora):
+                        n += 1
+            emparejadas[clave] = n + 1
+            if n < len(viejas):
+                ident = viejas[n][0]
+            else:
+                self._serie += 1
+                ident = f'{linea}|{destino}|{self._serie}'
+            resultado[ident] = [ident, linea, destino, llegada, texto]
+        return resultado
+
+    def _cambiada(self, anterior, nueva):
+        if anterior is None or anterior[1:3] != nueva[1:3]:
+            return True
+        if anterior[3] is None or nueva[3] is None:
+            # Sin hora se compara el texto tal cual
+            return (anterior[3] is None) != (nueva[3] is None) or anterior[4] != nueva[4]
+        return abs(anterior[3] - nueva[3]) > self.tolerancia * 1000
+
+    def actualizar(self, filas, ahora=None, completa=False):
+        """Mensaje para el navegador con lo que ha cambiado desde el último (todo si `completa`)."""
+        ahora = time.time() if ahora is None else ahora
+        if filas is self._ultimas and not completa:
+            return {'version': self.version, 'base': self.version, 'ahora': round(ahora * 1000),
+                    'cambios': [], 'borradas': []}
+        self._ultimas = filas
+        nuevas = self._con_ids(filas, ahora)
+        base = self.version
+        if completa or not self.version:
+            cambios = list(nuevas.values())
+            borradas = []
+            self._filas = nuevas
+            base = None
+        else:
+            # Se guarda lo enviado, no lo recibido: lo que se mueve poco no va acumulando diferencia
+            cambios, enviadas = [], {}
+            for ident, fila in nuevas.items():
+                anterior = self._filas.get(ident)
+                if self._cambiada(anterior, fila):
+                    cambios.append(fila)
+                    anterior = fila
+                enviadas[ident] = anterior
+            borradas = [ident for ident in self._filas if ident not in nuevas]
+            self._filas = enviadas
+        if cambios or borradas or base is None:
+            self.version += 1
+        return {'version': self.version, 'base': base, 'ahora': round(ahora * 1000),
+                'cambios': cambios, 'borradas': borradas}
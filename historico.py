@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Histórico compacto de llegadas de metro y de disponibilidad de ValenBici.
+
+Cada serie guarda registros de tamaño fijo (clave, instante, valores) en
+arrays de numpy:
+  - en memoria, un anillo de `capacidad` registros por clave (estación), así
+    que la memoria está acotada por el número de estaciones y no por el tiempo,
+  - en disco, segmentos .npy de solo añadir, ordenados por (clave, instante):
+    una consulta abre el segmento con mmap y localiza su rango con dos
+    búsquedas binarias, sin leer el resto de estaciones.
+Los registros nuevos se vuelcan a un segmento cada `intervalo` segundos (o
+antes, si algún anillo se llena, al salir del proceso y cuando el motor deja
+de ser el líder) y los segmentos de días anteriores se fusionan en uno por
+día.
+
+Varios procesos pueden compartir el directorio (workers de Streamlit, api.py,
+el líder de antes y el de después de un relevo):
+  - el número de cada clave se asigna en claves.db (SQLite, INSERT OR
+    IGNORE), así que es el mismo en todos; un claves.json de versiones
+    anteriores se importa la primera vez con sus números,
+  - solo fusiona segmentos el proceso que tiene el arrendamiento de la
+    tarea (almacen_compartido.py), y además con el bloqueo de escritura de
+    claves.db tomado y la lista de segmentos releída del disco,
+  - las consultas releen la lista cuando cambia el directorio y, si un
+    segmento desaparece mientras tanto (otro proceso lo ha fusionado),
+    vuelven a empezar.
+
+Los motores existentes alimentan el histórico al publicar cada instantánea:
+PrefetchMetro (hora prevista del próximo tren por estación, línea y destino)
+y ServicioValenBici (bicis y anclajes libres por estación). Solo se guarda
+un registro cuando el valor cambia.
+
+Consulta de ejemplo, bicis de la estación 84 en los últimos 7 días:
+
+    historico.valenbici.consultar('84', desde=time.time() - 7 * 86400)['bicis']
+"""
+
+import atexit
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+from tiempos import segundos_restantes_metro
+
+DIRECTORIO = os.environ.get(
+    'VALENCIA_HISTORICO', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'historico'))
+
+SEGUNDOS_DIA = 86400
+
+
+def _dia(t):
+    return int(t) // SEGUNDOS_DIA
+
+
+class Serie:
+
+    def __init__(self, directorio, nombre, campos, capacidad=256, intervalo=900.0, reloj=time.time, lider=None):
+        self.directorio = os.path.join(directorio, nombre)
+        os.makedirs(self.directorio, exist_ok=True)
+        self.nombre = nombre
+        # clave y t (segundos desde 1970) en uint32: 8 bytes más los campos
+        self.dtype = np.dtype([('clave', '<u4'), ('t', '<u4')] + [(c, t) for c, t in campos])
+        self.campos = [c for c, _ in campos]
+        self.capacidad = capacidad
+        self.intervalo = intervalo
+        self._reloj = reloj
+        self.lider = lider  # Función: True si este proceso puede fusionar segmentos (None: siempre)
+        self._lock = threading.RLock()
+
+        # Texto de la clave -> número, compartido por todos los procesos en claves.db
+        self.claves = {}  # Los ya conocidos por este proceso
+        self._claves = sqlite3.connect(os.path.join(self.directorio, 'claves.db'), timeout=30.0,
+                                       isolation_level=None, check_same_thread=False)
+        self._claves.execute('PRAGMA journal_mode=WAL')
+        self._claves.execute('CREATE TABLE IF NOT EXISTS claves (id INTEGER PRIMARY KEY, clave TEXT NOT NULL UNIQUE)')
+        self._importar_claves(os.path.join(self.directorio, 'claves.json'))
+
+        # número de clave -> [anillo, registros escritos, registros ya volcados]
+        self._anillos = {}
+        self._ultimo_volcado = self._reloj()
+        self._secuencia = 0
+        self._abiertos = {}  # ruta del segmento -> array en mmap
+        self._marca = None   # mtime del directorio en la última lectura de la lista de segmentos
+        self.segmentos = []
+        self._releer_segmentos()
+
+    # ------------------------------------------------------------- escritura
+
+    def _importar_claves(self, ruta):
+        # Números asignados por versiones anteriores, que ya están en los segmentos
+        if not os.path.exists(ruta):
+            return
+        with open(ruta, encoding='utf-8') as f:
+            claves = json.load(f)
+        self._claves.execute('BEGIN IMMEDIATE')
+        try:
+            self._claves.executemany('INSERT OR IGNORE INTO claves (id, clave) VALUES (?, ?)',
+                                     [(numero, clave) for clave, numero in claves.items()])
+            if os.path.exists(ruta):
+                os.remove(ruta)
+        except BaseException:
+            self._claves.execute('ROLLBACK')
+            raise
+        self._claves.execute('COMMIT')
+
+    def _numero(self, clave, crear=False):
+        clave = str(clave)
+        numero = self.claves.get(clave)
+        if numero is None:
+            if crear:
+                self._claves.execute('INSERT OR IGNORE INTO claves (clave) VALUES (?)', (clave,))
+            fila = self._claves.execute('SELECT id FROM claves WHERE clave = ?', (clave,)).fetchone()
+            if fila is not None:
+                numero = self.claves[clave] = fila[0]
+        return numero
+
+    def _id(self, clave):
+        return self._numero(clave, crear=True)
+
+    def ultimo(self, clave):
+        """Último registro guardado en memoria para `clave`, o None."""
+        with self._lock:
+            numero = self._numero(clave)
+            anillo = self._anillos.get(numero)
+            if anillo is None or not anillo[1]:
+                return None
+            return anillo[0][(anillo[1] - 1) % self.capacidad].copy()
+
+    def anadir(self, clave, t, valores, solo_cambios=False):
+        """Añade un registro; con solo_cambios se descarta si los valores son los del último."""
+        with self._lock:
+            numero = self._id(clave)
+            anillo = self._anillos.get(numero)
+            if anillo is None:
+                anillo = self._anillos[numero] = [np.zeros(self.capacidad, dtype=self.dtype), 0, 0]
+            registros, escritos, volcados = anillo
+            if solo_cambios and escritos:
+                anterior = registros[(escritos - 1) % self.capacidad]
+                if all(anterior[c] == v for c, v in zip(self.campos, valores)):
+                    return False
+            if escritos - volcados >= self.capacidad:
+                # El anillo está lleno de registros sin volcar: no se puede sobrescribir ninguno
+                self.volcar()
+            registros[escritos % self.capacidad] = (numero, int(t), *valores)
+            anillo[1] += 1
+            if self._reloj() - self._ultimo_volcado >= self.intervalo:
+                self.volcar()
+            return True
+
+    def _pendientes(self, anillo):
+        registros, escritos, volcados = anillo
+        posiciones = np.arange(volcados, escritos) % self.capacidad
+        return registros[posiciones]
+
+    def volcar(self):
+        """Escribe en un segmento nuevo todo lo que aún no está en disco."""
+        with self._lock:
+            self._ultimo_volcado = self._reloj()
+            trozos = [self._pendientes(a) for a in self._anillos.values() if a[1] > a[2]]
+            if not trozos:
+                return None
+            datos = np.concatenate(trozos)
+            ruta = self._escribir(datos)
+            for anillo in self._anillos.values():
+                anillo[2] = anillo[1]
+            self._compactar()
+            return ruta
+
+    def _escribir(self, datos):
+        datos = datos[np.lexsort((datos['t'], datos['clave']))]
+        self._secuencia += 1
+        nombre = (f"{int(datos['t'].min()):010d}-{int(datos['t'].max()):010d}-"
+                  f"{os.getpid()}-{self._secuencia}-{os.urandom(3).hex()}.npy")
+        ruta = os.path.join(self.directorio, nombre)
+        temporal = ruta + '.tmp'
+        with open(temporal, 'wb') as f:
+            np.save(f, datos)
+        os.replace(temporal, ruta)  # Nunca hay un segmento a medio escribir
+        self.segmentos.append((int(datos['t'].min()), int(datos['t'].max()), ruta))
+        self.segmentos.sort()
+        return ruta
+
+    def _leer_segmentos(self):
+        for nombre in os.listdir(self.directorio):
+            if nombre.endswith('.npy'):
+                desde, hasta = nombre.split('-')[:2]
+                yield int(desde), int(hasta), os.path.join(self.directorio, nombre)
+
+    def _releer_segmentos(self, forzar=False):
+        # Otros procesos también escriben y fusionan segmentos: se relee la lista si el directorio ha cambiado
+        marca = os.stat(self.directorio).st_mtime_ns
+        if not forzar and marca == self._marca:
+            return
+        self._marca = marca
+        self.segmentos = sorted(self._leer_segmentos())
+        vigentes = {ruta for _, _, ruta in self.segmentos}
+        for ruta in [ruta for ruta in self._abiertos if ruta not in vigentes]:
+            del self._abiertos[ruta]
+
+    def _compactar(self):
+        # Los segmentos de un mismo día ya cerrado se fusionan en uno, solo en el líder
+        try:
+            if self.lider is not None and not self.lider():
+                return
+        except Exception:
+            pass  # Sin almacén utilizable basta con el bloqueo de claves.db
+        # El bloqueo de escritura de claves.db excluye a cualquier otro proceso que esté fusionando
+        self._claves.execute('BEGIN IMMEDIATE')
+        try:
+            self._releer_segmentos(forzar=True)
+            hoy = _dia(self._reloj())
+            por_dia = {}
+            for segmento in self.segmentos:
+                if _dia(segmento[1]) < hoy:
+                    por_dia.setdefault(_dia(segmento[0]), []).append(segmento)
+            for segmentos in por_dia.values():
+                if len(segmentos) < 2:
+                    continue
+                self._escribir(np.concatenate([self._abrir(ruta) for _, _, ruta in segmentos]))
+                for segmento in segmentos:
+                    self.segmentos.remove(segmento)
+                    self._abiertos.pop(segmento[2], None)
+                    os.remove(segmento[2])
+        finally:
+            self._claves.execute('COMMIT')
+
+    # -------------------------------------------------------------- consulta
+
+    def _abrir(self, ruta):
+        datos = self._abiertos.get(ruta)
+        if datos is None:
+            datos = self._abiertos[ruta] = np.load(ruta, mmap_mode='r')
+        return datos
+
+    def consultar(self, clave, desde=None, hasta=None):
+        """Registros de `clave` con desde <= t <= hasta, ordenados por t."""
+        desde = 0 if desde is None else max(0, int(desde))
+        hasta = 2 ** 32 - 1 if hasta is None else min(2 ** 32 - 1, int(hasta))
+        with self._lock:
+            numero = self._numero(clave)
+            if numero is None:
+                return np.zeros(0, dtype=self.dtype)
+            for intento in range(3):
+                self._releer_segmentos(forzar=intento > 0)
+                try:
+                    trozos = self._trozos(numero, desde, hasta)
+                    break
+                except FileNotFoundError:
+                    # Otro proceso ha fusionado el segmento entre la lista y la lectura
+                    if intento == 2:
+                        raise
+            anillo = self._anillos.get(numero)
+            if anillo is not None and anillo[1] > anillo[2]:
+                pendientes = self._pendientes(anillo)
+                trozos.append(pendientes[(pendientes['t'] >= desde) & (pendientes['t'] <= hasta)])
+        if not trozos:
+            return np.zeros(0, dtype=self.dtype)
+        resultado = np.concatenate(trozos)
+        resultado = resultado[np.argsort(resultado['t'], kind='stable')]
+        # Sin los registros repetidos que se ven si la lista se leyó con el segmento fusionado ya escrito
+        # y los originales aún sin borrar (quedan contiguos: mismo t)
+        repetidos = np.zeros(len(resultado), dtype=bool)
+        repetidos[1:] = resultado[1:] == resultado[:-1]
+        return resultado[~repetidos] if repetidos.any() else resultado
+
+    def _trozos(self, numero, desde, hasta):
+        clave_u4, desde_u4, hasta_u4 = np.uint32(numero), np.uint32(desde), np.uint32(hasta)
+        trozos = []
+        for t_min, t_max, ruta in self.segmentos:
+            if t_max < desde or t_min > hasta:
+                continue
+            datos = self._abrir(ruta)
+            claves = datos['clave']
+            # Mismo tipo que la columna: si no, numpy convertiría la columna entera antes de buscar
+            i, j = np.searchsorted(claves, clave_u4, 'left'), np.searchsorted(claves, clave_u4, 'right')
+            if i == j:
+                continue
+            instantes = datos['t'][i:j]
+            inicio, fin = np.searchsorted(instantes, desde_u4, 'left'), np.searchsorted(instantes, hasta_u4, 'right')
+            trozos.append(np.asarray(datos[i + inicio:i + fin]))
+        return trozos
+
+    def __len__(self):
+        # Registros en disco más los pendientes de volcar
+        with self._lock:
+            self._releer_segmentos()
+            return (sum(len(self._abrir(ruta)) for _, _, ruta in self.segmentos)
+                    + sum(a[1] - a[2] for a in self._anillos.values()))
+
+
+class Historico:
+    """Series de metro y de ValenBici, con los métodos que reciben las instantáneas de los motores."""
+
+    def __init__(self, directorio=DIRECTORIO, capacidad=256, intervalo=900.0, almacen=None):
+        # Con almacén compartido solo fusiona segmentos el líder de cada tarea
+        def lider(tarea):
+            return None if almacen is None else (lambda: almacen.es_lider(tarea))
+        # Hora prevista (segundos desde 1970) del próximo tren por estación, línea y destino
+        self.metro = Serie(directorio, 'metro', [('llegada', '<u4')], capacidad, intervalo, lider=lider('metro'))
+        self.valenbici = Serie(directorio, 'valenbici', [('bicis', '<u2'), ('libres', '<u2')], capacidad, intervalo,
+                               lider=lider('valenbici'))
+        # Lo que queda en los anillos no se pierde al reiniciar el proceso
+        atexit.register(self.volcar)
+
+    def registrar_metro(self, instantanea):
+        claves, horas = [], []
+        for url, movimientos in instantanea.llegadas.items():
+            for movimiento in movimientos:
+                claves.append(f'{url}|{movimiento.linea}|{movimiento.destino}')
+                horas.append(movimiento.tiempo)
+        if not claves:
+            return
+        ahora = instantanea.creada
+        restantes = segundos_restantes_metro(horas, datetime.fromtimestamp(ahora))
+        # Próximo tren de cada clave: la llegada más cercana
+        proximas = {}
+        for clave, restante in zip(claves, restantes):
+            if not np.isnan(restante) and restante < proximas.get(clave, np.inf):
+                proximas[clave] = restante
+        for clave, restante in proximas.items():
+            self.metro.anadir(clave, ahora, (int(ahora + restante),), solo_cambios=True)
+
+    def registrar_valenbici(self, instantanea):
+        for estacion in instantanea.estaciones.values():
+            self.valenbici.anadir(estacion.number, instantanea.modificada,
+                                  (estacion.available_bikes, estacion.available_bike_stands), solo_cambios=True)
+
+    def volcar(self):
+        self.metro.volcar()
+        self.valenbici.volcar()
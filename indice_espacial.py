@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Índice espacial de rejilla para buscar puntos cercanos (bocas de metro,
+paradas de EMT y estaciones de ValenBici).
+
+Los puntos se proyectan a un plano (equirectangular alrededor de la latitud
+media, válido a escala de ciudad) y se reparten en celdas cuadradas. Una
+consulta solo calcula la distancia haversine de los puntos de las celdas que
+toca el círculo de búsqueda, así que el coste depende de los puntos cercanos
+y no del total.
+"""
+
+import math
+
+import numpy as np
+
+RADIO_TIERRA = 6371008.8  # metros
+METROS_POR_GRADO = math.pi * RADIO_TIERRA / 180
+# Pares (consulta, celda) que se examinan de una vez en las consultas por lotes
+CELDAS_POR_BLOQUE = 1 << 20
+
+METRO, EMT, VALENBICI = 0, 1, 2
+TIPOS = {METRO: 'Metro', EMT: 'EMT', VALENBICI: 'ValenBici'}
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    """Distancia en metros; acepta escalares o arrays de numpy."""
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = (np.sin((lat2 - lat1) / 2) ** 2
+         + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * RADIO_TIERRA * np.arcsin(np.sqrt(a))
+
+
+class IndiceEspacial:
+
+    def __init__(self, lat, lon, celda=250.0):
+        self.lat = np.ascontiguousarray(lat, dtype=np.float64)
+        self.lon = np.ascontiguousarray(lon, dtype=np.float64)
+        self.celda = celda  # lado de la celda en metros
+        self._cos = math.cos(math.radians(float(np.mean(self.lat)))) if len(self.lat) else 1.0
+
+        ix, iy = self._celdas(self.lat, self.lon)
+        # Puntos ordenados por celda; cada celda es un rango [inicio, fin) de `_orden`
+        claves = ix.astype(np.int64) << 32 | (iy.astype(np.int64) & 0xFFFFFFFF)
+        self._orden = np.argsort(claves, kind='stable')
+        claves = claves[self._orden]
+        distintas, inicios = np.unique(claves, return_index=True)
+        finales = np.append(inicios[1:], len(claves))
+        self._rangos = {int(c): (int(i), int(f)) for c, i, f in zip(distintas, inicios, finales)}
+        # Lo mismo en arrays para las consultas por lotes (searchsorted sobre las claves ordenadas)
+        self._claves, self._inicios, self._finales = distintas, inicios, finales
+
+    def __len__(self):
+        return len(self.lat)
+
+    def _celdas(self, lat, lon):
+        ix = np.floor(np.asarray(lon) * self._cos * METROS_POR_GRADO / self.celda).astype(np.int64)
+        iy = np.floor(np.asarray(lat) * METROS_POR_GRADO / self.celda).astype(np.int64)
+        return ix, iy
+
+    def _candidatos(self, lat, lon, radio):
+        ix, iy = self._celdas(lat, lon)
+        # Margen de seguridad: la proyección plana se desvía algo de la distancia real
+        n = int(math.ceil(radio * 1.01 / self.celda))
+        trozos = []
+        for x in range(int(ix) - n, int(ix) + n + 1):
+            for y in range(int(iy) - n, int(iy) + n + 1):
+                rango = self._rangos.get(x << 32 | (y & 0xFFFFFFFF))
+                if rango is not None:
+                    trozos.append(self._orden[rango[0]:rango[1]])
+        if not trozos:
+            return np.empty(0, dtype=np.intp)
+        return np.concatenate(trozos)
+
+    def en_radio(self, lat, lon, radio):
+        """(índices, distancias) de los puntos a `radio` metros o menos, del más cercano al más lejano."""
+        candidatos = self._candidatos(lat, lon, radio)
+        distancias = haversine(lat, lon, self.lat[candidatos], self.lon[candidatos])
+        dentro = distancias <= radio
+        candidatos, distancias = candidatos[dentro], distancias[dentro]
+        orden = np.argsort(distancias, kind='stable')
+        return candidatos[orden], distancias[orden]
+
+    def cercanos(self, lat, lon, k=5, radio_max=20000.0, mascara=None):
+        """(índices, distancias) de los k puntos más cercanos (hasta `radio_max` metros); con `mascara`
+        (un bool por punto), solo de los puntos marcados."""
+        radio = self.celda
+        while True:
+            indices, distancias = self.en_radio(lat, lon, radio)
+            if mascara is not None:
+                dentro = mascara[indices]
+                indices, distancias = indices[dentro], distancias[dentro]
+            # Con k puntos dentro del círculo no puede haber otro más cercano fuera de él
+            if len(indices) >= k or radio >= radio_max:
+                return indices[:k], distancias[:k]
+            radio = min(radio * 2, radio_max)
+
+    def _pares(self, lats, lons, radio):
+        # (consulta, punto, distancia) a `radio` metros o menos, ordenados por consulta y distancia;
+        # los mismos candidatos y en el mismo orden que _candidatos, sin bucles por consulta
+        vacio = np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp), np.empty(0)
+        if not len(self._claves):
+            return vacio
+        n = int(math.ceil(radio * 1.01 / self.celda))
+        desplazamientos = np.arange(-n, n + 1)
+        dx = np.repeat(desplazamientos, len(desplazamientos))
+        dy = np.tile(desplazamientos, len(desplazamientos))
+        bloque = max(1, CELDAS_POR_BLOQUE // len(dx))
+        trozos = []
+        for inicio in range(0, len(lats), bloque):
+            ix, iy = self._celdas(lats[inicio:inicio + bloque], lons[inicio:inicio + bloque])
+            claves = (ix[:, None] + dx) << 32 | ((iy[:, None] + dy) & 0xFFFFFFFF)
+            posiciones = np.minimum(np.searchsorted(self._claves, claves), len(self._claves) - 1)
+            consultas, celdas = np.nonzero(self._claves[posiciones] == claves)
+            posiciones = posiciones[consultas, celdas]
+            primeros = self._inicios[posiciones]
+            cuentas = self._finales[posiciones] - primeros
+            # Cada celda encontrada aporta el rango [primero, primero + cuenta) de `_orden`
+            saltos = np.repeat(primeros - (np.cumsum(cuentas) - cuentas), cuentas)
+            puntos = self._orden[np.arange(len(saltos)) + saltos]
+            consultas = np.repeat(consultas, cuentas) + inicio
+            trozos.append((consultas, puntos))
+        if not trozos:
+            return vacio
+        consultas = np.concatenate([t[0] for t in trozos])
+        puntos = np.concatenate([t[1] for t in trozos])
+        distancias = haversine(lats[consultas], lons[consultas], self.lat[puntos], self.lon[puntos])
+        dentro = distancias <= radio
+        consultas, puntos, distancias = consultas[dentro], puntos[dentro], distancias[dentro]
+        orden = np.lexsort((distancias, consultas))  # estable: empates en el orden de en_radio
+        return consultas[orden], puntos[orden], distancias[orden]
+
+    def en_radio_lote(self, lats, lons, radio):
+        """en_radio para muchos puntos de consulta: lista de (índices, distancias)."""
+        lats, lons = np.asarray(lats, dtype=np.float64), np.asarray(lons, dtype=np.float64)
+        consultas, puntos, distancias = self._pares(lats, lons, radio)
+        cortes = np.searchsorted(consultas, np.arange(len(lats) + 1))
+        return [(puntos[i:f], distancias[i:f]) for i, f in zip(cortes[:-1], cortes[1:])]
+
+    def cercanos_lote(self, lats, lons, k=5, radio_max=20000.0):
+        """cercanos para muchos puntos: matrices (n, k) de índices (-1 si falta) y distancias (inf)."""
+        lats, lons = np.asarray(lats, dtype=np.float64), np.asarray(lons, dtype=np.float64)
+        indices = np.full((len(lats), k), -1, dtype=np.intp)
+        distancias = np.full((len(lats), k), np.inf)
+        # Como en cercanos, el radio se dobla, pero solo para las consultas que aún no tienen k puntos
+        pendientes = np.arange(len(lats))
+        radio = self.celda
+        while len(pendientes):
+            consultas, puntos, d = self._pares(lats[pendientes], lons[pendientes], radio)
+            cuentas = np.bincount(consultas, minlength=len(pendientes))
+            listas = (cuentas >= k) | (radio >= radio_max)
+            puesto = np.arange(len(consultas)) - (np.cumsum(cuentas) - cuentas)[consultas]
+            tomar = listas[consultas] & (puesto < k)
+            filas = pendientes[consultas[tomar]]
+            indices[filas, puesto[tomar]] = puntos[tomar]
+            distancias[filas, puesto[tomar]] = d[tomar]
+            pendientes = pendientes[~listas]
+            radio = min(radio * 2, radio_max)
+        return indices, distancias
+
+
+class IndiceTransporte(IndiceEspacial):
+    """Índice sobre metro, EMT y ValenBici con el tipo, nombre y líneas de cada punto."""
+
+    def __init__(self, tablas, celda=250.0):
+        # tablas: [(tipo, lat, lon, nombres, líneas)]
+        self.tipo = np.concatenate([np.full(len(t[1]), t[0], dtype=np.int8) for t in tablas])
+        self.nombre = np.concatenate([np.asarray(t[3], dtype=object) for t in tablas])
+        self.lineas = np.concatenate([np.asarray(t[4], dtype=object) for t in tablas])
+        super().__init__(np.concatenate([np.asarray(t[1]) for t in tablas]),
+                         np.concatenate([np.asarray(t[2]) for t in tablas]), celda)
+
+    @classmethod
+    def desde_paquete(cls, paquete, celda=250.0):
+        metro, emt, bici = paquete['metro'], paquete['emt'], paquete['valenbici']
+        return cls([
+            (METRO, metro['lat'], metro['lon'], metro['Denominació / Denominación'], metro['Línies / Líneas']),
+            (EMT, emt['lat'], emt['lon'], emt['Denominació / Denominación'], emt['Línies / Líneas']),
+            (VALENBICI, bici['lat'], bici['lon'], bici['Direccion'], np.full(len(bici), '', dtype=object)),
+        ], celda)
+
+    def de_tipos(self, tipos):
+        """Máscara (un bool por punto) de los puntos de `tipos`, por nombre ('Metro', 'EMT', 'ValenBici')."""
+        return np.isin(self.tipo, [tipo for tipo, nombre in TIPOS.items() if nombre in tipos])
+
+    def filas(self, indices, distancias):
+        """Resultados de una consulta como lista de diccionarios para mostrar en una tabla."""
+        return [{
+            'Tipo': TIPOS[int(self.tipo[i])],
+            'Nombre': self.nombre[i],
+            'Líneas': self.lineas[i],
+            'Distancia (m)': int(round(d)),
+            'lat': float(self.lat[i]),
+            'lon': float(self.lon[i]),
+        } for i, d in zip(indices, distancias)]
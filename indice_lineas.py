@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Índice invertido de líneas: para cada línea de metro o de EMT, las paradas
+(filas de la tabla) que la sirven.
+
+La columna 'Línies / Líneas' trae las líneas de cada parada como texto
+('3,5,9' en metro, '4, 19, 99' o 'N1' en EMT). Se separa una sola vez al
+crear el índice y cada línea guarda:
+  - un bitset con un bit por fila (un int de Python), para combinar líneas:
+    "paradas de la 3 o la 9" es un OR y "paradas de la 19 y la 99" un AND,
+    menos de un microsegundo con las 1126 paradas de EMT,
+  - el array ordenado de sus filas.
+filas() convierte un bitset en el array de filas con numpy (sin recorrer los
+bits uno a uno) y nombres() en los nombres de parada, sin repetir.
+"""
+
+import re
+
+import numpy as np
+
+_SEPARADOR = re.compile(r'[,;\s]+')
+_PARTES_LINEA = re.compile(r'([A-Z]*)(\d*)(.*)')
+
+
+def separar_lineas(texto):
+    """'4, 19, 99' -> ('4', '19', '99'): las líneas de una parada, sin repetir."""
+    if texto is None:
+        return ()
+    texto = str(texto).strip()
+    if texto.lower() in ('', 'nan', 'none'):
+        return ()
+    return tuple(dict.fromkeys(linea.upper() for linea in _SEPARADOR.split(texto) if linea))
+
+
+def orden_linea(linea):
+    # Primero las líneas numéricas por su número; después las demás (C1, N1, N2... N10) por letra y número
+    prefijo, numero, resto = _PARTES_LINEA.fullmatch(linea).groups()
+    return (prefijo != '', prefijo, int(numero) if numero else -1, resto)
+
+
+class IndiceLineas:
+
+    def __init__(self, lineas, nombres):
+        # Líneas y nombre de cada fila, en el orden de la tabla
+        self.lineas_fila = [separar_lineas(texto) for texto in lineas]
+        self._nombres_fila = np.array([str(n) for n in nombres], dtype=object)
+        self._octetos = (len(self.lineas_fila) + 7) // 8
+
+        filas = {}
+        for i, lineas_parada in enumerate(self.lineas_fila):
+            for linea in lineas_parada:
+                filas.setdefault(linea, []).append(i)
+        self.lineas = sorted(filas, key=orden_linea)
+        self._filas = {linea: np.array(f, dtype=np.intp) for linea, f in filas.items()}
+        self._bits = {}
+        for linea, f in self._filas.items():
+            marcas = np.zeros(self._octetos * 8, dtype=bool)
+            marcas[f] = True
+            self._bits[linea] = int.from_bytes(np.packbits(marcas, bitorder='little').tobytes(), 'little')
+
+    def __len__(self):
+        return len(self.lineas)
+
+    def bits(self, linea):
+        """Bitset de las paradas de `linea` (0 si no existe)."""
+        return self._bits.get(str(linea).upper(), 0)
+
+    def union(self, lineas):
+        """Paradas servidas por alguna de `lineas`."""
+        bits = 0
+        for linea in lineas:
+            bits |= self.bits(linea)
+        return bits
+
+    def interseccion(self, lineas):
+        """Paradas servidas por todas las `lineas` (ninguna si no se indica ninguna línea)."""
+        lineas = list(lineas)
+        if not lineas:
+            return 0
+        bits = self.bits(lineas[0])
+        for linea in lineas[1:]:
+            bits &= self.bits(linea)
+        return bits
+
+    def filas(self, bits):
+        """Array ordenado de las filas de un bitset."""
+        if not bits:
+            return np.empty(0, dtype=np.intp)
+        octetos = np.frombuffer(bits.to_bytes(self._octetos, 'little'), dtype=np.uint8)
+        return np.flatnonzero(np.unpackbits(octetos, bitorder='little'))
+
+    def filas_linea(self, linea):
+        return self._filas.get(str(linea).upper(), np.empty(0, dtype=np.intp))
+
+    def nombres(self, bits):
+        """Nombres de las paradas de un bitset, sin repetir y en orden alfabético."""
+        return sorted(set(self._nombres_fila[self.filas(bits)]))
@@ -0,0 +1,20 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Descarga de las próximas llegadas de una estación de metro o una parada de EMT.
+
+Se usa igual desde la aplicación de Streamlit que desde los procesos que se
+ejecutan fuera de ella (notificador por correo, etc.), por eso no depende de
+Streamlit: los errores de red se propagan como requests.RequestException.
+"""
+
+import cliente_http
+import metricas
+from parser_llegadas import extraer_movimientos
+
+
+def descargar_movimientos(url):
+    response = cliente_http.get(url)
+    response.raise_for_status()  # Check for request errors
+    with metricas.PARSER.cronometrar('llegadas'):
+        return extraer_movimientos(response.text)
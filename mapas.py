@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Preparación de los mapas de pydeck (metro, EMT y ValenBici).
+
+Cada capa recibe solo lo que dibuja: la posición, redondeada a 5 decimales
+(~1 m), y los campos del tooltip con nombres de una letra. El icono es el
+mismo para todos los puntos de una capa, así que va una sola vez en un atlas
+(icon_atlas + icon_mapping) en lugar de repetirse como diccionario en cada
+fila. Con más de MAX_ICONOS puntos se usa una ScatterplotLayer: deck.gl la
+dibuja como instancias de un mismo círculo, sin cargar ninguna imagen.
+
+Mapa guarda el JSON que genera, sin sangrado (pydeck lo indenta), de modo
+que un mapa cacheado por selección se serializa una sola vez por proceso.
+"""
+
+import json
+import os
+from collections import namedtuple
+
+import numpy as np
+import pydeck as pdk
+from pydeck.bindings.json_tools import default_serialize
+
+DECIMALES = 5
+MAX_ICONOS = int(os.environ.get('VALENCIA_MAPA_MAX_ICONOS', 400))
+
+Icono = namedtuple('Icono', ['url', 'ancho', 'alto', 'color'])
+ICONO_METRO = Icono('https://cdn-icons-png.flaticon.com/128/684/684908.png', 128, 128, [213, 43, 30])
+ICONO_EMT = Icono('https://cdn-icons-png.flaticon.com/128/3176/3176278.png', 128, 128, [0, 122, 204])
+ICONO_BICI = Icono('https://img.icons8.com/emoji/48/000000/bicycle-emoji.png', 48, 48, [255, 165, 0])
+
+
+def puntos(lat, lon, **campos):
+    """Registros {'p': [lon, lat], campo: valor, ...} para los datos de una capa."""
+    lon = np.round(np.asarray(lon, dtype=float), DECIMALES).tolist()
+    lat = np.round(np.asarray(lat, dtype=float), DECIMALES).tolist()
+    nombres = list(campos)
+    # tolist() deja tipos de Python (int, str), que json serializa sin ayuda
+    valores = [np.asarray(v, dtype=object).tolist() for v in campos.values()]
+    return [dict(zip(nombres, fila), p=[x, y]) for x, y, *fila in zip(lon, lat, *valores)]
+
+
+def capa_puntos(registros, icono, tamano=2.5, instanciada=None, **opciones):
+    """IconLayer con el icono en un atlas, o ScatterplotLayer si hay muchos puntos."""
+    if instanciada is None:
+        instanciada = len(registros) > MAX_ICONOS
+    if instanciada:
+        return pdk.Layer('ScatterplotLayer', registros, get_position='p', get_fill_color=icono.color,
+                         get_radius=10, radius_min_pixels=3, radius_max_pixels=10, **opciones)
+    return pdk.Layer(
+        'IconLayer', registros,
+        get_position='p',
+        # Expresión constante: el mismo icono del atlas para todos los puntos
+        get_icon="('icono')",
+        icon_atlas=icono.url,
+        icon_mapping={'icono': {'x': 0, 'y': 0, 'width': icono.ancho, 'height': icono.alto,
+                                'anchorY': icono.alto}},
+        get_size=tamano,
+        size_scale=15,
+        **opciones)
+
+
+def vista(registros, zoom, pitch=0):
+    """Vista centrada en la media de los puntos."""
+    posiciones = np.array([r['p'] for r in registros], dtype=float).reshape(-1, 2)
+    lon, lat = posiciones.mean(axis=0) if len(posiciones) else (0.0, 0.0)
+    return pdk.ViewState(latitude=float(lat), longitude=float(lon), zoom=zoom, pitch=pitch)
+
+
+class Mapa(pdk.Deck):
+    """Deck que guarda su JSON: se serializa una vez aunque se muestre muchas veces."""
+
+    def to_json(self):
+        texto = self.__dict__.get('_json')
+        if texto is None:
+            texto = self._json = json.dumps(self, sort_keys=True, default=default_serialize,
+                                            separators=(',', ':'))
+        return texto
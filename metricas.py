@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Métricas del proceso en formato de texto de Prometheus.
+
+Se miden los caminos críticos:
+  - valencia_http_peticion_segundos{host,estado}: cada petición a un servicio
+    externo (estado es el código HTTP o el tipo de error de red),
+  - valencia_http_en_curso{host}: peticiones en curso,
+  - valencia_parser_segundos{parser}: extracción de llegadas y lectura de los
+    feeds de JCDecaux y Mapbox,
+  - valencia_pagina_segundos{pagina}: cada ejecución del script por página y
+    cada refresco de los fragmentos de llegadas,
+  - valencia_cache_total{cache,resultado} y valencia_eventos_total{componente,evento}:
+    los contadores que ya llevan las cachés y los motores, que se leen al
+    exportar y no cuestan nada en el camino crítico.
+
+Cada observación es una búsqueda binaria en los límites del histograma y una
+suma bajo un lock (del orden de 1 µs); con VALENCIA_METRICAS=0 no se mide nada.
+
+Si VALENCIA_METRICAS_PUERTO está definido se sirven en http://127.0.0.1:<puerto>/metrics.
+Con VALENCIA_PERFILADO=<fracción> esa fracción de las ejecuciones de página se
+perfila con cProfile y se conservan las más lentas en /perfiles.
+"""
+
+import cProfile
+import functools
+import heapq
+import io
+import itertools
+import logging
+import os
+import pstats
+import random
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+log = logging.getLogger('metricas')
+
+ACTIVAS = os.environ.get('VALENCIA_METRICAS', '1') != '0'
+PUERTO = int(os.environ.get('VALENCIA_METRICAS_PUERTO', 0))  # 0: sin servidor de métricas
+HOST = os.environ.get('VALENCIA_METRICAS_HOST', '127.0.0.1')
+PERFILADO = float(os.environ.get('VALENCIA_PERFILADO', 0))  # Fracción de ejecuciones perfiladas
+
+# Límites de los histogramas, en segundos: de 1 ms a 10 s
+LIMITES = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _etiquetas(nombres, valores, extra=''):
+    pares = [f'{n}="{_escapar(v)}"' for n, v in zip(nombres, valores)]
+    if extra:
+        pares.append(extra)
+    return '{' + ','.join(pares) + '}' if pares else ''
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _numero(valor):
+    if valor == float('inf'):
+        return '+Inf'
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class Contador:
+    tipo = 'counter'
+
+    def __init__(self, nombre, ayuda, etiquetas=()):
+        self.nombre, self.ayuda, self.etiquetas = nombre, ayuda, tuple(etiquetas)
+        self._valores = {}  # tupla de valores de las etiquetas -> valor
+        self._lock = threading.Lock()
+
+    def sumar(self, cantidad=1, *etiquetas):
+        if not ACTIVAS:
+            return
+        with self._lock:
+            self._valores[etiquetas] = self._valores.get(etiquetas, 0) + cantidad
+
+    def exportar(self):
+        with self._lock:
+            valores = list(self._valores.items())
+        for etiquetas, valor in valores:
+            yield f'{self.nombre}{_etiquetas(self.etiquetas, etiquetas)} {_numero(valor)}'
+
+
+class Indicador(Contador):
+    # Valor que sube y baja, como las peticiones en curso
+    tipo = 'gauge'
+
+    def fijar(self, valor, *etiquetas):
+        with self._lock:
+            self._valores[etiquetas] = valor
+
+
+class Histograma:
+    tipo = 'histogram'
+
+    def __init__(self, nombre, ayuda, etiquetas=(), limites=LIMITES):
+        self.nombre, self.ayuda, self.etiquetas = nombre, ayuda, tuple(etiquetas)
+        self.limites = tuple(limites)
+        self._series = {}  # tupla de valores de las etiquetas -> [cubetas, suma, cuenta]
+        self._lock = threading.Lock()
+
+    def observar(self, valor, *etiquetas):
+        if not ACTIVAS:
+            return
+        # Primera cubeta cuyo límite es >= valor (la última es +Inf)
+        cubeta = bisect_left(self.limites, valor)
+        with self._lock:
+            serie = self._series.get(etiquetas)
+            if serie is None:
+                serie = self._series[etiquetas] = [[0] * (len(self.limites) + 1), 0.0, 0]
+            serie[0][cubeta] += 1
+            serie[1] += valor
+            serie[2] += 1
+
+    def cronometrar(self, *etiquetas):
+        """Context manager o decorador que observa la duración del bloque o de la función."""
+        return _Cronometro(self, etiquetas)
+
+    def exportar(self):
+        with self._lock:
+            series = [(e, list(s[0]), s[1], s[2]) for e, s in self._series.items()]
+        for etiquetas, cubetas, suma, cuenta in series:
+            acumulado = 0
+            for limite, n in zip(self.limites + (float('inf'),), cubetas):
+                acumulado += n
+                le = f'le="{_numero(limite)}"'
+                yield f'{self.nombre}_bucket{_etiquetas(self.etiquetas, etiquetas, le)} {acumulado}'
+            yield f'{self.nombre}_sum{_etiquetas(self.etiquetas, etiquetas)} {_numero(suma)}'
+            yield f'{self.nombre}_count{_etiquetas(self.etiquetas, etiquetas)} {cuenta}'
+
+
+class _Cronometro:
+    __slots__ = ('histograma', 'etiquetas', 'inicio')
+
+    def __init__(self, histograma, etiquetas):
+        self.histograma, self.etiquetas = histograma, etiquetas
+
+    def __enter__(self):
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *error):
+        self.histograma.observar(time.perf_counter() - self.inicio, *self.etiquetas)
+        return False
+
+    def __call__(self, funcion):
+        @functools.wraps(funcion)
+        def cronometrada(*args, **kwargs):
+            with _Cronometro(self.histograma, self.etiquetas):
+                return funcion(*args, **kwargs)
+        return cronometrada
+
+
+class Recolectado:
+    """Métrica cuyos valores se leen al exportar de los contadores de otros objetos."""
+
+    def __init__(self, nombre, ayuda, etiquetas=(), tipo='counter'):
+        self.nombre, self.ayuda, self.etiquetas, self.tipo = nombre, ayuda, tuple(etiquetas), tipo
+        self._fuentes = {}  # nombre -> función que devuelve {tupla de etiquetas: valor}
+
+    def fuente(self, nombre, funcion):
+        # Con el mismo nombre se sustituye (p. ej. si Streamlit vuelve a crear un recurso)
+        self._fuentes[nombre] = funcion
+
+    def vigilar(self, nombre, objeto, **atributos):
+        """Publica getattr(objeto, atributo) con etiquetas (nombre, clave) por cada clave=atributo."""
+        self.fuente(nombre, lambda: {(nombre, clave): getattr(objeto, atributo)
+                                     for clave, atributo in atributos.items()})
+
+    def exportar(self):
+        for nombre, funcion in list(self._fuentes.items()):
+            try:
+                valores = funcion()
+            except Exception as e:
+                log.warning('No se pudo leer la métrica %s de %s: %s', self.nombre, nombre, e)
+                continue
+            for etiquetas, valor in valores.items():
+                yield f'{self.nombre}{_etiquetas(self.etiquetas, etiquetas)} {_numero(valor)}'
+
+
+class Registro:
+
+    def __init__(self):
+        self._metricas = {}
+
+    def _anadir(self, metrica):
+        return self._metricas.setdefault(metrica.nombre, metrica)
+
+    def contador(self, nombre, ayuda, etiquetas=()):
+        return self._anadir(Contador(nombre, ayuda, etiquetas))
+
+    def indicador(self, nombre, ayuda, etiquetas=()):
+        return self._anadir(Indicador(nombre, ayuda, etiquetas))
+
+    def histograma(self, nombre, ayuda, etiquetas=(), limites=LIMITES):
+        return self._anadir(Histograma(nombre, ayuda, etiquetas, limites))
+
+    def recolectado(self, nombre, ayuda, etiquetas=(), tipo='counter'):
+        return self._anadir(Recolectado(nombre, ayuda, etiquetas, tipo))
+
+    def exportar(self):
+        lineas = []
+        for metrica in self._metricas.values():
+            lineas.append(f'# HELP {metrica.nombre} {metrica.ayuda}')
+            lineas.append(f'# TYPE {metrica.nombre} {metrica.tipo}')
+            lineas.extend(metrica.exportar())
+        return '\n'.join(lineas) + '\n'
+
+
+registro = Registro()
+
+HTTP = registro.histograma('valencia_http_peticion_segundos', 'Duración de las peticiones a servicios externos',
+                           ('host', 'estado'))
+HTTP_EN_CURSO = registro.indicador('valencia_http_en_curso', 'Peticiones a servicios externos en curso', ('host',))
+DISYUNTORES = registro.indicador('valencia_disyuntor_estado',
+                                 'Disyuntor de cada servicio externo: 0 cerrado, 1 semiabierto, 2 abierto', ('host',))
+PARSER = registro.histograma('valencia_parser_segundos', 'Duración de la extracción de datos de una respuesta',
+                             ('parser',))
+PAGINAS = registro.histograma('valencia_pagina_segundos', 'Duración de cada ejecución del script por página',
+                              ('pagina',))
+CACHES = registro.recolectado('valencia_cache_total', 'Consultas a las cachés por resultado', ('cache', 'resultado'))
+EVENTOS = registro.recolectado('valencia_eventos_total', 'Contadores de los motores y del cliente HTTP',
+                               ('componente', 'evento'))
+
+
+# ::::::::::::::::::::::::::::::: PERFILADO :::::::::::::::::::::::::::::::
+
+class Perfilador:
+    """Perfila una fracción de las ejecuciones y conserva las `conservar` más lentas."""
+
+    def __init__(self, fraccion=PERFILADO, conservar=10, lineas=25):
+        self.fraccion = fraccion
+        self.conservar = conservar
+        self.lineas = lineas
+        self._lentas = []  # montículo de (duración, orden, etiqueta, instante, perfil)
+        self._orden = itertools.count()
+        self._lock = threading.Lock()
+        self._hilo = threading.local()  # Perfil activo en el hilo de cada ejecución
+
+    def empezar(self):
+        # Un perfil que quedó activo (la ejecución se interrumpió con st.stop o un rerun)
+        anterior = getattr(self._hilo, 'perfil', None)
+        if anterior is not None:
+            anterior.disable()
+            self._hilo.perfil = None
+        if not self.fraccion or random.random() >= self.fraccion:
+            return None
+        perfil = cProfile.Profile()
+        try:
+            perfil.enable()
+        except ValueError:
+            return None  # Ya hay otro perfilador activo
+        self._hilo.perfil = perfil
+        return perfil
+
+    def terminar(self, perfil, etiqueta, duracion):
+        perfil.disable()
+        self._hilo.perfil = None
+        with self._lock:
+            entrada = (duracion, next(self._orden), etiqueta, time.time(), perfil)
+            if len(self._lentas) < self.conservar:
+                heapq.heappush(self._lentas, entrada)
+            elif duracion > self._lentas[0][0]:
+                heapq.heapreplace(self._lentas, entrada)
+
+    def informe(self):
+        with self._lock:
+            lentas = sorted(self._lentas, reverse=True)
+        if not lentas:
+            return 'Sin ejecuciones perfiladas (VALENCIA_PERFILADO=0 o aún ninguna).\n'
+        salida = io.StringIO()
+        for duracion, _, etiqueta, instante, perfil in lentas:
+            salida.write(f'=== {etiqueta}: {duracion * 1e3:.1f} ms, '
+                         f'{time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(instante))}\n')
+            pstats.Stats(perfil, stream=salida).sort_stats('cumulative').print_stats(self.lineas)
+        return salida.getvalue()
+
+
+perfilador = Perfilador()
+
+
+def empezar_pagina():
+    """Marca el inicio de una ejecución del script; se cierra con terminar_pagina."""
+    return time.perf_counter(), perfilador.empezar()
+
+
+def terminar_pagina(pagina, medida):
+    inicio, perfil = medida
+    duracion = time.perf_counter() - inicio
+    PAGINAS.observar(duracion, pagina)
+    if perfil is not None:
+        perfilador.terminar(perfil, pagina, duracion)
+
+
+# :::::::::::::::::::::::::::::::: SERVIDOR :::::::::::::::::::::::::::::::
+
+class _Manejador(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        ruta = self.path.split('?', 1)[0]
+        if ruta == '/metrics':
+            contenido, tipo = registro.exportar(), 'text/plain; version=0.0.4; charset=utf-8'
+        elif ruta == '/perfiles':
+            contenido, tipo = perfilador.informe(), 'text/plain; charset=utf-8'
+        else:
+            self.send_error(404)
+            return
+        contenido = contenido.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', tipo)
+        self.send_header('Content-Length', str(len(contenido)))
+        self.end_headers()
+        self.wfile.write(contenido)
+
+    def log_message(self, *args):
+        pass
+
+
+def servir(puerto=PUERTO, host=HOST):
+    """Arranca el servidor de métricas en un hilo; None si el puerto no está disponible."""
+    try:
+        servidor = ThreadingHTTPServer((host, puerto), _Manejador)
+    except OSError as e:
+        # Otro proceso de la misma máquina ya lo sirve
+        log.warning('No se pudo abrir el servidor de métricas en %s:%s: %s', host, puerto, e)
+        return None
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, name='metricas', daemon=True).start()
+    return servidor
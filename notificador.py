@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Trabajador de avisos por correo de próximas llegadas de metro.
+
+Se ejecuta como proceso aparte, independiente de las sesiones de Streamlit:
+la página 'Arrival notification by email' solo guarda la suscripción en una
+base de datos SQLite y este proceso se encarga del resto.
+
+En cada ciclo:
+  - agrupa las suscripciones por estación, de modo que cada estación se
+    descarga una sola vez tenga los suscriptores que tenga,
+  - calcula el tiempo restante de todas sus llegadas de una vez,
+  - envía a cada suscriptor las llegadas que entran en su margen de aviso y
+    que no se le hayan enviado ya. Los trenes avisados se guardan en la misma
+    base de datos (sobreviven a un reinicio) y se reconocen por su orden en
+    su línea y destino, no por su hora: los trenes de una misma línea y
+    destino no se adelantan, así que los k primeros que aún no han pasado son
+    los k ya avisados, aunque un retraso les haya cambiado la hora,
+  - usa una única conexión SMTP abierta, con un límite de correos por segundo.
+
+Uso:
+    python notificador.py                 # bucle continuo, cada VALENCIA_REFRESCO_EMAIL segundos
+    python notificador.py --una-vez       # un solo ciclo
+    python notificador.py --smtp-local localhost:1025   # servidor SMTP de pruebas, sin TLS ni login
+"""
+
+import argparse
+import logging
+import os
+import smtplib
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from llegadas import descargar_movimientos
+from tiempos import SEGUNDOS_DIA, segundos_restantes_metro
+
+log = logging.getLogger('notificador')
+
+RUTA_SUSCRIPCIONES = os.environ.get(
+    'VALENCIA_SUSCRIPCIONES', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'suscripciones.db'))
+
+Suscripcion = namedtuple('Suscripcion', ['id', 'email', 'estacion', 'url', 'minutos'])
+
+# Ids por consulta en los IN (...): por debajo del límite de variables de SQLite (999 en versiones antiguas)
+MAX_VARIABLES = 500
+
+
+def _bloques(ids):
+    ids = list(ids)
+    for i in range(0, len(ids), MAX_VARIABLES):
+        yield ids[i:i + MAX_VARIABLES]
+
+
+# ::::::::::::::::::::::::::::: SUSCRIPCIONES ::::::::::::::::::::::::::::::::
+
+class AlmacenSuscripciones:
+
+    def __init__(self, ruta=RUTA_SUSCRIPCIONES):
+        self.ruta = ruta
+        with self._conexion() as conexion:
+            conexion.execute("""
+                CREATE TABLE IF NOT EXISTS suscripciones (
+                    id INTEGER PRIMARY KEY,
+                    email TEXT NOT NULL,
+                    estacion TEXT NOT NULL,
+                    url TEXT NOT NULL,
+                    minutos INTEGER NOT NULL,
+                    creada REAL NOT NULL,
+                    UNIQUE (email, url)
+                )""")
+            # Trenes ya avisados que aún no han pasado, con su hora prevista (s desde 1970) del último ciclo
+            conexion.execute("""
+                CREATE TABLE IF NOT EXISTS avisos (
+                    suscripcion INTEGER NOT NULL,
+                    linea TEXT NOT NULL,
+                    destino TEXT NOT NULL,
+                    llegada REAL NOT NULL
+                )""")
+            conexion.execute('CREATE INDEX IF NOT EXISTS avisos_suscripcion ON avisos (suscripcion)')
+
+    def _conexion(self):
+        # Una conexión por operación: la usan a la vez sesiones de Streamlit y el trabajador
+        conexion = sqlite3.connect(self.ruta, timeout=10)
+        conexion.execute('PRAGMA journal_mode=WAL')
+        return conexion
+
+    def suscribir(self, email, estacion, url, minutos):
+        with self._conexion() as conexion:
+            conexion.execute("""
+                INSERT INTO suscripciones (email, estacion, url, minutos, creada) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (email, url) DO UPDATE SET minutos = excluded.minutos""",
+                             (email, estacion, url, int(minutos), time.time()))
+
+    def dar_de_baja(self, email, url=None):
+        with self._conexion() as conexion:
+            if url is None:
+                cursor = conexion.execute('DELETE FROM suscripciones WHERE email = ?', (email,))
+            else:
+                cursor = conexion.execute('DELETE FROM suscripciones WHERE email = ? AND url = ?', (email, url))
+            return cursor.rowcount
+
+    def de_email(self, email):
+        with self._conexion() as conexion:
+            filas = conexion.execute(
+                'SELECT id, email, estacion, url, minutos FROM suscripciones WHERE email = ? ORDER BY estacion',
+                (email,)).fetchall()
+        return [Suscripcion(*fila) for fila in filas]
+
+    def por_estacion(self):
+        """url de llegadas -> lista de Suscripcion."""
+        with self._conexion() as conexion:
+            filas = conexion.execute(
+                'SELECT id, email, estacion, url, minutos FROM suscripciones ORDER BY url').fetchall()
+        grupos = {}
+        for fila in filas:
+            suscripcion = Suscripcion(*fila)
+            grupos.setdefault(suscripcion.url, []).append(suscripcion)
+        return grupos
+
+    def avisados(self, ids):
+        """{(suscripción, línea, destino): [horas previstas de los trenes avisados, de menor a mayor]}."""
+        filas = []
+        with self._conexion() as conexion:
+            for bloque in _bloques(ids):
+                filas += conexion.execute(
+                    'SELECT suscripcion, linea, destino, llegada FROM avisos '
+                    f"WHERE suscripcion IN ({', '.join('?' * len(bloque))})", bloque).fetchall()
+        avisados = {}
+        for suscripcion, linea, destino, llegada in sorted(filas, key=lambda fila: fila[3]):
+            avisados.setdefault((suscripcion, linea, destino), []).append(llegada)
+        return avisados
+
+    def guardar_avisados(self, ids, avisados, pasados):
+        """Sustituye los avisos de las suscripciones `ids` por `avisados` y olvida los trenes de antes de `pasados`."""
+        with self._conexion() as conexion:
+            for bloque in _bloques(ids):
+                conexion.execute(f"DELETE FROM avisos WHERE suscripcion IN ({', '.join('?' * len(bloque))})", bloque)
+            conexion.executemany('INSERT INTO avisos (suscripcion, linea, destino, llegada) VALUES (?, ?, ?, ?)',
+                                 [clave + (llegada,) for clave, llegadas in avisados.items() for llegada in llegadas])
+            conexion.execute('DELETE FROM avisos WHERE llegada < ?', (pasados,))
+
+
+# ::::::::::::::::::::::::::::::: ENVÍOS ::::::::::::::::::::::::::::::::::
+
+class EnviadorCorreo:
+    """Conexión SMTP reutilizada entre envíos, con un límite de correos por segundo."""
+
+    def __init__(self, usuario, clave=None, host='smtp.gmail.com', port=None, por_segundo=5.0,
+                 **opciones_smtp):
+        # yagmail se usa para componer los mensajes; la conexión se abre una vez y se mantiene.
+        # Se importa aquí: la aplicación usa AlmacenSuscripciones y no necesita cargarlo
+        import yagmail
+        self.yag = yagmail.SMTP(usuario, clave, host=host, port=port, **opciones_smtp)
+        self.intervalo = 1.0 / por_segundo if por_segundo else 0.0
+        self._siguiente = 0.0
+        self._conectado = False
+        self._lock = threading.Lock()
+        self.enviados = 0
+
+    def _esperar_turno(self):
+        ahora = time.monotonic()
+        if self._siguiente > ahora:
+            time.sleep(self._siguiente - ahora)
+        self._siguiente = max(ahora, self._siguiente) + self.intervalo
+
+    def enviar(self, destinatario, asunto, mensaje):
+        with self._lock:
+            self._esperar_turno()
+            destinatarios, texto = self.yag.prepare_send(to=destinatario, subject=asunto, contents=mensaje)
+            for intento in range(2):
+                try:
+                    if not self._conectado:
+                        self.yag.login()
+                        self._conectado = True
+                    self.yag.smtp.sendmail(self.yag.user, destinatarios, texto)
+                    self.enviados += 1
+                    return
+                except smtplib.SMTPServerDisconnected:
+                    # El servidor cerró la conexión por inactividad: se abre otra y se reintenta
+                    self._conectado = False
+                    if intento:
+                        raise
+
+    def cerrar(self):
+        with self._lock:
+            if self._conectado:
+                self.yag.close()
+                self._conectado = False
+
+
+# :::::::::::::::::::::::::::::: TRABAJADOR ::::::::::::::::::::::::::::::::
+
+def mensaje_llegadas(llegadas):
+    return "The following metros are arriving soon:\n" + "\n".join(
+        f"Línea {linea} hacia {destino} en {minutos} minutos" for linea, destino, minutos in llegadas)
+
+
+class Notificador:
+
+    def __init__(self, almacen, enviador, descargar=descargar_movimientos, concurrencia=8):
+        self.almacen = almacen
+        self.enviador = enviador
+        self.descargar = descargar
+        self.concurrencia = concurrencia
+
+    def _descargar(self, url):
+        try:
+            return url, self.descargar(url)
+        except Exception as e:
+            log.warning('No se pudieron obtener las llegadas de %s: %s', url, e)
+            return url, []
+
+    def ciclo(self, ahora=None):
+        """Un ciclo completo; devuelve cuántos correos se han enviado."""
+        grupos = self.almacen.por_estacion()
+        ahora = ahora or datetime.now()
+        enviados = 0
+        # Una descarga por estación, varias a la vez
+        with ThreadPoolExecutor(max_workers=self.concurrencia) as pool:
+            for url, llegadas in pool.map(self._descargar, grupos):
+                if llegadas:
+                    enviados += self._avisar(grupos[url], llegadas, ahora)
+        return enviados
+
+    def _avisar(self, suscripciones, llegadas, ahora):
+        restantes = segundos_restantes_metro([llegada["Tiempo"] for llegada in llegadas], ahora)
+        instante = ahora.timestamp()
+        # Próximos trenes de cada línea y destino, del más cercano al más lejano. Una hora que ya ha pasado
+        # cuenta hasta el día siguiente: no es un tren próximo. NaN (hora desconocida) nunca entra
+        trenes = {}
+        for llegada, restante in zip(llegadas, restantes):
+            if restante < SEGUNDOS_DIA / 2:
+                trenes.setdefault((llegada["Número de Línea"], llegada["Destino"]), []).append(float(restante))
+        for restantes_ruta in trenes.values():
+            restantes_ruta.sort()
+
+        ids = [suscripcion.id for suscripcion in suscripciones]
+        anteriores = self.almacen.avisados(ids)
+        # Rutas con trenes ya avisados de cada suscripción, agrupadas una sola vez
+        rutas_avisadas = {}
+        for id_, linea, destino in anteriores:
+            rutas_avisadas.setdefault(id_, set()).add((linea, destino))
+        avisados = {}
+        enviados = 0
+        for suscripcion in suscripciones:
+            nuevas, propios = [], {}
+            rutas = set(trenes) | rutas_avisadas.get(suscripcion.id, set())
+            for ruta in rutas:
+                proximos = trenes.get(ruta, [])
+                previos = [t for t in anteriores.get((suscripcion.id,) + ruta, ()) if t >= instante]
+                # Los k trenes ya avisados que no han pasado son los k primeros: se siguen con su hora de ahora
+                k = min(len(previos), len(proximos))
+                propios[ruta] = [instante + r for r in proximos[:k]] + previos[len(proximos):]
+                for restante in proximos[k:]:
+                    if restante // 60 <= suscripcion.minutos:
+                        nuevas.append((ruta, restante))
+            if nuevas:
+                nuevas.sort(key=lambda nueva: nueva[1])
+                try:
+                    self.enviador.enviar(suscripcion.email, 'Your Metro Arrivals', mensaje_llegadas(
+                        (linea, destino, int(restante // 60)) for (linea, destino), restante in nuevas))
+                    # Solo se marcan como avisados si el correo ha salido
+                    for ruta, restante in nuevas:
+                        propios[ruta].append(instante + restante)
+                    enviados += 1
+                except Exception as e:
+                    log.error('Error al enviar el aviso a %s: %s', suscripcion.email, e)
+            for ruta, horas in propios.items():
+                if horas:
+                    avisados[(suscripcion.id,) + ruta] = horas
+        self.almacen.guardar_avisados(ids, avisados, pasados=instante)
+        return enviados
+
+    def ejecutar(self, intervalo=60.0):
+        while True:
+            inicio = time.monotonic()
+            try:
+                enviados = self.ciclo()
+                log.info('Ciclo completado: %d correos enviados', enviados)
+            except Exception:
+                log.exception('Error en el ciclo de avisos')
+            time.sleep(max(0.0, intervalo - (time.monotonic() - inicio)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--una-vez', action='store_true', help='ejecutar un solo ciclo y salir')
+    parser.add_argument('--intervalo', type=float, default=float(os.environ.get('VALENCIA_REFRESCO_EMAIL', 60)))
+    parser.add_argument('--suscripciones', default=RUTA_SUSCRIPCIONES)
+    parser.add_argument('--smtp-local', metavar='HOST:PUERTO', help='servidor SMTP de pruebas, sin TLS ni login')
+    parser.add_argument('--correos-por-segundo', type=float, default=5.0)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s %(levelname)s %(message)s')
+
+    usuario, clave = os.environ.get('VALENCIA_SMTP_USUARIO'), os.environ.get('VALENCIA_SMTP_CLAVE')
+    if args.smtp_local:
+        # Sin login: el usuario solo es el remitente
+        host, port = args.smtp_local.rsplit(':', 1)
+        enviador = EnviadorCorreo(usuario or 'avisos@localhost', host=host, port=int(port),
+                                  por_segundo=args.correos_por_segundo,
+                                  smtp_ssl=False, smtp_starttls=False, smtp_skip_login=True)
+    else:
+        if not usuario or not clave:
+            parser.error('faltan VALENCIA_SMTP_USUARIO y VALENCIA_SMTP_CLAVE con la cuenta de correo')
+        enviador = EnviadorCorreo(usuario, clave, por_segundo=args.correos_por_segundo)
+
+    notificador = Notificador(AlmacenSuscripciones(args.suscripciones), enviador)
+    try:
+        if args.una_vez:
+            log.info('%d correos enviados', notificador.ciclo())
+        else:
+            notificador.ejecutar(args.intervalo)
+    finally:
+        enviador.cerrar()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,6 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Páginas de APP_Valenciaalminuto.py, un módulo por página con una función
+mostrar(). Cada módulo se importa la primera vez que alguien abre su página.
+"""
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Página 'Arrival notification by email' (sin entrada en el menú): alta y baja
+de avisos por correo, que envía el proceso notificador.py.
+"""
+
+import pandas as pd
+import streamlit as st
+
+import recursos
+from paginas.metro import mostrar_llegadas_metro
+
+
+def mostrar():
+
+    
+    # Mostrar imagen
+    st.image('estacion_T.jpg')
+    
+    # Texto introductorio
+    st.markdown("""
+    # Next Arrivals and Departures by Email
+    ### Tired of missing the subway?
+    
+    We've got the perfect solution for you! Just enter your email, pick your stop, and choose how many minutes in advance you need updates. You'll get an email whenever a metro is about to arrive at your stop, even with this page closed.
+    
+    Say goodbye to being late for your appointments or work!
+    """)
+    
+    # Selección de estación
+    estaciones = recursos.indice_metro().nombres
+    estacion_seleccionada = st.selectbox('Select a Station:', estaciones)
+    
+    # Entrada para correo electrónico del usuario
+    user_email = st.text_input('Enter your email for notifications')
+    
+    # Tiempo de alerta antes de la llegada
+    alert_time = st.number_input('Alert me X minutes before arrival:', min_value=1, max_value=60, value=10)
+    
+    # Las suscripciones se guardan en una base de datos; los correos los envía el proceso
+    # notificador.py aunque el usuario cierre la pestaña
+    suscripciones = recursos.almacen_suscripciones()
+    url_llegadas = recursos.urls_llegadas()[0][estacion_seleccionada]
+    
+    col1, col2 = st.columns(2)
+    if col1.button('Subscribe'):
+        if user_email:
+            suscripciones.suscribir(user_email, estacion_seleccionada, url_llegadas, alert_time)
+            st.success(f'Subscribed! You will receive an email when a metro is {alert_time} minutes or less from {estacion_seleccionada}.')
+        else:
+            st.error('Please enter your email.')
+    if col2.button('Unsubscribe'):
+        if user_email and suscripciones.dar_de_baja(user_email, url_llegadas):
+            st.success(f'You will no longer receive emails for {estacion_seleccionada}.')
+        else:
+            st.write('There was no subscription for this email and station.')
+    
+    if user_email:
+        activas = suscripciones.de_email(user_email)
+        if activas:
+            st.markdown("#### Your subscriptions")
+            st.table(pd.DataFrame([{'Station': s.estacion, 'Minutes before arrival': s.minutos} for s in activas]))
+    
+    # Llegadas actuales de la estación, leídas del motor de precarga
+    mostrar_llegadas_metro(estacion_seleccionada, url_llegadas)
+    
+    # Instrucciones adicionales
+    st.markdown("""
+    #### Additional Information
+    This application is designed to provide real-time updates and organize travel efficiently. You can plan your routes, receive notifications about changes and delays, and access recommendations for the quickest and most convenient trips. Join us and discover a new way to travel by metro.
+    """)
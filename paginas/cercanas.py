@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Página 'Stops Near Me': bocas de metro, paradas de EMT y estaciones de
+ValenBici a una distancia dada de un punto, con el índice espacial.
+"""
+
+import pandas as pd
+import pydeck as pdk
+import streamlit as st
+
+import mapas
+import recursos
+from indice_espacial import TIPOS
+
+ICONOS = {'Metro': mapas.ICONO_METRO, 'EMT': mapas.ICONO_EMT, 'ValenBici': mapas.ICONO_BICI}
+
+
+def buscar(lat, lon, radio, tipos):
+    """(filas, True si no hay nada en el radio y son las 5 más cercanas), solo de los tipos elegidos."""
+    indice = recursos.indice_transporte()
+    mascara = indice.de_tipos(tipos)
+    indices, distancias = indice.en_radio(lat, lon, radio)
+    dentro = mascara[indices]
+    indices, distancias = indices[dentro], distancias[dentro]
+    if len(indices):
+        return indice.filas(indices, distancias), False
+    # Nada dentro del radio: al menos las 5 más cercanas, también de los tipos elegidos
+    return indice.filas(*indice.cercanos(lat, lon, k=5, mascara=mascara)), True
+
+
+# Mapas por consulta, construidos y serializados una vez por proceso
+@st.cache_resource(max_entries=64)
+def mapa_cercanas(lat, lon, radio, tipos):
+    filas, _ = buscar(lat, lon, radio, tipos)
+    capas = []
+    for tipo in TIPOS.values():
+        del_tipo = [f for f in filas if f['Tipo'] == tipo]
+        if del_tipo:
+            registros = mapas.puntos([f['lat'] for f in del_tipo], [f['lon'] for f in del_tipo],
+                                     t=[tipo] * len(del_tipo), n=[f['Nombre'] for f in del_tipo],
+                                     d=[f['Distancia (m)'] for f in del_tipo])
+            capas.append(mapas.capa_puntos(registros, ICONOS[tipo], pickable=True))
+    # Círculo del radio alrededor del punto elegido
+    capas.append(pdk.Layer('ScatterplotLayer', mapas.puntos([lat], [lon]), get_position='p',
+                           get_fill_color=[0, 0, 0, 40], get_line_color=[0, 0, 0], stroked=True,
+                           get_radius=radio))
+    return mapas.Mapa(
+        layers=capas,
+        initial_view_state=pdk.ViewState(latitude=lat, longitude=lon, zoom=15, pitch=0),
+        map_style='mapbox://styles/mapbox/light-v9',
+        tooltip={"text": "{t}: {n}\n{d} m"}
+    )
+
+
+def mostrar():
+    st.markdown("""
+    # Stops Near Me
+    Find the metro entrances, EMT bus stops and ValenBici stations within walking distance of any point in Valencia.
+    Enter the coordinates of your location (by default, Plaça de l'Ajuntament) and choose how far you are willing to walk.
+    """)
+
+    col1, col2 = st.columns(2)
+    lat = col1.number_input('Latitude', value=39.4699, format='%.6f')
+    lon = col2.number_input('Longitude', value=-0.3763, format='%.6f')
+    radio = st.slider('Maximum distance (m)', min_value=100, max_value=2000, value=400, step=50)
+    tipos = st.multiselect('Show:', options=list(TIPOS.values()), default=list(TIPOS.values()))
+    tipos = tuple(t for t in TIPOS.values() if t in tipos)
+
+    filas, mas_cercanas = buscar(lat, lon, radio, tipos) if tipos else ([], False)
+    if not filas:
+        st.write("No stops of the selected types nearby.")
+        return
+    if mas_cercanas:
+        st.write(f"Nothing within {radio} m. These are the closest stops:")
+    st.table(pd.DataFrame(filas).drop(columns=['lat', 'lon']))
+    st.pydeck_chart(mapa_cercanas(lat, lon, radio, tipos))
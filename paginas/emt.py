@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Página 'EMT Schedules': próximas llegadas a una parada de EMT.
+"""
+
+import requests
+import streamlit as st
+
+import metricas
+import recursos
+
+
+@st.fragment(run_every=recursos.REFRESCO_EMT)
+@metricas.PAGINAS.cronometrar('refresco EMT')
+def mostrar_llegadas_bus(parada_seleccionada, url_llegadas):
+    try:
+        filas, edad = recursos.filas_llegadas('emt', url_llegadas)
+        if not filas:
+            st.write("No buses available at this moment.")
+            recursos.mostrar_edad(edad)
+            return
+
+        st.markdown(f"### Next arrivals for the stop: {parada_seleccionada}")
+        # Only the arrivals that changed are sent; the browser runs the countdown
+        recursos.panel_llegadas('emt', url_llegadas, filas)
+        recursos.mostrar_edad(edad)
+    except KeyError:
+        st.write("No buses available at this moment.")
+    except requests.RequestException:
+        # Sin datos anteriores de esta parada y EMT no responde
+        st.warning("EMT is not responding right now. The arrivals will appear as soon as it is back.")
+    except Exception as e:
+        st.write("An error occurred. Please try again later.")
+
+
+def mostrar():
+    st.markdown("""
+    # Next Bus Arrivals
+    Quickly check the next arrivals at your bus stop.
+    Select a stop and get updated information on the upcoming buses.
+    """)
+    st.image('bus.jpg')  # Ensure you have an appropriate image or remove this line
+
+    # Text input for the bus stop
+    parada_input = st.text_input('Enter the name or number of the stop:')
+    lineas = st.multiselect('Only stops on line:', recursos.indice_lineas('emt').lineas)
+    paradas_filtradas = recursos.buscar_paradas('emt', parada_input, lineas)
+
+    parada_seleccionada = st.selectbox('Select a stop:', paradas_filtradas)
+
+    if parada_seleccionada:
+        try:
+            # Verify if the entered stop exists in the data
+            _, urls_emt = recursos.urls_llegadas()
+            if parada_seleccionada in urls_emt:
+                url_llegadas = urls_emt[parada_seleccionada]
+
+                # Only the arrivals are re-rendered, every REFRESCO_EMT seconds
+                mostrar_llegadas_bus(parada_seleccionada, url_llegadas)
+            else:
+                st.write("The stop entered is not found in the dataset.")
+        except Exception as e:
+            st.write("An error occurred. Please try again later.")
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Página 'Favorites': varias estaciones de metro, paradas de EMT y estaciones de
+ValenBici a la vez. Las llegadas que no están en la instantánea del motor se
+descargan en paralelo, así que la página tarda lo que la más lenta.
+"""
+
+import pandas as pd
+import streamlit as st
+
+import metricas
+import recursos
+from prefetch_metro import a_diccionarios
+from tiempos import formatear_restante_metro, segundos_restantes_bus, segundos_restantes_metro
+
+# Número de llegadas que se muestran por estación
+LLEGADAS_POR_FAVORITO = 4
+
+
+@st.fragment(run_every=recursos.REFRESCO_FAVORITOS)
+@metricas.PAGINAS.cronometrar('refresco favoritos')
+def mostrar_favoritos(favoritos_metro, favoritos_emt, favoritos_bici):
+    urls_metro, urls_emt = recursos.urls_llegadas()
+    motor = recursos.motor_metro()
+
+    # Metro de la instantánea del motor; lo que falte y todas las paradas de EMT se
+    # descargan a la vez: la página tarda lo que la estación más lenta
+    llegadas, edades = {}, {}
+    pendientes = []
+    for nombre in favoritos_metro:
+        motor.ver(urls_metro[nombre])
+        movimientos = motor.llegadas(urls_metro[nombre])
+        if movimientos is None:
+            pendientes.append(urls_metro[nombre])
+        else:
+            llegadas[urls_metro[nombre]] = a_diccionarios(movimientos)
+            edades[urls_metro[nombre]] = motor.edad(urls_metro[nombre])
+    pendientes += [urls_emt[nombre] for nombre in favoritos_emt]
+    if pendientes:
+        cache = recursos.cache_llegadas()
+        llegadas.update(cache.obtener_varias(pendientes, recursos.cargar_llegadas(), recursos.ejecutor_llegadas()))
+        edades.update((url, cache.edad(url)) for url in pendientes)
+
+    tarjetas = ([('Metro', nombre, urls_metro[nombre]) for nombre in favoritos_metro]
+                + [('EMT', nombre, urls_emt[nombre]) for nombre in favoritos_emt])
+    tarjetas = [(tipo, nombre, llegadas[url], edades.get(url)) for tipo, nombre, url in tarjetas]
+    estaciones = recursos.servicio_valenbici().instantanea().tabla
+    tarjetas += [('ValenBici', nombre, estaciones[estaciones['address'] == nombre], None) for nombre in favoritos_bici]
+
+    columnas = st.columns(min(3, len(tarjetas)))
+    for i, (tipo, nombre, contenido, edad) in enumerate(tarjetas):
+        with columnas[i % len(columnas)]:
+            st.markdown(f"**{tipo}** · {nombre}")
+            if tipo == 'ValenBici':
+                if contenido.empty:
+                    st.caption("Station not available right now.")
+                else:
+                    estacion = contenido.iloc[0]
+                    st.markdown(f"{estacion['available_bikes']} bikes · {estacion['available_bike_stands']} free docks")
+            elif isinstance(contenido, Exception):
+                st.caption("Arrivals not available right now.")
+            elif not contenido:
+                st.caption("No arrivals right now.")
+            else:
+                if tipo == 'Metro':
+                    segundos = segundos_restantes_metro([m["Tiempo"] for m in contenido])
+                    restantes = formatear_restante_metro(segundos)
+                else:
+                    segundos = segundos_restantes_bus([m["Tiempo"] for m in contenido])
+                    restantes = [m["Tiempo"] for m in contenido]
+                filas = sorted(zip(segundos, contenido, restantes),
+                               key=lambda fila: (pd.isna(fila[0]), fila[0]))[:LLEGADAS_POR_FAVORITO]
+                st.dataframe(pd.DataFrame([{'Line': m["Número de Línea"], 'Destination': m["Destino"],
+                                            'Time': restante} for _, m, restante in filas]),
+                             hide_index=True)
+            if edad is not None and edad >= recursos.EDAD_AVISO and not isinstance(contenido, Exception):
+                recursos.mostrar_edad(edad)
+
+
+def mostrar():
+    st.markdown("""
+    # My Stops
+    Follow several metro stations, EMT stops and ValenBici stations on one screen.
+    Your selection is kept in the page address: bookmark it to come back to the same stops.
+    """)
+
+    nombres_bici = sorted(recursos.servicio_valenbici().instantanea().tabla['address'])
+    selectores = [('metro', 'Metro stations:', recursos.indice_metro().nombres),
+                  ('emt', 'EMT stops:', recursos.indice_emt().nombres),
+                  ('bici', 'ValenBici stations:', nombres_bici)]
+
+    seleccion = {}
+    for parametro, etiqueta, opciones in selectores:
+        clave = f'favoritos_{parametro}'
+        if clave not in st.session_state:
+            # Primera visita de la sesión: favoritos de la URL (?metro=...&emt=...&bici=...)
+            validas = set(opciones)
+            st.session_state[clave] = [v for v in st.query_params.get_all(parametro) if v in validas]
+        seleccion[parametro] = st.multiselect(etiqueta, opciones, key=clave)
+        st.query_params[parametro] = seleccion[parametro]
+
+    if any(seleccion.values()):
+        mostrar_favoritos(seleccion['metro'], seleccion['emt'], seleccion['bici'])
+    else:
+        st.write("Choose the stops you want to follow.")
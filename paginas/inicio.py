@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Página 'Home'. Solo texto e imagen: no carga ningún dato ni ningún módulo de
+datos, así que es lo primero que ve una sesión nueva sin esperar a nada.
+"""
+
+import streamlit as st
+
+
+def mostrar():
+    
+    st.image('1.jpg')
+    st.title("VALENCIA IN A MINUTE By Edu")
+    
+    # Sección para próximas llegadas y salidas
+    st.markdown("""
+Our application emerges from the need to provide a tool that updates in real time and offers precise and reliable information on the arrival of subways. In a world where time is invaluable, we understand the importance of minimizing waiting times and optimizing the journeys of passengers.
+
+## Real-Time Updates
+
+The main feature of our application is its ability to update in real time. This means that users can get instant information about subway arrivals, with measured and accurate times that allow them to plan their commutes efficiently. You will never have to guess when the next subway will arrive; our app will tell you instantly.
+
+## Improved Organization for Passenger Journeys
+
+In addition to providing exact schedules, our application is designed to enhance the organization of passengers' journeys. With advanced features, users can plan their routes, receive notifications about changes and delays, and access recommendations for the fastest and most convenient routes. Our goal is to make each journey as smooth and stress-free as possible.
+
+## A Solution to Your Transportation Needs
+
+In summary, our application arises from the need for a solution that offers real-time updates and superior organization for subway journeys. We are committed to innovation and continuous improvement so that your travel experience is optimal, efficient, and enjoyable. Join us and discover a new way to travel by subway.
+
+Additionally, we also have schedules for EMT buses and a page for calculating route duration between Valenbisi station stops.
+
+## Contact
+
+For any suggestions or inquiries, please send an email to the following address: [mrocval@etsinf.upv.es](mailto:mrocval@etsinf.upv.es).
+
+""")
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Página 'EMT Map': paradas de EMT elegidas sobre un mapa.
+"""
+
+import streamlit as st
+
+import mapas
+import recursos
+
+
+# Mapas por selección, construidos y serializados una vez por proceso. Las paradas van por fila de la
+# tabla y no por nombre: varias paradas de líneas distintas comparten nombre
+@st.cache_resource(max_entries=64)
+def mapa_emt(filas):
+    tabla = recursos.tabla('emt').take(list(filas))
+    if tabla.empty:
+        return None
+    registros = mapas.puntos(tabla['lat'], tabla['lon'],
+                             n=tabla['Denominació / Denominación'], l=tabla['Línies / Líneas'])
+    return mapas.Mapa(
+        layers=[mapas.capa_puntos(registros, mapas.ICONO_EMT, pickable=True, auto_highlight=True)],
+        initial_view_state=mapas.vista(registros, zoom=12, pitch=50),
+        map_style='mapbox://styles/mapbox/satellite-v9',
+        tooltip={"text": "{n}\nBuses: {l}"}
+    )
+
+
+def mostrar():
+    # Descripción de la aplicación
+    st.markdown("""
+                
+    # Interactive Map of EMT Bus Stops
+Welcome to the interactive visualization of EMT bus stops in Valencia.
+This map shows the locations of selected bus stops.
+You can choose the stops you are interested in and see their geographical distribution.
+    
+    """)
+
+    # Agregar una foto
+    st.image('esat.jpg')
+
+    # Datos de las paradas (lat y lon ya vienen convertidas en el paquete binario)
+    data = recursos.tabla('emt')
+
+    # Entrada para filtrar paradas por nombre
+    filter_query = st.text_input('Filter stops by name: ')
+
+    # Filtro por líneas con el índice de líneas: paradas de alguna o de todas las elegidas
+    lineas = recursos.indice_lineas('emt')
+    filter_lines = st.multiselect('Filter stops by line:', options=lineas.lineas)
+    if filter_lines:
+        todas = len(filter_lines) > 1 and st.radio(
+            'Stops served by:', ['Any of these lines', 'All of these lines']) == 'All of these lines'
+        bits = lineas.interseccion(filter_lines) if todas else lineas.union(filter_lines)
+        filtered_stops = data.take(lineas.filas(bits))
+    else:
+        filtered_stops = data
+
+    # Filtrar las paradas que coincidan con la entrada del usuario
+    if filter_query:
+        encontradas = recursos.indice_emt().buscar(filter_query)
+        filtered_stops = filtered_stops[filtered_stops['Denominació / Denominación'].isin(encontradas)]
+
+    selected_stop = None
+
+    # Checkbox para seleccionar todas las paradas
+    if st.checkbox('Select All Stops'):
+        selected_stops = filtered_stops['Denominació / Denominación'].unique()
+    else:
+        selected_stops = st.multiselect('Select Stops:', options=filtered_stops['Denominació / Denominación'].unique())
+
+    # Mapa de las paradas seleccionadas (cacheado por selección): sus filas entre las filtradas
+    # (la tabla tiene el índice por defecto, así que el índice es la posición de cada fila)
+    elegidas = filtered_stops['Denominació / Denominación'].isin(selected_stops).to_numpy()
+    map = mapa_emt(tuple(sorted(filtered_stops.index[elegidas])))
+
+    # Verificar si hay datos para mostrar
+    if map is not None:
+        st.pydeck_chart(map)
+    else:
+        st.write("No data available for the selected stops.")
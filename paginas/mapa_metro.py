@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Página 'Interactive Map' (sin entrada en el menú): estaciones de metro de las
+líneas elegidas sobre un mapa.
+"""
+
+import streamlit as st
+
+import mapas
+import recursos
+
+
+# Mapas por selección, construidos y serializados una vez por proceso. Las estaciones salen
+# del índice de líneas: la 5 incluye las que también tienen otras líneas ('3,5,9')
+@st.cache_resource(max_entries=64)
+def mapa_metro(lineas, todas=False):
+    indice = recursos.indice_lineas('metro')
+    bits = indice.interseccion(lineas) if todas else indice.union(lineas)
+    tabla = recursos.tabla('metro').take(indice.filas(bits))
+    if tabla.empty:
+        return None
+    registros = mapas.puntos(tabla['lat'], tabla['lon'])
+    return mapas.Mapa(
+        layers=[mapas.capa_puntos(registros, mapas.ICONO_METRO, pickable=True)],
+        initial_view_state=mapas.vista(registros, zoom=11, pitch=50),
+        map_style='mapbox://styles/mapbox/satellite-v9'  # Usando la vista satelital de Mapbox
+    )
+
+
+def mostrar():
+    # Descripción de la aplicación
+    
+    st.markdown("""
+    # Interactive Map of Metro Lines
+    This map shows the locations of selected metro stations.
+    You can choose the metro lines you are interested in and see their geographical distribution.
+    
+    """)
+
+    # Agregar una foto
+    st.image('Plano_general.jpg')
+
+    st.markdown("""
+        **Select** the lines you need to consult; the different available stations will appear on the map.
+    """)
+
+    # Líneas del índice de líneas (1, 3, 4...), no las combinaciones de la columna ('3,5,9')
+    lines = recursos.indice_lineas('metro').lineas
+
+    # Checkbox para seleccionar todas las líneas
+    todas = False
+    if st.checkbox('Select All Lines'):
+        selected_lines = lines
+    else:
+        selected_lines = st.multiselect('Select Metro Lines:', options=lines)
+        if len(selected_lines) > 1:
+            todas = st.radio('Show stations on:', ['Any of these lines', 'All of these lines']) == 'All of these lines'
+
+    # Mapa de las líneas seleccionadas (cacheado por selección)
+    map = mapa_metro(tuple(sorted(selected_lines)), todas)
+
+    # Verificar si hay datos para mostrar
+    if map is not None:
+        st.pydeck_chart(map)
+    else:
+        st.write("No data available for the selected lines.")
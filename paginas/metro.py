@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Página 'MetroValencia Schedule': próximas llegadas de una estación de metro,
+leídas de la instantánea del motor de precarga.
+"""
+
+import requests
+import streamlit as st
+
+import metricas
+import recursos
+
+
+@st.fragment(run_every=recursos.REFRESCO_METRO)
+@metricas.PAGINAS.cronometrar('refresco metro')
+def mostrar_llegadas_metro(estacion_seleccionada, url_llegadas):
+    st.markdown(f"#### Next Arrivals for the Station: {estacion_seleccionada}")
+    try:
+        filas, edad = recursos.filas_llegadas('metro', url_llegadas)
+    except requests.RequestException:
+        # Ni el motor ni la caché tienen datos de esta estación y el servicio no responde
+        st.warning("MetroValencia is not responding right now. The arrivals will appear as soon as it is back.")
+        return
+    if not filas:
+        st.write("No trains are expected at this station right now.")
+        recursos.mostrar_edad(edad)
+        return
+
+    # Solo se envían las llegadas que han cambiado; la cuenta atrás la lleva el navegador
+    recursos.panel_llegadas('metro', url_llegadas, filas)
+    recursos.mostrar_edad(edad)
+
+
+def mostrar():
+    # Sección para próximas llegadas y salidas
+    st.markdown("""
+                
+    # Next Arrivals and Departures
+    A new way to quickly check the next arrivals and departures at your stop.
+    Select a metro station and get updated information on the next trains arriving or departing from there.
+    
+    """)
+    
+    st.image('foto_metro.jpeg')
+
+    
+    st.markdown("""
+                
+    You can try entering ‘benimac’ and pressing enter.
+    """)
+
+    # Entrada de texto para la estación
+    estacion_input = st.text_input('Enter the Station Name: ')
+    lineas = st.multiselect('Only stations on line:', recursos.indice_lineas('metro').lineas)
+    estaciones_filtradas = recursos.buscar_paradas('metro', estacion_input, lineas)
+
+    estacion_seleccionada = st.selectbox('Select a Station:', estaciones_filtradas)
+
+    if estacion_seleccionada:
+        # Verificar si la estación ingresada existe en los datos
+        urls_metro, _ = recursos.urls_llegadas()
+        if estacion_seleccionada in urls_metro:
+            url_llegadas = urls_metro[estacion_seleccionada]
+
+            # Solo la tabla de llegadas se vuelve a pintar cada REFRESCO_METRO segundos
+            mostrar_llegadas_metro(estacion_seleccionada, url_llegadas)
+
+        else:
+            st.write("The station entered is not found in the dataset.")
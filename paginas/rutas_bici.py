@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Página 'ValenBici': disponibilidad de las estaciones y duración de la ruta en
+bici entre dos de ellas.
+"""
+
+import time
+
+import pandas as pd
+import pydeck as pdk
+import streamlit as st
+
+import mapas
+import recursos
+from rutas import FUENTE_ESTIMADA, FUENTE_MAPBOX, decodificar_polilinea
+from valenbici import ORIGEN_CSV
+
+
+@st.fragment(run_every=1.0)
+def esperar_ruta(servicio_rutas, estacion1, estacion2):
+    if servicio_rutas.en_vuelo(estacion1, estacion2):
+        st.caption("Loading the route from Mapbox...")
+    else:
+        st.rerun()
+
+
+def mostrar():
+    
+
+    # Estaciones de la última actualización del servicio: volver a ejecutar la página no descarga nada
+    servicio = recursos.servicio_valenbici()
+    instantanea = servicio.instantanea()
+    data = instantanea.tabla.copy(deep=False)
+    
+    # Datos de las capas: solo posición y campos del tooltip (ver mapas.py)
+    def puntos_estaciones(estaciones):
+        return mapas.puntos(estaciones['lat'], estaciones['lon'], a=estaciones['address'],
+                            b=estaciones['available_bikes'], e=estaciones['available_bike_stands'],
+                            s=estaciones['status'])
+
+    tooltip_estaciones = {
+        "html": "<b>Address:</b> {a}<br/>"
+                "<b>Bikes Available:</b> {b}<br/>"
+                "<b>Free Spaces:</b> {e}<br/>"
+                "<b>Status:</b> {s}",
+        "style": {
+            "backgroundColor": "steelblue",
+            "color": "white"
+        }
+    }
+
+    st.image('234.jpg')
+    st.title('Route Duration')
+    if instantanea.origen == ORIGEN_CSV:
+        st.caption("Live availability is not reachable right now; showing the stations from the last saved snapshot.")
+    else:
+        # El servicio consulta JCDecaux cada `periodo` segundos: antes de dos periodos no hay aviso
+        recursos.mostrar_edad(time.time() - instantanea.comprobada, aviso=max(recursos.EDAD_AVISO, 2 * servicio.periodo))
+    
+    st.markdown("""
+### Welcome to our interactive ValenBici tool!
+
+ Here’s how you can use our application to calculate the estimated travel time between two bicycle stations in Valence. This step-by-step guide will help you make the most of the service, ensuring that you can plan your trips efficiently within the free time limit.
+""")
+    
+    
+    # Buscador para la primera parada
+    search_text1 = st.sidebar.text_input("Search Stop 1:")
+    if search_text1:
+        filtered_data1 = data[data['address'].str.contains(search_text1, case=False)]
+    else:
+        filtered_data1 = data
+    
+    # Buscador para la segunda parada
+    search_text2 = st.sidebar.text_input("Search Stop 2:")
+    if search_text2:
+        filtered_data2 = data[data['address'].str.contains(search_text2, case=False)]
+    else:
+        filtered_data2 = data
+    
+    # Ordenar las paradas filtradas
+    filtered_data1 = filtered_data1.sort_values('address')
+    filtered_data2 = filtered_data2.sort_values('address')
+    
+    # Seleccionar dos paradas
+    parada1 = st.sidebar.selectbox("Stop 1", filtered_data1['address'])
+    parada2 = st.sidebar.selectbox("Stop 2", filtered_data2['address'])
+    
+    # Obtener coordenadas de las paradas seleccionadas
+    estacion1 = data[data['address'] == parada1][['number', 'lon', 'lat']].values[0]
+    estacion2 = data[data['address'] == parada2][['number', 'lon', 'lat']].values[0]
+    coords1, coords2 = estacion1[1:], estacion2[1:]
+    
+    # Filtrar los datos para mostrar solo las estaciones seleccionadas
+    selected_stations = data[data['address'].isin([parada1, parada2])]
+    
+    # El par calculado se guarda en la sesión: el mapa sigue con la ruta en las siguientes ejecuciones de la
+    # página (la de la descarga de la geometría incluida) mientras no se cambien las estaciones
+    if st.sidebar.button("Calculate Route"):
+        st.session_state['ruta_bici'] = {'par': (parada1, parada2), 'pedida': False}
+    pedido = st.session_state.get('ruta_bici')
+
+    if pedido is not None and pedido['par'] == (parada1, parada2):
+        # El tiempo sale al momento, sin red: de la caché de rutas si alguien ya la pidió y, si no,
+        # de la matriz de duraciones. La línea de la ruta se pide a Mapbox en otro hilo, si aún no está guardada
+        servicio_rutas = recursos.servicio_rutas()
+        ruta = servicio_rutas.ruta(estacion1, estacion2)
+        st.sidebar.write(f"Estimated time: {ruta.duracion / 60:.2f} minutos")
+        if ruta.fuente == FUENTE_ESTIMADA:
+            st.sidebar.caption("Approximate time, estimated from the distance between the stations.")
+        geometria = ruta.geometria
+        if ruta.fuente != FUENTE_MAPBOX:
+            ruta_mapbox = None
+            if not pedido['pedida']:
+                # Una sola petición por cálculo: si Mapbox falla no se vuelve a pedir en cada ejecución
+                pedido['pedida'] = True
+                ruta_mapbox = servicio_rutas.pedir_geometria(estacion1, estacion2)
+            if ruta_mapbox is not None:
+                geometria = ruta_mapbox.geometria
+            elif servicio_rutas.en_vuelo(estacion1, estacion2):
+                # Mientras tanto, la línea recta; al llegar la ruta se vuelve a ejecutar la página
+                esperar_ruta(servicio_rutas, estacion1, estacion2)
+            else:
+                st.sidebar.caption("The route service is not available: straight line between the stations.")
+    
+        # Añadir la ruta al mapa
+        route_layer = pdk.Layer(
+            "PathLayer",
+            data=pd.DataFrame([{"path": decodificar_polilinea(geometria)}]),
+            get_path="path",
+            get_width=5,
+            get_color=[255, 0, 0],
+            width_min_pixels=2
+        )
+    
+        # Configuración del mapa con estaciones seleccionadas
+        view_state = pdk.ViewState(
+            latitude=(coords1[1] + coords2[1]) / 2,
+            longitude=(coords1[0] + coords2[0]) / 2,
+            zoom=13,
+            pitch=0
+        )
+    
+        icon_layer = mapas.capa_puntos(puntos_estaciones(selected_stations), mapas.ICONO_BICI,
+                                       tamano=4, pickable=True)
+    
+        st.pydeck_chart(mapas.Mapa(
+            layers=[icon_layer, route_layer],
+            initial_view_state=view_state,
+            map_style='mapbox://styles/mapbox/light-v9',
+            tooltip=tooltip_estaciones
+        ))
+    
+    # Mostrar el mapa inicial con todas las estaciones
+    else:
+        registros = puntos_estaciones(data)
+        icon_layer = mapas.capa_puntos(registros, mapas.ICONO_BICI, tamano=4, pickable=True)
+    
+        st.pydeck_chart(mapas.Mapa(
+            layers=[icon_layer],
+            initial_view_state=mapas.vista(registros, zoom=13),
+            map_style='mapbox://styles/mapbox/light-v9',
+            tooltip=tooltip_estaciones
+        ))
+
+    
+    st.markdown("""
+    ### User Guide: ValenBici Route Time Calculator
+    
+#### Step 1: Access the Tool
+
+Simply visit our page on the Streamivyt app. The data you will use is updated every minute to ensure accuracy.
+
+#### Step 2: Select Your Stations
+
+In the sidebar, you will find two search fields:
+
+	•	Search Stop 1: Here you can type and select your starting station.
+	•	Search Stop 2: Here you can type and select your destination station.
+
+As you begin to type, the app will display the matching options, making it easy to select.
+
+#### Step 3: Calculate the Route
+
+Once both stations are selected, press the Calculate Route button. Our application will show the estimated biking time straight away, from its table of travel times between all the stations, and draw the route from the Mapbox Directions API.
+
+#### Step 4: View the Route on the Map
+
+After calculating the route:
+
+	•	The estimated travel time will be displayed in the sidebar.
+	•	On the main map, you will see the route marked in red, along with bicycle icons representing the selected stations.
+
+#### Step 5: Continuous Planning
+
+You don’t need to do anything else to keep the information updated. The page will automatically refresh every 60 seconds, ensuring that the information you see is always the latest. This is ideal for keeping your plans up to date without any additional effort.
+
+#### Additional Tips
+
+	•	Use the search function to quickly find your favorite stations.
+	•	Plan your trips according to the estimated time to maximize the use of the free 30-minute period provided by the annual pass.
+
+We hope this tool is extremely useful for your daily commutes in Valence! With ValenBici, getting around the city has never been so easy and convenient.
+    
+    """)
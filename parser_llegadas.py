@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Extracción de próximas llegadas de las páginas del geoportal (metro) y de
+QR.php (EMT) en una sola pasada sobre el HTML, sin construir el árbol DOM.
+
+Cada llegada es un <div> cuyo atributo style contiene 'padding-left: 5px'.
+Dentro de él:
+  - el número de línea es el final del src de la primera <img> (..._3.png -> 3),
+  - el destino es el texto del primer <b>,
+  - el tiempo es el texto del último <span>.
+El resultado es el mismo que daba BeautifulSoup con find_all('div', style=...).
+"""
+
+import re
+from html import unescape
+
+MARCA_LLEGADA = 'padding-left: 5px'
+
+LINEA_DESCONOCIDA = "Desconocido"
+DESTINO_DESCONOCIDO = "Destino desconocido"
+TIEMPO_DESCONOCIDO = "Tiempo desconocido"
+
+# Etiquetas que interesan (apertura o cierre) y comentarios, que se ignoran
+_ETIQUETA = re.compile(r'<!--.*?-->|<(/?)(div|b|span|img)\b((?:[^>"\']|"[^"]*"|\'[^\']*\')*)>',
+                       re.IGNORECASE | re.DOTALL)
+_ATRIBUTO = r'\b{}\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s>]+))'
+_STYLE = re.compile(_ATRIBUTO.format('style'), re.IGNORECASE)
+_SRC = re.compile(_ATRIBUTO.format('src'), re.IGNORECASE)
+# Resto de etiquetas: se eliminan del texto capturado
+_OTRA_ETIQUETA = re.compile(r'<[^>]*>')
+
+
+def _atributo(patron, atributos):
+    encontrado = patron.search(atributos)
+    if encontrado is None:
+        return None
+    valor = encontrado.group(1)
+    if valor is None:
+        valor = encontrado.group(2)
+    if valor is None:
+        valor = encontrado.group(3)
+    return unescape(valor)
+
+
+def _texto(html, inicio, fin):
+    return unescape(_OTRA_ETIQUETA.sub('', html[inicio:fin]))
+
+
+class _Llegada:
+    # Estado de un <div> de llegada mientras se recorre su contenido
+    __slots__ = ('indice', 'profundidad', 'src', 'destino', 'b_inicio', 'b_profundidad',
+                 'tiempo', 'span_inicio', 'span_nivel')
+
+    def __init__(self, indice):
+        self.indice = indice      # Posición en la lista de resultados (orden del documento)
+        self.profundidad = 1      # <div> abiertos dentro de este, incluido él mismo
+        self.src = None
+        self.destino = None
+        self.b_inicio = None      # posición donde empieza el texto del primer <b>
+        self.b_profundidad = 0
+        self.tiempo = None
+        self.span_inicio = None   # posición donde empieza el texto del último <span>
+        self.span_nivel = 0       # nivel de anidamiento del último <span> abierto
+
+
+def extraer_movimientos(html):
+    """Lista de llegadas {"Número de Línea", "Destino", "Tiempo"} de una página de llegadas."""
+    movimientos = []
+    abiertas = []   # Llegadas cuyo <div> sigue abierto (pueden anidarse)
+    spans = 0       # <span> abiertos en este momento
+
+    for etiqueta in _ETIQUETA.finditer(html):
+        nombre = etiqueta.group(2)
+        if nombre is None:
+            continue  # Comentario
+        nombre = nombre.lower()
+        cierre = etiqueta.group(1) == '/'
+
+        if nombre == 'div':
+            if cierre:
+                if abiertas:
+                    for llegada in abiertas:
+                        llegada.profundidad -= 1
+                    while abiertas and abiertas[-1].profundidad == 0:
+                        _terminar(html, abiertas.pop(), etiqueta.start(), movimientos)
+            else:
+                for llegada in abiertas:
+                    llegada.profundidad += 1
+                style = _atributo(_STYLE, etiqueta.group(3))
+                if style is not None and MARCA_LLEGADA in style:
+                    movimientos.append(None)  # Hueco que se rellena al cerrar el div
+                    abiertas.append(_Llegada(len(movimientos) - 1))
+            continue
+
+        if not abiertas:
+            if nombre == 'span':
+                spans += -1 if cierre else 1
+            continue
+
+        if nombre == 'img':
+            if not cierre:
+                for llegada in abiertas:
+                    if llegada.src is None:
+                        src = _atributo(_SRC, etiqueta.group(3))
+                        llegada.src = src if src is not None else ''
+        elif nombre == 'b':
+            for llegada in abiertas:
+                if llegada.destino is not None:
+                    continue
+                if not cierre:
+                    if llegada.b_inicio is None:
+                        llegada.b_inicio = etiqueta.end()
+                    llegada.b_profundidad += 1
+                elif llegada.b_inicio is not None:
+                    llegada.b_profundidad -= 1
+                    if llegada.b_profundidad == 0:
+                        llegada.destino = _texto(html, llegada.b_inicio, etiqueta.start()).strip()
+        else:  # span
+            if not cierre:
+                spans += 1
+                for llegada in abiertas:
+                    llegada.span_inicio = etiqueta.end()
+                    llegada.span_nivel = spans
+                    llegada.tiempo = None
+            else:
+                for llegada in abiertas:
+                    if llegada.span_inicio is not None and llegada.tiempo is None and llegada.span_nivel == spans:
+                        llegada.tiempo = _texto(html, llegada.span_inicio, etiqueta.start()).strip()
+                spans -= 1
+
+    # Divs sin cerrar al final del documento
+    while abiertas:
+        _terminar(html, abiertas.pop(), len(html), movimientos)
+    return movimientos
+
+
+def _terminar(html, llegada, fin, movimientos):
+    src = llegada.src
+    # Elementos sin cerrar dentro del div: su texto llega hasta el cierre del div
+    if llegada.destino is None and llegada.b_inicio is not None:
+        llegada.destino = _texto(html, llegada.b_inicio, fin).strip()
+    if llegada.tiempo is None and llegada.span_inicio is not None:
+        llegada.tiempo = _texto(html, llegada.span_inicio, fin).strip()
+
+    movimientos[llegada.indice] = {
+        "Número de Línea": src.split('_')[-1].split('.')[0] if src is not None else LINEA_DESCONOCIDA,
+        "Destino": llegada.destino if llegada.destino is not None else DESTINO_DESCONOCIDO,
+        "Tiempo": llegada.tiempo if llegada.tiempo is not None else TIEMPO_DESCONOCIDO,
+    }
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Planificador de descargas de llegadas: decide cuándo se vuelve a descargar
+cada estación de metro (prefetch_metro.py) en lugar de descargarlas todas
+cada `periodo` segundos.
+
+El intervalo de cada estación sale de:
+  - la llegada más cercana (segundos_restantes_metro / segundos_restantes_bus,
+    lo mismo que muestran las páginas): una fracción del tiempo que falta,
+    entre `minimo` y `maximo`. Con el próximo tren a 14 minutos no hay nada
+    que refrescar cada pocos segundos; con uno a 30 s, sí;
+  - su interés: las sesiones que la están mirando (cada lectura suma uno y el
+    total se reduce a la mitad cada `vida_interes` segundos) y los
+    suscriptores de avisos. Cuanto más interés, más corto el intervalo
+    (dividido por 1 + log2(1 + interés));
+  - el presupuesto global (peticiones por segundo): si la suma de las tasas
+    deseadas lo supera, todos los intervalos se estiran en la misma
+    proporción, y un cubo de fichas impide pasar de él aunque muchas
+    estaciones venzan a la vez.
+Las estaciones esperan en una cola de prioridad (heapq) ordenada por el
+instante en que les toca; un cambio de intervalo deja la entrada antigua en
+la cola, que se descarta al salir.
+
+Las paradas de EMT, que se descargan bajo demanda, usan solo la primera
+parte: su ttl en CacheLlegadas (ttl_llegadas).
+"""
+
+import heapq
+import math
+import re
+import time
+
+import numpy as np
+
+from tiempos import segundos_restantes_bus, segundos_restantes_metro
+
+# Textos de EMT sin minutos para un autobús que ya está llegando ('Port - En parada', 'Port - Próximo', 'Pròxim')
+_INMINENTE = re.compile(r'en parada|pr[oóò]xim', re.IGNORECASE)
+
+
+def proxima_llegada_metro(horas, ahora=None):
+    """Segundos hasta la llegada más cercana de unas horas 'HH:MM:SS', o None si no hay ninguna válida."""
+    return _minimo(segundos_restantes_metro(list(horas), ahora))
+
+
+def proxima_llegada_bus(textos):
+    """Lo mismo con los textos de EMT ('Port - 10 min')."""
+    return _minimo(segundos_restantes_bus(list(textos)))
+
+
+def _minimo(segundos):
+    segundos = segundos[~np.isnan(segundos)]
+    return float(segundos.min()) if len(segundos) else None
+
+
+def ttl_llegadas(minimo, maximo):
+    """Función movimientos -> ttl para CacheLlegadas (ttl_de): el intervalo de su llegada más cercana.
+    `maximo` solo si no hay ninguna llegada; con llegadas sin hora que se entienda, `minimo`."""
+    def ttl(movimientos):
+        if not movimientos:
+            return maximo
+        textos = [m["Tiempo"] for m in movimientos]
+        if any(_INMINENTE.search(texto) for texto in textos):
+            return minimo
+        restante = proxima_llegada_bus(textos)
+        if restante is None:
+            # Llegadas de metro descargadas bajo demanda ('HH:MM:SS')
+            restante = proxima_llegada_metro(textos)
+        if restante is None:
+            # 'Tiempo desconocido' o un formato nuevo: puede estar llegando, no se deja una hora en caché
+            return minimo
+        return intervalo_deseado(restante, minimo=minimo, maximo=maximo)
+    return ttl
+
+
+def intervalo_deseado(restante, interes=0.0, minimo=2.0, maximo=120.0, fraccion=0.25):
+    """Segundos hasta la siguiente descarga de una estación con la próxima llegada a `restante` segundos."""
+    base = maximo if restante is None else min(max(restante * fraccion, minimo), maximo)
+    return max(minimo, base / (1.0 + math.log2(1.0 + interes)))
+
+
+class Planificador:
+
+    def __init__(self, urls, presupuesto, minimo=2.0, maximo=120.0, fraccion=0.25, vida_interes=60.0,
+                 reloj=time.monotonic):
+        self.presupuesto = presupuesto  # Peticiones por segundo, entre todas las estaciones
+        self.minimo = minimo
+        self.maximo = maximo
+        self.fraccion = fraccion
+        self.vida_interes = vida_interes
+        self._reloj = reloj
+        ahora = reloj()
+        self._cola = [(ahora, url) for url in dict.fromkeys(urls)]  # (le toca en, url)
+        heapq.heapify(self._cola)
+        self._vence = {url: ahora for _, url in self._cola}  # url -> instante vigente en la cola
+        self._restante = {}      # url -> (segundos hasta la próxima llegada o None, instante de la descarga)
+        self._tasas = {}         # url -> descargas por segundo deseadas (1 / intervalo)
+        self.demanda = 0.0       # Suma de las tasas deseadas
+        self._interes = {}       # url -> (valor, instante)
+        self._suscriptores = {}  # url -> número de suscriptores
+        self._fichas = min(1.0, presupuesto)
+        self._repuestas = ahora
+        self.descargas = 0
+        self.limitadas = 0       # Veces que una estación vencida ha tenido que esperar una ficha
+
+    def __len__(self):
+        return len(self._vence)
+
+    # :::::::::::::::::::::::::::::::: INTERÉS ::::::::::::::::::::::::::::::::
+
+    def interes(self, url):
+        valor, instante = self._interes.get(url, (0.0, 0.0))
+        if valor:
+            valor *= 2.0 ** (-(self._reloj() - instante) / self.vida_interes)
+        return valor + self._suscriptores.get(url, 0)
+
+    def ver(self, url, veces=1.0):
+        """Anota `veces` lecturas de `url`; si con ello le toca antes, se adelanta en la cola."""
+        if url not in self._vence:
+            return
+        valor, instante = self._interes.get(url, (0.0, 0.0))
+        ahora = self._reloj()
+        valor = valor * 2.0 ** (-(ahora - instante) / self.vida_interes) + veces
+        self._interes[url] = (valor, ahora)
+        self._reprogramar(url)
+
+    def fijar_suscriptores(self, cuentas):
+        """{url: suscriptores}; sustituye a los anteriores."""
+        cambiadas = set(self._suscriptores) | set(cuentas)
+        self._suscriptores = {url: n for url, n in cuentas.items() if n}
+        for url in cambiadas:
+            self._reprogramar(url)
+
+    # ::::::::::::::::::::::::::::::::: COLA ::::::::::::::::::::::::::::::::::
+
+    def intervalo(self, url):
+        """Intervalo deseado de `url` con su última llegada conocida y su interés, sin el presupuesto."""
+        restante, descargada = self._restante.get(url, (None, None))
+        if restante is not None:
+            # La llegada se acerca desde que se descargó
+            restante -= self._reloj() - descargada
+        return intervalo_deseado(restante, self.interes(url), self.minimo, self.maximo, self.fraccion)
+
+    def escala(self):
+        """Cuánto se estiran los intervalos para que la demanda quepa en el presupuesto (1 si cabe)."""
+        return max(1.0, self.demanda / self.presupuesto)
+
+    def _fijar_tasa(self, url, intervalo):
+        tasa = 1.0 / intervalo
+        self.demanda += tasa - self._tasas.get(url, 0.0)
+        self._tasas[url] = tasa
+
+    def _poner(self, url, vence):
+        self._vence[url] = vence
+        heapq.heappush(self._cola, (vence, url))
+
+    def _reprogramar(self, url):
+        # Solo se adelanta: si le toca después de lo que ya tiene, se espera a su próxima descarga
+        vence = self._vence.get(url)
+        restante, descargada = self._restante.get(url, (None, None))
+        if vence is None or vence == math.inf or descargada is None:
+            # Desconocida, en vuelo o sin descargar aún
+            return
+        intervalo = self.intervalo(url)
+        self._fijar_tasa(url, intervalo)
+        nuevo = descargada + intervalo * self.escala()
+        if nuevo < vence - 0.5:
+            self._poner(url, max(nuevo, self._reloj()))
+
+    def programar(self, url, restante):
+        """Tras descargar `url`: `restante` son los segundos hasta su próxima llegada (None si no hay)."""
+        ahora = self._reloj()
+        self._restante[url] = (restante, ahora)
+        intervalo = self.intervalo(url)
+        self._fijar_tasa(url, intervalo)
+        self._poner(url, ahora + intervalo * self.escala())
+
+    def reintentar(self, url):
+        """Tras una descarga fallida: vuelve a la cola con el intervalo de su última llegada conocida."""
+        ahora = self._reloj()
+        restante, descargada = self._restante.get(url, (None, ahora))
+        self.programar(url, None if restante is None else restante - (ahora - descargada))
+
+    def _reponer(self, ahora):
+        # Cubo de fichas: `presupuesto` por segundo, como mucho las de un segundo acumuladas
+        self._fichas = min(max(1.0, self.presupuesto), self._fichas + (ahora - self._repuestas) * self.presupuesto)
+        self._repuestas = ahora
+
+    def pendientes(self, maximo=None):
+        """Saca de la cola las URLs a las que ya les toca, tantas como permita el presupuesto."""
+        ahora = self._reloj()
+        self._reponer(ahora)
+        urls = []
+        while self._cola and self._cola[0][0] <= ahora and (maximo is None or len(urls) < maximo):
+            vence, url = self._cola[0]
+            if self._vence.get(url) != vence:
+                heapq.heappop(self._cola)  # Entrada antigua: la estación se reprogramó
+                continue
+            if self._fichas < 1.0:
+                self.limitadas += 1
+                break
+            heapq.heappop(self._cola)
+            self._fichas -= 1.0
+            # En vuelo: no vuelve a la cola hasta programar() o reintentar()
+            self._vence[url] = math.inf
+            urls.append(url)
+        self.descargas += len(urls)
+        return urls
+
+    def espera(self):
+        """Segundos hasta que le toque a la siguiente URL (o haya ficha para ella)."""
+        ahora = self._reloj()
+        while self._cola and self._vence.get(self._cola[0][1]) != self._cola[0][0]:
+            heapq.heappop(self._cola)
+        if not self._cola:
+            return self.maximo
+        espera = self._cola[0][0] - ahora
+        if self._fichas < 1.0:
+            espera = max(espera, (1.0 - self._fichas) / self.presupuesto)
+        return max(0.0, espera)
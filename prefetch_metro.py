@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Motor de precarga en segundo plano de las llegadas de todas las estaciones de metro.
+
+Un hilo propio ejecuta un bucle de asyncio que descarga las URLs de próximas
+llegadas de fgv-bocas.csv con un número acotado de descargas simultáneas. Cuándo
+se vuelve a descargar cada estación lo decide un Planificador (planificador.py)
+según su próximo tren, cuántas sesiones la miran (ver()) y sus suscriptores de
+avisos, sin pasar de `presupuesto` peticiones por segundo entre todas (por
+defecto las mismas que descargarlas todas cada `periodo` segundos). Al terminar
+cada tanda publica una instantánea inmutable que las páginas leen sin hacer
+ninguna petición de red.
+
+Con un almacén compartido (almacen_compartido.py) solo el proceso que tiene
+el arrendamiento 'metro' descarga las estaciones y guarda cada ronda en él;
+el resto lee cada segundo las estaciones que han cambiado, publica con ellas
+su propia instantánea y le pasa al líder por el almacén lo que miran sus
+sesiones. Solo el líder llama a `al_publicar`, así que el histórico no se
+duplica.
+"""
+
+import asyncio
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime
+from types import MappingProxyType
+
+from planificador import Planificador, proxima_llegada_metro
+
+# Una llegada: (número de línea, destino, hora)
+Movimiento = namedtuple('Movimiento', ['linea', 'destino', 'tiempo'])
+
+# Resultado de una ronda completa: instante de publicación, url -> tupla de Movimiento y
+# url -> instante de su última descarga buena (si una estación falla se publica la anterior)
+Instantanea = namedtuple('Instantanea', ['creada', 'llegadas', 'actualizadas'])
+
+INSTANTANEA_VACIA = Instantanea(0.0, MappingProxyType({}), MappingProxyType({}))
+
+
+def a_movimientos(movimientos):
+    # Convierte la salida de descargar_movimientos en tuplas inmutables
+    return tuple(Movimiento(m["Número de Línea"], m["Destino"], m["Tiempo"]) for m in movimientos)
+
+
+def a_diccionarios(movimientos):
+    # Formato que esperan las páginas (el mismo que descargar_movimientos)
+    return [{"Número de Línea": m.linea, "Destino": m.destino, "Tiempo": m.tiempo} for m in movimientos]
+
+
+class PrefetchMetro:
+
+    # Cada cuánto mira el almacén un proceso que no es el líder
+    ESPERA_SEGUIDOR = 1.0
+    # Cada cuánto se vuelven a leer los suscriptores de avisos
+    ESPERA_SUSCRIPTORES = 60.0
+
+    def __init__(self, urls, cargar, periodo=10.0, concurrencia=8, al_publicar=None, almacen=None,
+                 presupuesto=None, intervalo_minimo=2.0, intervalo_maximo=120.0, suscriptores=None, al_ceder=None):
+        self.urls = tuple(dict.fromkeys(urls))  # Sin duplicados, conservando el orden
+        self.cargar = cargar
+        self.periodo = periodo
+        self.concurrencia = concurrencia
+        self.al_publicar = al_publicar  # Se llama con cada instantánea nueva (p. ej. el histórico)
+        self.al_ceder = al_ceder  # Se llama al dejar de ser el líder o al detenerse (p. ej. volcar el histórico)
+        self._era_lider = False
+        self.almacen = almacen
+        self.suscriptores = suscriptores  # Función que devuelve {url: suscriptores}
+        self.planificador = Planificador(self.urls, presupuesto or max(len(self.urls), 1) / periodo,
+                                         minimo=intervalo_minimo, maximo=intervalo_maximo)
+        self._vistas = {}  # url -> lecturas de las sesiones aún no pasadas al planificador
+        self._lock_vistas = threading.Lock()
+        self._vistas_leidas = 0  # id de la última vista de otro proceso leída del almacén
+        self._suscriptores_leidos = -float('inf')
+        self._leida = 0  # Versión de la última descarga leída del almacén
+        self._instantanea = INSTANTANEA_VACIA
+        self._hilo = None
+        self._loop = None
+        self._parar = None
+        self.rondas = 0
+        self.lecturas = 0  # Instantáneas publicadas con lo leído del almacén
+        self.errores = 0
+
+    def instantanea(self):
+        # Lectura sin bloqueo: la referencia se sustituye de forma atómica
+        return self._instantanea
+
+    def llegadas(self, url):
+        """Llegadas de la última ronda para `url`, o None si aún no se han descargado."""
+        return self._instantanea.llegadas.get(url)
+
+    def edad(self, url):
+        """Segundos desde la última descarga buena de `url`, o None si aún no hay ninguna."""
+        actualizada = self._instantanea.actualizadas.get(url)
+        return None if actualizada is None else time.time() - actualizada
+
+    def ver(self, url):
+        """Anota que una sesión está mirando `url`: el planificador la descarga más a menudo."""
+        with self._lock_vistas:
+            self._vistas[url] = self._vistas.get(url, 0) + 1
+
+    @property
+    def descargas(self):
+        return self.planificador.descargas
+
+    def iniciar(self):
+        if self._hilo is None:
+            self._hilo = threading.Thread(target=self._ejecutar, name='prefetch-metro', daemon=True)
+            self._hilo.start()
+        return self
+
+    def detener(self):
+        if self._loop is not None and self._parar is not None:
+            self._loop.call_soon_threadsafe(self._parar.set)
+        if self._hilo is not None:
+            self._hilo.join()
+            self._hilo = None
+        self._ceder()
+        if self.almacen is not None:
+            self.almacen.soltar('metro')
+
+    def _ejecutar(self):
+        self._loop = asyncio.new_event_loop()
+        try:
+            self._loop.run_until_complete(self._bucle())
+        finally:
+            self._loop.close()
+            self._loop = None
+
+    async def _bucle(self):
+        self._parar = asyncio.Event()
+        semaforo = asyncio.Semaphore(self.concurrencia)
+        while not self._parar.is_set():
+            lider = self._lider()
+            if self._era_lider and not lider:
+                self._ceder()
+            self._era_lider = lider
+            self._anotar_interes(lider)
+            if lider:
+                await self.ronda(semaforo)
+                # Hasta que le toque a la primera estación de la cola; al menos cada `periodo`
+                # se vuelve a mirar para renovar el arrendamiento y pasar las vistas
+                espera = min(max(self.planificador.espera(), 0.05), self.periodo)
+            else:
+                try:
+                    self.leer_almacen()
+                except Exception:
+                    self.errores += 1
+                espera = min(self.periodo, self.ESPERA_SEGUIDOR)
+            try:
+                await asyncio.wait_for(self._parar.wait(), timeout=espera)
+            except asyncio.TimeoutError:
+                pass
+
+    def _lider(self):
+        if self.almacen is None:
+            return True
+        try:
+            return self.almacen.liderar('metro', 3 * self.periodo)
+        except Exception:
+            # Sin almacén utilizable cada proceso descarga por su cuenta
+            self.errores += 1
+            return True
+
+    def _ceder(self):
+        if self._era_lider and self.al_ceder is not None:
+            try:
+                self.al_ceder()
+            except Exception:
+                self.errores += 1
+        self._era_lider = False
+
+    def _anotar_interes(self, lider):
+        # Vistas de las sesiones de este proceso (y, si es el líder, de los demás) y suscriptores
+        with self._lock_vistas:
+            vistas, self._vistas = self._vistas, {}
+        try:
+            if not lider:
+                if vistas:
+                    self.almacen.anotar_vistas(vistas)
+                return
+            if self.almacen is not None:
+                for id_, url, veces in self.almacen.vistas_desde(self._vistas_leidas):
+                    vistas[url] = vistas.get(url, 0) + veces
+                    self._vistas_leidas = max(self._vistas_leidas, id_)
+            for url, veces in vistas.items():
+                self.planificador.ver(url, veces)
+            ahora = time.monotonic()
+            if self.suscriptores is not None and ahora - self._suscriptores_leidos > self.ESPERA_SUSCRIPTORES:
+                self._suscriptores_leidos = ahora
+                self.planificador.fijar_suscriptores(self.suscriptores())
+        except Exception:
+            self.errores += 1
+
+    async def ronda(self, semaforo=None):
+        """Descarga las estaciones a las que les toca según el planificador y publica una instantánea."""
+        semaforo = semaforo or asyncio.Semaphore(self.concurrencia)
+        urls = self.planificador.pendientes()
+        if not urls:
+            return
+
+        async def descargar(url):
+            async with semaforo:
+                try:
+                    return url, a_movimientos(await asyncio.to_thread(self.cargar, url))
+                except Exception:
+                    self.errores += 1
+                    return url, None
+
+        resultados = await asyncio.gather(*(descargar(url) for url in urls))
+
+        # Si una estación falla se conserva su último resultado bueno, con su fecha
+        ahora = time.time()
+        llegadas = dict(self._instantanea.llegadas)
+        actualizadas = dict(self._instantanea.actualizadas)
+        for url, movimientos in resultados:
+            if movimientos is not None:
+                llegadas[url] = movimientos
+                actualizadas[url] = ahora
+                # La próxima descarga, según lo que falta para el tren más cercano
+                self.planificador.programar(url, proxima_llegada_metro(
+                    [m.tiempo for m in movimientos], datetime.fromtimestamp(ahora)))
+            else:
+                self.planificador.reintentar(url)
+        self._instantanea = Instantanea(ahora, MappingProxyType(llegadas), MappingProxyType(actualizadas))
+        self.rondas += 1
+        if self.almacen is not None:
+            try:
+                self.almacen.guardar_llegadas({url: m for url, m in resultados if m is not None}, ahora)
+            except Exception:
+                self.errores += 1
+        if self.al_publicar is not None:
+            try:
+                self.al_publicar(self._instantanea)
+            except Exception:
+                self.errores += 1
+
+    def leer_almacen(self):
+        """Publica una instantánea con las estaciones que el líder ha guardado desde la última lectura."""
+        # El almacén también guarda paradas de EMT: solo se leen (y hacen avanzar la versión) las de este motor
+        nuevas = self.almacen.llegadas_desde(self._leida, self.urls)
+        if not nuevas:
+            return
+        self._leida = max(version for _, version, _, _ in nuevas)
+        llegadas = dict(self._instantanea.llegadas)
+        actualizadas = dict(self._instantanea.actualizadas)
+        for url, _, actualizada, movimientos in nuevas:
+            llegadas[url] = movimientos
+            actualizadas[url] = actualizada
+        self._instantanea = Instantanea(max(actualizadas.values()), MappingProxyType(llegadas),
+                                        MappingProxyType(actualizadas))
+        self.lecturas += 1
@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Recursos compartidos por todas las sesiones y páginas de la aplicación.
+
+Cada recurso es una función con @st.cache_resource: se crea la primera vez
+que una página lo pide y después lo comparten todas las sesiones del
+proceso. Los módulos de datos (pandas, numpy, requests, pydeck...) se
+importan dentro de cada función, así que una página solo paga la carga de lo
+que usa: 'Home' no importa ninguno.
+"""
+
+import os
+
+import streamlit as st
+
+import metricas
+
+# Número máximo de sugerencias mostradas al escribir en un buscador
+MAX_SUGERENCIAS = 50
+
+# Intervalo de actualización de cada página, en segundos. Con st.fragment(run_every=...)
+# es el navegador quien pide la actualización: entre una y otra la sesión no ocupa
+# ningún hilo del servidor, y solo se vuelve a ejecutar la zona de llegadas. Por defecto,
+# los mismos intervalos que con time.sleep + rerun: 1 s en metro y 60 s en EMT (cada
+# refresco de EMT puede descargar la parada, así que bajarlo sube las peticiones a EMT)
+REFRESCO_METRO = float(os.environ.get('VALENCIA_REFRESCO_METRO', 1))
+REFRESCO_EMT = float(os.environ.get('VALENCIA_REFRESCO_EMT', 60))
+REFRESCO_FAVORITOS = float(os.environ.get('VALENCIA_REFRESCO_FAVORITOS', 15))
+
+# Edad (segundos) a partir de la cual las llegadas se marcan como antiguas: el servicio
+# no responde y se muestran las últimas que se pudieron descargar
+EDAD_AVISO = float(os.environ.get('VALENCIA_EDAD_AVISO', 60))
+
+
+# ::::::::::::::::::::::::::::::: DATOS :::::::::::::::::::::::::::::::::::
+
+# Tablas del paquete binario como DataFrame, una vez por proceso (no se modifican)
+@st.cache_resource
+def tabla(nombre):
+    import datos_estaticos
+    return datos_estaticos.paquete()[nombre].a_dataframe()
+
+# Nombre -> URL de llegadas de metro y de EMT (la primera fila de cada nombre)
+@st.cache_resource
+def urls_llegadas():
+    import datos_estaticos
+    paquete = datos_estaticos.paquete()
+    metro, emt = {}, {}
+    for nombre, url in zip(paquete['metro']['Denominació / Denominación'],
+                           paquete['metro']['Pròximes Arribades / Próximas llegadas']):
+        metro.setdefault(str(nombre), str(url))
+    for nombre, url in zip(paquete['emt']['Denominació / Denominación'],
+                           paquete['emt']['Pròximes Arribades / Proximas Llegadas']):
+        emt.setdefault(str(nombre), str(url))
+    return metro, emt
+
+# Índices de búsqueda por nombre (y número de parada en EMT), compartidos por todas las sesiones
+@st.cache_resource
+def indice_metro():
+    import datos_estaticos
+    from buscador import IndiceBusqueda
+    return IndiceBusqueda(datos_estaticos.paquete()['metro']['Denominació / Denominación'])
+
+@st.cache_resource
+def indice_emt():
+    import datos_estaticos
+    from buscador import IndiceBusqueda
+    tabla = datos_estaticos.paquete()['emt']
+    return IndiceBusqueda(tabla['Denominació / Denominación'], tabla['Id. Parada'])
+
+# Línea -> paradas de metro o de EMT ('metro' o 'emt'), para filtrar mapas y buscadores por línea
+@st.cache_resource
+def indice_lineas(nombre):
+    import datos_estaticos
+    from indice_lineas import IndiceLineas
+    tabla = datos_estaticos.paquete()[nombre]
+    return IndiceLineas(tabla['Línies / Líneas'], tabla['Denominació / Denominación'])
+
+# Índice espacial de metro, EMT y ValenBici para buscar paradas cercanas
+@st.cache_resource
+def indice_transporte():
+    import datos_estaticos
+    from indice_espacial import IndiceTransporte
+    return IndiceTransporte.desde_paquete(datos_estaticos.paquete())
+
+
+# Paradas de metro o de EMT ('metro' o 'emt') que encuentra el buscador para `consulta`,
+# solo entre las servidas por alguna de `lineas` si se indica alguna
+def buscar_paradas(nombre, consulta, lineas=()):
+    indice = indice_metro() if nombre == 'metro' else indice_emt()
+    k = MAX_SUGERENCIAS if consulta else None
+    if not lineas:
+        return indice.buscar(consulta, k=k)
+    servidas = indice_lineas(nombre)
+    permitidas = set(servidas.nombres(servidas.union(lineas)))
+    return [n for n in indice.buscar(consulta) if n in permitidas][:k]
+
+
+# :::::::::::::::::::::::::::::: MOTORES ::::::::::::::::::::::::::::::::::
+
+# Almacén de instantáneas compartido con los demás procesos de la máquina (VALENCIA_ALMACEN),
+# o None si este proceso trabaja solo
+@st.cache_resource
+def almacen():
+    import almacen_compartido
+    compartido = almacen_compartido.abrir()
+    if compartido is not None:
+        metricas.CACHES.vigilar('almacen', compartido, acierto='aciertos', fallo='fallos')
+    return compartido
+
+# Descarga de las llegadas de una estación o parada; con almacén compartido, antes mira si
+# otro proceso la acaba de descargar
+@st.cache_resource
+def cargar_llegadas():
+    from llegadas import descargar_movimientos
+    if almacen() is None:
+        return descargar_movimientos
+    return almacen().cargador(descargar_movimientos, frescura=cache_llegadas().ttl)
+
+# Caché de llegadas compartida por todas las sesiones del proceso
+@st.cache_resource
+def cache_llegadas():
+    from cache_llegadas import CacheLlegadas
+    from planificador import ttl_llegadas
+    # El ttl de cada parada va de VALENCIA_TTL_LLEGADAS a VALENCIA_TTL_MAX_LLEGADAS según su próxima llegada
+    ttl = float(os.environ.get('VALENCIA_TTL_LLEGADAS', 5))
+    cache = CacheLlegadas(ttl=ttl,
+                          max_entradas=int(os.environ.get('VALENCIA_MAX_ESTACIONES', 512)),
+                          max_edad=float(os.environ.get('VALENCIA_MAX_EDAD_LLEGADAS', 600)),
+                          ttl_de=ttl_llegadas(ttl, float(os.environ.get('VALENCIA_TTL_MAX_LLEGADAS', 60))))
+    metricas.CACHES.vigilar('llegadas', cache, acierto='aciertos', fallo='fallos', obsoleta='obsoletas')
+    return cache
+
+# Hilos para descargar varias estaciones a la vez (página de favoritos); el límite
+# por host lo pone cliente_http
+@st.cache_resource
+def ejecutor_llegadas():
+    from concurrent.futures import ThreadPoolExecutor
+    return ThreadPoolExecutor(max_workers=int(os.environ.get('VALENCIA_HILOS_LLEGADAS', 16)),
+                              thread_name_prefix='llegadas')
+
+# Histórico de llegadas y de disponibilidad de ValenBici, alimentado por los motores
+@st.cache_resource
+def historico():
+    from historico import Historico
+    return Historico(intervalo=float(os.environ.get('VALENCIA_VOLCADO_HISTORICO', 900)), almacen=almacen())
+
+# Motor de precarga de todas las estaciones de metro, uno por proceso. Descarga cada estación
+# según su próximo tren, quién la mira y sus suscriptores, sin pasar de VALENCIA_PRESUPUESTO_METRO
+# peticiones por segundo (por defecto, las de descargarlas todas cada VALENCIA_PERIODO_METRO s)
+@st.cache_resource
+def motor_metro():
+    import datos_estaticos
+    from llegadas import descargar_movimientos
+    from prefetch_metro import PrefetchMetro
+    urls = datos_estaticos.paquete()['metro']['Pròximes Arribades / Próximas llegadas']
+    motor = PrefetchMetro(urls, descargar_movimientos,
+                          periodo=float(os.environ.get('VALENCIA_PERIODO_METRO', 10)),
+                          concurrencia=int(os.environ.get('VALENCIA_CONCURRENCIA_METRO', 8)),
+                          al_publicar=historico().registrar_metro, al_ceder=historico().metro.volcar,
+                          almacen=almacen(),
+                          presupuesto=float(os.environ.get('VALENCIA_PRESUPUESTO_METRO', 0)) or None,
+                          intervalo_minimo=float(os.environ.get('VALENCIA_INTERVALO_MIN_METRO', 2)),
+                          intervalo_maximo=float(os.environ.get('VALENCIA_INTERVALO_MAX_METRO', 120)),
+                          suscriptores=lambda: {url: len(suscripciones) for url, suscripciones
+                                                in almacen_suscripciones().por_estacion().items()})
+    metricas.EVENTOS.vigilar('prefetch_metro', motor, rondas='rondas', descargas='descargas', lecturas='lecturas',
+                             errores='errores')
+    return motor.iniciar()
+
+# Suscripciones a los avisos por correo (las atiende el proceso notificador.py)
+@st.cache_resource
+def almacen_suscripciones():
+    from notificador import AlmacenSuscripciones
+    return AlmacenSuscripciones()
+
+# Disponibilidad de ValenBici, actualizada en segundo plano para todas las sesiones
+@st.cache_resource
+def servicio_valenbici():
+    from valenbici import ServicioValenBici
+    servicio = ServicioValenBici(periodo=float(os.environ.get('VALENCIA_PERIODO_VALENBICI', 60)),
+                                 al_publicar=historico().registrar_valenbici,
+                                 al_ceder=historico().valenbici.volcar, almacen=almacen())
+    metricas.EVENTOS.vigilar('valenbici', servicio, descargas='descargas', no_modificadas='no_modificadas',
+                             estaciones_cambiadas='estaciones_cambiadas', lecturas='lecturas', errores='errores')
+    return servicio.iniciar()
+
+# Rutas entre estaciones de ValenBici: caché en memoria y en disco, y matriz de duraciones
+@st.cache_resource
+def servicio_rutas():
+    import datos_estaticos
+    from rutas import AlmacenRutas, ServicioRutas, matriz_o_estimacion
+    tabla = datos_estaticos.paquete()['valenbici']
+    servicio = ServicioRutas(AlmacenRutas(), matriz_o_estimacion(tabla['Numero'], tabla['lat'], tabla['lon']),
+                             max_entradas=int(os.environ.get('VALENCIA_MAX_RUTAS', 4096)))
+    metricas.CACHES.vigilar('rutas', servicio, acierto_memoria='aciertos_memoria', acierto_disco='aciertos_disco',
+                            acierto_matriz='aciertos_matriz', fallo='descargas', sin_servicio='sin_servicio')
+    return servicio
+
+# Servidor de métricas (VALENCIA_METRICAS_PUERTO), uno por proceso
+@st.cache_resource
+def servidor_metricas():
+    return metricas.servir() if metricas.PUERTO else None
+
+
+# ::::::::::::::::::::::::::::: LLEGADAS ::::::::::::::::::::::::::::::::::
+
+# Filas del panel de llegadas de una estación o parada (delta_llegadas.py) y segundos desde
+# que se descargaron. Las de metro salen de la última instantánea del motor, sin red; si el
+# motor aún no la tiene, o es de EMT, de la caché. Si el servicio no responde pueden ser las
+# de hace un rato (la caché las revalida en segundo plano); si no hay ninguna se propaga
+# requests.RequestException
+def filas_llegadas(modo, url):
+    import time
+    from delta_llegadas import filas_bus, filas_metro
+    from prefetch_metro import a_diccionarios
+    if modo == 'metro':
+        motor = motor_metro()
+        motor.ver(url)
+        movimientos = motor.llegadas(url)
+        if movimientos is not None:
+            filas = filas_compartidas().obtener(
+                url, movimientos, lambda: filas_metro(a_diccionarios(movimientos)))
+            return filas, motor.edad(url)
+    cache = cache_llegadas()
+    llegadas = cache.obtener(url, cargar_llegadas())
+    edad = cache.edad(url)
+    if modo == 'metro':
+        return filas_compartidas().obtener(url, llegadas, lambda: filas_metro(llegadas)), edad
+    # Los minutos de EMT cuentan desde la descarga, no desde ahora
+    descargada = time.time() - (edad or 0.0)
+    return filas_compartidas().obtener(url, llegadas, lambda: filas_bus(llegadas, descargada)), edad
+
+# Marca con la antigüedad de las llegadas; aviso si el servicio lleva un rato sin responder
+def mostrar_edad(edad, aviso=EDAD_AVISO):
+    if edad is None:
+        return
+    if edad < aviso:
+        st.caption(f"Updated {edad:.0f} s ago.")
+    else:
+        hace = f"{edad / 60:.0f} min" if edad >= 120 else f"{edad:.0f} s"
+        st.warning(f"The service is not responding: showing the data from {hace} ago. "
+                   "It will update as soon as the service is back.")
+
+# Panel de llegadas que recibe solo lo que cambia (delta_llegadas.py) y lleva la cuenta atrás
+# en el navegador. Segundos que se puede mover una llegada sin volver a enviarla: EMT da minutos
+TOLERANCIA_PANEL = {'metro': 1.0, 'emt': 60.0}
+
+@st.cache_resource
+def filas_compartidas():
+    from delta_llegadas import FilasCompartidas
+    return FilasCompartidas()
+
+@st.cache_resource
+def componente_llegadas():
+    import streamlit.components.v1 as components
+    ruta = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'componentes', 'llegadas')
+    return components.declare_component('llegadas', path=ruta)
+
+# Pinta las llegadas de `url` ('metro' o 'emt') con las filas de filas_llegadas. Lo enviado a cada sesión se guarda en su session_state, un tablero por estación
+def panel_llegadas(modo, url, filas):
+    from delta_llegadas import TableroLlegadas
+    clave = f'tablero_{modo}'
+    guardado = st.session_state.get(clave)
+    if guardado is None or guardado[0] != url:
+        guardado = (url, TableroLlegadas(tolerancia=TOLERANCIA_PANEL[modo]))
+        st.session_state[clave] = guardado
+    tablero = guardado[1]
+
+    # El panel pide la tabla completa si le falta un mensaje (p. ej. al volver a la página)
+    peticion = st.session_state.get(f'panel_{modo}')
+    completa = bool(peticion) and peticion.get('completa') != tablero.atendida
+    if completa:
+        tablero.atendida = peticion['completa']
+    mensaje = tablero.actualizar(filas, completa=completa)
+    componente_llegadas()(modo=modo, mensaje=mensaje, key=f'panel_{modo}', default=None)
+
+# Tiempo restante hasta una llegada; para varias a la vez usar tiempos.tiempos_restantes_metro
+def calcular_tiempo_restante(hora_llegada):
+    from tiempos import tiempos_restantes_metro
+    return tiempos_restantes_metro([hora_llegada])[0]
+
+def calcular_tiempo_restante_bus(hora_llegada):
+    from tiempos import tiempos_restantes_bus
+    return tiempos_restantes_bus([hora_llegada])[0]
@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Rutas en bici entre estaciones de ValenBici.
+
+Con unas 276 estaciones el número de pares posibles es finito. La duración
+se contesta siempre sin red: la de la ruta ya guardada si la hay y, si no, la
+de una matriz con todos los pares (rutas_matriz.npz), que se rellena fuera de
+línea:
+
+    python rutas.py                  # estimación por distancia haversine
+    python rutas.py --mapbox         # duraciones reales con Mapbox Matrix
+
+La geometría para el mapa se pide a Mapbox Directions solo cuando hace falta
+(geometria(), o pedir_geometria() para no esperarla; una descarga por par
+aunque la pidan varias sesiones a la vez) y se guarda para siempre:
+  - en memoria, con un máximo de entradas (LRU), para las más consultadas,
+  - en disco (SQLite, rutas.db), por par de números de estación, con la
+    geometría codificada como polilínea (el formato que Mapbox devuelve con
+    geometries=polyline, unos 10 bytes por punto en lugar de ~40 en GeoJSON).
+
+Si Mapbox no responde, el mapa muestra una línea recta entre las dos
+estaciones.
+"""
+
+import argparse
+import logging
+import math
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+
+import cliente_http
+import metricas
+from indice_espacial import haversine
+
+log = logging.getLogger('rutas')
+
+DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+RUTA_RUTAS = os.environ.get('VALENCIA_RUTAS', os.path.join(DIRECTORIO, 'rutas.db'))
+RUTA_MATRIZ = os.environ.get('VALENCIA_MATRIZ_RUTAS', os.path.join(DIRECTORIO, 'rutas_matriz.npz'))
+
+MAPBOX_KEY = os.environ.get(
+    'VALENCIA_MAPBOX_KEY',
+    'sk.eyJ1IjoibXJvY3ZhbDAxOCIsImEiOiJjbHdxb2YzbnQwNHkxMmlzN3FiYjhmdjM2In0.OMAngKqcq66vxUyM8MeKWw')
+URL_DIRECCIONES = 'https://api.mapbox.com/directions/v5/mapbox/cycling'
+URL_MATRIZ = 'https://api.mapbox.com/directions-matrix/v1/mapbox/cycling'
+MAX_COORDENADAS_MATRIZ = 25  # Límite de Mapbox Matrix por petición
+
+# Estimación sin servicio de rutas: la distancia en línea recta por un factor de
+# rodeo típico de una trama urbana, a la velocidad media de una bici compartida
+FACTOR_RODEO = 1.35
+VELOCIDAD_BICI = 4.2  # m/s, unos 15 km/h
+
+# De dónde sale una ruta: Mapbox Directions, la matriz medida con Mapbox Matrix o la estimación por distancia
+FUENTE_MAPBOX, FUENTE_MATRIZ, FUENTE_ESTIMADA = 'mapbox', 'matriz', 'estimada'
+
+# duracion en segundos, distancia en metros, geometria como polilínea
+Ruta = namedtuple('Ruta', ['duracion', 'distancia', 'geometria', 'fuente'])
+
+
+# ::::::::::::::::::::::::::::: POLILÍNEAS ::::::::::::::::::::::::::::::::
+
+def codificar_polilinea(coordenadas, precision=5):
+    """[[lon, lat], ...] -> polilínea (algoritmo de Google, lat antes que lon)."""
+    factor = 10 ** precision
+    resultado = []
+    anterior = (0, 0)
+    for lon, lat in coordenadas:
+        actual = (int(round(lat * factor)), int(round(lon * factor)))
+        for valor in (actual[0] - anterior[0], actual[1] - anterior[1]):
+            valor = ~(valor << 1) if valor < 0 else valor << 1
+            while valor >= 0x20:
+                resultado.append(chr((0x20 | (valor & 0x1f)) + 63))
+                valor >>= 5
+            resultado.append(chr(valor + 63))
+        anterior = actual
+    return ''.join(resultado)
+
+
+def decodificar_polilinea(texto, precision=5):
+    """Polilínea -> [[lon, lat], ...], el orden de las coordenadas de GeoJSON y pydeck."""
+    factor = 10 ** precision
+    coordenadas = []
+    lat = lon = 0
+    i = 0
+    while i < len(texto):
+        deltas = []
+        for _ in range(2):
+            valor = desplazamiento = 0
+            while True:
+                byte = ord(texto[i]) - 63
+                i += 1
+                valor |= (byte & 0x1f) << desplazamiento
+                desplazamiento += 5
+                if byte < 0x20:
+                    break
+            deltas.append(~(valor >> 1) if valor & 1 else valor >> 1)
+        lat += deltas[0]
+        lon += deltas[1]
+        coordenadas.append([lon / factor, lat / factor])
+    return coordenadas
+
+
+# ::::::::::::::::::::::::::::::: MATRIZ :::::::::::::::::::::::::::::::::
+
+def duracion_estimada(distancia):
+    return distancia * FACTOR_RODEO / VELOCIDAD_BICI
+
+
+class MatrizDuraciones:
+    """Duración en segundos entre cada par de estaciones, por número de estación."""
+
+    def __init__(self, numeros, duraciones, medidas=None):
+        self.numeros = np.asarray(numeros, dtype=np.int32)
+        self.duraciones = np.asarray(duraciones, dtype=np.float32)
+        # True donde la duración viene de Mapbox y no de la estimación
+        self.medidas = (np.zeros(self.duraciones.shape, dtype=bool) if medidas is None
+                        else np.asarray(medidas, dtype=bool))
+        self._posicion = {int(n): i for i, n in enumerate(self.numeros)}
+
+    def __len__(self):
+        return len(self.numeros)
+
+    def duracion(self, origen, destino):
+        """(segundos, medida) o None si alguna estación no está en la matriz."""
+        i, j = self._posicion.get(origen), self._posicion.get(destino)
+        if i is None or j is None or math.isnan(self.duraciones[i, j]):
+            return None
+        return float(self.duraciones[i, j]), bool(self.medidas[i, j])
+
+    @classmethod
+    def estimar(cls, numeros, lat, lon):
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        distancias = haversine(lat[:, None], lon[:, None], lat[None, :], lon[None, :])
+        return cls(numeros, duracion_estimada(distancias))
+
+    def guardar(self, ruta=RUTA_MATRIZ):
+        temporal = f'{ruta}.{os.getpid()}.tmp.npz'
+        np.savez_compressed(temporal, numeros=self.numeros, duraciones=self.duraciones, medidas=self.medidas)
+        os.replace(temporal, ruta)
+        return ruta
+
+    @classmethod
+    def cargar(cls, ruta=RUTA_MATRIZ):
+        with np.load(ruta) as datos:
+            return cls(datos['numeros'], datos['duraciones'], datos['medidas'])
+
+
+def matriz_mapbox(numeros, lat, lon, token=MAPBOX_KEY, pausa=1.0):
+    """Matriz con duraciones de Mapbox Matrix; los bloques que fallan quedan estimados."""
+    matriz = MatrizDuraciones.estimar(numeros, lat, lon)
+    n = len(matriz)
+    # Cada petición admite 25 coordenadas: bloques de 12 orígenes por 13 destinos
+    paso_o, paso_d = MAX_COORDENADAS_MATRIZ // 2, MAX_COORDENADAS_MATRIZ - MAX_COORDENADAS_MATRIZ // 2
+    for i in range(0, n, paso_o):
+        for j in range(0, n, paso_d):
+            origenes, destinos = range(i, min(i + paso_o, n)), range(j, min(j + paso_d, n))
+            indices = list(origenes) + list(destinos)
+            coordenadas = ';'.join(f'{lon[k]},{lat[k]}' for k in indices)
+            try:
+                response = cliente_http.get(f'{URL_MATRIZ}/{coordenadas}', params={
+                    'access_token': token,
+                    'sources': ';'.join(map(str, range(len(origenes)))),
+                    'destinations': ';'.join(map(str, range(len(origenes), len(indices)))),
+                })
+                response.raise_for_status()
+                bloque = np.array(response.json()['durations'], dtype=np.float64)
+            except Exception as e:
+                log.warning('Bloque %d-%d sin respuesta de Mapbox, se queda estimado: %s', i, j, type(e).__name__)
+                continue
+            validos = ~np.isnan(bloque)
+            zona = np.ix_(origenes, destinos)
+            matriz.duraciones[zona] = np.where(validos, bloque, matriz.duraciones[zona])
+            matriz.medidas[zona] = validos
+            time.sleep(pausa)  # Límite de peticiones por minuto de Mapbox Matrix
+    return matriz
+
+
+# :::::::::::::::::::::::::::::: RUTAS ::::::::::::::::::::::::::::::::::
+
+def descargar_ruta(origen, destino, token=MAPBOX_KEY):
+    """(segundos, metros, polilínea) de Mapbox Directions entre dos puntos (lon, lat)."""
+    url = f"{URL_DIRECCIONES}/{origen[0]},{origen[1]};{destino[0]},{destino[1]}"
+    response = cliente_http.get(url, params={"access_token": token, "geometries": "polyline"})
+    response.raise_for_status()
+    with metricas.PARSER.cronometrar('mapbox'):
+        ruta = response.json()['routes'][0]
+    return ruta['duration'], ruta['distance'], ruta['geometry']
+
+
+class AlmacenRutas:
+    """Rutas de Mapbox por (estación de origen, estación de destino), en SQLite."""
+
+    def __init__(self, ruta=RUTA_RUTAS):
+        self.ruta = ruta
+        with self._conexion() as conexion:
+            conexion.execute("""
+                CREATE TABLE IF NOT EXISTS rutas (
+                    origen INTEGER NOT NULL,
+                    destino INTEGER NOT NULL,
+                    duracion REAL NOT NULL,
+                    distancia REAL NOT NULL,
+                    geometria TEXT NOT NULL,
+                    creada REAL NOT NULL,
+                    PRIMARY KEY (origen, destino)
+                ) WITHOUT ROWID""")
+
+    def _conexion(self):
+        # Una conexión por operación, como en notificador.AlmacenSuscripciones
+        conexion = sqlite3.connect(self.ruta, timeout=10)
+        conexion.execute('PRAGMA journal_mode=WAL')
+        return conexion
+
+    def obtener(self, origen, destino):
+        with self._conexion() as conexion:
+            fila = conexion.execute('SELECT duracion, distancia, geometria FROM rutas WHERE origen = ? AND destino = ?',
+                                    (origen, destino)).fetchone()
+        return None if fila is None else Ruta(*fila, FUENTE_MAPBOX)
+
+    def guardar(self, origen, destino, ruta):
+        with self._conexion() as conexion:
+            conexion.execute('INSERT OR REPLACE INTO rutas VALUES (?, ?, ?, ?, ?, ?)',
+                             (origen, destino, ruta.duracion, ruta.distancia, ruta.geometria, time.time()))
+
+    def __len__(self):
+        with self._conexion() as conexion:
+            return conexion.execute('SELECT COUNT(*) FROM rutas').fetchone()[0]
+
+
+class ServicioRutas:
+
+    def __init__(self, almacen, matriz=None, descargar=descargar_ruta, max_entradas=4096):
+        self.almacen = almacen
+        self.matriz = matriz
+        self.descargar = descargar
+        self.max_entradas = max_entradas
+        self._memoria = OrderedDict()
+        self._lock = threading.Lock()
+        self._en_vuelo = {}  # (origen, destino) -> Event de la descarga en curso
+        self.aciertos_memoria = 0
+        self.aciertos_disco = 0
+        self.aciertos_matriz = 0
+        self.descargas = 0
+        self.sin_servicio = 0
+
+    def _recordar(self, clave, ruta):
+        with self._lock:
+            self._memoria[clave] = ruta
+            self._memoria.move_to_end(clave)
+            while len(self._memoria) > self.max_entradas:
+                self._memoria.popitem(last=False)
+
+    def _guardada(self, clave):
+        with self._lock:
+            ruta = self._memoria.get(clave)
+            if ruta is not None:
+                self._memoria.move_to_end(clave)
+                self.aciertos_memoria += 1
+                return ruta
+        ruta = self.almacen.obtener(*clave)
+        if ruta is not None:
+            self.aciertos_disco += 1
+            self._recordar(clave, ruta)
+        return ruta
+
+    def ruta(self, origen, destino):
+        """Ruta entre dos estaciones, dadas como (número, lon, lat), sin red: la de Mapbox si ya está
+        guardada y, si no, la duración de la matriz con una línea recta (la geometría la da geometria())."""
+        ruta = self._guardada((int(origen[0]), int(destino[0])))
+        if ruta is not None:
+            return ruta
+        self.aciertos_matriz += 1
+        return self.estimar(origen, destino)
+
+    def geometria(self, origen, destino, espera=30.0):
+        """Ruta de Mapbox entre dos estaciones: guardada o descargada ahora; None si Mapbox no responde."""
+        clave = (int(origen[0]), int(destino[0]))
+        ruta = self._guardada(clave)
+        if ruta is not None:
+            return ruta
+        evento, propia = self._reservar(clave)
+        if not propia:
+            # Otra sesión ya la está descargando: se espera a su resultado
+            evento.wait(espera)
+            return self._guardada(clave)
+        return self._descargar(clave, origen, destino, evento)
+
+    def pedir_geometria(self, origen, destino):
+        """Como geometria(), sin esperar: la ruta de Mapbox si ya está guardada y, si no, None tras empezar a
+        descargarla en otro hilo (si nadie lo estaba haciendo ya). en_vuelo() dice cuándo ha terminado."""
+        clave = (int(origen[0]), int(destino[0]))
+        ruta = self._guardada(clave)
+        if ruta is None:
+            evento, propia = self._reservar(clave)
+            if propia:
+                threading.Thread(target=self._descargar, args=(clave, origen, destino, evento),
+                                 name='ruta-mapbox', daemon=True).start()
+        return ruta
+
+    def en_vuelo(self, origen, destino):
+        """True mientras se descarga la ruta de Mapbox entre las dos estaciones."""
+        with self._lock:
+            return (int(origen[0]), int(destino[0])) in self._en_vuelo
+
+    def _reservar(self, clave):
+        # (evento de la descarga de `clave`, True si la descarga le toca a quien llama)
+        with self._lock:
+            evento = self._en_vuelo.get(clave)
+            if evento is not None:
+                return evento, False
+            evento = self._en_vuelo[clave] = threading.Event()
+            return evento, True
+
+    def _descargar(self, clave, origen, destino, evento):
+        try:
+            ruta = Ruta(*self.descargar(origen[1:], destino[1:]), FUENTE_MAPBOX)
+            self.descargas += 1
+            self.almacen.guardar(*clave, ruta)
+            self._recordar(clave, ruta)
+            return ruta
+        except Exception as e:
+            # Sin servicio de rutas: no se guarda nada y la página dibuja la línea recta
+            # Solo el tipo de error: el mensaje de requests incluye la URL con el token
+            log.warning('No se pudo calcular la ruta %s -> %s: %s', clave[0], clave[1], type(e).__name__)
+            self.sin_servicio += 1
+            return None
+        finally:
+            with self._lock:
+                del self._en_vuelo[clave]
+            evento.set()
+
+    def estimar(self, origen, destino):
+        distancia = float(haversine(origen[2], origen[1], destino[2], destino[1]))
+        geometria = codificar_polilinea([origen[1:], destino[1:]])
+        medida = self.matriz.duracion(int(origen[0]), int(destino[0])) if self.matriz is not None else None
+        if medida is not None:
+            return Ruta(medida[0], distancia * FACTOR_RODEO, geometria, FUENTE_MATRIZ if medida[1] else FUENTE_ESTIMADA)
+        return Ruta(duracion_estimada(distancia), distancia * FACTOR_RODEO, geometria, FUENTE_ESTIMADA)
+
+
+def matriz_o_estimacion(numeros, lat, lon, ruta=RUTA_MATRIZ):
+    """Matriz guardada por el trabajo fuera de línea, o una estimación al momento si no existe."""
+    if os.path.exists(ruta):
+        try:
+            return MatrizDuraciones.cargar(ruta)
+        except (OSError, ValueError, KeyError) as e:
+            log.warning('No se pudo leer %s: %s', ruta, e)
+    return MatrizDuraciones.estimar(numeros, lat, lon)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mapbox', action='store_true', help='pedir las duraciones a Mapbox Matrix')
+    parser.add_argument('--pausa', type=float, default=1.0, help='segundos entre peticiones a Mapbox')
+    parser.add_argument('--salida', default=RUTA_MATRIZ)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s %(levelname)s %(message)s')
+
+    from valenbici import desde_csv
+    estaciones = sorted(desde_csv().values())
+    numeros = [e.number for e in estaciones]
+    lat = np.array([e.lat for e in estaciones])
+    lon = np.array([e.lon for e in estaciones])
+    if args.mapbox:
+        matriz = matriz_mapbox(numeros, lat, lon, pausa=args.pausa)
+    else:
+        matriz = MatrizDuraciones.estimar(numeros, lat, lon)
+    matriz.guardar(args.salida)
+    print(f'{args.salida}: {len(matriz)} estaciones, {int(matriz.medidas.sum())} de '
+          f'{len(matriz) ** 2} pares medidos con Mapbox')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
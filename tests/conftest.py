@@ -0,0 +1,28 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Configuración común de las pruebas: los módulos de la aplicación están en la
+raíz del repositorio, sin paquete, así que se añade al path.
+"""
+
+import os
+import sys
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES = os.path.join(RAIZ, 'benchmarks', 'fixtures')
+
+if RAIZ not in sys.path:
+    sys.path.insert(0, RAIZ)
+
+
+class Reloj:
+    """Reloj manual para los componentes que aceptan `reloj`."""
+
+    def __init__(self, ahora=1000.0):
+        self.ahora = ahora
+
+    def __call__(self):
+        return self.ahora
+
+    def avanzar(self, segundos):
+        self.ahora += segundos
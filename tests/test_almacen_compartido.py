@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+AlmacenInstantaneas: arrendamientos y lectura de lo nuevo por los procesos
+que no son el líder (aquí, dos instancias sobre el mismo fichero).
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from almacen_compartido import AlmacenInstantaneas
+from conftest import Reloj
+from prefetch_metro import Movimiento, PrefetchMetro
+
+METRO = ['https://geoportal.test/estacion/1', 'https://geoportal.test/estacion/2']
+EMT = 'https://emt.test/parada/1190'
+
+
+def movimientos(destino, hora='12:00:00'):
+    return (Movimiento('3', destino, hora),)
+
+
+@pytest.fixture
+def reloj():
+    return Reloj()
+
+
+@pytest.fixture
+def ruta(tmp_path):
+    return str(tmp_path / 'instantaneas.db')
+
+
+@pytest.fixture
+def lider(ruta, reloj):
+    return AlmacenInstantaneas(ruta, reloj=reloj)
+
+
+@pytest.fixture
+def seguidor(ruta, reloj):
+    return AlmacenInstantaneas(ruta, reloj=reloj)
+
+
+def motor(almacen):
+    return PrefetchMetro(METRO, cargar=None, almacen=almacen)
+
+
+def test_un_solo_lider(lider, seguidor, reloj):
+    assert lider.liderar('metro', 10)
+    assert not seguidor.liderar('metro', 10)
+    assert lider.es_lider('metro') and not seguidor.es_lider('metro')
+    # Renovar no cambia de dueño; al caducar lo toma otro
+    reloj.avanzar(5)
+    assert lider.liderar('metro', 10)
+    reloj.avanzar(11)
+    assert not lider.es_lider('metro')
+    assert seguidor.liderar('metro', 10)
+    assert not lider.liderar('metro', 10)
+
+
+def test_soltar(lider, seguidor):
+    assert lider.liderar('metro', 60)
+    lider.soltar('metro')
+    assert seguidor.liderar('metro', 60)
+
+
+def test_el_seguidor_lee_solo_lo_nuevo(lider, seguidor):
+    siguiendo = motor(seguidor)
+    lider.guardar_llegadas({METRO[0]: movimientos('Rafelbunyol'), METRO[1]: movimientos('Aeroport')})
+    siguiendo.leer_almacen()
+    assert siguiendo.llegadas(METRO[0]) == movimientos('Rafelbunyol')
+    assert siguiendo.lecturas == 1
+
+    # Sin cambios no se publica otra instantánea
+    anterior = siguiendo.instantanea()
+    siguiendo.leer_almacen()
+    assert siguiendo.instantanea() is anterior
+
+    lider.guardar_llegadas({METRO[1]: movimientos('Castelló')})
+    siguiendo.leer_almacen()
+    assert siguiendo.llegadas(METRO[0]) == movimientos('Rafelbunyol')
+    assert siguiendo.llegadas(METRO[1]) == movimientos('Castelló')
+    assert siguiendo.lecturas == 2
+
+
+def test_una_descarga_anterior_confirmada_despues_no_se_pierde(lider, seguidor, reloj):
+    # El instante de descarga se toma antes de escribir: otro proceso puede confirmar antes una
+    # fila más reciente. Lo que cuenta es el orden en que se confirman (la versión)
+    siguiendo = motor(seguidor)
+    lider.guardar_llegadas({METRO[0]: movimientos('Rafelbunyol')}, actualizada=reloj.ahora)
+    siguiendo.leer_almacen()
+    lider.guardar_llegadas({METRO[1]: movimientos('Aeroport')}, actualizada=reloj.ahora - 5)
+    siguiendo.leer_almacen()
+    assert siguiendo.llegadas(METRO[1]) == movimientos('Aeroport')
+
+
+def test_las_paradas_de_emt_no_adelantan_al_motor(lider, seguidor):
+    siguiendo = motor(seguidor)
+    lider.guardar_llegadas({METRO[0]: movimientos('Rafelbunyol')})
+    # Una parada de EMT que otro proceso guarda después no hace saltar la estación de metro
+    seguidor.guardar_llegadas({EMT: (Movimiento('16', 'La Punta', 'La Punta - 7 min'),)})
+    siguiendo.leer_almacen()
+    assert siguiendo.llegadas(METRO[0]) == movimientos('Rafelbunyol')
+    assert siguiendo.llegadas(EMT) is None
+
+
+def test_cargador_comparte_las_descargas_recientes(lider, seguidor, reloj):
+    descargas = []
+
+    def cargar(url):
+        descargas.append(url)
+        return [{"Número de Línea": '16', "Destino": 'La Punta', "Tiempo": 'La Punta - 7 min'}]
+
+    primero = lider.cargador(cargar, frescura=30)
+    segundo = seguidor.cargador(cargar, frescura=30)
+    assert primero(EMT) == segundo(EMT)
+    assert descargas == [EMT]
+    reloj.avanzar(31)
+    segundo(EMT)
+    assert descargas == [EMT, EMT]
+    assert (lider.aciertos, lider.fallos) == (0, 1)
+    assert (seguidor.aciertos, seguidor.fallos) == (1, 1)
+
+
+def test_cargador_cuenta_desde_varios_hilos(lider):
+    cargar = lider.cargador(lambda url: [], frescura=30)
+    cargar(EMT)
+    with ThreadPoolExecutor(8) as ejecutor:
+        list(ejecutor.map(lambda _: cargar(EMT), range(400)))
+    assert (lider.aciertos, lider.fallos) == (400, 1)
+
+
+def test_vistas(lider, seguidor, reloj):
+    seguidor.anotar_vistas({METRO[0]: 2})
+    vistas = lider.vistas_desde(0)
+    assert [(url, veces) for _, url, veces in vistas] == [(METRO[0], 2)]
+    ultima = vistas[-1][0]
+    assert lider.vistas_desde(ultima) == []
+    seguidor.anotar_vistas({METRO[1]: 1})
+    assert [url for _, url, _ in lider.vistas_desde(ultima)] == [METRO[1]]
+    # Las viejas se borran, pero los ids no se reutilizan
+    reloj.avanzar(400)
+    assert lider.vistas_desde(0) == []
+    seguidor.anotar_vistas({METRO[0]: 1})
+    assert [url for _, url, _ in lider.vistas_desde(ultima)] == [METRO[0]]
+
+
+def test_instantaneas(lider, seguidor):
+    assert seguidor.leer('valenbici') is None
+    lider.publicar('valenbici', 1.0, 2.0, [{'number': 1}])
+    version, modificada, comprobada, registros = seguidor.leer('valenbici')
+    assert registros == [{'number': 1}]
+    # Solo la fecha de comprobación: la misma versión, sin datos
+    lider.publicar('valenbici', 1.0, 3.0)
+    assert seguidor.leer('valenbici', version) == (version, 1.0, 3.0, None)
+
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+API: caché de respuestas, ETag y 304, gzip y validación de parámetros, con
+el servidor asyncio escuchando en un puerto local y sin motores reales.
+"""
+
+import asyncio
+import gzip
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from api import (API, MAX_CUERPO, MAX_K, CacheRespuestas, ErrorAPI, Servidor, _coincide, _gzip, _parametro,
+                 respuesta_json)
+from buscador import IndiceBusqueda
+from conftest import Reloj
+
+
+def test_cache_por_version_y_edad():
+    reloj = Reloj()
+    cache = CacheRespuestas(reloj=reloj)
+    respuesta = respuesta_json({'a': 1}, max_edad=5)
+    cache.guardar('/v1/x?', 1, respuesta)
+    assert cache.obtener('/v1/x?', 1) is respuesta
+    # Otra versión de los datos o pasada la edad máxima: hay que volver a generarla
+    assert cache.obtener('/v1/x?', 2) is None
+    reloj.avanzar(5)
+    assert cache.obtener('/v1/x?', 1) is None
+    assert (cache.aciertos, cache.fallos) == (1, 2)
+
+
+def test_cache_expulsa_la_menos_usada():
+    cache = CacheRespuestas(max_entradas=2)
+    for clave in ('a', 'b'):
+        cache.guardar(clave, 0, respuesta_json(clave, max_edad=60))
+    cache.obtener('a', 0)
+    cache.guardar('c', 0, respuesta_json('c', max_edad=60))
+    assert len(cache) == 2
+    assert cache.obtener('b', 0) is None and cache.obtener('a', 0) is not None
+
+
+def test_etag():
+    respuesta = respuesta_json({'a': 1})
+    assert respuesta.etag.startswith('W/"')
+    assert respuesta_json({'a': 1}).etag == respuesta.etag != respuesta_json({'a': 2}).etag
+    opaco = respuesta.etag[2:]
+    assert _coincide(respuesta.etag, respuesta.etag)
+    # Comparación débil: con y sin W/, en una lista o con *
+    assert _coincide(opaco, respuesta.etag)
+    assert _coincide(f'"otro", {respuesta.etag}', respuesta.etag)
+    assert _coincide(' * ', respuesta.etag)
+    assert not _coincide('', respuesta.etag)
+    assert not _coincide('W/"otro"', respuesta.etag)
+
+
+def test_gzip_solo_para_las_grandes_y_una_vez():
+    assert respuesta_json({'a': 1}).comprimido is None
+    respuesta = respuesta_json({'nombres': ['Benimaclet'] * 200})
+    comprimido = _gzip(respuesta)
+    assert gzip.decompress(comprimido) == respuesta.cuerpo
+    assert _gzip(respuesta) is comprimido
+
+
+@pytest.mark.parametrize('consulta, tipo, defecto, esperado', [
+    ({'k': '7'}, int, None, 7),
+    ({}, int, 20, 20),
+    ({'k': ''}, int, 20, 20),
+    ({'k': '39.47'}, float, None, 39.47),
+])
+def test_parametro(consulta, tipo, defecto, esperado):
+    assert _parametro(consulta, 'k', tipo, defecto) == esperado
+
+
+@pytest.mark.parametrize('consulta, tipo', [
+    ({}, str),
+    ({'k': 'siete'}, int),
+    ({'k': 'nan'}, float),
+    ({'k': 'inf'}, float),
+])
+def test_parametro_no_valido(consulta, tipo):
+    with pytest.raises(ErrorAPI) as error:
+        _parametro(consulta, 'k', tipo)
+    assert error.value.estado == 400
+
+
+NOMBRES = ['Benimaclet', 'Benimàmet', 'Xàtiva', 'Colón', 'Àngel Guimerà', 'Alameda', 'Facultats']
+
+
+@pytest.fixture
+def api():
+    datos = SimpleNamespace(indice_metro=IndiceBusqueda(NOMBRES), motor_metro=None, valenbici=None,
+                            cache_emt=SimpleNamespace(ttl=5))
+    return API(datos)
+
+
+def test_buscar(api):
+    respuesta = asyncio.run(api.responder('/v1/buscar?q=benim'))
+    assert respuesta.estado == 200
+    assert json.loads(respuesta.cuerpo) == {'resultados': [{'nombre': 'Benimaclet'}, {'nombre': 'Benimàmet'}]}
+    # La segunda vez sale de la caché, ya serializada
+    assert asyncio.run(api.responder('/v1/buscar?q=benim')) is respuesta
+    assert asyncio.run(api.responder(f'/v1/buscar?k={MAX_K * 10}')).estado == 200
+    assert asyncio.run(api.responder('/v1/buscar?k=x')).estado == 400
+    assert asyncio.run(api.responder('/v1/buscar?tipo=tren')).estado == 400
+    assert asyncio.run(api.responder('/v1/nada')).estado == 404
+
+
+@pytest.mark.parametrize('k, esperados', [('0', 1), ('-3', 1), ('2', 2)])
+def test_buscar_k_entre_1_y_max_k(api, k, esperados):
+    respuesta = asyncio.run(api.responder(f'/v1/buscar?q=a&k={k}'))
+    assert len(json.loads(respuesta.cuerpo)['resultados']) == esperados
+
+
+async def _peticion(puerto, texto):
+    reader, writer = await asyncio.open_connection('127.0.0.1', puerto)
+    writer.write(texto.encode('latin-1'))
+    await writer.drain()
+    datos = await reader.read()
+    writer.close()
+    cabecera, _, cuerpo = datos.partition(b'\r\n\r\n')
+    lineas = cabecera.decode('latin-1').split('\r\n')
+    cabeceras = dict(linea.split(': ', 1) for linea in lineas[1:])
+    return int(lineas[0].split(' ')[1]), cabeceras, cuerpo
+
+
+def servir(api, *peticiones):
+    """Respuestas (estado, cabeceras, cuerpo) del servidor a cada petición, una por conexión."""
+    async def ejecutar():
+        servidor = await Servidor(api, '127.0.0.1', 0).iniciar()
+        try:
+            return [await _peticion(servidor.puerto, p) for p in peticiones]
+        finally:
+            servidor.cerrar()
+    return asyncio.run(ejecutar())
+
+
+def get(ruta, *cabeceras, metodo='GET'):
+    return '\r\n'.join([f'{metodo} {ruta} HTTP/1.1', 'Host: test', *cabeceras, 'Connection: close', '', ''])
+
+
+def test_servidor_etag_y_304(api):
+    (estado, cabeceras, cuerpo), = servir(api, get('/v1/buscar?q=xativa'))
+    assert estado == 200 and b'X\xc3\xa0tiva' in cuerpo
+    etag = cabeceras['ETag']
+    (estado, cabeceras, cuerpo), = servir(api, get('/v1/buscar?q=xativa', f'If-None-Match: {etag}'))
+    assert (estado, cuerpo, cabeceras['ETag']) == (304, b'', etag)
+
+
+def test_servidor_gzip_y_head(api):
+    # Sin q salen todas las estaciones: supera MIN_GZIP si se repite lo bastante
+    api.datos.indice_metro = IndiceBusqueda([f'{n} {i}' for i in range(40) for n in NOMBRES])
+    plano, comprimido, cabeza = servir(api, get('/v1/buscar?k=200'),
+                                       get('/v1/buscar?k=200', 'Accept-Encoding: gzip, br'),
+                                       get('/v1/buscar?k=200', metodo='HEAD'))
+    assert 'Content-Encoding' not in plano[1]
+    assert comprimido[1]['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(comprimido[2]) == plano[2]
+    assert comprimido[1]['ETag'] == plano[1]['ETag']
+    assert cabeza[2] == b'' and cabeza[1]['Content-Length'] == str(len(plano[2]))
+
+
+def test_servidor_metodos_y_peticiones_mal_formadas(api):
+    post, basura = servir(api, get('/v1/buscar', metodo='POST'), 'HOLA\r\n\r\n')
+    assert post[0] == 405 and basura[0] == 400
+
+
+def test_servidor_cuerpos(api):
+    con_cuerpo, grande, no_valida, post = servir(
+        api, get('/v1/buscar', 'Content-Length: 4') + 'HOLA',
+        get('/v1/buscar', f'Content-Length: {MAX_CUERPO + 1}', metodo='POST'),
+        get('/v1/buscar', 'Content-Length: -1'),
+        get('/v1/buscar', 'Content-Length: 4', metodo='POST') + 'HOLA')
+    assert con_cuerpo[0] == 400 and con_cuerpo[1]['Connection'] == 'close'
+    # Se responde sin esperar a un cuerpo que no se va a leer
+    assert grande[0] == 413 and grande[1]['Connection'] == 'close'
+    assert no_valida[0] == 400 and post[0] == 405
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+IndiceBusqueda: normalización, orden de los resultados y límite k.
+"""
+
+import pytest
+
+from buscador import IndiceBusqueda, normalizar
+
+ESTACIONES = ['Alameda', 'Àngel Guimerà', 'Benimaclet', 'Camí Reial', 'Colón', 'Marxalenes',
+              'Sant Isidre', 'Xàtiva', 'Facultats - Manuel Broseta', 'Marítim', 'Sant Joan']
+
+
+@pytest.fixture(scope='module')
+def indice():
+    return IndiceBusqueda(ESTACIONES)
+
+
+def todas(nombres, consulta):
+    # Referencia sin índice: las que contienen todas las palabras de la consulta
+    palabras = normalizar(consulta).split()
+    return {n for n in nombres if all(p in normalizar(n) for p in palabras)}
+
+
+def test_normalizar():
+    assert normalizar("Camí Reial") == 'cami reial'
+    assert normalizar("Marcel·lí") == 'marcelli'
+    assert normalizar("  Facultats - Manuel  Broseta ") == 'facultats manuel broseta'
+
+
+@pytest.mark.parametrize('consulta', ['cami', 'CAMÍ', 'a', 'sant', 'mar', 'an gu', 'ima', 'zz', 'n'])
+def test_encuentra_lo_mismo_que_recorrer_todo(indice, consulta):
+    assert set(indice.buscar(consulta)) == todas(ESTACIONES, consulta)
+
+
+def test_orden_de_mejor_a_peor(indice):
+    # Empieza por la consulta, después alguna palabra empieza por ella, después la contiene
+    assert indice.buscar('ma') == ['Marítim', 'Marxalenes', 'Facultats - Manuel Broseta', 'Benimaclet']
+    assert indice.buscar('an') == ['Àngel Guimerà', 'Facultats - Manuel Broseta', 'Sant Isidre', 'Sant Joan']
+    assert indice.buscar('sant')[:2] == ['Sant Isidre', 'Sant Joan']
+    assert indice.buscar('joan') == ['Sant Joan']
+    assert indice.buscar('reial') == ['Camí Reial']
+
+
+def test_nombre_exacto_primero():
+    indice = IndiceBusqueda(['Colón Sud', 'Colón', 'Pl. Colón'])
+    assert indice.buscar('colon') == ['Colón', 'Colón Sud', 'Pl. Colón']
+
+
+def test_consulta_vacia(indice):
+    assert indice.buscar('') == sorted(ESTACIONES)
+    assert indice.buscar('  ·  ', k=2) == sorted(ESTACIONES)[:2]
+
+
+@pytest.mark.parametrize('k', [1, 2, 3, 100])
+def test_k_son_los_primeros(indice, k):
+    assert indice.buscar('a', k=k) == indice.buscar('a')[:k]
+
+
+@pytest.mark.parametrize('k', [0, -1, -5])
+def test_k_sin_resultados(indice, k):
+    assert indice.buscar('a', k=k) == []
+    assert indice.buscar('', k=k) == []
+
+
+def test_numero_de_parada():
+    indice = IndiceBusqueda(['Pl. Ajuntament', 'Xàtiva - Renfe', 'Colón'], ids=[1190, 1477.0, 589])
+    assert indice.buscar('1190') == ['Pl. Ajuntament']
+    assert indice.buscar('1477', k=1) == ['Xàtiva - Renfe']
+    assert indice.buscar('999') == []
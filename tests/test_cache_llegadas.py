@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+CacheLlegadas: una sola descarga para peticiones simultáneas, ttl y
+stale-while-revalidate.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from cache_llegadas import CacheLlegadas
+from conftest import Reloj
+
+URL = 'https://geoportal.test/estacion/1'
+
+
+class Cargador:
+    """cargar(url) que cuenta las llamadas y puede quedarse esperando o fallar."""
+
+    def __init__(self):
+        self.llamadas = 0
+        self.error = None
+        self.soltar = threading.Event()
+        self.soltar.set()
+        self.empezada = threading.Event()
+        self._lock = threading.Lock()
+
+    def __call__(self, url):
+        with self._lock:
+            self.llamadas += 1
+            n = self.llamadas
+        self.empezada.set()
+        assert self.soltar.wait(5)
+        if self.error is not None:
+            raise self.error
+        return [{'url': url, 'descarga': n}]
+
+
+@pytest.fixture
+def reloj():
+    return Reloj()
+
+
+@pytest.fixture
+def cargar():
+    return Cargador()
+
+
+def test_una_sola_descarga_para_peticiones_simultaneas(cargar):
+    cache = CacheLlegadas(ttl=10)
+    cargar.soltar.clear()
+    with ThreadPoolExecutor(8) as ejecutor:
+        futuros = [ejecutor.submit(cache.obtener, URL, cargar) for _ in range(8)]
+        assert cargar.empezada.wait(5)
+        cargar.soltar.set()
+        resultados = [f.result(5) for f in futuros]
+    assert cargar.llamadas == 1
+    assert all(r is resultados[0] for r in resultados)
+
+
+def test_el_error_llega_a_todas_y_no_se_guarda(cargar):
+    cache = CacheLlegadas(ttl=10)
+    cargar.error = ConnectionError('caído')
+    cargar.soltar.clear()
+    with ThreadPoolExecutor(4) as ejecutor:
+        futuros = [ejecutor.submit(cache.obtener, URL, cargar) for _ in range(4)]
+        assert cargar.empezada.wait(5)
+        cargar.soltar.set()
+        for futuro in futuros:
+            with pytest.raises(ConnectionError):
+                futuro.result(5)
+    assert cargar.llamadas == 1
+    assert cache.edad(URL) is None
+    cargar.error = None
+    assert cache.obtener(URL, cargar)[0]['descarga'] == 2
+
+
+def test_ttl(cargar, reloj):
+    cache = CacheLlegadas(ttl=10, max_edad=10, reloj=reloj)
+    primera = cache.obtener(URL, cargar)
+    reloj.avanzar(9.9)
+    assert cache.obtener(URL, cargar) is primera
+    assert cache.edad(URL) == pytest.approx(9.9)
+    # Pasado el ttl y la edad máxima se descarga otra vez antes de responder
+    reloj.avanzar(0.2)
+    assert cache.obtener(URL, cargar)[0]['descarga'] == 2
+    assert (cache.aciertos, cache.fallos) == (1, 2)
+
+
+def test_invalidar(cargar):
+    cache = CacheLlegadas(ttl=10)
+    cache.obtener(URL, cargar)
+    cache.invalidar(URL)
+    assert cache.obtener(URL, cargar)[0]['descarga'] == 2
+
+
+def test_ttl_por_entrada(cargar, reloj):
+    cache = CacheLlegadas(ttl=10, max_edad=0, reloj=reloj, ttl_de=lambda movimientos: 2)
+    cache.obtener(URL, cargar)
+    reloj.avanzar(2.5)
+    assert cache.obtener(URL, cargar)[0]['descarga'] == 2
+
+
+def test_ttl_de_que_falla_usa_el_ttl_comun(cargar, reloj):
+    cache = CacheLlegadas(ttl=10, max_edad=0, reloj=reloj, ttl_de=lambda movimientos: 1 / 0)
+    cache.obtener(URL, cargar)
+    reloj.avanzar(5)
+    assert cache.obtener(URL, cargar)[0]['descarga'] == 1
+
+
+def test_caducada_se_sirve_mientras_se_revalida(cargar, reloj):
+    cache = CacheLlegadas(ttl=10, max_edad=600, reloj=reloj)
+    primera = cache.obtener(URL, cargar)
+    reloj.avanzar(30)
+    cargar.soltar.clear()
+    # Responde al momento con lo que hay, aunque la descarga en segundo plano no ha terminado
+    assert cache.obtener(URL, cargar) is primera
+    assert cargar.empezada.wait(5)
+    assert cache.obtener(URL, cargar) is primera
+    assert cache.obsoletas == 2
+    cargar.soltar.set()
+    for _ in range(500):
+        if cache.edad(URL) == 0:
+            break
+        threading.Event().wait(0.01)
+    assert cache.obtener(URL, cargar)[0]['descarga'] == 2
+    assert cargar.llamadas == 2
+
+
+def test_revalidacion_fallida_conserva_lo_anterior(cargar, reloj):
+    cache = CacheLlegadas(ttl=10, max_edad=600, reloj=reloj)
+    primera = cache.obtener(URL, cargar)
+    reloj.avanzar(30)
+    cargar.error = TimeoutError()
+    assert cache.obtener(URL, cargar) is primera
+    for _ in range(500):
+        if cargar.llamadas == 2 and not cache._en_curso:
+            break
+        threading.Event().wait(0.01)
+    assert cache.obtener(URL, cargar) is primera
+    assert cache.edad(URL) == pytest.approx(30)
+
+
+def test_mas_alla_de_max_edad_se_espera_a_la_descarga(cargar, reloj):
+    cache = CacheLlegadas(ttl=10, max_edad=60, reloj=reloj)
+    cache.obtener(URL, cargar)
+    reloj.avanzar(61)
+    assert cache.obtener(URL, cargar)[0]['descarga'] == 2
+
+
+def test_expulsa_la_menos_usada(cargar):
+    cache = CacheLlegadas(ttl=10, max_entradas=2)
+    for url in ('a', 'b'):
+        cache.obtener(url, cargar)
+    cache.obtener('a', cargar)
+    cache.obtener('c', cargar)
+    assert cache.edad('b') is None
+    assert cache.edad('a') is not None and cache.edad('c') is not None
+
+
+def test_obtener_varias(cargar):
+    cache = CacheLlegadas(ttl=10)
+    cache.obtener('a', cargar)
+    with ThreadPoolExecutor(4) as ejecutor:
+        resultado = cache.obtener_varias(['a', 'b', 'c', 'b'], cargar, ejecutor)
+    assert sorted(resultado) == ['a', 'b', 'c']
+    assert cargar.llamadas == 3
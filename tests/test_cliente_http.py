@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ClienteHTTP: reintentos de los errores y estados reintentables, y el
+presupuesto de reintentos y el disyuntor abierto a mitad, con un adaptador de
+requests sin red.
+"""
+
+import io
+
+import pytest
+import requests
+from requests.adapters import BaseAdapter
+
+from cliente_http import ABIERTO, CircuitoAbierto, ClienteHTTP, PresupuestoReintentos
+
+URL = 'https://servicio.test/estacion/1'
+
+
+class Adaptador(BaseAdapter):
+    """Contesta cada petición con el siguiente estado (o lanza la siguiente excepción) de la lista."""
+
+    def __init__(self, respuestas):
+        super().__init__()
+        self.respuestas = list(respuestas)
+        self.peticiones = 0
+
+    def send(self, request, **kwargs):
+        self.peticiones += 1
+        respuesta = self.respuestas.pop(0)
+        if isinstance(respuesta, Exception):
+            raise respuesta
+        response = requests.Response()
+        response.status_code = respuesta
+        response.url = request.url
+        response.request = request
+        response.raw = io.BytesIO(b'')
+        return response
+
+    def close(self):
+        pass
+
+
+def cliente(*respuestas, **opciones):
+    http = ClienteHTTP(espera_base=0, espera_max=0, **opciones)
+    adaptador = Adaptador(respuestas)
+    http.session.mount('https://', adaptador)
+    return http, adaptador
+
+
+def test_reintenta_los_estados_reintentables():
+    http, adaptador = cliente(503, 502, 200)
+    assert http.get(URL).status_code == 200
+    assert adaptador.peticiones == 3
+    assert http.reintentos_hechos == 2
+
+
+def test_no_reintenta_los_demas_estados():
+    http, adaptador = cliente(404, 200)
+    assert http.get(URL).status_code == 404
+    assert adaptador.peticiones == 1
+
+
+def test_sin_reintentos_devuelve_la_ultima_respuesta():
+    http, adaptador = cliente(503, 503, 503, 200)
+    assert http.get(URL).status_code == 503
+    assert adaptador.peticiones == 3
+
+
+def test_reintenta_los_errores_de_conexion():
+    http, adaptador = cliente(requests.ConnectionError('caído'), requests.Timeout(), 200)
+    assert http.get(URL).status_code == 200
+    http, adaptador = cliente(*[requests.Timeout()] * 3)
+    with pytest.raises(requests.Timeout):
+        http.get(URL)
+    assert adaptador.peticiones == 3
+
+
+def test_sin_presupuesto_no_se_reintenta():
+    http, adaptador = cliente(503, 200, presupuesto=PresupuestoReintentos(proporcion=0, maximo=0))
+    assert http.get(URL).status_code == 503
+    assert adaptador.peticiones == 1
+    assert http.reintentos_denegados == 1
+
+
+def test_presupuesto_de_reintentos():
+    presupuesto = PresupuestoReintentos(proporcion=0.5, maximo=2.0)
+    assert presupuesto.gastar() and presupuesto.gastar()
+    assert not presupuesto.gastar()
+    presupuesto.ingresar()
+    assert not presupuesto.gastar()
+    presupuesto.ingresar()
+    assert presupuesto.gastar()
+
+
+def test_si_el_disyuntor_se_abre_al_reintentar_sale_el_error_del_host():
+    # El segundo fallo abre el disyuntor: el tercer intento no se envía
+    http, adaptador = cliente(requests.ConnectionError('caído'), requests.Timeout(), 200, umbral_disyuntor=2)
+    with pytest.raises(requests.Timeout):
+        http.get(URL)
+    assert adaptador.peticiones == 2
+    http, adaptador = cliente(503, 502, 200, umbral_disyuntor=2)
+    assert http.get(URL).status_code == 502
+    assert adaptador.peticiones == 2
+    # Con el disyuntor ya abierto, la siguiente petición sí es CircuitoAbierto
+    assert http._disyuntores['servicio.test'].estado == ABIERTO
+    with pytest.raises(CircuitoAbierto):
+        http.get(URL)
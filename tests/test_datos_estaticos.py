@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+paquete(): un datos.bin que no se puede leer o de otra versión o esquema se
+recompila en lugar de fallar.
+"""
+
+import json
+import struct
+
+import pytest
+
+import datos_estaticos
+from datos_estaticos import MAGIA, VERSION, Paquete, compilar
+
+
+@pytest.fixture(scope='module')
+def compilado(tmp_path_factory):
+    ruta = tmp_path_factory.mktemp('datos') / 'datos.bin'
+    compilar(str(ruta))
+    return ruta.read_bytes()
+
+
+@pytest.fixture
+def paquete(monkeypatch, tmp_path):
+    # paquete() sin el del proceso, sobre un fichero de prueba
+    monkeypatch.setattr(datos_estaticos, '_paquete', None)
+    ruta = tmp_path / 'datos.bin'
+    return ruta, lambda: datos_estaticos.paquete(str(ruta))
+
+
+def con_cabecera(compilado, **cambios):
+    (longitud,) = struct.unpack_from('<I', compilado, len(MAGIA))
+    inicio = len(MAGIA) + 4
+    cabecera = json.loads(compilado[inicio:inicio + longitud])
+    cabecera.update(cambios)
+    texto = json.dumps(cabecera, ensure_ascii=False).encode('utf-8')
+    # Misma longitud que la original, para que los desplazamientos de las columnas sigan valiendo
+    assert len(texto) <= longitud
+    return compilado[:len(MAGIA)] + struct.pack('<I', longitud) + texto.ljust(longitud) + compilado[inicio + longitud:]
+
+
+def test_el_paquete_compilado_se_lee(compilado, paquete):
+    ruta, cargar = paquete
+    ruta.write_bytes(compilado)
+    assert cargar().al_dia()
+    assert len(cargar()['metro']) > 0
+
+
+@pytest.mark.parametrize('contenido', [
+    b'',
+    b'VAM1',
+    b'PK\x03\x04 no es un paquete',
+    b'VAM1\xff\xff\x00\x00{"version"',
+])
+def test_un_fichero_que_no_se_puede_leer_se_recompila(compilado, paquete, contenido):
+    ruta, cargar = paquete
+    ruta.write_bytes(contenido)
+    assert cargar().al_dia()
+    assert ruta.read_bytes()[:len(MAGIA)] == MAGIA
+
+
+def test_un_paquete_truncado_se_recompila(compilado, paquete):
+    ruta, cargar = paquete
+    ruta.write_bytes(compilado[:len(compilado) // 2])
+    assert cargar().al_dia()
+    assert ruta.stat().st_size == len(compilado)
+
+
+@pytest.mark.parametrize('cambios', [{'version': VERSION - 1}, {'esquema': {}}])
+def test_otra_version_u_otro_esquema_se_recompila(compilado, paquete, cambios):
+    ruta, cargar = paquete
+    ruta.write_bytes(con_cabecera(compilado, **cambios))
+    assert not Paquete(str(ruta)).al_dia()
+    assert cargar().cabecera['version'] == VERSION
+    assert Paquete(str(ruta)).al_dia()
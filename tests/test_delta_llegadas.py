@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+TableroLlegadas: mensajes por diferencias al navegador y filas de las
+llegadas de EMT.
+"""
+
+from delta_llegadas import FilasCompartidas, TableroLlegadas, filas_bus
+
+AHORA = 1_700_000_000.0
+
+
+def ms(segundos):
+    # Instante de llegada en ms desde 1970, a `segundos` de AHORA
+    return round((AHORA + segundos) * 1000)
+
+
+def fila(destino, segundos, linea='3', texto=''):
+    return (linea, destino, None if segundos is None else ms(segundos), texto)
+
+
+def ids(mensaje):
+    return [cambio[0] for cambio in mensaje['cambios']]
+
+
+def test_el_primer_mensaje_es_la_tabla_completa():
+    tablero = TableroLlegadas()
+    mensaje = tablero.actualizar([fila('Rafelbunyol', 60), fila('Aeroport', 120)], AHORA)
+    assert mensaje['base'] is None and mensaje['version'] == 1
+    assert [c[2] for c in mensaje['cambios']] == ['Rafelbunyol', 'Aeroport']
+    assert mensaje['borradas'] == []
+
+
+def test_las_mismas_filas_no_envian_nada():
+    tablero = TableroLlegadas()
+    filas = [fila('Rafelbunyol', 60)]
+    tablero.actualizar(filas, AHORA)
+    mensaje = tablero.actualizar(filas, AHORA + 1)
+    assert mensaje == {'version': 1, 'base': 1, 'ahora': ms(1), 'cambios': [], 'borradas': []}
+    # Otra lista con lo mismo tampoco
+    mensaje = tablero.actualizar(list(filas), AHORA + 2)
+    assert (mensaje['version'], mensaje['cambios'], mensaje['borradas']) == (1, [], [])
+
+
+def test_solo_se_envia_lo_que_cambia_mas_que_la_tolerancia():
+    tablero = TableroLlegadas(tolerancia=1.0)
+    primero = tablero.actualizar([fila('Rafelbunyol', 60), fila('Aeroport', 120)], AHORA)
+    rafelbunyol, aeroport = ids(primero)
+    mensaje = tablero.actualizar([fila('Rafelbunyol', 60.5), fila('Aeroport', 150)], AHORA + 5)
+    assert mensaje['base'] == 1 and mensaje['version'] == 2
+    assert ids(mensaje) == [aeroport]
+    assert mensaje['cambios'][0][3] == ms(150)
+    # Lo que se movió poco no acumula: se compara con lo enviado (60), no con lo recibido (60.5)
+    mensaje = tablero.actualizar([fila('Rafelbunyol', 61.2), fila('Aeroport', 150)], AHORA + 6)
+    assert ids(mensaje) == [rafelbunyol]
+
+
+def test_los_que_pasan_se_borran_y_los_demas_conservan_su_id():
+    tablero = TableroLlegadas()
+    primero = tablero.actualizar([fila('Rafelbunyol', 10), fila('Rafelbunyol', 400)], AHORA)
+    pasado, siguiente = ids(primero)
+    # El primer tren ha pasado: el de 400 s sigue siendo el mismo, aunque ahora vaya el primero
+    mensaje = tablero.actualizar([fila('Rafelbunyol', 400), fila('Rafelbunyol', 800)], AHORA + 30)
+    assert mensaje['borradas'] == [pasado]
+    assert len(mensaje['cambios']) == 1 and mensaje['cambios'][0][0] not in (pasado, siguiente)
+    assert mensaje['cambios'][0][3] == ms(800)
+
+
+def test_sin_hora_se_compara_el_texto():
+    tablero = TableroLlegadas()
+    primero = tablero.actualizar([fila('Port', None, texto='Port - Pròxim')], AHORA)
+    mensaje = tablero.actualizar([fila('Port', None, texto='Port - Pròxim')], AHORA + 1)
+    assert mensaje['cambios'] == []
+    mensaje = tablero.actualizar([fila('Port', None, texto='Port - En parada')], AHORA + 2)
+    assert ids(mensaje) == ids(primero)
+
+
+def test_completa_reenvia_todo():
+    tablero = TableroLlegadas()
+    filas = [fila('Rafelbunyol', 60), fila('Aeroport', 120)]
+    primero = tablero.actualizar(filas, AHORA)
+    mensaje = tablero.actualizar(filas, AHORA + 1, completa=True)
+    assert mensaje['base'] is None and mensaje['version'] == 2
+    assert ids(mensaje) == ids(primero)
+
+
+def test_filas_bus():
+    llegadas = [{"Número de Línea": '16', "Destino": 'La Punta', "Tiempo": 'La Punta - 30 min'},
+                {"Número de Línea": '16', "Destino": 'La Punta', "Tiempo": 'La Punta - 7 min'},
+                {"Número de Línea": '8', "Destino": 'Port', "Tiempo": 'Port - Pròxim'}]
+    assert filas_bus(llegadas, AHORA) == [('16', 'La Punta', ms(420), 'La Punta - 7 min'),
+                                          ('16', 'La Punta', ms(1800), 'La Punta - 30 min'),
+                                          ('8', 'Port', None, 'Port - Pròxim')]
+
+
+def test_filas_compartidas_se_calculan_una_vez_por_descarga():
+    compartidas = FilasCompartidas()
+    llegadas, calculos = [], []
+
+    def calcular():
+        calculos.append(1)
+        return ['filas']
+
+    assert compartidas.obtener('url', llegadas, calcular) is compartidas.obtener('url', llegadas, calcular)
+    compartidas.obtener('url', [], calcular)
+    assert len(calculos) == 2
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Transiciones del disyuntor de cliente_http: cerrado -> abierto -> semiabierto
+-> cerrado o abierto otra vez, con un reloj manual.
+"""
+
+import pytest
+
+from cliente_http import ABIERTO, CERRADO, SEMIABIERTO, Disyuntor
+from conftest import Reloj
+
+
+@pytest.fixture
+def reloj():
+    return Reloj()
+
+
+@pytest.fixture
+def disyuntor(reloj):
+    return Disyuntor('servicio.test', umbral=3, espera=10.0, espera_max=35.0, reloj=reloj)
+
+
+def abrir(disyuntor):
+    for _ in range(disyuntor.umbral):
+        assert disyuntor.permitir()
+        disyuntor.fallo()
+
+
+def test_se_abre_con_umbral_fallos_seguidos(disyuntor):
+    disyuntor.fallo()
+    disyuntor.fallo()
+    assert disyuntor.estado == CERRADO
+    disyuntor.fallo()
+    assert disyuntor.estado == ABIERTO
+    assert not disyuntor.permitir()
+
+
+def test_un_exito_reinicia_la_cuenta(disyuntor):
+    disyuntor.fallo()
+    disyuntor.fallo()
+    disyuntor.exito()
+    disyuntor.fallo()
+    disyuntor.fallo()
+    assert disyuntor.estado == CERRADO
+
+
+def test_semiabierto_deja_pasar_una_sola_prueba(disyuntor, reloj):
+    abrir(disyuntor)
+    reloj.avanzar(9.9)
+    assert not disyuntor.permitir()
+    reloj.avanzar(0.2)
+    assert disyuntor.permitir()
+    assert disyuntor.estado == SEMIABIERTO
+    assert not disyuntor.permitir()
+
+
+def test_prueba_buena_cierra(disyuntor, reloj):
+    abrir(disyuntor)
+    reloj.avanzar(10)
+    assert disyuntor.permitir()
+    disyuntor.exito()
+    assert disyuntor.estado == CERRADO
+    assert disyuntor.permitir() and disyuntor.permitir()
+
+
+def test_prueba_fallida_reabre_con_el_doble_de_espera(disyuntor, reloj):
+    abrir(disyuntor)
+    esperas = []
+    for _ in range(3):
+        reloj.avanzar(100)
+        assert disyuntor.permitir()
+        disyuntor.fallo()
+        assert disyuntor.estado == ABIERTO
+        inicio = reloj.ahora
+        while not disyuntor.permitir():
+            reloj.avanzar(1)
+        esperas.append(reloj.ahora - inicio)
+        disyuntor.fallo()
+    # 20, 40 -> 35 (espera_max) y se queda ahí
+    assert esperas == [20, 35, 35]
+
+
+def test_tras_cerrar_la_espera_vuelve_a_la_inicial(disyuntor, reloj):
+    abrir(disyuntor)
+    reloj.avanzar(10)
+    disyuntor.permitir()
+    disyuntor.fallo()
+    reloj.avanzar(20)
+    disyuntor.permitir()
+    disyuntor.exito()
+    abrir(disyuntor)
+    reloj.avanzar(9)
+    assert not disyuntor.permitir()
+    reloj.avanzar(1)
+    assert disyuntor.permitir()
+
+
+def test_error_no_reintentable_no_cambia_el_estado(disyuntor, reloj):
+    # Una URL mal formada en la petición de prueba no dice nada del host: sigue semiabierto,
+    # pero la prueba queda libre para la siguiente petición
+    abrir(disyuntor)
+    reloj.avanzar(10)
+    assert disyuntor.permitir()
+    disyuntor.sin_respuesta()
+    assert disyuntor.estado == SEMIABIERTO
+    assert disyuntor.permitir()
+    assert not disyuntor.permitir()
+
+
+def test_error_no_reintentable_en_cerrado_no_reinicia_la_cuenta(disyuntor):
+    disyuntor.fallo()
+    disyuntor.fallo()
+    disyuntor.sin_respuesta()
+    disyuntor.fallo()
+    assert disyuntor.estado == ABIERTO
+
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Serie del histórico: anillo por clave, volcado a segmentos, consultas por
+rango y fusión de los segmentos de días cerrados.
+"""
+
+from collections import namedtuple
+
+import numpy as np
+import pytest
+
+from conftest import Reloj
+from historico import SEGUNDOS_DIA, Historico, Serie
+
+CAMPOS = [('bicis', '<u2'), ('libres', '<u2')]
+T0 = 19675 * SEGUNDOS_DIA  # 00:00 UTC, para que las horas de prueba caigan en el mismo día
+
+
+@pytest.fixture
+def reloj():
+    return Reloj(T0)
+
+
+@pytest.fixture
+def serie(tmp_path, reloj):
+    return Serie(str(tmp_path), 'valenbici', CAMPOS, capacidad=4, intervalo=900.0, reloj=reloj)
+
+
+def test_solo_cambios(serie):
+    assert serie.anadir('84', T0, (3, 17), solo_cambios=True)
+    assert not serie.anadir('84', T0 + 60, (3, 17), solo_cambios=True)
+    assert serie.anadir('84', T0 + 120, (4, 16), solo_cambios=True)
+    assert serie.ultimo('84')['bicis'] == 4
+    assert serie.ultimo('85') is None
+    assert len(serie) == 2
+
+
+def test_consulta_en_memoria_y_en_disco(serie):
+    for i in range(3):
+        serie.anadir('84', T0 + i * 60, (i, 20 - i))
+        serie.anadir('12', T0 + i * 60, (10 + i, 10 - i))
+    serie.volcar()
+    serie.anadir('84', T0 + 180, (3, 17))
+    assert len(serie.segmentos) == 1
+    assert list(serie.consultar('84')['bicis']) == [0, 1, 2, 3]
+    assert list(serie.consultar('84', desde=T0 + 60, hasta=T0 + 180)['bicis']) == [1, 2, 3]
+    assert list(serie.consultar('12', hasta=T0 + 60)['bicis']) == [10, 11]
+    assert len(serie.consultar('99')) == 0
+
+
+def test_el_anillo_lleno_se_vuelca_sin_perder_registros(serie):
+    for i in range(10):
+        serie.anadir('84', T0 + i, (i, 0))
+    assert len(serie.segmentos) == 2
+    assert list(serie.consultar('84')['bicis']) == list(range(10))
+
+
+def test_se_vuelca_cada_intervalo(serie, reloj):
+    serie.anadir('84', T0, (1, 19))
+    assert serie.segmentos == []
+    reloj.avanzar(900)
+    serie.anadir('84', T0 + 900, (2, 18))
+    assert len(serie.segmentos) == 1
+
+
+def test_sobrevive_a_un_reinicio(tmp_path, serie, reloj):
+    serie.anadir('84', T0, (1, 19))
+    serie.anadir('12', T0, (5, 15))
+    serie.volcar()
+    otra = Serie(str(tmp_path), 'valenbici', CAMPOS, capacidad=4, reloj=reloj)
+    assert list(otra.consultar('12')['bicis']) == [5]
+    otra.anadir('7', T0 + 60, (2, 18))
+    assert list(otra.consultar('84')['bicis']) == [1]
+
+
+def test_fusiona_los_dias_cerrados(serie, reloj):
+    for dia in range(2):
+        for hora in range(3):
+            serie.anadir('84', T0 + dia * SEGUNDOS_DIA + hora * 3600, (dia, hora))
+            serie.volcar()
+    # Los segmentos de hoy se quedan como están hasta que acabe el día
+    assert len(serie.segmentos) == 6
+    reloj.avanzar(2 * SEGUNDOS_DIA)
+    serie.anadir('84', T0 + 2 * SEGUNDOS_DIA, (2, 0))
+    serie.volcar()
+    assert len(serie.segmentos) == 3
+    resultado = serie.consultar('84')
+    assert list(zip(resultado['bicis'], resultado['libres'])) == [(0, 0), (0, 1), (0, 2), (1, 0), (1, 1), (1, 2),
+                                                                  (2, 0)]
+    assert np.all(np.diff(resultado['t'].astype(np.int64)) > 0)
+
+
+Estacion = namedtuple('Estacion', ['number', 'available_bikes', 'available_bike_stands'])
+Instantanea = namedtuple('Instantanea', ['modificada', 'estaciones'])
+
+
+def test_registrar_valenbici(tmp_path):
+    historico = Historico(str(tmp_path))
+    historico.registrar_valenbici(Instantanea(T0, {84: Estacion(84, 3, 17), 12: Estacion(12, 0, 20)}))
+    historico.registrar_valenbici(Instantanea(T0 + 60, {84: Estacion(84, 2, 18), 12: Estacion(12, 0, 20)}))
+    assert list(historico.valenbici.consultar('84')['bicis']) == [3, 2]
+    assert list(historico.valenbici.consultar(12)['t']) == [T0]
+
+
+def test_claves_compartidas_entre_procesos(tmp_path, reloj):
+    # Dos series sobre el mismo directorio, como dos workers: el mismo número para cada clave
+    una = Serie(str(tmp_path), 'valenbici', CAMPOS, reloj=reloj)
+    otra = Serie(str(tmp_path), 'valenbici', CAMPOS, reloj=reloj)
+    una.anadir('84', T0, (1, 19))
+    otra.anadir('12', T0, (5, 15))
+    otra.anadir('84', T0 + 60, (2, 18))
+    una.volcar()
+    otra.volcar()
+    assert list(una.consultar('84')['bicis']) == [1, 2]
+    assert list(otra.consultar('12')['bicis']) == [5]
+
+
+def test_solo_el_lider_fusiona(tmp_path, reloj):
+    lider = [False]
+    serie = Serie(str(tmp_path), 'metro', [('llegada', '<u4')], reloj=reloj, lider=lambda: lider[0])
+    for hora in range(3):
+        serie.anadir('x', T0 + hora * 3600, (hora,))
+        serie.volcar()
+    reloj.avanzar(SEGUNDOS_DIA)
+    serie.anadir('x', T0 + SEGUNDOS_DIA, (9,))
+    serie.volcar()
+    assert len(serie.segmentos) == 4
+    lider[0] = True
+    serie.anadir('x', T0 + SEGUNDOS_DIA + 60, (10,))
+    serie.volcar()
+    assert len(serie.segmentos) == 3
+    assert list(serie.consultar('x')['llegada']) == [0, 1, 2, 9, 10]
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+IndiceEspacial frente a recorrer todos los puntos, con puntos al azar
+alrededor de Valencia.
+"""
+
+import numpy as np
+import pytest
+
+import indice_espacial
+from indice_espacial import EMT, METRO, IndiceEspacial, IndiceTransporte, haversine
+
+CENTRO = 39.47, -0.376
+
+
+@pytest.fixture(scope='module')
+def puntos():
+    azar = np.random.default_rng(7)
+    lat = CENTRO[0] + azar.uniform(-0.05, 0.05, 2000)
+    lon = CENTRO[1] + azar.uniform(-0.06, 0.06, 2000)
+    return lat, lon
+
+
+@pytest.fixture(scope='module')
+def indice(puntos):
+    return IndiceEspacial(*puntos)
+
+
+@pytest.fixture(scope='module')
+def consultas():
+    azar = np.random.default_rng(11)
+    return CENTRO[0] + azar.uniform(-0.06, 0.06, 50), CENTRO[1] + azar.uniform(-0.07, 0.07, 50)
+
+
+def todos(puntos, lat, lon):
+    return haversine(lat, lon, *puntos)
+
+
+def test_haversine():
+    # Un grado de latitud son unos 111.2 km
+    assert haversine(39.0, -0.4, 40.0, -0.4) == pytest.approx(111195, rel=1e-4)
+    assert haversine(*CENTRO, *CENTRO) == 0
+
+
+@pytest.mark.parametrize('radio', [50, 300, 1200])
+def test_en_radio_igual_que_recorrer_todo(indice, puntos, consultas, radio):
+    for lat, lon in zip(*consultas):
+        indices, distancias = indice.en_radio(lat, lon, radio)
+        distancia = todos(puntos, lat, lon)
+        assert set(indices) == set(np.flatnonzero(distancia <= radio))
+        np.testing.assert_allclose(distancias, distancia[indices])
+        assert np.all(np.diff(distancias) >= 0)
+
+
+@pytest.mark.parametrize('k', [1, 5, 20])
+def test_cercanos_igual_que_recorrer_todo(indice, puntos, consultas, k):
+    for lat, lon in zip(*consultas):
+        indices, distancias = indice.cercanos(lat, lon, k)
+        np.testing.assert_allclose(distancias, np.sort(todos(puntos, lat, lon))[:k])
+
+
+def test_cercanos_con_menos_puntos_que_k():
+    indice = IndiceEspacial([39.47, 39.48], [-0.37, -0.38])
+    indices, distancias = indice.cercanos(*CENTRO, k=5)
+    assert sorted(indices) == [0, 1]
+    assert np.all(np.diff(distancias) >= 0)
+
+
+def test_lotes_igual_que_uno_a_uno(indice, consultas):
+    for (i, d), lat, lon in zip(indice.en_radio_lote(*consultas, 400), *consultas):
+        esperado = indice.en_radio(lat, lon, 400)
+        np.testing.assert_array_equal(i, esperado[0])
+        np.testing.assert_allclose(d, esperado[1])
+    indices, distancias = indice.cercanos_lote(*consultas, k=3)
+    for fila, (lat, lon) in enumerate(zip(*consultas)):
+        esperado = indice.cercanos(lat, lon, 3)
+        np.testing.assert_array_equal(indices[fila], esperado[0])
+        np.testing.assert_allclose(distancias[fila], esperado[1])
+
+
+def test_lotes_por_bloques(indice, consultas, monkeypatch):
+    # Con bloques de pocas celdas las consultas se reparten en varias pasadas
+    completo = indice.en_radio_lote(*consultas, 600)
+    monkeypatch.setattr(indice_espacial, 'CELDAS_POR_BLOQUE', 40)
+    for (i, d), (i_completo, d_completo) in zip(indice.en_radio_lote(*consultas, 600), completo):
+        np.testing.assert_array_equal(i, i_completo)
+        np.testing.assert_array_equal(d, d_completo)
+
+
+def test_lote_vacio():
+    indice = IndiceEspacial([], [])
+    assert indice.en_radio_lote([39.47], [-0.37], 500)[0][0].size == 0
+    indices, distancias = indice.cercanos_lote([39.47, 39.48], [-0.37, -0.38], k=2)
+    assert (indices == -1).all() and np.isinf(distancias).all()
+
+
+def test_lote_sin_suficientes_puntos_rellena():
+    indice = IndiceEspacial([39.47], [-0.37])
+    indices, distancias = indice.cercanos_lote([39.47], [-0.37], k=3)
+    assert list(indices[0]) == [0, -1, -1]
+    assert distancias[0, 0] == 0 and np.isinf(distancias[0, 1:]).all()
+
+
+def test_filas_de_transporte():
+    indice = IndiceTransporte([
+        (METRO, [39.4699], [-0.3763], ['Xàtiva'], ['3, 5, 9']),
+        (EMT, [39.4702], [-0.3770], ['Pl. Ajuntament'], ['4, 6, 8']),
+    ])
+    filas = indice.filas(*indice.en_radio(39.4699, -0.3763, 200))
+    assert [(f['Tipo'], f['Nombre'], f['Distancia (m)']) for f in filas] == [('Metro', 'Xàtiva', 0),
+                                                                               ('EMT', 'Pl. Ajuntament', 69)]
+
+
+def test_cercanos_con_mascara(indice, puntos, consultas):
+    mascara = np.arange(len(puntos[0])) % 3 == 0
+    for lat, lon in zip(*consultas):
+        indices, distancias = indice.cercanos(lat, lon, 4, mascara=mascara)
+        assert mascara[indices].all()
+        distancia = todos(puntos, lat, lon)
+        np.testing.assert_allclose(distancias, np.sort(distancia[mascara])[:4])
+
+
+def test_de_tipos():
+    indice = IndiceTransporte([
+        (METRO, [39.4699], [-0.3763], ['Xàtiva'], ['3, 5, 9']),
+        (EMT, [39.4702, 39.4800], [-0.3770, -0.3700], ['Pl. Ajuntament', 'Colón'], ['4', '6']),
+    ])
+    assert list(indice.de_tipos(['EMT'])) == [False, True, True]
+    assert not indice.de_tipos([]).any()
+    # Solo EMT: la más cercana no es la boca de metro, aunque esté en el mismo punto
+    indices, _ = indice.cercanos(39.4699, -0.3763, k=1, mascara=indice.de_tipos(['EMT']))
+    assert [f['Nombre'] for f in indice.filas(indices, [0])] == ['Pl. Ajuntament']
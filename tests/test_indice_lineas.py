@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+IndiceLineas frente a recorrer las filas, con el texto de líneas tal como
+viene en las tablas de metro y EMT.
+"""
+
+import numpy as np
+import pytest
+
+from indice_lineas import IndiceLineas, orden_linea, separar_lineas
+
+LINEAS = ['3,5,9', '4, 19, 99', 'N1', '', None, '19;99', '3', 'nan', '4 N1 n10', '99, 99']
+NOMBRES = ['Xàtiva', 'Pl. Ajuntament', 'Nit', 'Sin líneas', 'Tampoco', 'Colón', 'Benimaclet', 'Nada',
+           'Pl. Ajuntament', 'Blasco Ibáñez']
+
+
+@pytest.mark.parametrize('texto, esperado', [
+    ('3,5,9', ('3', '5', '9')),
+    ('4, 19, 99', ('4', '19', '99')),
+    ('n1;N1 c2', ('N1', 'C2')),
+    ('', ()), (None, ()), ('nan', ()), (float('nan'), ()),
+])
+def test_separar_lineas(texto, esperado):
+    assert separar_lineas(texto) == esperado
+
+
+def test_orden_de_las_lineas():
+    assert sorted(['N10', '99', 'C1', '4', 'N2', '19', 'N1'], key=orden_linea) == ['4', '19', '99', 'C1', 'N1',
+                                                                                  'N2', 'N10']
+
+
+@pytest.fixture
+def indice():
+    return IndiceLineas(LINEAS, NOMBRES)
+
+
+def recorrer(condicion):
+    return [i for i, texto in enumerate(LINEAS) if condicion(set(separar_lineas(texto)))]
+
+
+def test_lineas(indice):
+    assert indice.lineas == ['3', '4', '5', '9', '19', '99', 'N1', 'N10']
+    assert len(indice) == 8
+
+
+def test_filas_de_cada_linea(indice):
+    for linea in indice.lineas:
+        esperado = recorrer(lambda lineas: linea in lineas)
+        assert list(indice.filas_linea(linea)) == esperado
+        assert list(indice.filas(indice.bits(linea))) == esperado
+    assert list(indice.filas_linea('n1')) == [2, 8]
+    assert len(indice.filas_linea('70')) == 0 and indice.bits('70') == 0
+
+
+def test_union_e_interseccion(indice):
+    assert list(indice.filas(indice.union(['3', 'N1']))) == recorrer(lambda l: l & {'3', 'N1'})
+    assert list(indice.filas(indice.interseccion(['19', '99']))) == recorrer(lambda l: {'19', '99'} <= l)
+    assert indice.interseccion(['4', '70']) == 0
+    assert indice.interseccion([]) == 0 and indice.union([]) == 0
+    assert len(indice.filas(0)) == 0
+
+
+def test_nombres_sin_repetir(indice):
+    assert indice.nombres(indice.union(['4'])) == ['Pl. Ajuntament']
+    assert indice.nombres(indice.bits('99')) == ['Blasco Ibáñez', 'Colón', 'Pl. Ajuntament']
+
+
+def test_muchas_filas():
+    # Más filas que bits en un octeto y una fila al final, como en la tabla de EMT
+    lineas = ['1'] * 1125 + ['1, 2']
+    indice = IndiceLineas(lineas, [str(i) for i in range(1126)])
+    assert np.array_equal(indice.filas(indice.bits('1')), np.arange(1126))
+    assert list(indice.filas(indice.interseccion(['1', '2']))) == [1125]
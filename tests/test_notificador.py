@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Notificador: suscripciones, una descarga por estación y un solo aviso por
+llegada (aunque se retrase o se reinicie el proceso), con un enviador y
+unas llegadas de prueba.
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+import notificador as modulo
+from notificador import AlmacenSuscripciones, Notificador
+
+URL = 'https://geoportal.test/estacion/13'
+OTRA = 'https://geoportal.test/estacion/60'
+AHORA = datetime(2024, 5, 1, 12, 0, 0)
+
+
+def llegada(hora, linea='3', destino='Rafelbunyol'):
+    return {"Número de Línea": linea, "Destino": destino, "Tiempo": hora}
+
+
+class Enviador:
+    """Guarda los correos en lugar de enviarlos; con `fallar` lanza como un SMTP caído."""
+
+    def __init__(self):
+        self.correos = []
+        self.fallar = False
+
+    def enviar(self, destinatario, asunto, mensaje):
+        if self.fallar:
+            raise OSError('SMTP caído')
+        self.correos.append((destinatario, mensaje))
+
+
+class Llegadas:
+    """descargar(url) con las llegadas de cada estación; cuenta las descargas."""
+
+    def __init__(self):
+        self.por_url = {URL: [], OTRA: []}
+        self.descargas = []
+
+    def __call__(self, url):
+        self.descargas.append(url)
+        llegadas = self.por_url[url]
+        if isinstance(llegadas, Exception):
+            raise llegadas
+        return llegadas
+
+
+@pytest.fixture
+def almacen(tmp_path):
+    return AlmacenSuscripciones(str(tmp_path / 'suscripciones.db'))
+
+
+@pytest.fixture
+def enviador():
+    return Enviador()
+
+
+@pytest.fixture
+def llegadas():
+    return Llegadas()
+
+
+@pytest.fixture
+def notificador(almacen, enviador, llegadas):
+    return Notificador(almacen, enviador, descargar=llegadas)
+
+
+def test_suscripciones(almacen):
+    almacen.suscribir('ana@test', 'Xàtiva', URL, 5)
+    almacen.suscribir('ana@test', 'Xàtiva', URL, 10)
+    almacen.suscribir('ana@test', 'Colón', OTRA, 3)
+    almacen.suscribir('joan@test', 'Xàtiva', URL, 2)
+    assert [(s.estacion, s.minutos) for s in almacen.de_email('ana@test')] == [('Colón', 3), ('Xàtiva', 10)]
+    grupos = almacen.por_estacion()
+    assert sorted(s.email for s in grupos[URL]) == ['ana@test', 'joan@test']
+    assert almacen.dar_de_baja('ana@test', OTRA) == 1
+    assert almacen.dar_de_baja('ana@test') == 1
+    assert list(almacen.por_estacion()) == [URL]
+
+
+def test_avisa_solo_lo_que_entra_en_el_margen(almacen, notificador, enviador, llegadas):
+    almacen.suscribir('ana@test', 'Xàtiva', URL, 5)
+    llegadas.por_url[URL] = [llegada('12:03:00'), llegada('12:20:00', destino='Aeroport')]
+    assert notificador.ciclo(AHORA) == 1
+    (destinatario, mensaje), = enviador.correos
+    assert destinatario == 'ana@test'
+    assert 'Rafelbunyol en 3 minutos' in mensaje and 'Aeroport' not in mensaje
+
+
+def test_no_repite_el_aviso(almacen, notificador, enviador, llegadas):
+    almacen.suscribir('ana@test', 'Xàtiva', URL, 5)
+    llegadas.por_url[URL] = [llegada('12:03:00')]
+    assert notificador.ciclo(AHORA) == 1
+    assert notificador.ciclo(AHORA) == 0
+    assert len(enviador.correos) == 1
+
+
+def test_una_descarga_por_estacion(almacen, notificador, enviador, llegadas):
+    for email in ('ana@test', 'joan@test', 'pep@test'):
+        almacen.suscribir(email, 'Xàtiva', URL, 5)
+    llegadas.por_url[URL] = [llegada('12:03:00')]
+    assert notificador.ciclo(AHORA) == 3
+    assert llegadas.descargas == [URL]
+
+
+def test_hora_desconocida_no_avisa(almacen, notificador, llegadas):
+    almacen.suscribir('ana@test', 'Xàtiva', URL, 5)
+    llegadas.por_url[URL] = [llegada('Vía 1'), llegada('')]
+    assert notificador.ciclo(AHORA) == 0
+
+
+def test_si_el_correo_falla_se_vuelve_a_intentar(almacen, notificador, enviador, llegadas):
+    almacen.suscribir('ana@test', 'Xàtiva', URL, 5)
+    llegadas.por_url[URL] = [llegada('12:03:00')]
+    enviador.fallar = True
+    assert notificador.ciclo(AHORA) == 0
+    enviador.fallar = False
+    assert notificador.ciclo(AHORA) == 1
+
+
+def test_una_estacion_caida_no_para_las_demas(almacen, notificador, llegadas):
+    almacen.suscribir('ana@test', 'Xàtiva', URL, 5)
+    almacen.suscribir('ana@test', 'Colón', OTRA, 5)
+    llegadas.por_url[URL] = ConnectionError('geoportal caído')
+    llegadas.por_url[OTRA] = [llegada('12:02:00')]
+    assert notificador.ciclo(AHORA) == 1
+
+
+def test_un_tren_con_retraso_no_se_vuelve_a_avisar(almacen, notificador, enviador, llegadas):
+    almacen.suscribir('ana@test', 'Xàtiva', URL, 5)
+    llegadas.por_url[URL] = [llegada('12:03:00')]
+    assert notificador.ciclo(AHORA) == 1
+    llegadas.por_url[URL] = [llegada('12:05:00')]
+    assert notificador.ciclo(AHORA + timedelta(minutes=1)) == 0
+
+
+def test_el_tren_siguiente_si_se_avisa(almacen, notificador, enviador, llegadas):
+    almacen.suscribir('ana@test', 'Xàtiva', URL, 5)
+    llegadas.por_url[URL] = [llegada('12:03:00'), llegada('12:09:00')]
+    assert notificador.ciclo(AHORA) == 1
+    # El de las 12:09 entra en el margen; el primero sigue siendo el ya avisado
+    assert notificador.ciclo(AHORA + timedelta(minutes=4)) == 1
+    assert 'en 5 minutos' in enviador.correos[-1][1] and 'en 2 minutos' not in enviador.correos[-1][1]
+    # Ya han pasado los dos: el siguiente es nuevo
+    llegadas.por_url[URL] = [llegada('12:14:00')]
+    assert notificador.ciclo(AHORA + timedelta(minutes=10)) == 1
+
+
+def test_los_avisos_sobreviven_a_un_reinicio(almacen, notificador, enviador, llegadas):
+    almacen.suscribir('ana@test', 'Xàtiva', URL, 5)
+    llegadas.por_url[URL] = [llegada('12:03:00')]
+    assert notificador.ciclo(AHORA) == 1
+    otro = Notificador(almacen, enviador, descargar=llegadas)
+    assert otro.ciclo(AHORA + timedelta(seconds=30)) == 0
+
+
+def test_muchas_suscripciones_en_varios_bloques(monkeypatch, almacen, notificador, enviador, llegadas):
+    # Las consultas IN (...) se parten en bloques de MAX_VARIABLES ids
+    monkeypatch.setattr(modulo, 'MAX_VARIABLES', 2)
+    for i in range(5):
+        almacen.suscribir(f'usuario{i}@test', 'Xàtiva', URL, 5)
+    llegadas.por_url[URL] = [llegada('12:03:00'), llegada('12:04:00', destino='Aeroport')]
+    assert notificador.ciclo(AHORA) == 5
+    ids = [s.id for s in almacen.por_estacion()[URL]]
+    assert len(almacen.avisados(ids)) == 10
+    assert notificador.ciclo(AHORA + timedelta(seconds=30)) == 0
+    assert len(enviador.correos) == 5
+
+
+def test_sin_cuenta_de_correo_no_arranca(monkeypatch):
+    monkeypatch.delenv('VALENCIA_SMTP_USUARIO', raising=False)
+    monkeypatch.delenv('VALENCIA_SMTP_CLAVE', raising=False)
+    monkeypatch.setattr('sys.argv', ['notificador.py', '--una-vez'])
+    with pytest.raises(SystemExit):
+        modulo.main()
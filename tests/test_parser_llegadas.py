@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+parser_llegadas frente a la extracción original con BeautifulSoup, sobre las
+páginas grabadas de geoportal y EMT y algunos casos raros.
+"""
+
+import os
+
+import pytest
+from bs4 import BeautifulSoup
+
+from conftest import FIXTURES
+from parser_llegadas import DESTINO_DESCONOCIDO, LINEA_DESCONOCIDA, TIEMPO_DESCONOCIDO, extraer_movimientos
+
+
+# Extracción de obtener_proximos_movimientos_bus antes de parser_llegadas
+def referencia_bs(html):
+    soup = BeautifulSoup(html, 'html.parser')
+    movimientos = []
+    for div in soup.find_all('div', style=lambda value: value and 'padding-left: 5px' in value):
+        imagen = div.find('img')
+        numero_linea = imagen['src'].split('_')[-1].split('.')[0] if imagen else "Desconocido"
+        b_tag = div.find('b')
+        destino = b_tag.text.strip() if b_tag else "Destino desconocido"
+        span_tags = div.find_all('span')
+        tiempo = span_tags[-1].text.strip() if span_tags else "Tiempo desconocido"
+        movimientos.append({"Número de Línea": numero_linea, "Destino": destino, "Tiempo": tiempo})
+    return movimientos
+
+
+def paginas():
+    for carpeta in ('geoportal', 'emt'):
+        for nombre in sorted(os.listdir(os.path.join(FIXTURES, carpeta))):
+            yield f'{carpeta}/{nombre}'
+
+
+@pytest.mark.parametrize('pagina', list(paginas()))
+def test_mismo_resultado_que_beautifulsoup(pagina):
+    with open(os.path.join(FIXTURES, pagina), encoding='utf-8') as f:
+        html = f.read()
+    assert extraer_movimientos(html) == referencia_bs(html)
+
+
+RAROS = [
+    '',
+    '<html><body>No hay información</body></html>',
+    # Sin imagen, sin destino y sin tiempo
+    '<div style="padding-left: 5px"></div>',
+    # Atributos con comillas simples, mayúsculas y entidades
+    "<DIV STYLE='padding-left: 5px; color: red'><IMG SRC='img/linea_N1.png'/> <B> Nit: Tarongers &amp; Port </B>"
+    "<SPAN>a</SPAN><span>Port - 3 min</span></DIV>",
+    # Divs anidados y comentarios
+    '<div style="padding-left: 5px"><!-- <b>no</b> --><div><img src="x_7.png"><b>Dentro</b></div>'
+    '<span>10:00:00</span></div>',
+    # Un div de llegada sin cerrar al final de la página
+    '<div style="padding-left: 5px"><img src="linea_3.png"><b>Rafelbunyol</b><span>12:00:00</span>',
+]
+
+
+@pytest.mark.parametrize('html', RAROS)
+def test_casos_raros(html):
+    assert extraer_movimientos(html) == referencia_bs(html)
+
+
+def test_valores_por_defecto():
+    movimiento, = extraer_movimientos('<div style="padding-left: 5px"></div>')
+    assert movimiento == {"Número de Línea": LINEA_DESCONOCIDA, "Destino": DESTINO_DESCONOCIDO,
+                          "Tiempo": TIEMPO_DESCONOCIDO}
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Planificador: intervalos por próxima llegada e interés, y el presupuesto de
+peticiones por segundo como techo.
+"""
+
+import pytest
+
+from conftest import Reloj
+from planificador import Planificador, intervalo_deseado, ttl_llegadas
+
+URLS = [f'https://geoportal.test/estacion/{i}' for i in range(100)]
+
+
+def simular(planificador, reloj, segundos, restante=lambda url: 30.0, paso=0.1):
+    # Descarga al momento lo que toca y anota su próxima llegada
+    por_url = {}
+    for _ in range(int(segundos / paso)):
+        for url in planificador.pendientes():
+            por_url[url] = por_url.get(url, 0) + 1
+            planificador.programar(url, restante(url))
+        reloj.avanzar(paso)
+    return por_url
+
+
+def test_intervalo_deseado():
+    assert intervalo_deseado(None, minimo=2, maximo=120) == 120
+    assert intervalo_deseado(40, minimo=2, maximo=120) == 10
+    assert intervalo_deseado(1, minimo=2, maximo=120) == 2
+    assert intervalo_deseado(10_000, minimo=2, maximo=120) == 120
+    # Con interés el intervalo se acorta, sin bajar del mínimo
+    assert intervalo_deseado(40, interes=1, minimo=2, maximo=120) == 5
+    assert intervalo_deseado(40, interes=1000, minimo=2, maximo=120) == 2
+
+
+def test_no_pasa_del_presupuesto():
+    reloj = Reloj()
+    # 100 estaciones con el tren a 30 s querrían 100 / 7.5 = 13.3 descargas por segundo
+    planificador = Planificador(URLS, presupuesto=5.0, minimo=2, maximo=120, reloj=reloj)
+    por_url = simular(planificador, reloj, 200)
+    descargas = sum(por_url.values())
+    assert descargas <= 5.0 * 200 + 1
+    assert descargas >= 0.9 * 5.0 * 200
+    assert planificador.escala() > 1
+    assert len(por_url) == len(URLS)
+
+
+def test_con_presupuesto_de_sobra_sigue_el_intervalo_deseado():
+    reloj = Reloj()
+    planificador = Planificador(URLS[:2], presupuesto=100.0, minimo=2, maximo=120, reloj=reloj)
+    por_url = simular(planificador, reloj, 100, restante=lambda url: 40.0 if url == URLS[0] else 400.0)
+    # Cada 10 s y cada 100 s, más la descarga inicial
+    assert por_url[URLS[0]] == pytest.approx(11, abs=1)
+    assert por_url[URLS[1]] == pytest.approx(2, abs=1)
+    assert planificador.escala() == 1
+
+
+def test_las_vistas_adelantan_la_estacion():
+    reloj = Reloj()
+    planificador = Planificador(URLS[:2], presupuesto=100.0, minimo=2, maximo=120, reloj=reloj)
+    assert simular(planificador, reloj, 1, restante=lambda url: 400.0) == {URLS[0]: 1, URLS[1]: 1}
+    reloj.avanzar(30)
+    assert planificador.pendientes() == []
+    for _ in range(20):
+        planificador.ver(URLS[1])
+    assert planificador.pendientes() == [URLS[1]]
+
+
+def test_en_vuelo_no_se_vuelve_a_sacar():
+    reloj = Reloj()
+    planificador = Planificador(URLS[:1], presupuesto=100.0, minimo=2, maximo=120, reloj=reloj)
+    assert planificador.pendientes() == URLS[:1]
+    reloj.avanzar(500)
+    planificador.ver(URLS[0])
+    assert planificador.pendientes() == []
+    planificador.reintentar(URLS[0])
+    reloj.avanzar(120)
+    assert planificador.pendientes() == URLS[:1]
+
+
+def test_suscriptores_cuentan_como_interes():
+    reloj = Reloj()
+    planificador = Planificador(URLS[:2], presupuesto=100.0, reloj=reloj)
+    planificador.fijar_suscriptores({URLS[0]: 3})
+    assert planificador.interes(URLS[0]) == 3
+    assert planificador.intervalo(URLS[0]) < planificador.intervalo(URLS[1])
+    planificador.fijar_suscriptores({})
+    assert planificador.interes(URLS[0]) == 0
+
+
+def bus(*textos):
+    return [{"Tiempo": texto} for texto in textos]
+
+
+@pytest.mark.parametrize('movimientos, esperado', [
+    ([], 60),
+    (bus('Port - 1 min'), 15),
+    (bus('Port - 10 min'), 60),
+    (bus('Port - En parada'), 5),
+    (bus('Port - Próximo', 'Port - 20 min'), 5),
+    (bus('Port - Pròxim'), 5),
+    (bus('Tiempo desconocido'), 5),
+])
+def test_ttl_llegadas(movimientos, esperado):
+    assert ttl_llegadas(5, 60)(movimientos) == esperado
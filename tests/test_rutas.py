@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Rutas en bici: codificación de polilíneas, AlmacenRutas y ServicioRutas con
+una descarga de prueba (sin Mapbox).
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from rutas import (FUENTE_ESTIMADA, FUENTE_MAPBOX, FUENTE_MATRIZ, AlmacenRutas, MatrizDuraciones, Ruta,
+                   ServicioRutas, codificar_polilinea, decodificar_polilinea)
+
+# (número, lon, lat)
+XATIVA = (1, -0.3770, 39.4669)
+COLON = (2, -0.3710, 39.4700)
+BENIMACLET = (3, -0.3590, 39.4860)
+
+
+def test_polilinea_de_la_documentacion_de_google():
+    coordenadas = [[-120.2, 38.5], [-120.95, 40.7], [-126.453, 43.252]]
+    assert codificar_polilinea(coordenadas) == '_p~iF~ps|U_ulLnnqC_mqNvxq`@'
+    assert decodificar_polilinea('_p~iF~ps|U_ulLnnqC_mqNvxq`@') == coordenadas
+
+
+def test_polilinea_ida_y_vuelta():
+    coordenadas = [[-0.37701, 39.46693], [-0.37698, 39.46701], [-0.3589, 39.48602], [-0.3589, 39.48602]]
+    assert decodificar_polilinea(codificar_polilinea(coordenadas)) == coordenadas
+    assert decodificar_polilinea('') == []
+
+
+def test_almacen(tmp_path):
+    almacen = AlmacenRutas(str(tmp_path / 'rutas.db'))
+    assert almacen.obtener(1, 2) is None
+    almacen.guardar(1, 2, Ruta(300.0, 900.0, 'abc', FUENTE_MAPBOX))
+    almacen.guardar(1, 2, Ruta(320.0, 950.0, 'abd', FUENTE_MAPBOX))
+    # Sobrevive a otra instancia sobre el mismo fichero; (2, 1) es otro par
+    otro = AlmacenRutas(almacen.ruta)
+    assert otro.obtener(1, 2) == Ruta(320.0, 950.0, 'abd', FUENTE_MAPBOX)
+    assert otro.obtener(2, 1) is None
+    assert len(otro) == 1
+
+
+class Descarga:
+    """descargar(origen, destino) que cuenta las llamadas y puede quedarse esperando o fallar."""
+
+    def __init__(self):
+        self.llamadas = 0
+        self.error = None
+        self.soltar = threading.Event()
+        self.soltar.set()
+        self.empezada = threading.Event()
+
+    def __call__(self, origen, destino):
+        self.llamadas += 1
+        self.empezada.set()
+        assert self.soltar.wait(5)
+        if self.error is not None:
+            raise self.error
+        return 420.0, 1300.0, codificar_polilinea([origen, destino])
+
+
+@pytest.fixture
+def descarga():
+    return Descarga()
+
+
+@pytest.fixture
+def servicio(tmp_path, descarga):
+    return ServicioRutas(AlmacenRutas(str(tmp_path / 'rutas.db')), descargar=descarga)
+
+
+def test_la_duracion_no_usa_la_red(servicio, descarga):
+    ruta = servicio.ruta(XATIVA, COLON)
+    assert ruta.fuente == FUENTE_ESTIMADA and ruta.duracion > 0
+    assert decodificar_polilinea(ruta.geometria) == [list(XATIVA[1:]), list(COLON[1:])]
+    assert descarga.llamadas == 0
+
+
+def test_duracion_de_la_matriz(tmp_path, descarga):
+    matriz = MatrizDuraciones([1, 2], [[0, 250], [270, 0]], [[True, True], [True, True]])
+    servicio = ServicioRutas(AlmacenRutas(str(tmp_path / 'rutas.db')), matriz, descargar=descarga)
+    assert servicio.ruta(COLON, XATIVA)[::3] == (270.0, FUENTE_MATRIZ)
+    # Una estación fuera de la matriz se estima por distancia
+    assert servicio.ruta(XATIVA, BENIMACLET).fuente == FUENTE_ESTIMADA
+
+
+def test_la_geometria_se_descarga_una_vez(servicio, descarga):
+    ruta = servicio.geometria(XATIVA, COLON)
+    assert ruta == Ruta(420.0, 1300.0, ruta.geometria, FUENTE_MAPBOX)
+    assert servicio.geometria(XATIVA, COLON) is ruta
+    # Con la ruta ya guardada la duración es la de Mapbox
+    assert servicio.ruta(XATIVA, COLON) is ruta
+    assert (descarga.llamadas, servicio.descargas, servicio.aciertos_memoria) == (1, 1, 2)
+
+
+def test_la_geometria_queda_en_disco(tmp_path, servicio, descarga):
+    servicio.geometria(XATIVA, COLON)
+    otro = ServicioRutas(AlmacenRutas(servicio.almacen.ruta), descargar=descarga)
+    assert otro.ruta(XATIVA, COLON).fuente == FUENTE_MAPBOX
+    assert (descarga.llamadas, otro.aciertos_disco) == (1, 1)
+
+
+def test_una_sola_descarga_para_sesiones_simultaneas(servicio, descarga):
+    descarga.soltar.clear()
+    with ThreadPoolExecutor(6) as ejecutor:
+        futuros = [ejecutor.submit(servicio.geometria, XATIVA, COLON) for _ in range(6)]
+        assert descarga.empezada.wait(5)
+        descarga.soltar.set()
+        rutas = [f.result(5) for f in futuros]
+    assert descarga.llamadas == 1
+    assert all(r == rutas[0] for r in rutas)
+
+
+def test_sin_mapbox_no_se_guarda_nada(servicio, descarga):
+    descarga.error = ConnectionError('Mapbox caído')
+    assert servicio.geometria(XATIVA, COLON) is None
+    assert servicio.sin_servicio == 1 and len(servicio.almacen) == 0
+    descarga.error = None
+    assert servicio.geometria(XATIVA, COLON).fuente == FUENTE_MAPBOX
+
+
+def test_pedir_geometria_no_espera(servicio, descarga):
+    descarga.soltar.clear()
+    assert servicio.pedir_geometria(XATIVA, COLON) is None
+    assert descarga.empezada.wait(5)
+    assert servicio.en_vuelo(XATIVA, COLON)
+    # Pedirla otra vez mientras se descarga no empieza otra descarga
+    assert servicio.pedir_geometria(XATIVA, COLON) is None
+    descarga.soltar.set()
+    assert servicio.geometria(XATIVA, COLON).fuente == FUENTE_MAPBOX
+    assert not servicio.en_vuelo(XATIVA, COLON)
+    assert servicio.pedir_geometria(XATIVA, COLON).fuente == FUENTE_MAPBOX
+    assert descarga.llamadas == 1
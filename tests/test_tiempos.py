@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+tiempos.py frente a las funciones fila a fila de antes, con lotes pequeños
+(fila a fila) y grandes (numpy).
+"""
+
+import math
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+import tiempos
+
+
+def calcular_tiempo_restante(hora_llegada, ahora):
+    formato = '%H:%M:%S'
+    try:
+        hora_actual = datetime.strptime(ahora.strftime(formato), formato)
+        hora_llegada_dt = datetime.strptime(hora_llegada, formato)
+        if hora_llegada_dt < hora_actual:
+            hora_llegada_dt += timedelta(days=1)
+        return ":".join(str(hora_llegada_dt - hora_actual).split(":")[1:])
+    except ValueError:
+        return '+1 hora'
+
+
+def minutos_bus(hora_llegada):
+    try:
+        return int(hora_llegada.split('min')[0].split('-')[-1].strip()) * 60
+    except ValueError:
+        return math.nan
+
+
+HORAS = ['12:00:00', '00:00:00', '23:59:59', '7:05:00', '24:00:00', '12:61:00', '', 'Inmediato', '12:00:60',
+         'Vía 1', '12:00:00 ']
+
+TEXTOS = ['P. Congressos - 21 min', 'Pròxim', '- 5 min', '5min', 'Dr. Lluch-Mar - 7 min', '- +3 min',
+          'Tiempo desconocido', '- ١٢ min', '- ５ min', '1_0 min', '_10 min', '-\xa07 min', '-  8 min',
+          'Port - 9', 'Port - 0 min', '- 1234567890123456 min', '- 12345678901234567890 min', '- 9 min min',
+          'Port - 1 2 min', 'Port - min', '']
+
+
+@pytest.mark.parametrize('repeticiones', [1, 100])
+def test_metro(repeticiones):
+    ahora = datetime(2024, 5, 1, 23, 50, 30)
+    horas = HORAS * repeticiones
+    assert tiempos.tiempos_restantes_metro(horas, ahora) == [calcular_tiempo_restante(h, ahora) for h in horas]
+
+
+@pytest.mark.parametrize('repeticiones', [1, 100])
+def test_bus_igual_que_int(repeticiones):
+    textos = TEXTOS * repeticiones
+    esperado = np.array([minutos_bus(t) for t in textos], dtype=np.float64)
+    np.testing.assert_array_equal(tiempos.segundos_restantes_bus(textos), esperado)
+
+
+def test_bus_con_salto_de_linea_en_un_texto():
+    textos = ['Port - 3 min'] * tiempos.MIN_LOTE_BUS + ['Port\n- 4 min']
+    assert tiempos.segundos_restantes_bus(textos)[-1] == 240
+
+
+def test_formatear_bus():
+    assert tiempos.tiempos_restantes_bus(['Port - 75 min', 'Pròxim', 'Port - 1500 min']) == [
+        '01:15', tiempos.SIN_HORA_BUS, '01:00']
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ServicioValenBici: peticiones condicionales, 304 y cuerpos repetidos, y
+sustitución solo de las estaciones que cambian.
+"""
+
+import json
+
+import pytest
+
+from valenbici import ORIGEN_API, ORIGEN_CSV, Estacion, ServicioValenBici
+
+URL = 'https://jcdecaux.test/vls/v1/stations'
+
+
+def estacion(numero, bicis=5, estado='OPEN'):
+    return {'number': numero, 'address': f'Estación {numero}', 'position': {'lat': 39.47, 'lng': -0.37},
+            'available_bikes': bicis, 'available_bike_stands': 20 - bicis, 'bike_stands': 20,
+            'status': estado, 'last_update': 1_700_000_000_000}
+
+
+class Respuesta:
+
+    def __init__(self, status_code, cuerpo=b'', headers=None):
+        self.status_code = status_code
+        self.content = cuerpo
+        self.headers = headers or {}
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise ConnectionError(self.status_code)
+
+
+class Cliente:
+    """cliente.get que contesta con las respuestas de la lista y guarda las cabeceras enviadas."""
+
+    def __init__(self):
+        self.respuestas = []
+        self.cabeceras = []
+
+    def feed(self, estaciones, etag=None):
+        headers = {'ETag': etag} if etag else {}
+        self.respuestas.append(Respuesta(200, json.dumps(estaciones).encode(), headers))
+
+    def get(self, url, headers=None, **kwargs):
+        self.cabeceras.append(dict(headers or {}))
+        return self.respuestas.pop(0)
+
+
+def respaldo():
+    return {1: Estacion(1, 'Copia', 39.47, -0.37, 1, 19, 20, 'OPEN', 0)}
+
+
+@pytest.fixture
+def cliente():
+    return Cliente()
+
+
+@pytest.fixture
+def servicio(cliente):
+    return ServicioValenBici(URL, cliente=cliente, respaldo=respaldo)
+
+
+def test_hasta_la_primera_descarga_sirve_la_copia(servicio):
+    assert servicio.instantanea().origen == ORIGEN_CSV
+    assert list(servicio.estaciones()['address']) == ['Copia']
+
+
+def test_la_primera_descarga_sustituye_la_copia(servicio, cliente):
+    cliente.feed([estacion(1), estacion(2)])
+    assert servicio.actualizar() == 2
+    instantanea = servicio.instantanea()
+    assert instantanea.origen == ORIGEN_API
+    assert sorted(instantanea.estaciones) == [1, 2]
+
+
+def test_solo_cambian_las_estaciones_que_cambian(servicio, cliente):
+    cliente.feed([estacion(1), estacion(2), estacion(3)])
+    servicio.actualizar()
+    anterior = servicio.instantanea()
+    cliente.feed([estacion(1), estacion(2, bicis=9)])
+    assert servicio.actualizar() == 2  # la 2 cambia y la 3 se retira
+    instantanea = servicio.instantanea()
+    assert instantanea.estaciones[1] is anterior.estaciones[1]
+    assert instantanea.estaciones[2].available_bikes == 9
+    assert 3 not in instantanea.estaciones
+    assert servicio.estaciones_cambiadas == 5
+
+
+def test_peticion_condicional_y_304(servicio, cliente):
+    cliente.feed([estacion(1)], etag='"v1"')
+    servicio.actualizar()
+    anterior = servicio.instantanea()
+    cliente.respuestas.append(Respuesta(304))
+    assert servicio.actualizar() == 0
+    assert cliente.cabeceras[-1] == {'If-None-Match': '"v1"'}
+    # Se comprueba, pero la tabla y las estaciones son las mismas
+    assert servicio.instantanea().tabla is anterior.tabla
+    assert servicio.no_modificadas == 1
+
+
+def test_el_mismo_cuerpo_no_se_vuelve_a_procesar(servicio, cliente):
+    cliente.feed([estacion(1)])
+    cliente.feed([estacion(1)])
+    servicio.actualizar()
+    anterior = servicio.instantanea()
+    assert servicio.actualizar() == 0
+    assert servicio.instantanea().tabla is anterior.tabla
+    assert servicio.no_modificadas == 1
+
+
+def test_un_feed_vacio_o_un_error_no_borran_los_datos(servicio, cliente):
+    cliente.feed([estacion(1)])
+    servicio.actualizar()
+    cliente.feed([])
+    with pytest.raises(ValueError):
+        servicio.actualizar()
+    cliente.respuestas.append(Respuesta(503))
+    with pytest.raises(ConnectionError):
+        servicio.actualizar()
+    assert list(servicio.instantanea().estaciones) == [1]
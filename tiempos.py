@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cálculo por lotes del tiempo restante hasta cada llegada.
+
+Equivalen a calcular_tiempo_restante (metro, horas 'HH:MM:SS') y a
+calcular_tiempo_restante_bus (EMT, textos '... - N min'), pero procesan
+todas las llegadas de una vez con numpy y con un único "ahora"
+compartido, en lugar de llamar a strptime y split fila a fila.
+
+Los de EMT solo compensan con muchos textos (MIN_LOTE_BUS): el split de
+cada fila ya era barato. Con numpy solo se leen los de la forma habitual
+(' 21 ' entre el guion y 'min'); los demás pasan por int(), así que el
+resultado es el mismo también con dígitos de otros alfabetos, '_' o
+números largos.
+
+Los segundos restantes se devuelven como array de float; NaN indica un
+texto que la función original no sabía interpretar.
+"""
+
+from datetime import datetime
+
+import numpy as np
+
+SEGUNDOS_DIA = 24 * 3600
+
+# Textos que devolvían las funciones originales cuando no entendían la hora
+SIN_HORA_METRO = '+1 hora'
+SIN_HORA_BUS = "Tiempo desconocido"
+
+_DIGITOS = [0, 1, 3, 4, 6, 7]  # Posiciones de los dígitos en 'HH:MM:SS'
+# Por debajo de tantos textos de EMT (una parada tiene unas decenas) numpy cuesta más que int() fila a fila
+MIN_LOTE_BUS = 150
+
+
+def _segundos_del_dia(ahora):
+    return ahora.hour * 3600 + ahora.minute * 60 + ahora.second
+
+
+def _hora_lenta(texto):
+    # Formatos que strptime acepta pero no son 'HH:MM:SS' exacto (p. ej. '7:05:00')
+    try:
+        hora = datetime.strptime(texto, '%H:%M:%S')
+    except (TypeError, ValueError):
+        return np.nan
+    return hora.hour * 3600 + hora.minute * 60 + hora.second
+
+
+def segundos_restantes_metro(horas, ahora=None):
+    """Segundos hasta cada hora 'HH:MM:SS'; si ya ha pasado, cuenta hasta la del día siguiente."""
+    ahora = _segundos_del_dia(ahora or datetime.now())
+    textos = np.asarray(horas, dtype=object)
+    segundos = np.full(len(textos), np.nan)
+    if not len(textos):
+        return segundos
+
+    # Camino rápido: los textos de 8 caracteres se leen como una matriz de códigos (UCS-4)
+    unicode = textos.astype('U')
+    matriz = unicode.astype('U8').view(np.int32).reshape(len(textos), 8)
+    digitos = matriz[:, _DIGITOS] - ord('0')
+    rapidas = ((np.char.str_len(unicode) == 8)
+               & (matriz[:, 2] == ord(':')) & (matriz[:, 5] == ord(':'))
+               & ((digitos >= 0) & (digitos <= 9)).all(axis=1))
+    h = digitos[:, 0] * 10 + digitos[:, 1]
+    m = digitos[:, 2] * 10 + digitos[:, 3]
+    s = digitos[:, 4] * 10 + digitos[:, 5]
+    rapidas &= (h < 24) & (m < 60) & (s < 60)
+    segundos[rapidas] = (h * 3600 + m * 60 + s)[rapidas]
+
+    # Resto de textos: uno a uno con strptime, como la función original
+    for i in np.flatnonzero(~rapidas):
+        segundos[i] = _hora_lenta(textos[i])
+
+    # Paso de medianoche: una hora ya pasada es la del día siguiente
+    return np.mod(segundos - ahora, SEGUNDOS_DIA)
+
+
+def formatear_restante_metro(segundos):
+    """Mismo texto que calcular_tiempo_restante ('MM:SS'; '+1 hora' si no había hora)."""
+    resultado = []
+    for valor in segundos:
+        if np.isnan(valor):
+            resultado.append(SIN_HORA_METRO)
+        else:
+            valor = int(valor)
+            resultado.append(f'{(valor // 60) % 60:02d}:{valor % 60:02d}')
+    return resultado
+
+
+def _minutos_lento(texto):
+    try:
+        return int(str(texto).split('min')[0].split('-')[-1].strip())
+    except ValueError:
+        return np.nan
+
+
+def _segundos_lento(textos):
+    return np.array([_minutos_lento(texto) * 60 for texto in textos], dtype=np.float64)
+
+
+def segundos_restantes_bus(textos):
+    """Segundos hasta cada llegada de EMT a partir de textos como 'P. Congressos - 21 min'."""
+    if len(textos) < MIN_LOTE_BUS:
+        return _segundos_lento(textos)
+    segundos = np.full(len(textos), np.nan)
+    # Todos los textos en un solo buffer UTF-8, separados por '\n': cada búsqueda es una pasada sobre él
+    try:
+        unidos = '\n'.join(textos)
+    except TypeError:
+        unidos = '\n'.join(map(str, textos))
+    octetos = np.frombuffer(unidos.encode('utf-8'), dtype=np.uint8)
+    saltos = np.flatnonzero(octetos == ord('\n'))
+    if len(saltos) != len(textos) - 1:
+        # Algún texto lleva su propio '\n': no se pueden separar las filas, todos por el camino lento
+        return _segundos_lento(textos)
+    inicios = np.concatenate(([0], saltos + 1))
+    finales = np.append(saltos, len(octetos))
+
+    # Igual que hora_llegada.split('min')[0].split('-')[-1].strip(): el número está justo
+    # antes de la primera 'min' de la fila (o de su final), después del último '-' previo
+    emes = np.flatnonzero(octetos[:-2] == ord('m'))
+    mins = emes[(octetos[emes + 1] == ord('i')) & (octetos[emes + 2] == ord('n'))]
+    fin = _siguiente(mins, inicios, finales)
+    inicio = _anterior(np.flatnonzero(octetos == ord('-')), fin, inicios, inicios - 1) + 1
+
+    # Camino rápido para la forma habitual, ' 21 ': como mucho un espacio a cada lado y de 1 a 15
+    # dígitos ASCII (más no caben en un int64 sin desbordar). El resto ('Pròxim', '+3', '５', '1_0',
+    # espacios de fuera de ASCII...) se calcula con int() fila a fila, como antes
+    hay = fin > inicio
+    ultimo = len(octetos) - 1
+    primero = inicio + (hay & (octetos[np.minimum(inicio, ultimo)] == ord(' ')))
+    final = fin - (hay & (octetos[np.maximum(fin - 1, 0)] == ord(' ')))
+    cifras = final - primero
+    rapidas = (cifras >= 1) & (cifras <= 15)
+    minutos = np.zeros(len(textos), dtype=np.int64)
+    for j in range(int(cifras[rapidas].max()) if rapidas.any() else 0):
+        # Dígito j de cada fila que lo tiene (de izquierda a derecha)
+        tiene = rapidas & (cifras > j)
+        digito = octetos[np.minimum(primero + j, ultimo)].astype(np.int64) - ord('0')
+        rapidas &= ~tiene | ((digito >= 0) & (digito <= 9))
+        minutos = np.where(tiene, minutos * 10 + digito, minutos)
+    segundos[rapidas] = minutos[rapidas] * 60
+
+    for i in np.flatnonzero(~rapidas):
+        segundos[i] = _minutos_lento(textos[i]) * 60
+    return segundos
+
+
+def _siguiente(posiciones, desde, limite):
+    # Primera de `posiciones` (ordenadas) en [desde, limite) para cada fila; `limite` si no hay ninguna
+    i = np.searchsorted(posiciones, desde)
+    candidata = posiciones[np.minimum(i, len(posiciones) - 1)] if len(posiciones) else limite
+    return np.where((i < len(posiciones)) & (candidata < limite), candidata, limite)
+
+
+def _anterior(posiciones, hasta, desde, ninguna):
+    # Última de `posiciones` (ordenadas) en [desde, hasta) para cada fila; `ninguna` si no hay
+    i = np.searchsorted(posiciones, hasta) - 1
+    candidata = posiciones[np.maximum(i, 0)] if len(posiciones) else ninguna
+    return np.where((i >= 0) & (candidata >= desde), candidata, ninguna)
+
+
+def formatear_restante_bus(segundos):
+    """Mismo texto que calcular_tiempo_restante_bus ('HH:MM'; 'Tiempo desconocido' si no había tiempo)."""
+    resultado = []
+    for valor in segundos:
+        if np.isnan(valor):
+            resultado.append(SIN_HORA_BUS)
+        else:
+            # timedelta.seconds descarta los días completos
+            valor = int(valor) % SEGUNDOS_DIA
+            resultado.append(f'{valor // 3600:02d}:{(valor // 60) % 60:02d}')
+    return resultado
+
+
+def tiempos_restantes_metro(horas, ahora=None):
+    return formatear_restante_metro(segundos_restantes_metro(horas, ahora))
+
+
+def tiempos_restantes_bus(textos):
+    return formatear_restante_bus(segundos_restantes_bus(textos))
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Servicio de disponibilidad de ValenBici, uno por proceso.
+
+Un hilo propio consulta el feed de estaciones de JCDecaux cada `periodo`
+segundos, así que volver a ejecutar la página (cada tecla en los buscadores)
+no hace ninguna petición de red:
+  - las peticiones son condicionales (If-None-Match / If-Modified-Since) si
+    el origen envía ETag o Last-Modified; un 304, o un cuerpo idéntico al
+    anterior, no se vuelve a procesar,
+  - cada estación del feed se compara con la de la tabla en memoria y solo
+    se sustituyen las que han cambiado; el DataFrame que leen las páginas
+    se reconstruye únicamente cuando hay algún cambio,
+  - hasta la primera descarga buena, o si JCDecaux no responde nunca, se
+    sirve la copia incluida en Valenbici.csv (a través de datos_estaticos).
+Tras una caída se siguen sirviendo los últimos datos buenos del feed.
+
+Con un almacén compartido (almacen_compartido.py) solo el proceso que tiene
+el arrendamiento 'valenbici' consulta JCDecaux y publica las estaciones; los
+demás leen del almacén la versión nueva cuando cambia (y reconstruyen su
+tabla una vez por cambio) o solo la fecha de comprobación si no.
+"""
+
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import namedtuple
+from types import MappingProxyType
+
+import pandas as pd
+
+import cliente_http
+import datos_estaticos
+import metricas
+
+log = logging.getLogger('valenbici')
+
+CONTRATO = 'Valence'
+API_KEY = os.environ.get('VALENCIA_JCDECAUX_KEY', 'e70c46dec74a2ec4923ed1ce7255e8c1d6ccec7f')
+URL_ESTACIONES = os.environ.get(
+    'VALENCIA_JCDECAUX_URL', f'https://api.jcdecaux.com/vls/v1/stations?contract={CONTRATO}&apiKey={API_KEY}')
+
+# Orígenes de los datos publicados
+ORIGEN_API, ORIGEN_CSV = 'api', 'csv'
+
+# Una estación, con los nombres de columna del feed de JCDecaux (y lat/lon)
+Estacion = namedtuple('Estacion', ['number', 'address', 'lat', 'lon', 'available_bikes',
+                                   'available_bike_stands', 'bike_stands', 'status', 'last_update'])
+
+# Datos publicados: cuándo se comprobaron, cuándo cambiaron, de dónde vienen,
+# número -> Estacion y el DataFrame que leen las páginas
+Instantanea = namedtuple('Instantanea', ['comprobada', 'modificada', 'origen', 'estaciones', 'tabla'])
+
+
+def desde_feed(estacion):
+    posicion = estacion.get('position') or {}
+    return Estacion(int(estacion['number']), estacion.get('address') or estacion.get('name', ''),
+                    float(posicion.get('lat', 'nan')), float(posicion.get('lng', 'nan')),
+                    int(estacion.get('available_bikes', 0)), int(estacion.get('available_bike_stands', 0)),
+                    int(estacion.get('bike_stands', 0)), estacion.get('status', 'CLOSED'),
+                    int(estacion.get('last_update') or 0))
+
+
+def desde_csv():
+    """Estaciones de la copia incluida en Valenbici.csv."""
+    tabla = datos_estaticos.paquete()['valenbici']
+    fechas = pd.to_datetime(pd.Series(tabla['fecha_actualizacion'].astype(str)),
+                            format='%d/%m/%Y %H:%M:%S', errors='coerce')
+    # Milisegundos desde 1970, como last_update en el feed (0 si no hay fecha)
+    milisegundos = ((fechas - pd.Timestamp(0)) // pd.Timedelta(milliseconds=1)).fillna(0)
+    columnas = zip(tabla['Numero'].tolist(), tabla['Direccion'].astype(str), tabla['lat'].tolist(),
+                   tabla['lon'].tolist(), tabla['Bicis_disponibles'].tolist(), tabla['Espacios_libres'].tolist(),
+                   tabla['Espacios_totales'].tolist(), tabla['Activo'].tolist(), milisegundos.tolist())
+    return {numero: Estacion(numero, direccion, lat, lon, bicis, libres, totales,
+                             'OPEN' if activo else 'CLOSED', int(fecha))
+            for numero, direccion, lat, lon, bicis, libres, totales, activo, fecha in columnas}
+
+
+def _tabla(estaciones):
+    return pd.DataFrame(sorted(estaciones.values()), columns=Estacion._fields)
+
+
+class ServicioValenBici:
+
+    # Cada cuánto mira el almacén un proceso que no es el líder
+    ESPERA_SEGUIDOR = 5.0
+
+    def __init__(self, url=URL_ESTACIONES, periodo=60.0, cliente=None, respaldo=desde_csv, al_publicar=None,
+                 almacen=None, al_ceder=None):
+        self.url = url
+        self.periodo = periodo
+        self.cliente = cliente or cliente_http.cliente
+        self._respaldo = respaldo
+        self.al_publicar = al_publicar  # Se llama con cada instantánea con cambios (p. ej. el histórico)
+        self.al_ceder = al_ceder  # Se llama al dejar de ser el líder o al detenerse (p. ej. volcar el histórico)
+        self._era_lider = False
+        self.almacen = almacen
+        self._version = None     # Versión del almacén de la instantánea actual
+        self._publicada = None   # Fecha de modificación de lo último que este proceso publicó
+        self._instantanea = None
+        self._lock = threading.Lock()
+        self._validadores = {}  # Cabeceras condicionales para la siguiente petición
+        self._huella = None  # Resumen del último cuerpo procesado
+        self._hilo = None
+        self._parar = threading.Event()
+        self.descargas = 0
+        self.no_modificadas = 0
+        self.estaciones_cambiadas = 0
+        self.lecturas = 0
+        self.errores = 0
+
+    def instantanea(self):
+        if self._instantanea is None:
+            with self._lock:
+                if self._instantanea is None:
+                    estaciones = self._respaldo()
+                    self._instantanea = Instantanea(0.0, 0.0, ORIGEN_CSV, MappingProxyType(estaciones),
+                                                    _tabla(estaciones))
+        return self._instantanea
+
+    def estaciones(self):
+        """DataFrame de estaciones (copia superficial: la página puede añadir columnas)."""
+        return self.instantanea().tabla.copy(deep=False)
+
+    def iniciar(self):
+        if self._hilo is None:
+            self._parar.clear()
+            self._hilo = threading.Thread(target=self._bucle, name='valenbici', daemon=True)
+            self._hilo.start()
+        return self
+
+    def detener(self):
+        self._parar.set()
+        if self._hilo is not None:
+            self._hilo.join()
+            self._hilo = None
+        self._ceder()
+        if self.almacen is not None:
+            self.almacen.soltar('valenbici')
+
+    def _bucle(self):
+        while not self._parar.is_set():
+            inicio = time.monotonic()
+            lider = self._lider()
+            if self._era_lider and not lider:
+                self._ceder()
+            self._era_lider = lider
+            try:
+                if lider:
+                    self.actualizar()
+                else:
+                    self.leer_almacen()
+            except Exception as e:
+                self.errores += 1
+                log.warning('No se pudo actualizar ValenBici: %s', e)
+            if lider and self.almacen is not None:
+                self._publicar()
+            espera = self.periodo if lider else min(self.periodo, self.ESPERA_SEGUIDOR)
+            self._parar.wait(max(0.0, espera - (time.monotonic() - inicio)))
+
+    def _ceder(self):
+        if self._era_lider and self.al_ceder is not None:
+            try:
+                self.al_ceder()
+            except Exception as e:
+                self.errores += 1
+                log.warning('No se pudo ceder ValenBici: %s', e)
+        self._era_lider = False
+
+    def _lider(self):
+        if self.almacen is None:
+            return True
+        try:
+            return self.almacen.liderar('valenbici', 3 * self.periodo)
+        except Exception as e:
+            # Sin almacén utilizable cada proceso consulta JCDecaux por su cuenta
+            self.errores += 1
+            log.warning('Almacén compartido no disponible: %s', e)
+            return True
+
+    def _publicar(self):
+        # Solo los datos del feed: la copia del CSV la tiene cada proceso
+        actual = self._instantanea
+        if actual is None or actual.origen != ORIGEN_API:
+            return
+        try:
+            registros = None if actual.modificada == self._publicada else list(actual.estaciones.values())
+            self.almacen.publicar('valenbici', actual.modificada, actual.comprobada, registros)
+            self._publicada = actual.modificada
+        except Exception as e:
+            self.errores += 1
+            log.warning('No se pudo publicar ValenBici en el almacén: %s', e)
+
+    def leer_almacen(self):
+        """Toma la instantánea que ha publicado el líder; devuelve True si ha cambiado."""
+        guardada = self.almacen.leer('valenbici', self._version)
+        if guardada is None:
+            return False
+        version, modificada, comprobada, registros = guardada
+        if registros is None:
+            self._instantanea = self.instantanea()._replace(comprobada=comprobada)
+            return False
+        estaciones = {e.number: e for e in (Estacion(*r) for r in registros)}
+        self._instantanea = Instantanea(comprobada, modificada, ORIGEN_API, MappingProxyType(estaciones),
+                                        _tabla(estaciones))
+        self._version = version
+        self.lecturas += 1
+        return True
+
+    def actualizar(self):
+        """Una consulta al feed; devuelve cuántas estaciones han cambiado."""
+        actual = self.instantanea()
+        response = self.cliente.get(self.url, headers=self._validadores)
+        self.descargas += 1
+        if response.status_code == 304:
+            self.no_modificadas += 1
+            self._instantanea = actual._replace(comprobada=time.time())
+            return 0
+        response.raise_for_status()
+
+        self._validadores = {}
+        if response.headers.get('ETag'):
+            self._validadores['If-None-Match'] = response.headers['ETag']
+        if response.headers.get('Last-Modified'):
+            self._validadores['If-Modified-Since'] = response.headers['Last-Modified']
+
+        huella = hashlib.blake2b(response.content, digest_size=16).digest()
+        if huella == self._huella and actual.origen == ORIGEN_API:
+            self.no_modificadas += 1
+            self._instantanea = actual._replace(comprobada=time.time())
+            return 0
+
+        with metricas.PARSER.cronometrar('jcdecaux'):
+            cambios = self._aplicar(response.json(), actual)
+        self._huella = huella
+        return cambios
+
+    def _aplicar(self, feed, actual):
+        nuevas = {}
+        for estacion in feed:
+            try:
+                estacion = desde_feed(estacion)
+            except (KeyError, TypeError, ValueError):
+                continue
+            nuevas[estacion.number] = estacion
+        if not nuevas:
+            # Un feed vacío no sustituye a los datos que ya hay
+            raise ValueError('el feed de JCDecaux no contiene estaciones')
+
+        # Al pasar de la copia del CSV al feed se sustituye la tabla entera
+        anteriores = actual.estaciones if actual.origen == ORIGEN_API else {}
+        cambiadas = [numero for numero, estacion in nuevas.items() if anteriores.get(numero) != estacion]
+        retiradas = [numero for numero in anteriores if numero not in nuevas]
+        ahora = time.time()
+        if not cambiadas and not retiradas and actual.origen == ORIGEN_API:
+            self._instantanea = actual._replace(comprobada=ahora)
+            return 0
+
+        estaciones = dict(anteriores)
+        for numero in cambiadas:
+            estaciones[numero] = nuevas[numero]
+        for numero in retiradas:
+            del estaciones[numero]
+        # Se publica una instantánea nueva: las sesiones que leen la anterior no ven cambios a medias
+        self._instantanea = Instantanea(ahora, ahora, ORIGEN_API, MappingProxyType(estaciones),
+                                        _tabla(estaciones))
+        self.estaciones_cambiadas += len(cambiadas) + len(retiradas)
+        if self.al_publicar is not None:
+            try:
+                self.al_publicar(self._instantanea)
+            except Exception as e:
+                log.warning('Error al publicar la instantánea de ValenBici: %s', e)
+        return len(cambiadas) + len(retiradas)